@@ -7,6 +7,7 @@ import streamlit as st
 import pandas as pd
 from flight_delay import ui
 from flight_delay import services
+from flight_delay.api import aviationstack_client
 
 
 def init_session():
@@ -30,7 +31,8 @@ def visualization(destination_iata: str, predicted_delay: int, flight_num: str):
     :type flight_num: str
     """
     st.session_state['predicted_flights'] = services.add_flight_for_visualization(
-        destination_iata, predicted_delay, flight_num, st.session_state['predicted_flights']
+        destination_iata, predicted_delay, flight_num, st.session_state['predicted_flights'],
+        source_iata=st.session_state['airport_code']
     )
 
     data = pd.DataFrame(st.session_state['predicted_flights'])
@@ -54,7 +56,8 @@ def prediction():
         return
 
     destination_iata, predicted_delay, flight_num = services.run_prediction(
-        flight_number_input, flight_date_input, st.session_state['timetable_df']
+        flight_number_input, flight_date_input, st.session_state['timetable_df'],
+        airport_code=st.session_state['airport_code']
     )
 
     st.success(
@@ -71,23 +74,35 @@ def main():
     """
     st.set_page_config(page_title="Flight Delay Prediction", page_icon="✈️")
 
+    # API keys from .streamlit/secrets.toml unless they are set in the environment
+    aviationstack_client.set_secrets(st.secrets)
+
     init_session()
 
+    services.start_metrics_endpoint()
+
     ui.render_header()
 
     st.session_state['airport_code'] = ui.render_airport_select()
 
+    # Blocks only on the cold start, afterwards the last good timetable is served immediately.
+    # The prefetch fetches the departures together with the arrivals and weather, the refresher reads them.
     with st.spinner('Loading timetable...'):
-        st.session_state['timetable_df'] = ui.get_timetable_df(
-            st.session_state['airport_code'], 'departure'
+        services.prefetch_airport_data(st.session_state['airport_code'])
+        st.session_state['timetable_df'], fetched_at = services.get_live_timetable(
+            st.session_state['airport_code']
         )
 
     if st.session_state['timetable_df'].empty:
         st.warning('Timetable rendering failed. Timetable is empty.')
     else:
-        ui.render_timetable(st.session_state['timetable_df'])
+        forecasts = services.get_forecasts(st.session_state['airport_code'], st.session_state['timetable_df'])
+        ui.render_timetable(
+            st.session_state['timetable_df'], None if forecasts is None else forecasts.by_row
+        )
+        ui.render_timetable_age(fetched_at)
 
-    ui.render_refresh_button(st.session_state['airport_code'], st.session_state['timetable_df'])
+    ui.render_refresh_button(st.session_state['airport_code'])
 
     prediction()
 
@@ -0,0 +1,79 @@
+"""
+Latency of the single flight feature preprocessing:
+prepare_features (pandas) vs encode_flight_record (pure NumPy fast path).
+
+Runs offline - weather and arrivals are synthetic.
+
+    python benchmarks/bench_feature_encoder.py
+"""
+
+import timeit
+import pandas as pd
+from flight_delay import data_preprocessing
+
+N_FLIGHTS = 300
+REPEAT = 200
+
+
+def make_timetable(n_flights: int) -> list[dict]:
+    """
+    Synthetic raw AviationStack departure records for one day.
+    """
+    airlines = ['CSA', 'RYR', 'DLH', 'KLM', 'AFR']
+    destinations = ['FRA', 'STN', 'MUC', 'AMS', 'CDG', 'JFK']
+    return [
+        {
+            'departure': {
+                'terminal': None if i % 3 else '2',
+                'delay': None,
+                'scheduledTime': f'2025-12-26t{(i * 5 // 60) % 24:02d}:{(i * 5) % 60:02d}:00.000',
+                'actualTime': None,
+            },
+            'arrival': {'iataCode': destinations[i % len(destinations)]},
+            'airline': {'icaoCode': airlines[i % len(airlines)]},
+            'flight': {'iataNumber': f'XX{i}'},
+        }
+        for i in range(n_flights)
+    ]
+
+
+def main():
+    """
+    Prints the mean latency per flight of both preprocessing paths.
+    """
+    weather = pd.DataFrame({
+        'time': pd.date_range('2025-12-26', periods=24, freq='h'),
+        'temp_c': 3.0, 'precip_mm': 0.0, 'wind_kph': 12.0,
+    })
+    arrivals = pd.DataFrame({
+        'hour_bucket': pd.date_range('2025-12-26', periods=250, freq='5min').round('h'),
+    })
+    data_preprocessing.get_weather = lambda airport_code='PRG': weather
+    data_preprocessing.get_arrival_df = lambda airport_code='PRG': arrivals
+
+    records = make_timetable(N_FLIGHTS)
+    timetable_df = pd.json_normalize(records)
+    timetable_df.attrs['fetched_at'] = pd.Timestamp.now(tz='UTC')
+    flight_row = timetable_df.iloc[[42]]
+    record = records[42]
+
+    # warm up the schema and indexes, they are built once per fetch
+    data_preprocessing.prepare_features(timetable_df, flight_row)
+    traffic_index = data_preprocessing.get_traffic_index(timetable_df)
+    weather_index = data_preprocessing.get_weather_index()
+
+    pandas_time = timeit.timeit(
+        lambda: data_preprocessing.prepare_features(timetable_df, flight_row), number=REPEAT
+    ) / REPEAT
+    numpy_time = timeit.timeit(
+        lambda: data_preprocessing.encode_flight_record(record, traffic_index, weather_index),
+        number=REPEAT
+    ) / REPEAT
+
+    print(f'prepare_features:     {pandas_time * 1e3:8.3f} ms / flight')
+    print(f'encode_flight_record: {numpy_time * 1e3:8.3f} ms / flight')
+    print(f'speedup:              {pandas_time / numpy_time:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
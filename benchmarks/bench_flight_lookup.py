@@ -0,0 +1,70 @@
+"""
+Latency of the flight number lookup on a large multi-airport timetable:
+full column scan (previous filter_flight) vs the flight number index.
+
+Runs offline - the timetable is synthetic.
+
+    python benchmarks/bench_flight_lookup.py
+"""
+
+import timeit
+import numpy as np
+import pandas as pd
+from flight_delay import prediction
+
+N_ROWS = 50_000
+AIRPORTS = ['PRG', 'VIE', 'FRA', 'MUC', 'AMS', 'CDG', 'LHR', 'WAW']
+REPEAT = 200
+
+
+def make_timetable(n_rows: int) -> pd.DataFrame:
+    """
+    Synthetic json_normalized timetable of several airports, a third of the flights has a codeshare.
+    """
+    rng = np.random.default_rng(0)
+    airlines = ['OK', 'FR', 'LH', 'KL', 'AF', 'OS', 'LO', 'BA']
+    df = pd.DataFrame({
+        'departure.iataCode': rng.choice(AIRPORTS, n_rows),
+        'flight.iataNumber': [f' {airlines[i % len(airlines)].lower()}{i} ' for i in range(n_rows)],
+        'codeshared.flight.iataNumber': [
+            f'{airlines[(i + 3) % len(airlines)]}{i + n_rows}' if i % 3 == 0 else None for i in range(n_rows)
+        ],
+        'arrival.iataCode': rng.choice(AIRPORTS, n_rows),
+    })
+    df.attrs['fetched_at'] = pd.Timestamp.now(tz='UTC')
+    return df
+
+
+def scan(df: pd.DataFrame, flight_number: str) -> pd.DataFrame:
+    """
+    The previous filter_flight - normalizes the whole column on every lookup.
+    """
+    df = df.copy()
+    df['flight.iataNumber'] = df['flight.iataNumber'].fillna("").str.strip().str.upper()
+    return df[df['flight.iataNumber'] == flight_number]
+
+
+def main():
+    df = make_timetable(N_ROWS)
+    queries = [f'OK{i}' for i in range(0, N_ROWS, N_ROWS // 50 * 8)] + ['XX1']
+
+    build_ms = timeit.timeit(lambda: prediction.build_flight_index(df), number=5) / 5 * 1000
+    prediction.get_flight_index(df)
+
+    scan_ms = timeit.timeit(lambda: [scan(df, q) for q in queries], number=3) / (3 * len(queries)) * 1000
+    index_ms = timeit.timeit(
+        lambda: [prediction.filter_flight(df, q) for q in queries], number=REPEAT
+    ) / (REPEAT * len(queries)) * 1000
+    get_ms = timeit.timeit(
+        lambda: [prediction.get_flight_index(df).get(q) for q in queries], number=REPEAT
+    ) / (REPEAT * len(queries)) * 1000
+
+    print(f'{N_ROWS} rows, {len(AIRPORTS)} airports')
+    print(f'index build (once per fetch) {build_ms:9.2f} ms')
+    print(f'column scan per lookup       {scan_ms:9.3f} ms')
+    print(f'filter_flight with index     {index_ms:9.3f} ms   {scan_ms / index_ms:6.0f}x')
+    print(f'index lookup only            {get_ms:9.4f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Cold start of the delay model: a new process imports the backend, loads the model
+and predicts one flight. joblib XGBRegressor vs native booster vs numpy evaluator.
+
+Uses the trained model in models/ if there is one, otherwise a synthetic one of a similar size.
+
+    python benchmarks/bench_model_load.py
+"""
+
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+from flight_delay import predictor as model_backends
+
+REPEAT = 5
+
+COLD_START = '''
+import sys, numpy as np
+from flight_delay import predictor
+model = predictor.load_predictor(sys.argv[1], sys.argv[2])
+model.predict(np.zeros((1, len(model.feature_names_in_)), dtype=np.float32))
+'''
+
+
+def make_models(models_dir: Path):
+    """
+    Synthetic model (13 features, 300 trees of depth 6) saved in all the formats.
+    """
+    import joblib
+    import pandas as pd
+    from xgboost import XGBRegressor
+
+    rng = np.random.default_rng(0)
+    x = pd.DataFrame(rng.normal(size=(5000, 13)), columns=[f'f{i}' for i in range(13)])
+    y = x['f0'] * 10 + x['f3'] ** 2 + rng.normal(size=len(x))
+    joblib.dump(XGBRegressor(n_estimators=300, max_depth=6).fit(x, y), models_dir / 'flight_delay_xgb.joblib')
+    model_backends.export_model(models_dir / 'flight_delay_xgb.joblib', models_dir)
+
+
+def cold_start(backend: str, models_dir: Path) -> float:
+    """
+    Best wall time of a new process loading the model and predicting once.
+    """
+    times = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', COLD_START, backend, str(models_dir)], check=True)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        models_dir = model_backends.MODELS_DIR
+        if not (models_dir / 'flight_delay_xgb.joblib').exists():
+            models_dir = Path(tmp)
+            make_models(models_dir)
+        elif not (models_dir / 'flight_delay_xgb.json').exists():
+            model_backends.export_model(models_dir / 'flight_delay_xgb.joblib', models_dir)
+
+        baseline = cold_start('joblib', models_dir)
+        for backend in ('joblib', 'booster', 'numpy'):
+            seconds = baseline if backend == 'joblib' else cold_start(backend, models_dir)
+            print(f'{backend:8s} {seconds * 1000:8.1f} ms   {baseline / seconds:5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Loading the departures for the training set: wide CSV vs partitioned Parquet dataset.
+Every variant runs in a new process, so the peak RSS (VmHWM) is its own.
+
+    csv full       pd.read_csv(..., low_memory=False) like the notebook
+    csv usecols    only the columns of the training set, explicit dtypes
+    parquet        only the columns of the training set (column projection)
+    parquet month  the same for one month (predicate pushdown on the month partition)
+
+Uses data/raw/departures_250101_250430.csv if there is one, otherwise a synthetic export of a similar shape.
+
+    python benchmarks/bench_storage.py [rows]
+"""
+
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from flight_delay.training import dataset, storage
+
+REPEAT = 3
+
+LOAD = '''
+import sys, time
+import pandas as pd
+from flight_delay.training import dataset, storage
+variant, path = sys.argv[1], sys.argv[2]
+start = time.perf_counter()
+if variant == 'csv full':
+    df = pd.read_csv(path, low_memory=False)
+elif variant == 'csv usecols':
+    df = pd.read_csv(path, usecols=list(dataset.DEPARTURE_DTYPES), dtype=dataset.DEPARTURE_DTYPES)
+elif variant == 'parquet':
+    df = storage.read_dataset(path, columns=list(dataset.DEPARTURE_DTYPES))
+else:
+    df = storage.read_dataset(path, columns=list(dataset.DEPARTURE_DTYPES), start_month='2025-02', end_month='2025-02')
+seconds = time.perf_counter() - start
+# ru_maxrss would include the parent process at fork time, VmHWM is reset by exec
+peak_kb = next(int(line.split()[1]) for line in open('/proc/self/status') if line.startswith('VmHWM'))
+print(seconds, peak_kb, len(df))
+'''
+
+
+def make_export(path: Path, rows: int):
+    """
+    Synthetic departures export - the training columns plus 40 text columns like the nested AviationStack fields.
+    """
+    rng = np.random.default_rng(0)
+    scheduled = pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 120 * 24 * 60, rows), unit='min')
+    df = pd.DataFrame({
+        'status': rng.choice(['active', 'cancelled', 'unknown'], rows, p=[0.9, 0.05, 0.05]),
+        'departure.iataCode': 'prg',
+        'departure.scheduledTime': scheduled.strftime('%Y-%m-%dt%H:%M:00.000'),
+        'departure.estimatedTime': scheduled.strftime('%Y-%m-%dt%H:%M:00.000'),
+        'departure.actualTime': (scheduled + pd.to_timedelta(rng.integers(0, 60, rows), unit='min'))
+        .strftime('%Y-%m-%dt%H:%M:00.000'),
+        'departure.delay': rng.integers(0, 60, rows).astype(float),
+        'departure.terminal': rng.choice([1.0, 2.0], rows),
+        'airline.icaoCode': rng.choice([f'a{i:02d}' for i in range(60)], rows),
+        'arrival.iataCode': rng.choice([f'd{i:03d}' for i in range(200)], rows),
+    })
+    for i in range(40):
+        df[f'extra.field{i}'] = rng.choice([f'value{j}' for j in range(50)], rows)
+    df.to_csv(path, index=False)
+
+
+def measure(variant: str, path: Path) -> tuple[float, float]:
+    """
+    Best load time in seconds and the peak RSS in MB of that run.
+    """
+    runs = []
+    for _ in range(REPEAT):
+        out = subprocess.run(
+            [sys.executable, '-c', LOAD, variant, str(path)], check=True, capture_output=True, text=True
+        ).stdout.split()
+        runs.append((float(out[0]), int(out[1]) / 1024))
+    return min(runs)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = dataset.RAW_DIR / 'departures_250101_250430.csv'
+        if not csv_path.exists():
+            csv_path = Path(tmp) / 'departures.csv'
+            make_export(csv_path, rows)
+
+        parquet_path = Path(tmp) / 'departures'
+        start = time.perf_counter()
+        storage.convert_csv(csv_path, parquet_path, 'departures')
+        print(f'conversion: {time.perf_counter() - start:.1f} s (once)')
+
+        baseline = None
+        for variant, path in [('csv full', csv_path), ('csv usecols', csv_path),
+                              ('parquet', parquet_path), ('parquet month', parquet_path)]:
+            seconds, rss = measure(variant, path)
+            baseline = baseline or seconds
+            print(f'{variant:14s} {seconds * 1000:8.1f} ms  {baseline / seconds:5.1f}x   peak RSS {rss:7.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Import time of the Streamlit-free core vs the Streamlit adapter layer,
+measured in fresh processes with 'python -X importtime'.
+
+    python benchmarks/import_time.py
+"""
+
+import subprocess
+import sys
+
+MODULES = [
+    'flight_delay.prediction',      # core: client, features, prediction logic
+    'flight_delay.predictor',       # core: model serving formats
+    'flight_delay.services',        # Streamlit adapter
+]
+
+HEAVY = ('streamlit', 'requests', 'httpx', 'joblib', 'sklearn', 'xgboost')
+
+REPEAT = 5
+
+
+def import_time(module: str) -> tuple[float, set]:
+    """
+    Cumulative import time of the module in a new process (best of REPEAT)
+    and the heavy dependencies it pulled in.
+
+    :return: (milliseconds, heavy modules imported)
+    """
+    best = None
+    for _ in range(REPEAT):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            capture_output=True, text=True, check=True
+        )
+        total = 0
+        loaded = set()
+        for line in result.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = (part.strip() for part in line[len('import time:'):].split('|'))
+            if name.lstrip() == module:
+                total = int(cumulative)
+            top = name.strip().split('.')[0]
+            if top in HEAVY:
+                loaded.add(top)
+        if best is None or total < best[0]:
+            best = (total, loaded)
+    return best[0] / 1000, best[1]
+
+
+def main():
+    for module in MODULES:
+        ms, loaded = import_time(module)
+        print(f'{module:26s} {ms:8.1f} ms   heavy: {", ".join(sorted(loaded)) or "-"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Load test of the prediction service (flight_delay.server): p50 / p99 latency and throughput
+of concurrent /predict requests, with and without micro-batching.
+
+Offline by default - the app runs in a child process (uvicorn) with a synthetic timetable
+and an XGBoost model trained on random data. Needs 'pip install fastapi uvicorn'.
+
+    python benchmarks/load_test_server.py
+    python benchmarks/load_test_server.py --url http://localhost:8000 --flights OK123,FR200
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import socket
+import time
+import numpy as np
+import pandas as pd
+import httpx
+from flight_delay import data_preprocessing, server
+
+N_FLIGHTS = 300
+
+
+def make_timetable(n_flights: int) -> pd.DataFrame:
+    """
+    Synthetic departure timetable (json_normalized AviationStack response).
+    """
+    airlines = ['CSA', 'RYR', 'DLH', 'KLM', 'AFR']
+    destinations = ['FRA', 'STN', 'MUC', 'AMS', 'CDG', 'JFK']
+    df = pd.DataFrame({
+        'departure.terminal': [None] * n_flights,
+        'departure.delay': [None] * n_flights,
+        'departure.scheduledTime': [
+            f'2025-12-26t{(i * 5 // 60) % 24:02d}:{(i * 5) % 60:02d}:00.000' for i in range(n_flights)
+        ],
+        'airline.icaoCode': [airlines[i % len(airlines)] for i in range(n_flights)],
+        'departure.actualTime': [None] * n_flights,
+        'arrival.iataCode': [destinations[i % len(destinations)] for i in range(n_flights)],
+        'flight.iataNumber': [f'XX{i}' for i in range(n_flights)],
+    })
+    df.attrs['fetched_at'] = pd.Timestamp.now(tz='UTC')
+    return df
+
+
+def make_model():
+    """
+    XGBoost model of a realistic size trained on random data in the model's feature order.
+    """
+    from xgboost import XGBRegressor
+
+    features = list(data_preprocessing.get_feature_schema().feature_order)
+    rng = np.random.default_rng(0)
+    x = pd.DataFrame(rng.normal(size=(5000, len(features))), columns=features)
+    y = 10 * x['departure_traffic'] + rng.normal(size=len(x))
+    return XGBRegressor(n_estimators=300, max_depth=6).fit(x, y)
+
+
+def serve_offline(port: int, max_batch_size: int):
+    """
+    Runs the app with the synthetic timetable and model (in a separate process).
+    """
+    import uvicorn
+
+    timetable_df = make_timetable(N_FLIGHTS)
+    data_preprocessing.get_arrival_df = lambda airport_code='PRG': pd.DataFrame()
+    app = server.create_app(
+        get_timetable=lambda airport: (timetable_df, timetable_df.attrs['fetched_at']),
+        predictor=make_model(), weather_index=lambda airport_code: {}, max_batch_size=max_batch_size,
+    )
+    uvicorn.run(app, host='127.0.0.1', port=port, log_level='warning')
+
+
+def start_server(max_batch_size: int) -> str:
+    """
+    Starts the offline server in a separate process (the load generator must not share its GIL).
+
+    :return: Base URL of the server.
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    multiprocessing.Process(target=serve_offline, args=(port, max_batch_size), daemon=True).start()
+
+    url = f'http://127.0.0.1:{port}'
+    while True:
+        try:
+            httpx.get(f'{url}/health')
+            return url
+        except httpx.TransportError:
+            time.sleep(0.2)
+
+
+async def load(url: str, flights: list[str], requests: int, concurrency: int) -> list[float]:
+    """
+    Sends the requests with the given number of concurrent clients.
+
+    :return: Latencies of the requests in seconds.
+    """
+    latencies = []
+    queue = [flights[i % len(flights)] for i in range(requests)]
+
+    async def worker(client):
+        while queue:
+            flight = queue.pop()
+            start = time.perf_counter()
+            response = await client.get(f'{url}/predict', params={'flight': flight})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return latencies
+
+
+def report(name: str, latencies: list[float], seconds: float, batching: dict):
+    """
+    Prints the latency percentiles, throughput and the mean batch size.
+    """
+    ms = np.array(latencies) * 1000
+    print(
+        f'{name:22s} p50 {np.percentile(ms, 50):7.1f} ms   p99 {np.percentile(ms, 99):7.1f} ms   '
+        f'{len(ms) / seconds:7.0f} req/s   mean batch {batching.get("mean_batch_size", 0):5.1f}'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Running server to test, offline in-process server if not set.')
+    parser.add_argument('--flights', help='Comma separated flight numbers to request (with --url).')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    args = parser.parse_args()
+
+    if args.url:
+        targets = [('server', args.url)]
+        flights = args.flights.split(',')
+    else:
+        flights = list(make_timetable(N_FLIGHTS)['flight.iataNumber'])
+        targets = [
+            (f'max_batch_size={size}', start_server(size)) for size in (1, server.MAX_BATCH_SIZE)
+        ]
+
+    for name, url in targets:
+        asyncio.run(load(url, flights, 100, args.concurrency))  # warm up
+        start = time.perf_counter()
+        latencies = asyncio.run(load(url, flights, args.requests, args.concurrency))
+        seconds = time.perf_counter() - start
+        report(name, latencies, seconds, httpx.get(f'{url}/health').json().get('batching', {}))
+
+
+if __name__ == '__main__':
+    main()
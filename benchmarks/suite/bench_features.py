@@ -0,0 +1,77 @@
+"""
+Feature hot paths on timetables of 100 to 100k rows.
+
+    cd benchmarks/suite && pytest --benchmark-autosave
+"""
+
+import pandas as pd
+import pytest
+from conftest import flight_number, to_timetable_df
+from flight_delay import data_preprocessing, prediction
+
+pytest.importorskip('pytest_benchmark')
+
+
+@pytest.mark.benchmark(group='json_normalize')
+def test_normalize_timetable(benchmark, timetable_df, timetable_json):
+    """
+    Raw AviationStack response to the timetable dataframe (prediction.fetch_timetable_df).
+    """
+    raw = timetable_json(len(timetable_df))
+    benchmark.extra_info['rows'] = len(timetable_df)
+    benchmark(to_timetable_df, raw)
+
+
+@pytest.mark.benchmark(group='prepare_features')
+def test_prepare_features(benchmark, timetable_df):
+    """
+    Single flight, pandas path (traffic and weather indexes are warm).
+    """
+    flight_row = prediction.filter_flight(timetable_df, flight_number(timetable_df))
+    assert not data_preprocessing.prepare_features(timetable_df, flight_row).empty
+    benchmark.extra_info['rows'] = len(timetable_df)
+    benchmark(data_preprocessing.prepare_features, timetable_df, flight_row)
+
+
+@pytest.mark.benchmark(group='prepare_features_batch')
+def test_prepare_features_batch(benchmark, timetable_df):
+    """
+    Whole timetable at once (forecasts, /predict/batch).
+    """
+    benchmark.extra_info['rows'] = len(timetable_df)
+    features = benchmark(data_preprocessing.prepare_features_batch, timetable_df)
+    assert len(features) == len(timetable_df)
+
+
+@pytest.mark.benchmark(group='add_traffic')
+def test_add_traffic(benchmark, timetable_df):
+    """
+    Traffic features of one flight from the cached traffic index.
+    """
+    flight_row = prediction.filter_flight(timetable_df, flight_number(timetable_df))[
+        list(data_preprocessing.RAW_FEATURE_COLUMNS)
+    ].rename(columns=data_preprocessing.RAW_FEATURE_COLUMNS)
+    flight_row['scheduled_time'] = pd.to_datetime(flight_row['scheduled_time'])
+    benchmark.extra_info['rows'] = len(timetable_df)
+    benchmark(data_preprocessing.add_traffic, timetable_df, flight_row.copy())
+
+
+@pytest.mark.benchmark(group='traffic_index')
+def test_build_traffic_index(benchmark, timetable_df):
+    """
+    Cold traffic index, built once per timetable fetch.
+    """
+    arrivals = data_preprocessing.get_arrival_df()
+    benchmark.extra_info['rows'] = len(timetable_df)
+    benchmark(data_preprocessing.build_traffic_index, timetable_df, arrivals)
+
+
+@pytest.mark.benchmark(group='filter_flight')
+def test_filter_flight(benchmark, timetable_df):
+    """
+    Flight number lookup (the flight index is warm).
+    """
+    number = flight_number(timetable_df)
+    assert not prediction.filter_flight(timetable_df, number).empty
+    benchmark.extra_info['rows'] = len(timetable_df)
+    benchmark(prediction.filter_flight, timetable_df, number)
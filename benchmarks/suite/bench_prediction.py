@@ -0,0 +1,77 @@
+"""
+Departures board preprocessing and the end-to-end prediction with a small trained model.
+
+    cd benchmarks/suite && pytest --benchmark-autosave
+"""
+
+import datetime
+import pandas as pd
+import pytest
+from conftest import FIRST_DAY, flight_number
+from flight_delay import prediction
+
+pytest.importorskip('pytest_benchmark')
+
+
+@pytest.mark.benchmark(group='timetable_view')
+def test_timetable_view(benchmark, timetable_df):
+    """
+    Preprocessing of ui.render_timetable, the board of the first day with the precomputed delays.
+    """
+    from flight_delay import ui
+
+    now = FIRST_DAY.tz_localize('UTC') + pd.Timedelta(hours=6)
+    delays = pd.Series(10, index=timetable_df.index, dtype='Int64')
+    assert not ui.timetable_view(timetable_df, delays, now=now).empty
+    benchmark.extra_info['rows'] = len(timetable_df)
+    benchmark(ui.timetable_view, timetable_df, delays, now=now)
+
+
+@pytest.mark.benchmark(group='predict_timetable')
+def test_predict_timetable(benchmark, timetable_df, small_model):
+    """
+    Forecasts of the whole timetable with one predict call.
+    """
+    benchmark.extra_info['rows'] = len(timetable_df)
+    delays = benchmark(prediction.predict_timetable, small_model, timetable_df, 'PRG')
+    assert delays.notna().all()
+
+
+@pytest.fixture
+def services(monkeypatch, small_model):
+    """
+    Streamlit services with the small model and without the background forecasts.
+    """
+    from flight_delay import services
+
+    monkeypatch.setattr(services, 'load_predictor', lambda airport_code='PRG': small_model)
+    monkeypatch.setattr(services, 'get_forecasts', lambda airport_code, timetable_df: None)
+    monkeypatch.setattr('builtins.print', lambda *args, **kwargs: None)
+    return services
+
+
+@pytest.mark.benchmark(group='run_prediction')
+def test_run_prediction(benchmark, timetable_df, services):
+    """
+    End to end - lookup, features and predict, the prediction cache is cleared before every round.
+    """
+    number = flight_number(timetable_df)
+    day = datetime.date(2025, 3, 12)
+    benchmark.extra_info['rows'] = len(timetable_df)
+    result = benchmark.pedantic(
+        services.run_prediction, args=(number, day, timetable_df, 'PRG'),
+        setup=prediction._prediction_cache.clear, rounds=50, warmup_rounds=1,
+    )
+    assert result[2] == number and result[1] is not None
+
+
+@pytest.mark.benchmark(group='run_prediction_cached')
+def test_run_prediction_cached(benchmark, timetable_df, services):
+    """
+    End to end with the prediction cached (the same flight asked again).
+    """
+    number = flight_number(timetable_df)
+    day = datetime.date(2025, 3, 12)
+    benchmark.extra_info['rows'] = len(timetable_df)
+    result = benchmark(services.run_prediction, number, day, timetable_df, 'PRG')
+    assert result[1] is not None
@@ -0,0 +1,153 @@
+"""
+Offline fixtures of the benchmark suite: synthetic AviationStack timetables of 100 to 100k rows,
+a recorded Open-Meteo response (data/open_meteo_prg.json, see record_weather.py) and a small trained model.
+No API is called, the results only depend on the code and the machine.
+"""
+
+import json
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
+from flight_delay import data_preprocessing, prediction
+
+DATA_DIR = Path(__file__).resolve().parent / 'data'
+
+# Timetable sizes, FLIGHT_DELAY_BENCH_MAX_ROWS skips the larger ones for a quick run
+SIZES = [n for n in (100, 1_000, 10_000, 100_000) if n <= int(os.environ.get('FLIGHT_DELAY_BENCH_MAX_ROWS', 100_000))]
+
+# First day of the recorded forecast, the timetables start here
+FIRST_DAY = pd.Timestamp('2025-03-12')
+
+AIRLINES = [('CSA', 'OK', 'Czech Airlines'), ('RYR', 'FR', 'Ryanair'), ('DLH', 'LH', 'Lufthansa'),
+            ('KLM', 'KL', 'KLM'), ('AFR', 'AF', 'Air France'), ('WZZ', 'W6', 'Wizz Air')]
+DESTINATIONS = ['FRA', 'STN', 'MUC', 'AMS', 'CDG', 'VIE', 'WAW', 'LHR', 'BCN', 'FCO', 'JFK', 'DXB']
+STATUSES = ['scheduled', 'active', 'landed', 'cancelled']
+
+
+def make_timetable_json(n_rows: int, first_day: pd.Timestamp = FIRST_DAY) -> dict:
+    """
+    Synthetic AviationStack timetable response, the flights are spread over the 7 days of the forecast.
+    Every third flight has a codeshare partner.
+
+    :param n_rows: Number of flights.
+    :type n_rows: int
+    :return: Response with 'data' like the timetable endpoint.
+    :rtype: dict
+    """
+    rng = np.random.default_rng(n_rows)
+    minutes = np.sort(rng.integers(0, 7 * 24 * 60, n_rows))
+    scheduled = (first_day + pd.to_timedelta(minutes, unit='min')).strftime('%Y-%m-%dt%H:%M:00.000')
+    data = []
+    for i in range(n_rows):
+        icao, iata, name = AIRLINES[i % len(AIRLINES)]
+        delay = int(rng.integers(0, 40)) if i % 4 == 0 else None
+        record = {
+            'type': 'departure',
+            'status': STATUSES[i % len(STATUSES)],
+            'departure': {
+                'iataCode': 'PRG',
+                'terminal': None if i % 3 else str(1 + i % 2),
+                'delay': delay,
+                'scheduledTime': scheduled[i],
+                'actualTime': scheduled[i] if delay is not None else None,
+            },
+            'arrival': {'iataCode': DESTINATIONS[i % len(DESTINATIONS)]},
+            'airline': {'name': name, 'iataCode': iata, 'icaoCode': icao},
+            'flight': {'number': str(i), 'iataNumber': f'{iata}{i}', 'icaoNumber': f'{icao}{i}'},
+        }
+        if i % 3 == 0:
+            partner_icao, partner_iata, partner_name = AIRLINES[(i + 1) % len(AIRLINES)]
+            record['codeshared'] = {
+                'airline': {'name': partner_name, 'iataCode': partner_iata, 'icaoCode': partner_icao},
+                'flight': {'number': str(i + n_rows), 'iataNumber': f'{partner_iata}{i + n_rows}'},
+            }
+        data.append(record)
+    return {'pagination': {'limit': n_rows, 'offset': 0, 'count': n_rows, 'total': n_rows}, 'data': data}
+
+
+def to_timetable_df(raw: dict) -> pd.DataFrame:
+    """
+    json_normalize like prediction.fetch_timetable_df. The version is fixed per size,
+    so the indexes derived from the timetable are cached like between two refreshes.
+    """
+    df = pd.json_normalize(raw['data'])
+    df.attrs['fetched_at'] = pd.Timestamp('2025-03-12 06:00', tz='UTC') + pd.Timedelta(microseconds=len(df))
+    return df
+
+
+@pytest.fixture(scope='session')
+def timetable_json():
+    """
+    Synthetic timetable responses by size, built once per session.
+    """
+    cache = {}
+
+    def get(n_rows: int) -> dict:
+        if n_rows not in cache:
+            cache[n_rows] = make_timetable_json(n_rows)
+        return cache[n_rows]
+
+    return get
+
+
+@pytest.fixture(params=SIZES, ids=lambda n: f'{n}rows')
+def timetable_df(request, timetable_json):
+    """
+    Normalized timetable of every size.
+    """
+    return to_timetable_df(timetable_json(request.param))
+
+
+@pytest.fixture(scope='session')
+def recorded_weather() -> pd.DataFrame:
+    """
+    Parsed Open-Meteo response of PRG.
+    """
+    data = json.loads((DATA_DIR / 'open_meteo_prg.json').read_text())
+    df_weather = data_preprocessing.parse_weather(data)
+    df_weather.attrs['fetched_at'] = pd.Timestamp('2025-03-12 06:00', tz='UTC')
+    return df_weather
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch, recorded_weather, timetable_json):
+    """
+    The weather is the recorded response, the arrivals a synthetic timetable - no API is called.
+    """
+    arrivals = to_timetable_df(make_timetable_json(500))
+    arrivals['arrival.scheduledTime'] = pd.to_datetime(arrivals['departure.scheduledTime'])
+    arrivals['hour_bucket'] = arrivals['arrival.scheduledTime'].dt.round('h')
+    monkeypatch.setattr(data_preprocessing, 'get_weather', lambda airport_code='PRG': recorded_weather)
+    monkeypatch.setattr(data_preprocessing, 'get_arrival_df', lambda airport_code='PRG': arrivals)
+    monkeypatch.setattr(prediction, 'get_weather', lambda airport_code='PRG': recorded_weather)
+
+
+@pytest.fixture(scope='session')
+def small_model(tmp_path_factory):
+    """
+    Small XGBoost model (50 trees) trained on synthetic features in the model's feature order,
+    served like the real one (predictor.load_predictor).
+    """
+    import joblib
+    from xgboost import XGBRegressor
+    from flight_delay import predictor as model_backends
+
+    features = list(data_preprocessing.get_feature_schema().feature_order)
+    rng = np.random.default_rng(0)
+    x = pd.DataFrame(rng.normal(size=(5_000, len(features))).astype(np.float32), columns=features)
+    y = 10 * x['departure_traffic'] + 5 * x['precip_mm'] + rng.normal(size=len(x))
+    model = XGBRegressor(n_estimators=50, max_depth=4, n_jobs=1, random_state=0).fit(x, y)
+
+    models_dir = tmp_path_factory.mktemp('models')
+    joblib.dump(model, models_dir / f'{model_backends.MODEL_NAME}.joblib')
+    model_backends.export_model(model, models_dir)
+    return model_backends.load_predictor(models_dir=models_dir)
+
+
+def flight_number(df: pd.DataFrame) -> str:
+    """
+    Flight number in the middle of the timetable.
+    """
+    return df['flight.iataNumber'].iloc[len(df) // 2]
@@ -0,0 +1,73 @@
+"""
+Records the Open-Meteo response used by the benchmark suite (data/open_meteo_prg.json).
+
+    python benchmarks/suite/record_weather.py                         # live forecast of PRG
+    python benchmarks/suite/record_weather.py --from-history 2025-03-10  # offline, from data/raw
+
+The offline mode builds the response from the weather history of the repository (same format as the live
+forecast, local time), so the suite stays reproducible without network access.
+"""
+
+import argparse
+import json
+from pathlib import Path
+import pandas as pd
+from flight_delay.airports import DEFAULT_AIRPORT, airport_location
+from flight_delay.api import open_meteo_client
+from flight_delay.data_preprocessing import WEATHER_FEATURES
+from flight_delay.weather_store import load_history
+
+OUTPUT = Path(__file__).resolve().parent / 'data' / 'open_meteo_prg.json'
+
+
+def response_from_history(start: str, days: int) -> dict:
+    """
+    Hourly history of the default airport in the format of the Open-Meteo forecast response.
+
+    :param start: First day ('2025-03-10').
+    :type start: str
+    :param days: Number of days.
+    :type days: int
+    :return: Response with 'hourly' times (local) and the weather variables.
+    :rtype: dict
+    """
+    df = load_history(DEFAULT_AIRPORT, WEATHER_FEATURES)
+    start = pd.Timestamp(start)
+    df = df[(df['time'] >= start) & (df['time'] < start + pd.Timedelta(days=days))]
+    latitude, longitude = airport_location(DEFAULT_AIRPORT)
+    return {
+        'latitude': latitude,
+        'longitude': longitude,
+        'timezone': 'Europe/Prague',
+        'hourly_units': {'time': 'iso8601', 'temperature_2m': '°C', 'precipitation': 'mm', 'wind_speed_10m': 'km/h'},
+        'hourly': {
+            'time': df['time'].dt.strftime('%Y-%m-%dT%H:%M').tolist(),
+            'temperature_2m': df['temp_c'].tolist(),
+            'precipitation': df['precip_mm'].tolist(),
+            'wind_speed_10m': df['wind_kph'].tolist(),
+        },
+    }
+
+
+def main(argv: list[str] = None):
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description='Records the Open-Meteo response of the benchmark suite.')
+    parser.add_argument('--from-history', metavar='DAY', help='Build the response from data/raw instead of the API.')
+    parser.add_argument('--output', type=Path, default=OUTPUT)
+    args = parser.parse_args(argv)
+
+    days = open_meteo_client.PAST_DAYS + open_meteo_client.FORECAST_DAYS
+    if args.from_history:
+        data = response_from_history(args.from_history, days)
+    else:
+        data = open_meteo_client.fetch_forecast(*airport_location(DEFAULT_AIRPORT))
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(data, ensure_ascii=False))
+    print(f'Recorded {len(data["hourly"]["time"])} hours to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Departure airports served by the application.
+Per-airport data (timetables, arrivals, weather, models) is cached separately for every airport,
+the caches are bounded so one process can serve many hubs - airports nobody asked for lately are evicted.
+"""
+
+import os
+from flight_delay.utils.dicts import AIRPORT_COORDS, SUPPORTED_AIRPORTS
+
+DEFAULT_AIRPORT = 'PRG'
+
+# Number of airports whose data is kept in memory at once
+MAX_AIRPORTS = int(os.environ.get('FLIGHT_DELAY_MAX_AIRPORTS', len(SUPPORTED_AIRPORTS)))
+
+# Estimated memory budget of the cached per-airport dataframes (timetables, arrivals)
+MAX_AIRPORT_CACHE_BYTES = int(os.environ.get('FLIGHT_DELAY_AIRPORT_CACHE_MB', 256)) * 1024 * 1024
+
+
+def normalize_airport(airport_code: str) -> str:
+    """
+    :param airport_code: IATA airport code in any case.
+    :type airport_code: str
+    :return: Upper case IATA code, the default airport if empty.
+    :rtype: str
+    """
+    airport_code = (airport_code or '').strip().upper()
+    return airport_code or DEFAULT_AIRPORT
+
+
+def airport_location(airport_code: str) -> tuple[float, float]:
+    """
+    Coordinates of the airport for the weather forecast.
+
+    :param airport_code: IATA airport code.
+    :type airport_code: str
+    :return: (latitude, longitude)
+    :rtype: tuple[float, float]
+    :raises KeyError: Unknown airport.
+    """
+    longitude, latitude = AIRPORT_COORDS[normalize_airport(airport_code)]
+    return latitude, longitude
@@ -0,0 +1,272 @@
+"""
+Asynchronous API client (httpx) for the cold start of the app.
+Fetches the departure and arrival timetables and the weather forecast concurrently
+over one pooled connection set, so the cold path costs about as much as the slowest call.
+The synchronous entry point runs on one long-lived event loop thread that owns the client,
+so the connections are reused by the following prefetches.
+"""
+
+import asyncio
+import threading
+import time
+from urllib.parse import urlsplit
+from flight_delay.api import aviationstack_client, http_client, open_meteo_client, streaming
+from flight_delay.utils import metrics
+
+
+class AsyncApiClient:
+    """
+    Async HTTP client with a persistent connection pool.
+    Use it as an async context manager, the pool lives until the context exits.
+    """
+
+    def __init__(self, timeout: float = 10, max_connections: int = 10):
+        """
+        :param timeout: Request timeout in seconds.
+        :type timeout: float
+        :param max_connections: Size of the connection pool.
+        :type max_connections: int
+        """
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = None
+
+    async def __aenter__(self):
+        import httpx  # only needed when the async client is used
+
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections
+            ),
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self._client.aclose()
+        self._client = None
+        return False
+
+    async def get_json(self, url: str, params: dict = None) -> dict:
+        """
+        Executes a GET request and returns the decoded JSON.
+
+        :param url: Request URL.
+        :type url: str
+        :param params: Query parameters.
+        :type params: dict
+        :return: JSON response.
+        :rtype: dict
+        """
+        host = urlsplit(url).netloc
+        start = time.perf_counter()
+        try:
+            response = await self._client.get(url, params=params)
+            response.raise_for_status()
+            return response.json()
+        except Exception:
+            metrics.inc('upstream_errors_total', host=host)
+            raise
+        finally:
+            metrics.observe('upstream_seconds', time.perf_counter() - start, host=host)
+
+
+class ClientLoop:
+    """
+    Event loop in a daemon thread with one open AsyncApiClient, started on first use.
+    Synchronous callers (any thread) run coroutines on it and share the client's connection pool.
+    """
+
+    def __init__(self, **client_kwargs):
+        """
+        :param client_kwargs: Passed to AsyncApiClient (timeout, max_connections).
+        """
+        self._client_kwargs = client_kwargs
+        self._loop = None
+        self._client = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _start(self) -> tuple[asyncio.AbstractEventLoop, AsyncApiClient]:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='async-client', daemon=True)
+                thread.start()
+                client = AsyncApiClient(**self._client_kwargs)
+                asyncio.run_coroutine_threadsafe(client.__aenter__(), loop).result()
+                self._loop, self._client, self._thread = loop, client, thread
+            return self._loop, self._client
+
+    @property
+    def client(self) -> AsyncApiClient | None:
+        """
+        :return: The open client, None before the first run.
+        :rtype: AsyncApiClient | None
+        """
+        return self._client
+
+    def run(self, coroutine_fn, timeout: float = None):
+        """
+        Runs coroutine_fn(client) on the loop and waits for its result.
+
+        :param coroutine_fn: Coroutine function taking the open AsyncApiClient.
+        :param timeout: Seconds to wait for the result, no limit if None.
+        :type timeout: float
+        :return: Result of the coroutine.
+        """
+        loop, client = self._start()
+        return asyncio.run_coroutine_threadsafe(coroutine_fn(client), loop).result(timeout)
+
+    def close(self):
+        """
+        Closes the client and stops the loop, the next run starts new ones.
+        """
+        with self._lock:
+            loop, client, thread = self._loop, self._client, self._thread
+            self._loop = self._client = self._thread = None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(client.__aexit__(None, None, None), loop).result(5)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+            loop.close()
+
+
+_client_loop = ClientLoop()
+
+
+def get_client_loop() -> ClientLoop:
+    """
+    :return: Client loop shared by the process.
+    :rtype: ClientLoop
+    """
+    return _client_loop
+
+
+def airport_requests(airport_code: str, latitude: float, longitude: float) -> dict:
+    """
+    All the requests needed to predict delays at the airport (without API keys).
+    The first fetch of the departure refresher reads the prefetched departures (see prediction.fetch_timetable_df).
+    Paginated timetables are fetched page by page by the streaming client (see streaming), which does not
+    read the prefetched responses - with FLIGHT_DELAY_STREAMING only the weather is prefetched.
+
+    :param airport_code: IATA airport code.
+    :type airport_code: str
+    :param latitude: Latitude of the airport (weather).
+    :type latitude: float
+    :param longitude: Longitude of the airport (weather).
+    :type longitude: float
+    :return: {name: (url, params)}
+    :rtype: dict
+    """
+    reqs = {}
+    if not streaming.STREAMING:
+        timetable_url = f'{aviationstack_client.AVIATIONSTACK_BASE_URL}timetable'
+        reqs['departures'] = (timetable_url, aviationstack_client.timetable_params(airport_code, 'departure'))
+        reqs['arrivals'] = (timetable_url, aviationstack_client.timetable_params(airport_code, 'arrival'))
+    reqs['weather'] = (open_meteo_client.OPEN_METEO_URL, open_meteo_client.forecast_params(latitude, longitude))
+    return reqs
+
+
+async def fetch_airport_entries(airport_code: str, latitude: float, longitude: float,
+                                client: AsyncApiClient = None) -> dict:
+    """
+    Fetches both timetables and the weather forecast at the same time (see airport_requests).
+    Responses in the persistent response cache are not requested, the fetched ones are stored in it
+    with the TTL of their synchronous client.
+    A failed request does not cancel the others, its exception is returned instead.
+
+    :param airport_code: IATA airport code.
+    :type airport_code: str
+    :param latitude: Latitude of the airport.
+    :type latitude: float
+    :param longitude: Longitude of the airport.
+    :type longitude: float
+    :param client: Open client to reuse (its pool). If None, one is opened for this call only -
+                   prefetch_airport_data passes the long-lived one of the client loop.
+    :type client: AsyncApiClient
+    :return: {name: (JSON response, when it was fetched upstream (time.time())) or Exception}
+    :rtype: dict
+    """
+    if client is None:
+        async with AsyncApiClient() as new_client:
+            return await fetch_airport_entries(airport_code, latitude, longitude, new_client)
+
+    async def fetch(url, params):
+        base_url = aviationstack_client.AVIATIONSTACK_BASE_URL
+        aviationstack = url.startswith(base_url)
+        ttl = aviationstack_client.RESPONSE_CACHE_TTL if aviationstack else open_meteo_client.RESPONSE_CACHE_TTL
+
+        # another process or replica may have fetched it within the TTL
+        entry = await asyncio.to_thread(http_client.read_cache, url, params)
+        if entry is not None:
+            return entry
+
+        if aviationstack:
+            payload = await aviationstack_client.async_post_query(client, url[len(base_url):], params)
+        else:
+            payload = await client.get_json(url, params)
+        fetched_at = time.time()
+        await asyncio.to_thread(http_client.write_cache, url, params, payload, ttl, fetched_at)
+        return payload, fetched_at
+
+    reqs = airport_requests(airport_code, latitude, longitude)
+    results = await asyncio.gather(
+        *(fetch(url, params) for url, params in reqs.values()), return_exceptions=True
+    )
+    return dict(zip(reqs, results))
+
+
+async def fetch_airport_data(airport_code: str, latitude: float, longitude: float,
+                             client: AsyncApiClient = None) -> dict:
+    """
+    Fetches both timetables and the weather forecast at the same time, see fetch_airport_entries.
+
+    :param airport_code: IATA airport code.
+    :type airport_code: str
+    :param latitude: Latitude of the airport.
+    :type latitude: float
+    :param longitude: Longitude of the airport.
+    :type longitude: float
+    :param client: Open client to reuse (its pool), if None one is opened for this call only.
+    :type client: AsyncApiClient
+    :return: {name: JSON response or Exception}
+    :rtype: dict
+    """
+    entries = await fetch_airport_entries(airport_code, latitude, longitude, client)
+    return {name: entry if isinstance(entry, Exception) else entry[0] for name, entry in entries.items()}
+
+
+def prefetch_airport_data(airport_code: str, latitude: float, longitude: float) -> dict:
+    """
+    Synchronous entry point for the app. Fetches everything concurrently on the client loop (the connections
+    stay open for the next prefetch) and stores the responses so the following (cached) synchronous calls
+    do not hit the APIs again. The stored responses keep the time they were fetched upstream.
+
+    :param airport_code: IATA airport code.
+    :type airport_code: str
+    :param latitude: Latitude of the airport.
+    :type latitude: float
+    :param longitude: Longitude of the airport.
+    :type longitude: float
+    :return: {name: JSON response or Exception}
+    :rtype: dict
+    """
+    entries = get_client_loop().run(lambda client: fetch_airport_entries(airport_code, latitude, longitude, client))
+    reqs = airport_requests(airport_code, latitude, longitude)
+
+    results = {}
+    for name, entry in entries.items():
+        if isinstance(entry, Exception):
+            print(f'Prefetch of {name} for "{airport_code}" failed: {entry}')
+            results[name] = entry
+            continue
+        url, params = reqs[name]
+        http_client.store_prefetched(url, params, *entry)
+        results[name] = entry[0]
+
+    return results
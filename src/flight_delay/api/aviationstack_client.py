@@ -1,51 +1,191 @@
 """
 API client interface for the AviationStack flight data service.
 Handles the HTTP communication with the AviationStack API.
+
+API keys are looked up when a request is made: environment variables first,
+then the secrets registered with set_secrets (the app registers st.secrets).
 """
-import requests
-import streamlit as st
+import os
+from flight_delay.airports import MAX_AIRPORTS, MAX_AIRPORT_CACHE_BYTES
+from flight_delay.api import http_client
+from flight_delay.api.singleflight import SingleFlight, AsyncSingleFlight
+from flight_delay.utils.caching import ttl_cache
 
 AVIATIONSTACK_BASE_URL = "https://api.aviationstack.com/v1/"
 
-API_KEY_ARRIVAL = st.secrets.get('AVIATIONSTACK_2_API_KEY')
-API_KEY_DEPARTURE = st.secrets.get('AVIATIONSTACK_API_KEY')
+# Responses are shared through the persistent response cache for 5 minutes
+RESPONSE_CACHE_TTL = 300
+
+API_KEY_ARRIVAL_NAME = 'AVIATIONSTACK_2_API_KEY'
+API_KEY_DEPARTURE_NAME = 'AVIATIONSTACK_API_KEY'
+
+# Explicitly set keys take precedence over the lookup
+API_KEY_ARRIVAL = None
+API_KEY_DEPARTURE = None
+
+_secrets = None
+
+# Concurrent identical requests (same endpoint and params) share one upstream call
+_flight = SingleFlight()
+_async_flight = AsyncSingleFlight()
+
+
+def timetable_params(airport_code: str, timetable_type: str) -> dict:
+    """
+    Query parameters of the 'timetable' endpoint.
+
+    :param airport_code: IATA airport code.
+    :type airport_code: str
+    :param timetable_type: 'departure' or 'arrival'.
+    :type timetable_type: str
+    :return: Query parameters.
+    :rtype: dict
+    """
+    return {'iataCode': airport_code, 'type': timetable_type}
+
+
+def set_secrets(secrets):
+    """
+    Registers a secrets mapping (e.g. st.secrets) used when a key is not in the environment.
+
+    :param secrets: Mapping with a 'get' method.
+    """
+    global _secrets
+    _secrets = secrets
+
+
+def lookup_key(name: str) -> str | None:
+    """
+    Reads the key from the environment, then from the registered secrets.
+
+    :param name: Name of the key.
+    :type name: str
+    :return: The key or None if it is not set.
+    :rtype: str | None
+    """
+    value = os.environ.get(name)
+    if value:
+        return value
+    if _secrets is None:
+        return None
+    try:
+        return _secrets.get(name)
+    except Exception as e:
+        # st.secrets raises when there is no secrets.toml
+        print(f'Secrets not available: {e}')
+        return None
+
+
+def get_api_key(params: dict = None) -> str:
+    """
+    Chooses the API key for the request. Arrivals use the 2nd key.
+
+    :param params: Query parameters of the request.
+    :type params: dict
+    :return: API key.
+    :rtype: str
+    """
+    if params and params.get('type') == 'arrival':
+        api_key = API_KEY_ARRIVAL or lookup_key(API_KEY_ARRIVAL_NAME)
+    else:
+        api_key = API_KEY_DEPARTURE or lookup_key(API_KEY_DEPARTURE_NAME)
+
+    if not api_key:
+        raise ValueError('AVIATIONSTACK_API_KEY variable is missing!')
+    return api_key
+
 
+def post_query_entry(endpoint: str, params: dict = None, ttl: float = 0) -> tuple[dict, float]:
+    """
+    Executes a GET request to the AviationStack API (pooled session, see http_client).
+    Concurrent calls with the same endpoint and params wait for one request and share its response.
+
+    :param endpoint: API endpoint to query ('timetable', 'flights', ...).
+    :type endpoint: str
+    :param params: Optional query parameters ('date', 'type', ...).
+    :type params: dict
+    :param ttl: Seconds the response may be served from the persistent response cache, 0 = no caching.
+    :type ttl: float
+    :return: (JSON response from the API, when it was fetched upstream (time.time())).
+    :rtype: tuple[dict, float]
+    """
+    params = dict(params or {})
+    params['access_key'] = get_api_key(params)
+    url = f"{AVIATIONSTACK_BASE_URL}{endpoint}"
 
-def post_query(endpoint: str, params: dict = None) -> dict:
+    key = http_client.request_key(url, params)
+    return _flight.do(key, lambda: http_client.get_json_entry(url, params=params, timeout=10, ttl=ttl))
+
+
+def post_query(endpoint: str, params: dict = None, ttl: float = 0) -> dict:
     """
-    Executes a GET request to the AviationStack API.
+    Executes a GET request to the AviationStack API, see post_query_entry.
     
     :param endpoint: API endpoint to query ('timetable', 'flights', ...).
     :type endpoint: str
     :param params: Optional query parameters ('date', 'type', ...).
     :type params: dict
+    :param ttl: Seconds the response may be served from the persistent response cache, 0 = no caching.
+    :type ttl: float
     :return: JSON response from the API.
     :rtype: dict
     """
-    if params is None:
-        params = {}
+    return post_query_entry(endpoint, params, ttl)[0]
 
-    if 'type' in params and params['type'] == 'arrival':
-        api_key = API_KEY_ARRIVAL
-    else:
-        api_key = API_KEY_DEPARTURE
 
-    if not api_key:
-        raise ValueError('AVIATIONSTACK_API_KEY variable is missing!')
+async def async_post_query(client, endpoint: str, params: dict = None) -> dict:
+    """
+    Asynchronous 'post_query' with an open async_client.AsyncApiClient.
+    Concurrent calls with the same endpoint and params in one event loop share one request.
 
-    params['access_key'] = api_key
+    :param client: Open async client.
+    :type client: AsyncApiClient
+    :param endpoint: API endpoint to query.
+    :type endpoint: str
+    :param params: Optional query parameters.
+    :type params: dict
+    :return: JSON response from the API.
+    :rtype: dict
+    """
+    params = dict(params or {})
+    params['access_key'] = get_api_key(params)
     url = f"{AVIATIONSTACK_BASE_URL}{endpoint}"
 
-    response = requests.get(url, params=params, timeout=10)
-    response.raise_for_status()
-    data = response.json()
-    return data
+    key = http_client.request_key(url, params)
+    return await _async_flight.do(key, lambda: client.get_json(url, params))
+
+
+def coalesce(key, fn):
+    """
+    Calls fn() unless a call with the same key is already running, then waits for that one.
+    Shares the group (and coalescing_stats) of post_query, e.g. for the paginated fetch (see streaming).
+
+    :param key: Identity of the call, see http_client.request_key.
+    :param fn: Function executing the call.
+    :return: Result of the (shared) call.
+    """
+    return _flight.do(key, fn)
+
+
+def coalescing_stats() -> dict:
+    """
+    Counters of the request coalescing - requests sent upstream ('issued')
+    and requests that waited for an identical one in flight ('coalesced').
+
+    :return: {'issued': int, 'coalesced': int}
+    :rtype: dict
+    """
+    stats = _flight.stats()
+    async_stats = _async_flight.stats()
+    return {name: stats[name] + async_stats[name] for name in stats}
 
 
-@st.cache_data(ttl=300) # Cache for 5 minutes
+# Cache for 5 minutes, one arrival timetable per airport
+@ttl_cache(ttl=300, max_entries=MAX_AIRPORTS, max_bytes=MAX_AIRPORT_CACHE_BYTES)
 def fetch_query(endpoint: str, params: dict = None) -> dict:
     """
-    Wrapper for 'post_query'. Caches results for 5 minutes. 
+    Wrapper for 'post_query'. Caches results for 5 minutes, in this process (at most MAX_AIRPORTS responses)
+    and in the persistent response cache shared by all the processes (see response_cache).
     Function prevents unwanted caching of invalid states by raising a ValueError.
     
     :param endpoint: API endpoint to query.
@@ -55,7 +195,7 @@ def fetch_query(endpoint: str, params: dict = None) -> dict:
     :return: JSON response data.
     :rtype: dict
     """
-    res = post_query(endpoint, params)
+    res = post_query(endpoint, params, ttl=RESPONSE_CACHE_TTL)
     if res is None:
         raise ValueError('Empty API response - prevented caching')
     return res
@@ -0,0 +1,209 @@
+"""
+Shared HTTP layer of the API clients.
+One pooled requests.Session per process (keep-alive, no TLS handshake per call),
+a short-lived store of responses that were prefetched concurrently (see async_client)
+and the persistent response cache shared across processes (see response_cache).
+"""
+
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+from flight_delay.api.response_cache import get_response_cache
+from flight_delay.utils import metrics
+
+# Prefetched responses are consumed by the first matching request or dropped after this many seconds
+PREFETCH_TTL = 60
+
+_session = None
+_session_lock = threading.Lock()
+
+_prefetched = {}
+_prefetched_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Returns the process wide requests session. Created on the first call.
+
+    :return: Shared session with a connection pool.
+    :rtype: requests.Session
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests  # imported on the first request, not at startup
+
+            _session = requests.Session()
+        return _session
+
+
+def request_key(url: str, params: dict = None) -> tuple:
+    """
+    Identifies a GET request. API keys are not part of the key.
+
+    :param url: Request URL.
+    :type url: str
+    :param params: Query parameters.
+    :type params: dict
+    :return: Hashable request key.
+    :rtype: tuple
+    """
+    params = params or {}
+    return url, tuple(sorted((k, str(v)) for k, v in params.items() if k != 'access_key'))
+
+
+def store_prefetched(url: str, params: dict, payload: dict, fetched_at: float = None):
+    """
+    Stores a response fetched ahead of time, the next get_json for the same request returns it.
+
+    :param url: Request URL.
+    :type url: str
+    :param params: Query parameters.
+    :type params: dict
+    :param payload: Decoded JSON response.
+    :type payload: dict
+    :param fetched_at: When the response was fetched upstream (time.time()), now if None.
+    :type fetched_at: float
+    """
+    with _prefetched_lock:
+        _prefetched[request_key(url, params)] = (
+            time.monotonic() + PREFETCH_TTL, payload, time.time() if fetched_at is None else fetched_at
+        )
+
+
+def _pop_prefetched(key: tuple) -> tuple[dict, float] | None:
+    """
+    Returns (and removes) a prefetched response and its fetch time if it has not expired yet, otherwise None.
+    """
+    with _prefetched_lock:
+        expires, payload, fetched_at = _prefetched.pop(key, (0, None, None))
+    if time.monotonic() > expires:
+        return None
+    return payload, fetched_at
+
+
+def cache_key(url: str, params: dict = None) -> str:
+    """
+    Key of the request in the response cache. API keys are not part of the key.
+
+    :param url: Request URL.
+    :type url: str
+    :param params: Query parameters.
+    :type params: dict
+    :return: Cache key.
+    :rtype: str
+    """
+    url, items = request_key(url, params)
+    return f'{url}?{urlencode(items)}'
+
+
+def read_cache(url: str, params: dict = None) -> tuple[dict, float] | None:
+    """
+    Looks the request up in the response cache. A failing cache is a miss.
+    The lookup is recorded per host (metrics 'response_cache_total').
+
+    :param url: Request URL.
+    :type url: str
+    :param params: Query parameters.
+    :type params: dict
+    :return: (cached JSON response, when it was fetched upstream (time.time())), None on a miss.
+    :rtype: tuple[dict, float] | None
+    """
+    entry = None
+    try:
+        entry = get_response_cache().get(cache_key(url, params))
+    except Exception as e:
+        print(f'Response cache read failed: {e}')
+    metrics.inc('response_cache_total', host=urlsplit(url).netloc, result='miss' if entry is None else 'hit')
+    if entry is None:
+        return None
+    if isinstance(entry, dict) and set(entry) == {'fetched_at', 'payload'}:
+        return entry['payload'], entry['fetched_at']
+    # stored before the entries carried their fetch time
+    return entry, time.time()
+
+
+def write_cache(url: str, params: dict, payload, ttl: float, fetched_at: float = None):
+    """
+    Stores the response with its fetch time in the response cache. Failures are printed, never raised.
+
+    :param url: Request URL.
+    :type url: str
+    :param params: Query parameters.
+    :type params: dict
+    :param payload: Decoded JSON response.
+    :param ttl: Time to live in seconds.
+    :type ttl: float
+    :param fetched_at: When the response was fetched upstream (time.time()), now if None.
+    :type fetched_at: float
+    """
+    entry = {'fetched_at': time.time() if fetched_at is None else fetched_at, 'payload': payload}
+    try:
+        get_response_cache().set(cache_key(url, params), entry, ttl)
+    except Exception as e:
+        print(f'Response cache write failed: {e}')
+
+
+def get_json_entry(url: str, params: dict = None, timeout: float = 10, ttl: float = 0) -> tuple[dict, float]:
+    """
+    Executes a GET request with the shared session and returns the decoded JSON with its fetch time.
+    Uses the prefetched response if there is one, then the response cache (if ttl > 0).
+    Cache failures never fail the request, they are treated as a miss.
+    The latency of the requests sent upstream is recorded per host (metrics 'upstream_seconds').
+
+    :param url: Request URL.
+    :type url: str
+    :param params: Query parameters.
+    :type params: dict
+    :param timeout: Request timeout in seconds.
+    :type timeout: float
+    :param ttl: How long the response may be served from the response cache, 0 disables caching.
+    :type ttl: float
+    :return: (JSON response, when it was fetched upstream (time.time())) - a cached response keeps its time.
+    :rtype: tuple[dict, float]
+    """
+    host = urlsplit(url).netloc
+
+    entry = _pop_prefetched(request_key(url, params))
+    if entry is not None:
+        metrics.inc('response_cache_total', host=host, result='prefetched')
+
+    if entry is None and ttl > 0:
+        entry = read_cache(url, params)
+        if entry is not None:
+            return entry
+
+    if entry is None:
+        start = time.perf_counter()
+        try:
+            response = get_session().get(url, params=params, timeout=timeout)
+            response.raise_for_status()
+            entry = response.json(), time.time()
+        except Exception:
+            metrics.inc('upstream_errors_total', host=host)
+            raise
+        finally:
+            metrics.observe('upstream_seconds', time.perf_counter() - start, host=host)
+
+    if ttl > 0:
+        write_cache(url, params, entry[0], ttl, fetched_at=entry[1])
+
+    return entry
+
+
+def get_json(url: str, params: dict = None, timeout: float = 10, ttl: float = 0) -> dict:
+    """
+    Executes a GET request with the shared session and returns the decoded JSON, see get_json_entry.
+
+    :param url: Request URL.
+    :type url: str
+    :param params: Query parameters.
+    :type params: dict
+    :param timeout: Request timeout in seconds.
+    :type timeout: float
+    :param ttl: How long the response may be served from the response cache, 0 disables caching.
+    :type ttl: float
+    :return: JSON response.
+    :rtype: dict
+    """
+    return get_json_entry(url, params, timeout, ttl)[0]
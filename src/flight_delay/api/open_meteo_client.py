@@ -0,0 +1,85 @@
+"""
+API client interface for the Open-Meteo weather forecast service.
+"""
+
+import os
+from flight_delay.api import http_client
+
+OPEN_METEO_URL = 'https://api.open-meteo.com/v1/forecast'
+
+# The forecast is updated hourly, responses are shared through the response cache for 30 minutes
+RESPONSE_CACHE_TTL = 1800
+
+# Days of the hourly weather fetched at once - the weather store (weather_store) is filled from them,
+# flights of the coming days and of the last days need no further request
+FORECAST_DAYS = int(os.environ.get('FLIGHT_DELAY_FORECAST_DAYS', 7))
+PAST_DAYS = int(os.environ.get('FLIGHT_DELAY_WEATHER_PAST_DAYS', 2))
+
+# Locations of one multi-location request, keeps the URL short
+MAX_LOCATIONS = 50
+
+
+def forecast_params(latitude: float, longitude: float, timezone: str = 'auto',
+                    forecast_days: int = FORECAST_DAYS, past_days: int = PAST_DAYS) -> dict:
+    """
+    Query parameters of the hourly forecast used by the model (temperature, precipitation, wind).
+
+    :param latitude: Latitude of the airport.
+    :type latitude: float
+    :param longitude: Longitude of the airport.
+    :type longitude: float
+    :param timezone: Timezone of the returned times, 'auto' for the local time of the airport (as in the timetables).
+    :type timezone: str
+    :param forecast_days: Number of forecast days (today included).
+    :type forecast_days: int
+    :param past_days: Number of past days before today.
+    :type past_days: int
+    :return: Query parameters.
+    :rtype: dict
+    """
+    return {
+        'latitude': latitude,
+        'longitude': longitude,
+        'hourly': 'temperature_2m,precipitation,wind_speed_10m',
+        'wind_speed_unit': 'kmh',
+        'timezone': timezone,
+        'forecast_days': forecast_days,
+        'past_days': past_days,
+    }
+
+
+def fetch_forecast(latitude: float, longitude: float) -> dict:
+    """
+    Fetches the hourly forecast for the location.
+
+    :param latitude: Latitude of the airport.
+    :type latitude: float
+    :param longitude: Longitude of the airport.
+    :type longitude: float
+    :return: JSON response from the API.
+    :rtype: dict
+    """
+    return http_client.get_json(
+        OPEN_METEO_URL, forecast_params(latitude, longitude), timeout=5, ttl=RESPONSE_CACHE_TTL
+    )
+
+
+def fetch_forecasts(locations: list[tuple[float, float]], timezone: str = 'GMT') -> list[dict]:
+    """
+    Fetches the hourly forecasts of several locations with one request (comma separated coordinates).
+
+    :param locations: (latitude, longitude) of the locations, at most MAX_LOCATIONS.
+    :type locations: list[tuple[float, float]]
+    :param timezone: Timezone of the returned times, the same for all the locations.
+    :type timezone: str
+    :return: JSON responses in the order of the locations.
+    :rtype: list[dict]
+    """
+    params = forecast_params(
+        ','.join(f'{latitude:.4f}' for latitude, _ in locations),
+        ','.join(f'{longitude:.4f}' for _, longitude in locations),
+        timezone=timezone,
+    )
+    data = http_client.get_json(OPEN_METEO_URL, params, timeout=10)
+    # one location is answered with an object, more with a list
+    return data if isinstance(data, list) else [data]
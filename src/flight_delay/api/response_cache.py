@@ -0,0 +1,267 @@
+"""
+Persistent cache of API responses shared across processes (Streamlit workers, replicas, restarts).
+Backends: local SQLite file (default), diskcache directory, Redis compatible server.
+
+The backend is chosen with the FLIGHT_DELAY_CACHE environment variable:
+    sqlite:///path/to/responses.sqlite   (default: data/cache/responses.sqlite)
+    diskcache:///path/to/directory
+    redis://host:6379/0
+    none
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[3]
+
+DEFAULT_CACHE_PATH = BASE_DIR / 'data' / 'cache' / 'responses.sqlite'
+
+# 50 MB of JSON responses is days of timetables for a few airports
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+
+class ResponseCache:
+    """
+    Interface of the response cache backends. Values are JSON serializable API responses.
+    """
+
+    def get(self, key: str):
+        """
+        :param key: Request key.
+        :type key: str
+        :return: Cached response or None if missing / expired.
+        """
+        raise NotImplementedError
+
+    def set(self, key: str, value, ttl: float):
+        """
+        :param key: Request key.
+        :type key: str
+        :param value: Response to cache.
+        :param ttl: Time to live in seconds.
+        :type ttl: float
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """
+        Removes all the cached responses.
+        """
+        raise NotImplementedError
+
+
+class NullCache(ResponseCache):
+    """
+    Disabled cache, every get is a miss.
+    """
+
+    def get(self, key: str):
+        return None
+
+    def set(self, key: str, value, ttl: float):
+        pass
+
+    def clear(self):
+        pass
+
+
+class SQLiteCache(ResponseCache):
+    """
+    Cache in a local SQLite file. Safe for several processes on the same machine.
+    Expired entries are dropped, then the least recently used ones until the total size fits max_bytes.
+    """
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        :param path: Path of the database file, parent directories are created.
+        :type path: Path
+        :param max_bytes: Maximal total size of the cached responses.
+        :type max_bytes: int
+        """
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, '
+                'expires REAL NOT NULL, accessed REAL NOT NULL)'
+            )
+
+    @contextmanager
+    def _connect(self):
+        """
+        Opens a connection for one transaction (committed on success) and closes it.
+        """
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT value FROM responses WHERE key = ? AND expires > ?', (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+        return json.loads(row[0])
+
+    def set(self, key: str, value, ttl: float):
+        now = time.time()
+        payload = json.dumps(value)
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO responses (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)',
+                (key, payload, len(payload), now + ttl, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """
+        Drops expired entries and then the least recently used ones over the size limit.
+        """
+        conn.execute('DELETE FROM responses WHERE expires <= ?', (now,))
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for key, size in conn.execute('SELECT key, size FROM responses ORDER BY accessed').fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            total -= size
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM responses')
+
+
+class DiskCache(ResponseCache):
+    """
+    Cache in a diskcache directory (optional dependency 'diskcache').
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        :param directory: Cache directory.
+        :type directory: Path
+        :param max_bytes: Size limit, least recently used entries are evicted above it.
+        :type max_bytes: int
+        """
+        import diskcache  # optional dependency
+
+        self._cache = diskcache.Cache(
+            str(directory), size_limit=max_bytes, eviction_policy='least-recently-used'
+        )
+
+    def get(self, key: str):
+        return self._cache.get(key)
+
+    def set(self, key: str, value, ttl: float):
+        self._cache.set(key, value, expire=ttl)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class RedisCache(ResponseCache):
+    """
+    Cache in a Redis compatible server. Works with any client that has get(name),
+    set(name, value, ex=seconds) and delete(name), e.g. redis.Redis or a local stand-in.
+    Size is bounded by the server (maxmemory with an LRU maxmemory-policy).
+    """
+
+    def __init__(self, client, prefix: str = 'flight_delay:'):
+        """
+        :param client: Redis compatible client.
+        :param prefix: Prefix of the keys.
+        :type prefix: str
+        """
+        self.client = client
+        self.prefix = prefix
+        self._keys = set()
+
+    def get(self, key: str):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def set(self, key: str, value, ttl: float):
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+        self._keys.add(self.prefix + key)
+
+    def clear(self):
+        # only the keys written by this process, the server may be shared
+        for key in self._keys:
+            self.client.delete(key)
+        self._keys.clear()
+
+
+def cache_from_url(url: str) -> ResponseCache:
+    """
+    Creates the cache backend from its URL (see module docstring).
+
+    :param url: Backend URL.
+    :type url: str
+    :return: Cache backend.
+    :rtype: ResponseCache
+    """
+    if not url or url == 'none':
+        return NullCache()
+    if url.startswith('sqlite:///'):
+        return SQLiteCache(url[len('sqlite:///'):])
+    if url.startswith('diskcache:///'):
+        return DiskCache(url[len('diskcache:///'):])
+    if url.startswith(('redis://', 'rediss://')):
+        import redis  # optional dependency
+
+        return RedisCache(redis.Redis.from_url(url))
+    raise ValueError(f'Unknown response cache URL: {url}')
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    Returns the process wide response cache, created on the first call from FLIGHT_DELAY_CACHE.
+    If the backend cannot be created, caching is disabled.
+
+    :return: Response cache.
+    :rtype: ResponseCache
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            url = os.environ.get('FLIGHT_DELAY_CACHE', f'sqlite:///{DEFAULT_CACHE_PATH}')
+            try:
+                _cache = cache_from_url(url)
+            except Exception as e:
+                print(f'Response cache "{url}" not available ({e}). Caching disabled.')
+                _cache = NullCache()
+        return _cache
+
+
+def set_response_cache(cache: ResponseCache):
+    """
+    Replaces the process wide response cache (tests, custom backends).
+
+    :param cache: New cache backend.
+    :type cache: ResponseCache
+    """
+    global _cache
+    with _cache_lock:
+        _cache = cache
@@ -0,0 +1,121 @@
+"""
+Request coalescing (single-flight) for identical upstream calls.
+While a call for a key is in flight, other callers with the same key wait for it
+and get its result (or its exception) instead of sending the same request again.
+Results are shared by all the callers, treat them as read-only.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Thread-safe single-flight group (Streamlit sessions run in separate threads).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.issued = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable):
+        """
+        Calls fn() unless a call with the same key is already running, then waits for that one.
+
+        :param key: Identity of the call.
+        :type key: Hashable
+        :param fn: Function executing the call.
+        :type fn: Callable
+        :return: Result of the (shared) call.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.issued += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            # forget the call first, a caller arriving after the failure gets a fresh attempt
+            self._forget(key)
+            future.set_exception(e)
+            raise
+        self._forget(key)
+        future.set_result(result)
+        return result
+
+    def _forget(self, key: Hashable):
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def stats(self) -> dict:
+        """
+        :return: Number of issued and coalesced calls.
+        :rtype: dict
+        """
+        with self._lock:
+            return {'issued': self.issued, 'coalesced': self.coalesced}
+
+
+class AsyncSingleFlight:
+    """
+    Single-flight group for coroutines. Calls are only shared within one event loop,
+    the group itself may be used from several loops (threads) at once.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.issued = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        """
+        Awaits fn() unless a call with the same key is already running in this loop, then waits for that one.
+        Cancelling one waiter does not cancel the shared call.
+
+        :param key: Identity of the call.
+        :type key: Hashable
+        :param fn: Coroutine function executing the call.
+        :type fn: Callable[[], Awaitable]
+        :return: Result of the (shared) call.
+        """
+        loop = asyncio.get_running_loop()
+        call_key = (id(loop), key)
+
+        with self._lock:
+            task = self._calls.get(call_key)
+            if task is None or task.get_loop() is not loop:
+                task = loop.create_task(fn())
+                self._calls[call_key] = task
+                self.issued += 1
+                task.add_done_callback(lambda t: self._forget(call_key, t))
+            else:
+                self.coalesced += 1
+
+        return await asyncio.shield(task)
+
+    def _forget(self, call_key: tuple, task: asyncio.Task):
+        with self._lock:
+            if self._calls.get(call_key) is task:
+                del self._calls[call_key]
+
+    def stats(self) -> dict:
+        """
+        :return: Number of issued and coalesced calls.
+        :rtype: dict
+        """
+        with self._lock:
+            return {'issued': self.issued, 'coalesced': self.coalesced}
@@ -0,0 +1,338 @@
+"""
+Paginated, streaming ingestion of large AviationStack results (big hubs, the historical 'flights' endpoint).
+
+The pages (limit / offset) are requested one after another and parsed while they arrive - with ijson
+(optional dependency, pip install ijson) record by record straight from the socket, otherwise one page at a time
+with orjson or json. Only the columns the pipeline uses are kept, appended to a columnar buffer, so the memory
+stays bounded by the kept columns and one record (one page without ijson), not by the whole JSON payload.
+The kept columns go through the persistent response cache and the request coalescing like post_query.
+The rows of the first pages can be used before the last page arrives (fetch_paginated_df(on_page=...)),
+the refresher serves them on a cold start.
+
+    FLIGHT_DELAY_STREAMING=1   # prediction.fetch_timetable_df and get_arrival_df use the paginated fetch
+"""
+
+import json
+import os
+import time
+from typing import Callable, Iterable, Iterator, Mapping
+from urllib.parse import urlsplit
+import pandas as pd
+from flight_delay.api import aviationstack_client, http_client
+from flight_delay.api.response_cache import get_response_cache
+from flight_delay.utils import metrics
+
+STREAMING = os.environ.get('FLIGHT_DELAY_STREAMING', '0').lower() in ('1', 'true', 'yes')
+
+# Records per request, the paid plans allow up to 1000
+PAGE_SIZE = int(os.environ.get('FLIGHT_DELAY_PAGE_SIZE', 100))
+
+# Upper bound of the requests of one fetch
+MAX_PAGES = int(os.environ.get('FLIGHT_DELAY_MAX_PAGES', 200))
+
+# Raw columns used by the app, the forecasts, the server and the incremental training
+TIMETABLE_COLUMNS = (
+    'type',
+    'status',
+    'departure.iataCode',
+    'departure.terminal',
+    'departure.delay',
+    'departure.scheduledTime',
+    'departure.estimatedTime',
+    'departure.actualTime',
+    'arrival.iataCode',
+    'arrival.delay',
+    'arrival.scheduledTime',
+    'airline.name',
+    'airline.iataCode',
+    'airline.icaoCode',
+    'flight.number',
+    'flight.iataNumber',
+    'flight.icaoNumber',
+    'codeshared.airline.icaoCode',
+    'codeshared.flight.iataNumber',
+)
+
+
+class ColumnBuffer:
+    """
+    Growing table of selected (dotted, json_normalize style) columns of nested JSON records.
+    The records themselves are not kept.
+    """
+
+    def __init__(self, columns: Iterable[str] = TIMETABLE_COLUMNS):
+        """
+        :param columns: Dotted paths of the kept values, e.g. 'departure.scheduledTime'.
+        :type columns: Iterable[str]
+        """
+        self.columns = tuple(columns)
+        self._paths = [column.split('.') for column in self.columns]
+        self._values = [[] for _ in self.columns]
+
+    def append(self, record: Mapping):
+        """
+        Adds one record, missing values are None.
+
+        :param record: Nested JSON record.
+        :type record: Mapping
+        """
+        for path, values in zip(self._paths, self._values):
+            value = record
+            for part in path:
+                value = value.get(part) if isinstance(value, Mapping) else None
+            values.append(value)
+
+    def extend(self, records: Iterable[Mapping]) -> int:
+        """
+        :param records: Nested JSON records, consumed one by one.
+        :type records: Iterable[Mapping]
+        :return: Number of added records.
+        :rtype: int
+        """
+        count = 0
+        for record in records:
+            self.append(record)
+            count += 1
+        return count
+
+    def to_dict(self) -> dict[str, list]:
+        """
+        :return: {column: values}, the lists of the buffer (JSON serializable).
+        :rtype: dict[str, list]
+        """
+        return dict(zip(self.columns, self._values))
+
+    def __len__(self) -> int:
+        return len(self._values[0]) if self._values else 0
+
+    def frame(self, start: int = 0, stop: int = None) -> pd.DataFrame:
+        """
+        :param start: First row.
+        :type start: int
+        :param stop: Row after the last one, the end by default.
+        :type stop: int
+        :return: The rows as a dataframe with the dotted column names (like pd.json_normalize).
+        :rtype: pd.DataFrame
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        return pd.DataFrame(
+            {column: values[start:stop] for column, values in zip(self.columns, self._values)},
+            index=pd.RangeIndex(start, max(start, stop)),
+        )
+
+
+# Top level values of a page besides the records, see parse_page
+_PAGE_VALUES = ('data.item', 'error', 'pagination')
+
+
+def _parse_events(events: Iterator[tuple], buffer: ColumnBuffer, object_builder) -> dict:
+    """
+    Builds the records, the pagination and a possible error of a page from ijson.parse events.
+    The records are appended one by one, the page is never held as a whole.
+
+    :raises ValueError: The API returned an error payload.
+    """
+    pagination = {}
+    for prefix, event, value in events:
+        if prefix not in _PAGE_VALUES or event == 'map_key' or event in ('end_map', 'end_array'):
+            continue
+        if event in ('start_map', 'start_array'):
+            builder = object_builder()
+            depth = 0
+            while True:
+                builder.event(event, value)
+                if event in ('start_map', 'start_array'):
+                    depth += 1
+                elif event in ('end_map', 'end_array'):
+                    depth -= 1
+                if depth == 0:
+                    break
+                _, event, value = next(events)
+            value = builder.value
+
+        if prefix == 'data.item':
+            buffer.append(value)
+        elif prefix == 'error':
+            raise ValueError(f'API error: {value}')
+        elif isinstance(value, dict):
+            pagination = value
+    return pagination
+
+
+def parse_page(response, buffer: ColumnBuffer) -> dict:
+    """
+    Appends the 'data' records of a streamed response to the buffer.
+    With ijson the records are parsed while the body arrives, otherwise the page is parsed at once.
+
+    :param response: requests response opened with stream=True.
+    :param buffer: Buffer of the kept columns.
+    :type buffer: ColumnBuffer
+    :return: Pagination of the page (limit, offset, count, total), empty if the response has none.
+    :rtype: dict
+    :raises ValueError: The API returned an error payload.
+    """
+    try:
+        import ijson  # optional dependency, parses the socket stream incrementally
+    except ImportError:
+        ijson = None
+
+    if ijson is not None:
+        response.raw.decode_content = True
+        return _parse_events(ijson.parse(response.raw, use_float=True), buffer, ijson.ObjectBuilder)
+
+    try:
+        import orjson  # optional dependency, faster than json for big pages
+        payload = orjson.loads(response.content)
+    except ImportError:
+        payload = json.loads(response.content)
+
+    if 'error' in payload:
+        raise ValueError(f'API error: {payload["error"]}')
+    buffer.extend(payload.get('data') or [])
+    return payload.get('pagination') or {}
+
+
+def last_page(pagination: dict, offset: int, count: int, page_size: int) -> bool:
+    """
+    Decides by the pagination of the response, the plan may cap the limit below the requested page size.
+
+    :param pagination: Pagination of the page.
+    :type pagination: dict
+    :param offset: Offset after the page.
+    :type offset: int
+    :param count: Records of the page.
+    :type count: int
+    :param page_size: Requested records per page.
+    :type page_size: int
+    :return: True if there are no more records.
+    :rtype: bool
+    """
+    if count == 0:
+        return True
+    if pagination.get('total') is not None:
+        return offset >= int(pagination['total'])
+    # without the total a page shorter than the applied limit is the last one
+    return count < int(pagination.get('limit') or page_size)
+
+
+def _stream_pages(buffer: ColumnBuffer, endpoint: str, params: dict = None, page_size: int = PAGE_SIZE,
+                  max_pages: int = MAX_PAGES, timeout: float = 30) -> Iterator[int]:
+    """
+    Requests the pages one after another and appends their records to the buffer.
+    The offset advances by the records received, until the pagination says there are no more.
+
+    :return: Number of records of every page, after the page is in the buffer.
+    :rtype: Iterator[int]
+    """
+    params = dict(params or {})
+    params['access_key'] = aviationstack_client.get_api_key(params)
+    params['limit'] = page_size
+    url = f'{aviationstack_client.AVIATIONSTACK_BASE_URL}{endpoint}'
+    host = urlsplit(url).netloc
+
+    offset = 0
+    for _ in range(max_pages):
+        params['offset'] = offset
+        start = time.perf_counter()
+        try:
+            with http_client.get_session().get(url, params=params, timeout=timeout, stream=True) as response:
+                response.raise_for_status()
+                before = len(buffer)
+                pagination = parse_page(response, buffer)
+                count = len(buffer) - before
+        except Exception:
+            metrics.inc('upstream_errors_total', host=host)
+            raise
+        finally:
+            metrics.observe('upstream_seconds', time.perf_counter() - start, host=host)
+
+        offset += count
+        yield count
+        if last_page(pagination, offset, count, page_size):
+            return
+
+    print(f'{endpoint}: stopped after {max_pages} pages, the rest of the results is not fetched.')
+
+
+def _frame(columns: Mapping[str, list], fetched_at: pd.Timestamp) -> pd.DataFrame:
+    """
+    :return: Timetable of the column lists with its version, empty dataframe if there are no rows.
+    :rtype: pd.DataFrame
+    """
+    df = pd.DataFrame(columns)
+    if df.empty:
+        return pd.DataFrame()
+    df.attrs['fetched_at'] = fetched_at
+    return df
+
+
+def fetch_paginated_df(endpoint: str, params: dict = None, columns: Iterable[str] = TIMETABLE_COLUMNS,
+                       page_size: int = PAGE_SIZE, max_pages: int = MAX_PAGES,
+                       ttl: float = aviationstack_client.RESPONSE_CACHE_TTL,
+                       on_page: Callable[[pd.DataFrame], None] = None) -> pd.DataFrame:
+    """
+    Fetches all the pages into one dataframe. Errors are raised.
+
+    The kept columns are stored in the persistent response cache for ttl seconds (shared by the processes
+    and replicas), and concurrent identical fetches wait for one download (the coalescing of post_query).
+    The caller downloading the pages gets the rows fetched so far after every page.
+
+    :param endpoint: API endpoint ('timetable', 'flights', ...).
+    :type endpoint: str
+    :param params: Query parameters without the pagination.
+    :type params: dict
+    :param columns: Dotted paths of the kept values.
+    :type columns: Iterable[str]
+    :param page_size: Records per request.
+    :type page_size: int
+    :param max_pages: Maximal number of requests.
+    :type max_pages: int
+    :param ttl: Seconds the result may be served from the response cache, 0 = no caching.
+    :type ttl: float
+    :param on_page: Called with the rows so far (df.attrs['partial'] is True) after every page, before the next
+                    one is requested. Its errors are printed.
+                    Not called for results from the cache or from another caller's download.
+    :type on_page: Callable[[pd.DataFrame], None]
+    :return: All the rows with df.attrs['fetched_at'] - when they were downloaded, also if they come from the
+             cache. Empty if there are none.
+    :rtype: pd.DataFrame
+    """
+    columns = tuple(columns)
+    url = f'{aviationstack_client.AVIATIONSTACK_BASE_URL}{endpoint}'
+    host = urlsplit(url).netloc
+    # the columns are part of the key, the cached value is not the raw response
+    key_params = {**(params or {}), 'columns': ','.join(columns)}
+    key = http_client.cache_key(url, key_params)
+
+    def download() -> dict:
+        if ttl > 0:
+            cached = None
+            try:
+                cached = get_response_cache().get(key)
+            except Exception as e:
+                print(f'Response cache read failed: {e}')
+            metrics.inc('response_cache_total', host=host, result='miss' if cached is None else 'hit')
+            if cached is not None:
+                return cached
+
+        buffer = ColumnBuffer(columns)
+        for count in _stream_pages(buffer, endpoint, params, page_size, max_pages):
+            if on_page is not None and count:
+                partial = buffer.frame()
+                partial.attrs['fetched_at'] = pd.Timestamp.now(tz='UTC')
+                partial.attrs['partial'] = True
+                try:
+                    on_page(partial)
+                except Exception as e:
+                    print(f'{endpoint}: page callback failed: {e}')
+
+        result = {'fetched_at': time.time(), 'columns': buffer.to_dict()}
+        if ttl > 0 and len(buffer):
+            try:
+                get_response_cache().set(key, result, ttl)
+            except Exception as e:
+                print(f'Response cache write failed: {e}')
+        return result
+
+    result = aviationstack_client.coalesce(http_client.request_key(url, key_params), download)
+    return _frame(result['columns'], pd.Timestamp(result['fetched_at'], unit='s', tz='UTC'))
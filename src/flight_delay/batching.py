@@ -0,0 +1,99 @@
+"""
+Micro-batching of concurrent prediction requests.
+Requests arriving close together are collected and processed with one call,
+a batch is sent when it is full or when its oldest request has waited max_wait seconds.
+"""
+
+import asyncio
+from typing import Callable
+
+
+class MicroBatcher:
+    """
+    Collects items submitted from coroutines into batches for one process(items) call.
+    process runs in a worker thread, so the event loop keeps accepting requests meanwhile.
+    """
+
+    def __init__(self, process: Callable[[list], list], max_batch_size: int = 64, max_wait: float = 0.005):
+        """
+        :param process: Processes a batch, returns one result per item (in the same order).
+        :type process: Callable[[list], list]
+        :param max_batch_size: Maximal number of items in a batch.
+        :type max_batch_size: int
+        :param max_wait: Maximal time in seconds an item waits for the batch to fill up.
+        :type max_wait: float
+        """
+        self.process = process
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._pending = []
+        self._timer = None
+
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item):
+        """
+        Adds the item to the next batch and waits for its result.
+
+        :param item: Input of process.
+        :return: Result of process for the item.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """
+        Sends the pending items (at most max_batch_size) as one batch.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch = self._pending[:self.max_batch_size]
+        self._pending = self._pending[self.max_batch_size:]
+        if batch:
+            asyncio.get_running_loop().create_task(self._run(batch))
+
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+
+    async def _run(self, batch: list):
+        """
+        Processes the batch in a worker thread and hands out the results.
+        """
+        self.batches += 1
+        self.items += len(batch)
+        items = [item for item, _ in batch]
+
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(None, self.process, items)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        """
+        :return: Number of batches, items and the mean batch size.
+        :rtype: dict
+        """
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+        }
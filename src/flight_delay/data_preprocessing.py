@@ -4,19 +4,116 @@ It prepares wanted features including external weather and airport traffic data.
 """
 
 import json
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping
 import pandas as pd
-import requests
 import numpy as np
-import streamlit as st
-from flight_delay.api import aviationstack_client
+from flight_delay.airports import DEFAULT_AIRPORT, MAX_AIRPORTS, MAX_AIRPORT_CACHE_BYTES, airport_location
+from flight_delay.api import aviationstack_client, open_meteo_client, streaming
+from flight_delay.destination_weather import DESTINATION_WEATHER_FEATURES, get_destination_weather, to_utc_hours
+from flight_delay.utils import metrics
+from flight_delay.utils.caching import LRUCache, ttl_cache
 from flight_delay.utils.dicts import SCHENGEN_AIRPORTS
+from flight_delay.weather_store import HourlyWeather, build_weather_store
 
 
 BASE_DIR = Path(__file__).resolve().parents[2]
 
+PRG_LAT = 50.1008
+PRG_LON = 14.2600
 
-def prepare_features(df_departures : pd.DataFrame, flight_row : pd.DataFrame, one_hot = False) -> pd.DataFrame:
+# Raw AviationStack timetable columns used by the model and their feature names.
+RAW_FEATURE_COLUMNS = {
+    'departure.terminal': 'terminal',
+    'departure.delay': 'delay',
+    'departure.scheduledTime': 'scheduled_time',
+    'airline.icaoCode': 'airline',
+    'departure.actualTime': 'actual_time',
+    'arrival.iataCode': 'destination_airport'
+}
+
+CATEGORICAL_FEATURES = ('terminal', 'airline', 'destination_airport')
+
+WEATHER_FEATURES = ('temp_c', 'precip_mm', 'wind_kph')
+
+
+@dataclass(frozen=True)
+class FeatureSchema:
+    """
+    Preprocessing artifacts of the trained model (fill_values.json, categories.json).
+    Loaded once per process, see get_feature_schema.
+    """
+    fill_values: Mapping[str, float]
+    categories: Mapping[str, pd.CategoricalDtype]
+    category_codes: Mapping[str, Mapping]
+    feature_order: tuple[str, ...]
+
+    @classmethod
+    def from_dir(cls, processed_dir: Path) -> 'FeatureSchema':
+        """
+        Loads the schema from a directory with fill_values.json and categories.json.
+
+        :param processed_dir: Directory with the JSON artifacts.
+        :type processed_dir: Path
+        :return: Loaded schema.
+        :rtype: FeatureSchema
+        """
+        processed_dir = Path(processed_dir)
+
+        with open(processed_dir/'fill_values.json', 'r', encoding='utf-8') as f:
+            fill_values = json.load(f)
+
+        with open(processed_dir/'categories.json', 'r', encoding='utf-8') as f:
+            categories = json.load(f)
+
+        # Categories were saved from the lowercase training data, API returns uppercase codes
+        categories['destination_airport'] = [airport.upper() for airport in categories['destination_airport']]
+        categories['airline'] = [airline.upper() for airline in categories['airline']]
+
+        return cls(
+            fill_values=MappingProxyType(fill_values),
+            categories=MappingProxyType({
+                col: pd.api.types.CategoricalDtype(categories=categories[col], ordered=False)
+                for col in CATEGORICAL_FEATURES
+            }),
+            category_codes=MappingProxyType({
+                col: MappingProxyType({value: code for code, value in enumerate(categories[col])})
+                for col in CATEGORICAL_FEATURES
+            }),
+            # fill_values are the medians of Xtrain, so the keys are in the model's feature order
+            feature_order=tuple(fill_values),
+        )
+
+
+@lru_cache(maxsize=1)
+def get_feature_schema() -> FeatureSchema:
+    """
+    Returns the feature schema, the JSON artifacts are read only on the first call.
+
+    :return: Feature schema of the current model.
+    :rtype: FeatureSchema
+    """
+    return FeatureSchema.from_dir(BASE_DIR/'data'/'processed')
+
+
+def reload_feature_schema() -> FeatureSchema:
+    """
+    Drops the loaded feature schema and loads the artifacts again.
+    Call it after fill_values.json / categories.json change.
+
+    :return: Newly loaded feature schema.
+    :rtype: FeatureSchema
+    """
+    get_feature_schema.cache_clear()
+    return get_feature_schema()
+
+
+def prepare_features(df_departures : pd.DataFrame, flight_row : pd.DataFrame, one_hot = False,
+                     airport_code: str = DEFAULT_AIRPORT, schema: FeatureSchema = None) -> pd.DataFrame:
     """
     Preprocesses a raw flight row into a dataframe with specific features for the ML model.
     Feature engineering - Adds traffic information (departures/arrivals). Adds weather data.
@@ -27,40 +124,33 @@ def prepare_features(df_departures : pd.DataFrame, flight_row : pd.DataFrame, on
     :param flight_row: Row with the flight we want to predict on.
     :type flight_row: pd.DataFrame
     :param one_hot: True for One Hot Encoding, False for Label Encoding.
+    :param airport_code: IATA code of the departure airport (traffic and weather are per airport).
+    :type airport_code: str
+    :param schema: Fill values and categories of the model (of its pinned version), the current artifacts by default.
+    :type schema: FeatureSchema
     :return: Row with processed features or empty dataframe if the preprocessing fails.
     :rtype: DataFrame
     """
-    df_departures = df_departures.copy()
-
     schengen_airports = SCHENGEN_AIRPORTS
 
-    flight_row = flight_row[[
-        'departure.terminal',
-        'departure.delay',
-        'departure.scheduledTime',
-        'airline.icaoCode',
-        'departure.actualTime',
-        'arrival.iataCode'
-    ]]
-
-    flight_row = flight_row.rename(columns={
-        'departure.terminal': 'terminal',
-        'departure.delay': 'delay',
-        'departure.scheduledTime': 'scheduled_time',
-        'airline.icaoCode': 'airline',
-        'departure.actualTime': 'actual_time',
-        'arrival.iataCode': 'destination_airport'
-    })
+    flight_row = flight_row[list(RAW_FEATURE_COLUMNS)]
+
+    flight_row = flight_row.rename(columns=RAW_FEATURE_COLUMNS)
 
     if pd.isna(flight_row['scheduled_time'].iloc[0]):
-        flight_row = flight_row.replace(flight_row['scheduled_time'], flight_row['actual_time'])
+        flight_row['scheduled_time'] = flight_row['scheduled_time'].fillna(flight_row['actual_time'])
 
     flight_row['scheduled_time'] = pd.to_datetime(flight_row['scheduled_time'])
     flight_row['actual_time'] = pd.to_datetime(flight_row['actual_time'])
 
-    flight_row = add_traffic(df_departures, flight_row)
+    flight_row = add_traffic(df_departures, flight_row, airport_code)
+
+    flight_row = add_weather(flight_row, airport_code)
+
+    schema = schema or get_feature_schema()
 
-    flight_row = add_weather(flight_row)
+    if uses_destination_weather(schema):
+        add_destination_weather(flight_row, flight_row['scheduled_time'].dt.round('h'), airport_code)
 
     # Convert scheduled_time to columns that are relevant for ML
     flight_row['day_of_week'] = flight_row['scheduled_time'].dt.weekday
@@ -81,10 +171,7 @@ def prepare_features(df_departures : pd.DataFrame, flight_row : pd.DataFrame, on
 
     # print(flight_row.columns)
 
-    with open(BASE_DIR/'data'/'processed'/'fill_values.json', 'r', encoding='utf-8') as f:
-        fill_values = json.load(f)
-
-    flight_row = flight_row.fillna(value=fill_values).infer_objects(copy=False)
+    flight_row = flight_row.fillna(value=dict(schema.fill_values)).infer_objects(copy=False)
 
     flight_row.drop(columns='actual_time', inplace=True)
 
@@ -94,24 +181,12 @@ def prepare_features(df_departures : pd.DataFrame, flight_row : pd.DataFrame, on
         else:
             flight_row['terminal'] = 1
 
-    categorical = ['terminal', 'airline', 'destination_airport']
-
-    with open(BASE_DIR/'data'/'processed'/'categories.json', 'r', encoding='utf-8') as f:
-        categories = json.load(f)
-
     # for col in flight_row.columns:
     #     print(f'{col} : {flight_row[col].iloc[0]}')
 
-    categories['destination_airport'] = [airport.upper() for airport in categories['destination_airport']]
-    categories['airline'] = [airline.upper() for airline in categories['airline']]
-
     if not one_hot:
-        for col in categorical:
-            cat_type = pd.api.types.CategoricalDtype(
-                categories=categories[col],
-                ordered=False
-            )
-            flight_row[col] = flight_row[col].astype(cat_type).cat.codes
+        for col in CATEGORICAL_FEATURES:
+            flight_row[col] = flight_row[col].astype(schema.categories[col]).cat.codes
 
     # DEBUGGING TABLE
     # summary = pd.DataFrame({
@@ -137,91 +212,413 @@ def prepare_features(df_departures : pd.DataFrame, flight_row : pd.DataFrame, on
     return pd.DataFrame()
 
 
-@st.cache_data(ttl=1800)
-def get_weather() -> pd.DataFrame:
+def hour_buckets(times: pd.Series) -> pd.Series:
     """
-    Fetches the weather forecast for PRG airport from the Open-Meteo API.
-    Results are cached for 30 minutes.
-    
-    :return: Hourly weather data for today.
+    Rounds the timestamps to the nearest hour - the time key of the traffic and weather features.
+    Shared by the online features and the offline training set (see training).
+
+    :param times: Timestamps or ISO strings, invalid values become NaT.
+    :type times: pd.Series
+    :return: Hour buckets.
+    :rtype: pd.Series
+    """
+    return pd.to_datetime(times, errors='coerce').dt.round('h')
+
+
+def add_time_features(df: pd.DataFrame, scheduled_time: pd.Series) -> pd.DataFrame:
+    """
+    Adds the day in month and the cyclical hour / weekday features of the scheduled departure.
+
+    :param df: Features dataframe, changed in place.
+    :type df: pd.DataFrame
+    :param scheduled_time: Scheduled departure times (datetime64) aligned with df.
+    :type scheduled_time: pd.Series
+    :return: df with the time features.
+    :rtype: pd.DataFrame
+    """
+    hour = scheduled_time.dt.round('h').dt.hour
+    day_of_week = scheduled_time.dt.weekday
+
+    df['day_in_month'] = scheduled_time.dt.day
+    df['hour_sin'] = np.sin(2 * np.pi * hour / 24)
+    df['hour_cos'] = np.cos(2 * np.pi * hour / 24)
+    df['weekday_sin'] = np.sin(2 * np.pi * day_of_week / 7)
+    df['weekday_cos'] = np.cos(2 * np.pi * day_of_week / 7)
+    return df
+
+
+def uses_destination_weather(schema: FeatureSchema) -> bool:
+    """
+    :param schema: Preprocessing artifacts of the model.
+    :type schema: FeatureSchema
+    :return: True if the model was trained with the destination weather features.
+             Other models need no destination weather request.
+    :rtype: bool
+    """
+    return any(col in schema.fill_values for col in DESTINATION_WEATHER_FEATURES)
+
+
+def add_destination_weather(df: pd.DataFrame, hour_bucket: pd.Series, airport_code: str = DEFAULT_AIRPORT) -> pd.DataFrame:
+    """
+    Adds the weather at the destination in the hour of the departure, all the destinations are fetched
+    in batched requests (see destination_weather). Unknown values are left NaN for the fill values.
+
+    :param df: Features with 'destination_airport' (IATA), changed in place.
+    :type df: pd.DataFrame
+    :param hour_bucket: Scheduled departure hours (local time of the departure airport) aligned with df.
+    :type hour_bucket: pd.Series
+    :param airport_code: IATA code of the departure airport.
+    :type airport_code: str
+    :return: df with the DESTINATION_WEATHER_FEATURES.
+    :rtype: pd.DataFrame
+    """
+    weather = get_destination_weather().lookup(
+        df['destination_airport'].astype(str).str.upper(), to_utc_hours(hour_bucket, airport_code)
+    )
+    for i, col in enumerate(DESTINATION_WEATHER_FEATURES):
+        df[col] = weather[:, i]
+    return df
+
+
+def fill_missing_terminal(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Fills the missing terminal by the destination - Schengen flights depart from terminal 2, the others from 1.
+
+    :param df: Features with 'terminal' and 'destination_airport' (upper case IATA), changed in place.
+    :type df: pd.DataFrame
+    :return: df with the terminal filled.
+    :rtype: pd.DataFrame
+    """
+    terminal_fallback = df['destination_airport'].isin(SCHENGEN_AIRPORTS).map({True: 2, False: 1})
+    df['terminal'] = df['terminal'].fillna(terminal_fallback)
+    return df
+
+
+def prepare_features_batch(df_departures : pd.DataFrame, airport_code: str = DEFAULT_AIRPORT,
+                           schema: FeatureSchema = None) -> pd.DataFrame:
+    """
+    Vectorized version of prepare_features for the whole departure timetable.
+    Builds the feature matrix for every row at once, traffic and weather are looked up
+    with one value_counts / map per column instead of one scan per flight.
+
+    :param df_departures: Full departure timetable.
+    :type df_departures: pd.DataFrame
+    :param airport_code: IATA code of the departure airport.
+    :type airport_code: str
+    :param schema: Fill values and categories of the model, the current artifacts by default.
+    :type schema: FeatureSchema
+    :return: Processed features with the same index as df_departures.
+             Rows that could not be fully preprocessed are dropped.
     :rtype: DataFrame
     """
-    prg_lat = 50.1008
-    prg_lon = 14.2600
-
-    url = 'https://api.open-meteo.com/v1/forecast'
-    params = {
-        'latitude': prg_lat,
-        'longitude': prg_lon,
-        'hourly': 'temperature_2m,precipitation,wind_speed_10m',
-        'wind_speed_unit': 'kmh',
-        'timezone': 'Europe/Prague',
-        'forecast_days': 1
-    }
+    missing = [c for c in RAW_FEATURE_COLUMNS if c not in df_departures.columns]
+    if df_departures.empty or missing:
+        return pd.DataFrame()
+
+    df = df_departures[list(RAW_FEATURE_COLUMNS)].rename(columns=RAW_FEATURE_COLUMNS)
+
+    df['scheduled_time'] = pd.to_datetime(df['scheduled_time'], errors='coerce')
+    df['actual_time'] = pd.to_datetime(df['actual_time'], errors='coerce')
+    df['scheduled_time'] = df['scheduled_time'].fillna(df['actual_time'])
+
+    hour_bucket = hour_buckets(df['scheduled_time'])
+
+    # Traffic - same definition as in add_traffic, looked up in the shared traffic index
+    with metrics.span('prepare_features.traffic'):
+        traffic_index = get_traffic_index(df_departures, airport_code)
+        df['departure_traffic'] = hour_bucket.map(traffic_index['departure']).fillna(0) - 1
+
+        if traffic_index['arrival'] is not None:
+            df['arrival_traffic'] = hour_bucket.map(traffic_index['arrival']).fillna(0)
+        else:
+            df['arrival_traffic'] = np.nan
+
+    # Weather - exact hour match as in add_weather, one offset lookup in the weather store
+    with metrics.span('prepare_features.weather'):
+        weather = get_weather_index(airport_code).lookup(hour_bucket)
+        for i, col in enumerate(WEATHER_FEATURES):
+            df[col] = weather[:, i]
+
+    schema = schema or get_feature_schema()
+
+    if uses_destination_weather(schema):
+        with metrics.span('prepare_features.destination_weather'):
+            add_destination_weather(df, hour_bucket, airport_code)
+
+    with metrics.span('prepare_features.encode'):
+        df = add_time_features(df, df['scheduled_time'])
+
+        df = df.drop(columns=['scheduled_time', 'actual_time', 'delay'])
+
+        df = df.fillna(value=dict(schema.fill_values)).infer_objects(copy=False)
+
+        df = fill_missing_terminal(df)
+
+        for col in CATEGORICAL_FEATURES:
+            df[col] = df[col].astype(schema.categories[col]).cat.codes
+
+    return df[df.notna().all(axis=1)]
+
+
+def _record_value(record: Mapping, key: str):
+    """
+    Reads a value from a raw AviationStack record. Works for both the nested JSON record
+    and the flattened (json_normalize) one. Missing values and NaNs are returned as None.
+    """
+    if key in record:
+        value = record[key]
+    else:
+        value = record
+        for part in key.split('.'):
+            if not isinstance(value, Mapping):
+                return None
+            value = value.get(part)
+
+    if value is None or value is pd.NA or value is pd.NaT or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return value
+
+
+def _parse_time(value) -> datetime | None:
+    """
+    Parses an ISO timestamp from the API ('2025-12-26t07:05:00.000'), None if it is not valid.
+    """
+    if value is None or isinstance(value, datetime):
+        return value
     try:
-        response = requests.get(url, params=params, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-
-        # parse the hourly data
-        hourly = data['hourly']
-        df_weather = pd.DataFrame({
-            'time': pd.to_datetime(hourly['time']),
-            'temp_c': hourly['temperature_2m'],
-            'precip_mm': hourly['precipitation'],
-            'wind_kph': hourly['wind_speed_10m']
-        })
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+def _round_hour(time: datetime) -> datetime:
+    """
+    Rounds to the nearest hour like pandas .dt.round('h') (half hours to the even hour).
+    """
+    floor = time.replace(minute=0, second=0, microsecond=0)
+    rest = time - floor
+    half_hour = timedelta(minutes=30)
+    if rest > half_hour or (rest == half_hour and floor.hour % 2 == 1):
+        return floor + timedelta(hours=1)
+    return floor
+
+
+def encode_flight_record(record: Mapping, traffic_index: dict, weather_index: dict,
+                         feature_names=None, out: np.ndarray = None,
+                         schema: FeatureSchema = None, airport_code: str = DEFAULT_AIRPORT) -> np.ndarray | None:
+    """
+    Fast path of prepare_features for a single flight without any pandas operations.
+    Maps the raw AviationStack record directly into a float32 feature vector.
+    Produces the same values as prepare_features (tested for parity).
+
+    :param record: Raw timetable record - nested JSON dict or flattened row (row.to_dict()).
+    :type record: Mapping
+    :param traffic_index: Traffic index of the departure timetable (get_traffic_index).
+    :type traffic_index: dict
+    :param weather_index: Weather index (get_weather_index).
+    :type weather_index: dict
+    :param feature_names: Order of the features, e.g. predictor.feature_names_in_.
+                          Defaults to the schema feature order.
+    :param out: Optional preallocated float32 array to write the features into.
+    :type out: np.ndarray
+    :param schema: Fill values and categories of the model, the current artifacts by default.
+    :type schema: FeatureSchema
+    :param airport_code: IATA code of the departure airport (timezone of the destination weather lookup).
+    :type airport_code: str
+    :return: Feature vector or None if some feature could not be filled.
+    :rtype: np.ndarray | None
+    """
+    schema = schema or get_feature_schema()
+    fill_values = schema.fill_values
+
+    if feature_names is None:
+        feature_names = schema.feature_order
+    if out is None:
+        out = np.empty(len(feature_names), dtype=np.float32)
+
+    scheduled = (
+        _parse_time(_record_value(record, 'departure.scheduledTime'))
+        or _parse_time(_record_value(record, 'departure.actualTime'))
+    )
+    hour_bucket = _round_hour(scheduled) if scheduled is not None else None
+
+    features = {}
+
+    # Traffic
+    features['departure_traffic'] = traffic_index['departure'].get(hour_bucket, 0) - 1
+    if traffic_index['arrival'] is not None:
+        features['arrival_traffic'] = traffic_index['arrival'].get(hour_bucket, 0)
+
+    # Weather
+    weather = weather_index.get(hour_bucket)
+    if weather is not None:
+        features.update(zip(WEATHER_FEATURES, weather))
+
+    # Destination weather, only for models trained with it
+    destination = _record_value(record, 'arrival.iataCode')
+    if destination is not None and hour_bucket is not None and any(
+            name in DESTINATION_WEATHER_FEATURES for name in feature_names):
+        hour = to_utc_hours(pd.Series([hour_bucket]), airport_code).iloc[0]
+        if not pd.isna(hour):
+            weather = get_destination_weather().get(str(destination).upper(), hour)
+            if weather is not None:
+                features.update(zip(DESTINATION_WEATHER_FEATURES, weather))
+
+    # Time features
+    if scheduled is not None:
+        features['day_in_month'] = scheduled.day
+        features['hour_sin'] = np.sin(2 * np.pi * hour_bucket.hour / 24)
+        features['hour_cos'] = np.cos(2 * np.pi * hour_bucket.hour / 24)
+        features['weekday_sin'] = np.sin(2 * np.pi * scheduled.weekday() / 7)
+        features['weekday_cos'] = np.cos(2 * np.pi * scheduled.weekday() / 7)
+
+    # Categorical features, missing values are filled before encoding as in prepare_features
+    for col, raw_col in [('terminal', 'departure.terminal'),
+                         ('airline', 'airline.icaoCode'),
+                         ('destination_airport', 'arrival.iataCode')]:
+        value = _record_value(record, raw_col)
+        if value is None:
+            value = fill_values.get(col)
+        features[col] = schema.category_codes[col].get(value, -1)
+
+    for i, name in enumerate(feature_names):
+        value = features.get(name)
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            value = fill_values[name]
+        out[i] = value
+
+    if np.isnan(out).any():
+        return None
+    return out
+
+
+@metrics.timed('get_weather')
+@ttl_cache(ttl=1800, max_entries=MAX_AIRPORTS)
+def get_weather(airport_code: str = DEFAULT_AIRPORT) -> pd.DataFrame:
+    """
+    Fetches the weather forecast for the airport from the Open-Meteo API.
+    Results are cached for 30 minutes, for at most MAX_AIRPORTS airports.
+
+    :param airport_code: IATA code of the airport.
+    :type airport_code: str
+    :return: Hourly weather of the last and the coming days (open_meteo_client.PAST_DAYS, FORECAST_DAYS).
+    :rtype: DataFrame
+    """
+    try:
+        data = open_meteo_client.fetch_forecast(*airport_location(airport_code))
+        df_weather = parse_weather(data)
 
     except Exception as e:
-        st.warning(f'Weather API Failed: {e}. Using fallback values for weather.')
+        print(f'Weather API Failed: {e}. Using fallback values for weather.')
         return pd.DataFrame()
     return df_weather
 
 
-def add_weather(flight_row : pd.DataFrame) -> pd.DataFrame:
+def parse_weather(data: dict) -> pd.DataFrame:
+    """
+    Parses the hourly Open-Meteo forecast response.
+
+    :param data: JSON response from the Open-Meteo API.
+    :type data: dict
+    :return: Hourly weather data.
+    :rtype: DataFrame
+    """
+    hourly = data['hourly']
+    df_weather = pd.DataFrame({
+        'time': pd.to_datetime(hourly['time']),
+        'temp_c': hourly['temperature_2m'],
+        'precip_mm': hourly['precipitation'],
+        'wind_kph': hourly['wind_speed_10m']
+    })
+    df_weather.attrs['fetched_at'] = pd.Timestamp.now(tz='UTC')
+    return df_weather
+
+
+def build_weather_index(df_weather: pd.DataFrame, airport_code: str = DEFAULT_AIRPORT) -> HourlyWeather:
+    """
+    Maps every hour of the weather history and of the forecast to its weather values.
+
+    :param df_weather: Hourly forecast (get_weather), can be empty.
+    :type df_weather: pd.DataFrame
+    :param airport_code: IATA code of the airport (its weather history is merged in).
+    :type airport_code: str
+    :return: Weather store, weather_index.get(hour) -> (temp_c, precip_mm, wind_kph) or None
+    :rtype: HourlyWeather
+    """
+    return build_weather_store(airport_code, df_weather, WEATHER_FEATURES)
+
+
+# {airport code: (fetched_at of the weather forecast, weather index)}
+_weather_index_cache = LRUCache(max_entries=MAX_AIRPORTS, name='weather_index')
+
+
+def get_weather_index(airport_code: str = DEFAULT_AIRPORT) -> HourlyWeather:
+    """
+    Returns the weather index of the airport (history and current forecast), built once per weather fetch.
+
+    :param airport_code: IATA code of the airport.
+    :type airport_code: str
+    :return: Weather index, see build_weather_index.
+    :rtype: HourlyWeather
+    """
+    df_weather = get_weather(airport_code)
+    fetched_at = df_weather.attrs.get('fetched_at')
+    cached_key, cached_index = _weather_index_cache.get(airport_code, (None, None))
+
+    if fetched_at is not None and cached_key == fetched_at:
+        return cached_index
+    if cached_index is not None:
+        # an index of an older fetch
+        _weather_index_cache.count_stale()
+
+    weather_index = build_weather_index(df_weather, airport_code)
+
+    if fetched_at is not None:
+        _weather_index_cache.set(airport_code, (fetched_at, weather_index))
+
+    return weather_index
+
+
+def add_weather(flight_row : pd.DataFrame, airport_code: str = DEFAULT_AIRPORT) -> pd.DataFrame:
     """
     Adds the weather features to the flight row. If no hour bucket matches, fills features with NaNs.
     
     :param flight_row: Row with the flight data.
     :type flight_row: pd.DataFrame
+    :param airport_code: IATA code of the departure airport.
+    :type airport_code: str
     :return: Row with added weather features.
     :rtype: DataFrame
     """
 
     flight_hour = flight_row['scheduled_time'].dt.round('h').iloc[0]
 
-    df_weather = get_weather()
-
-    match = df_weather[df_weather['time'] == flight_hour]
+    match = get_weather_index(airport_code).get(flight_hour)
 
-    if not match.empty:
-        # Assign values to the flight_row
-        flight_row['temp_c'] = match.iloc[0]['temp_c']
-        flight_row['precip_mm'] = match.iloc[0]['precip_mm']
-        flight_row['wind_kph'] = match.iloc[0]['wind_kph']
-    else:
-        flight_row['temp_c'] = np.nan
-        flight_row['precip_mm'] = np.nan
-        flight_row['wind_kph'] = np.nan
+    for col, value in zip(WEATHER_FEATURES, match or (np.nan,) * len(WEATHER_FEATURES)):
+        flight_row[col] = value
 
     return flight_row
 
 
-@st.cache_data(ttl=1800)
-def get_arrival_df() -> pd.DataFrame:
+@metrics.timed('get_arrival_df')
+@ttl_cache(ttl=1800, max_entries=MAX_AIRPORTS, max_bytes=MAX_AIRPORT_CACHE_BYTES)
+def get_arrival_df(airport_code: str = DEFAULT_AIRPORT) -> pd.DataFrame:
     """
-    Fetches the arrival timetable for PRG airport. Uses AviationStack API.
-    Caches data for 30 minutes.    
+    Fetches the arrival timetable for the airport. Uses AviationStack API.
+    Caches data for 30 minutes, the least recently used airports are evicted over the memory budget.
 
+    :param airport_code: IATA code of the airport.
+    :type airport_code: str
     :return: Timetable with arrivals
     :rtype: DataFrame
     """
     try:
-        df_arrivals = aviationstack_client.fetch_query(
-            'timetable', {'iataCode': 'PRG', 'type': 'arrival'}
-        )
-
-        df_arrivals = pd.json_normalize(df_arrivals['data'])
+        params = aviationstack_client.timetable_params(airport_code, 'arrival')
+        if streaming.STREAMING:
+            df_arrivals = streaming.fetch_paginated_df('timetable', params, columns=('arrival.scheduledTime',))
+        else:
+            df_arrivals = pd.json_normalize(aviationstack_client.fetch_query('timetable', params)['data'])
 
         df_arrivals['arrival.scheduledTime'] = pd.to_datetime(df_arrivals['arrival.scheduledTime'])
 
@@ -233,7 +630,68 @@ def get_arrival_df() -> pd.DataFrame:
         return pd.DataFrame()
 
 
-def add_traffic(df_departures: pd.DataFrame, flight_row: pd.DataFrame) -> pd.DataFrame:
+def build_traffic_index(df_departures: pd.DataFrame, df_arrivals: pd.DataFrame) -> dict:
+    """
+    Counts departures and arrivals per hour bucket.
+
+    :param df_departures: Timetable with departures.
+    :type df_departures: pd.DataFrame
+    :param df_arrivals: Timetable with arrivals (with 'hour_bucket' column), can be empty.
+    :type df_arrivals: pd.DataFrame
+    :return: {'departure': {hour_bucket: count}, 'arrival': {hour_bucket: count} or None
+             if the arrivals are not available}
+    :rtype: dict
+    """
+    departure_buckets = hour_buckets(df_departures['departure.scheduledTime'])
+
+    arrival_counts = None
+    if not df_arrivals.empty:
+        arrival_counts = df_arrivals['hour_bucket'].value_counts().to_dict()
+
+    return {
+        'departure': departure_buckets.value_counts().to_dict(),
+        'arrival': arrival_counts,
+    }
+
+
+# {airport code: (fetched_at of the timetable, traffic index)} - entries are replaced as a whole,
+# so readers never see a half built index
+_traffic_index_cache = LRUCache(max_entries=MAX_AIRPORTS, name='traffic_index')
+
+
+def get_traffic_index(df_departures: pd.DataFrame, airport_code: str = DEFAULT_AIRPORT) -> dict:
+    """
+    Returns the traffic index for the departure timetable.
+    The index is built once per timetable fetch (keyed on df.attrs['fetched_at'] set by
+    prediction.fetch_timetable_df) and reused by every prediction on that timetable.
+    Timetables without the fetch timestamp get a fresh index every call.
+
+    :param df_departures: Full departure timetable.
+    :type df_departures: pd.DataFrame
+    :param airport_code: IATA code of the departure airport (arrivals are fetched for it).
+    :type airport_code: str
+    :return: Traffic index, see build_traffic_index.
+    :rtype: dict
+    """
+    fetched_at = df_departures.attrs.get('fetched_at')
+    cached_key, cached_index = _traffic_index_cache.get(airport_code, (None, None))
+
+    if fetched_at is not None and cached_key == fetched_at:
+        return cached_index
+    if cached_index is not None:
+        # an index of an older fetch
+        _traffic_index_cache.count_stale()
+
+    traffic_index = build_traffic_index(df_departures, get_arrival_df(airport_code))
+
+    if fetched_at is not None:
+        _traffic_index_cache.set(airport_code, (fetched_at, traffic_index))
+
+    return traffic_index
+
+
+def add_traffic(df_departures: pd.DataFrame, flight_row: pd.DataFrame,
+                airport_code: str = DEFAULT_AIRPORT) -> pd.DataFrame:
     """
     Calculates airport traffic features for the specific time window. 
     Adds the traffic features to the flight row.  
@@ -242,24 +700,21 @@ def add_traffic(df_departures: pd.DataFrame, flight_row: pd.DataFrame) -> pd.Dat
     :type df_departures: pd.DataFrame
     :param flight_row: Row with the flight we are predicting on.
     :type flight_row: pd.DataFrame
+    :param airport_code: IATA code of the departure airport.
+    :type airport_code: str
     :return: Row with added traffic features.
     :rtype: DataFrame
     """
-    # Departures
     flight_time = flight_row['scheduled_time'].dt.round('h').iloc[0]
 
-    df_departures['departure.scheduledTime'] = pd.to_datetime(df_departures['departure.scheduledTime'])
-
-    df_departures['hour_bucket'] = df_departures['departure.scheduledTime'].dt.round('h')
+    traffic_index = get_traffic_index(df_departures, airport_code)
 
     # Departure traffic is all the departuring flights in the same hour bucket - 1 for the flight that we are predicting
-    flight_row['departure_traffic'] = (df_departures['hour_bucket'] == flight_time).sum() - 1
+    flight_row['departure_traffic'] = traffic_index['departure'].get(flight_time, 0) - 1
 
-    df_arrivals = get_arrival_df()
-
-    if not df_arrivals.empty:
+    if traffic_index['arrival'] is not None:
         # Arrival traffic is all the arriving flights in the same hour bucket
-        flight_row['arrival_traffic'] = (df_arrivals['hour_bucket'] == flight_time).sum()
+        flight_row['arrival_traffic'] = traffic_index['arrival'].get(flight_time, 0)
     else:
         # np.nan so the column gets filled later with the fallback value
         flight_row['arrival_traffic'] = np.nan
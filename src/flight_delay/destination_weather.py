@@ -0,0 +1,243 @@
+"""
+Weather at the destination airports of the departures.
+
+A timetable has flights to ~150 destinations. Their forecasts are fetched with Open-Meteo's multi-location request
+(open_meteo_client.fetch_forecasts, MAX_LOCATIONS coordinates per request) and cached per coarse grid cell -
+destinations in the same cell (GRID_DEGREES, ~50 km) share one forecast, and one refresh costs a handful of
+requests per CACHE_TTL instead of one per destination. The forecasts are in UTC, flights of any departure airport
+look up the same cells.
+"""
+
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from flight_delay.api import open_meteo_client
+from flight_delay.utils.caching import LRUCache
+from flight_delay.utils.dicts import AIRPORT_COORDS, AIRPORT_TIMEZONES
+from flight_delay.weather_store import HourlyWeather
+
+# Model features, the departure airport weather features (data_preprocessing.WEATHER_FEATURES) of the destination
+DESTINATION_WEATHER_FEATURES = ('dest_temp_c', 'dest_precip_mm', 'dest_wind_kph')
+
+# Size of a grid cell in degrees of latitude and longitude
+GRID_DEGREES = float(os.environ.get('FLIGHT_DELAY_DEST_WEATHER_GRID', 0.5))
+
+# Same as the departure weather (data_preprocessing.get_weather)
+CACHE_TTL = 1800
+
+# Seconds without a new request after a failed one, the flights get the fill values meanwhile
+RETRY_AFTER = 60
+
+# Cells kept in the cache, more than the destinations of all the supported airports
+MAX_CELLS = 1024
+
+
+def grid_cell(latitude: float, longitude: float, grid: float = GRID_DEGREES) -> tuple[int, int]:
+    """
+    :param latitude: Latitude of the location.
+    :type latitude: float
+    :param longitude: Longitude of the location.
+    :type longitude: float
+    :param grid: Size of a cell in degrees.
+    :type grid: float
+    :return: Indexes of the grid cell with the location.
+    :rtype: tuple[int, int]
+    """
+    return int(np.floor(latitude / grid)), int(np.floor(longitude / grid))
+
+
+def cell_center(cell: tuple[int, int], grid: float = GRID_DEGREES) -> tuple[float, float]:
+    """
+    :param cell: Indexes of the grid cell (grid_cell).
+    :type cell: tuple[int, int]
+    :param grid: Size of a cell in degrees.
+    :type grid: float
+    :return: (latitude, longitude) of the centre of the cell, the forecast of the cell is fetched there.
+    :rtype: tuple[float, float]
+    """
+    return (cell[0] + 0.5) * grid, (cell[1] + 0.5) * grid
+
+
+def to_utc_hours(hours: pd.Series, airport_code: str) -> pd.Series:
+    """
+    Converts the local hours of the departure airport to UTC.
+
+    :param hours: Whole hours in the local time of the airport (no timezone).
+    :type hours: pd.Series
+    :param airport_code: IATA code of the departure airport.
+    :type airport_code: str
+    :return: Hours in UTC (no timezone), NaT if the airport timezone is unknown or the hour is ambiguous
+             (the hours when the clocks change).
+    :rtype: pd.Series
+    """
+    hours = pd.to_datetime(pd.Series(hours))
+    if airport_code not in AIRPORT_TIMEZONES:
+        return pd.Series(pd.NaT, index=hours.index, dtype='datetime64[ns]')
+    return (
+        hours.dt.tz_localize(AIRPORT_TIMEZONES[airport_code], ambiguous='NaT', nonexistent='NaT')
+        .dt.tz_convert('UTC').dt.tz_localize(None)
+    )
+
+
+class DestinationWeather:
+    """
+    Forecasts of the grid cells of the destinations, refreshed in batched requests.
+    """
+
+    def __init__(self, fetch=open_meteo_client.fetch_forecasts, ttl: float = CACHE_TTL,
+                 grid: float = GRID_DEGREES, max_cells: int = MAX_CELLS):
+        """
+        :param fetch: Fetches the forecasts of a list of (latitude, longitude), see open_meteo_client.fetch_forecasts.
+        :param ttl: Seconds a forecast of a cell is used.
+        :type ttl: float
+        :param grid: Size of a cell in degrees.
+        :type grid: float
+        :param max_cells: Maximal number of cached cells, the least recently used is dropped.
+        :type max_cells: int
+        """
+        self._fetch = fetch
+        self.ttl = ttl
+        self.grid = grid
+        # {cell: (expires at (monotonic), hourly weather in UTC)}
+        self._cells = LRUCache(max_entries=max_cells, name='destination_weather')
+        self._lock = threading.Lock()
+        self._retry_at = 0.0
+        self.requests = 0
+
+    def cells(self, iata_codes) -> dict[str, tuple[int, int]]:
+        """
+        :param iata_codes: IATA codes of the destinations.
+        :return: {IATA code: grid cell}, destinations without known coordinates are left out.
+        :rtype: dict[str, tuple[int, int]]
+        """
+        cells = {}
+        for iata in set(iata_codes):
+            if iata in AIRPORT_COORDS:
+                longitude, latitude = AIRPORT_COORDS[iata]
+                cells[iata] = grid_cell(latitude, longitude, self.grid)
+        return cells
+
+    def refresh(self, cells) -> dict[tuple[int, int], HourlyWeather]:
+        """
+        Fetches the cells without a valid forecast, MAX_LOCATIONS cells per request.
+        On failure the expired forecasts are kept and no request is made for RETRY_AFTER seconds.
+
+        :param cells: Grid cells to return.
+        :return: {cell: hourly weather in UTC}, cells without a forecast are left out.
+        :rtype: dict[tuple[int, int], HourlyWeather]
+        """
+        return {cell: entry[1] for cell, entry in self._refresh_entries(cells).items()}
+
+    def _refresh_entries(self, cells) -> dict[tuple[int, int], tuple[float, HourlyWeather]]:
+        """
+        See refresh.
+
+        :return: {cell: (expires at, hourly weather in UTC)}, cells without a forecast are left out.
+        :rtype: dict[tuple[int, int], tuple[float, HourlyWeather]]
+        """
+        cells = set(cells)
+        with self._lock:
+            now = time.monotonic()
+            cached = {cell: self._cells.get(cell) for cell in cells}
+            missing = sorted(cell for cell, entry in cached.items() if entry is None or entry[0] <= now)
+            for cell in missing:
+                if cached[cell] is not None:
+                    self._cells.count_stale()
+
+            if missing and now >= self._retry_at:
+                for i in range(0, len(missing), open_meteo_client.MAX_LOCATIONS):
+                    chunk = missing[i:i + open_meteo_client.MAX_LOCATIONS]
+                    try:
+                        self.requests += 1
+                        responses = self._fetch([cell_center(cell, self.grid) for cell in chunk])
+                        for cell, data in zip(chunk, responses):
+                            cached[cell] = (now + self.ttl, parse_forecast(data))
+                            self._cells.set(cell, cached[cell])
+                    except Exception as e:
+                        print(f'Destination weather API failed: {e}. Using fallback values for weather.')
+                        self._retry_at = now + RETRY_AFTER
+                        break
+
+        return {cell: entry for cell, entry in cached.items() if entry is not None}
+
+    def version(self, iata_codes) -> tuple:
+        """
+        Version of the forecasts of the destinations, changes whenever one of their cells is fetched again.
+        The expired cells are refreshed first, like before a lookup.
+
+        :param iata_codes: IATA codes of the destinations.
+        :return: Sorted ((cell, expires at), ...) of the cells with a forecast.
+        :rtype: tuple
+        """
+        entries = self._refresh_entries(self.cells(iata_codes).values())
+        return tuple(sorted((cell, entry[0]) for cell, entry in entries.items()))
+
+    def lookup(self, destinations: pd.Series, hours: pd.Series) -> np.ndarray:
+        """
+        Weather at the destinations in the given hours, all the destinations are refreshed at once.
+
+        :param destinations: IATA codes of the destinations.
+        :type destinations: pd.Series
+        :param hours: Whole hours in UTC (no timezone), aligned with destinations, may contain NaT.
+        :type hours: pd.Series
+        :return: Array of shape (len(destinations), len(DESTINATION_WEATHER_FEATURES)), NaN where unknown.
+        :rtype: np.ndarray
+        """
+        out = np.full((len(destinations), len(DESTINATION_WEATHER_FEATURES)), np.nan)
+        destinations = pd.Series(destinations).reset_index(drop=True)
+        hours = pd.Series(hours).reset_index(drop=True)
+
+        cells = self.cells(destinations.dropna())
+        forecasts = self.refresh(cells.values())
+        for iata, cell in cells.items():
+            if cell in forecasts:
+                rows = (destinations == iata).to_numpy()
+                out[rows] = forecasts[cell].lookup(hours[rows])
+        return out
+
+    def get(self, iata: str, hour: pd.Timestamp) -> tuple | None:
+        """
+        :param iata: IATA code of the destination.
+        :type iata: str
+        :param hour: Whole hour in UTC (no timezone).
+        :type hour: pd.Timestamp
+        :return: Weather values in the order of DESTINATION_WEATHER_FEATURES, None if unknown.
+        :rtype: tuple | None
+        """
+        cell = self.cells([iata]).get(iata)
+        if cell is None:
+            return None
+        forecast = self.refresh([cell]).get(cell)
+        return forecast.get(hour) if forecast is not None else None
+
+
+def parse_forecast(data: dict) -> HourlyWeather:
+    """
+    Parses one location of the Open-Meteo response (times in UTC).
+
+    :param data: JSON response of one location.
+    :type data: dict
+    :return: Hourly weather in UTC.
+    :rtype: HourlyWeather
+    """
+    hourly = data['hourly']
+    df = pd.DataFrame({
+        'time': pd.to_datetime(hourly['time']),
+        'dest_temp_c': hourly['temperature_2m'],
+        'dest_precip_mm': hourly['precipitation'],
+        'dest_wind_kph': hourly['wind_speed_10m'],
+    })
+    return HourlyWeather.from_frames([df], DESTINATION_WEATHER_FEATURES)
+
+
+_destination_weather = DestinationWeather()
+
+
+def get_destination_weather() -> DestinationWeather:
+    """
+    :return: Destination weather cache shared by the process.
+    :rtype: DestinationWeather
+    """
+    return _destination_weather
@@ -0,0 +1,238 @@
+"""
+Precomputed delay forecasts of the whole departure timetable.
+
+A background scheduler predicts every departure of an airport with one batch call (prediction.predict_timetable)
+whenever its timetable, its weather, the destination forecasts or the model changes, and stores the delays in a lookup table.
+Answering "what is the delay of OK123" is then a dict read instead of a feature build and a model call.
+Streamlit-free, see services for the app wiring.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Callable, Mapping
+import pandas as pd
+from flight_delay import prediction
+from flight_delay.data_preprocessing import get_weather
+from flight_delay.utils.caching import LRUCache
+
+# The weather is cached for 30 minutes, a newer forecast can only appear after that
+CHECK_INTERVAL = 30 * 60
+
+
+@dataclass(frozen=True)
+class ForecastTable:
+    """
+    Predicted delays of one timetable fetch, replaced as a whole.
+    """
+    airport_code: str
+    timetable_fetched_at: pd.Timestamp | None
+    weather_fetched_at: pd.Timestamp | None
+    # the model version the delays were predicted with
+    model: object
+    # {normalized flight number (operating and codeshare): delay in minutes}
+    delays: Mapping[str, int]
+    # delays with the index of the timetable, missing for flights that could not be preprocessed
+    by_row: pd.Series
+    # see prediction.destination_weather_version, None for models without the destination weather
+    destination_weather_version: tuple | None = None
+
+    def lookup(self, flight_number: str) -> int | None:
+        """
+        :param flight_number: Normalized flight number.
+        :type flight_number: str
+        :return: Predicted delay in minutes, None if the flight has no forecast.
+        :rtype: int | None
+        """
+        return self.delays.get(flight_number)
+
+
+def build_forecast_table(predictor, df: pd.DataFrame, airport_code: str,
+                         weather_fetched_at: pd.Timestamp = None,
+                         destination_weather_version: tuple = None) -> ForecastTable:
+    """
+    Predicts every flight of the timetable and indexes the delays by flight number.
+    A flight number on more rows gets the delay of its first row, like the single flight prediction.
+
+    :param predictor: Loaded model (see predictor.load_predictor).
+    :param df: Departure timetable.
+    :type df: pd.DataFrame
+    :param airport_code: IATA code of the departure airport.
+    :type airport_code: str
+    :param weather_fetched_at: Version of the weather the features were built with.
+    :type weather_fetched_at: pd.Timestamp
+    :param destination_weather_version: Version of the destination forecasts the features were built with.
+    :type destination_weather_version: tuple
+    :return: Forecast table.
+    :rtype: ForecastTable
+    :raises KeyError: The model expects a feature that is not generated.
+    """
+    model = prediction.pinned_model(predictor)
+    by_row = prediction.predict_timetable(predictor, df, airport_code)
+
+    delays = {}
+    values = by_row.to_numpy()
+    for flight_number, positions in prediction.get_flight_index(df).items():
+        delay = values[positions[0]]
+        if not pd.isna(delay):
+            delays[flight_number] = int(delay)
+
+    return ForecastTable(
+        airport_code=airport_code,
+        timetable_fetched_at=df.attrs.get('fetched_at'),
+        weather_fetched_at=weather_fetched_at,
+        model=model,
+        delays=MappingProxyType(delays),
+        by_row=by_row,
+        destination_weather_version=destination_weather_version,
+    )
+
+
+class ForecastScheduler:
+    """
+    Keeps the forecast tables of the requested airports up to date in a daemon thread.
+    A table is rebuilt when the timetable was refreshed (notify), when the weather, the destination forecasts
+    or the model changed
+    (checked every check_interval) - never per user request. Readers get the last table immediately.
+    """
+
+    def __init__(self, get_timetable: Callable[[str], tuple[pd.DataFrame, pd.Timestamp | None]],
+                 get_predictor: Callable[[str], object], max_airports: int = None,
+                 check_interval: float = CHECK_INTERVAL, weather: Callable[[str], pd.DataFrame] = get_weather):
+        """
+        :param get_timetable: Returns (timetable, fetched_at) of an airport, e.g. RefresherPool.get.
+        :type get_timetable: Callable[[str], tuple[pd.DataFrame, pd.Timestamp | None]]
+        :param get_predictor: Returns the model of an airport.
+        :type get_predictor: Callable[[str], object]
+        :param max_airports: Maximal number of airports with a forecast table, the least recently read is dropped.
+        :type max_airports: int
+        :param check_interval: Seconds between two checks of the weather (also of the destinations) and the model.
+        :type check_interval: float
+        :param weather: Returns the weather of an airport, its attrs['fetched_at'] is the version.
+        :type weather: Callable[[str], pd.DataFrame]
+        """
+        self._get_timetable = get_timetable
+        self._get_predictor = get_predictor
+        self._weather = weather
+        self.check_interval = check_interval
+
+        self._tables = LRUCache(max_entries=max_airports, name='forecasts')
+        # airports to rebuild, in the order they were notified
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def refresh(self, airport_code: str) -> bool:
+        """
+        Rebuilds the forecast table of the airport if its timetable, weather, destination forecasts or model changed.
+        On failure the old table is kept.
+
+        :param airport_code: IATA airport code
+        :type airport_code: str
+        :return: True if a new table was stored.
+        :rtype: bool
+        """
+        try:
+            df, fetched_at = self._get_timetable(airport_code)
+            if fetched_at is None or df.empty:
+                return False
+            weather_fetched_at = self._weather(airport_code).attrs.get('fetched_at')
+            predictor = self._get_predictor(airport_code)
+            model = prediction.pinned_model(predictor)
+            destination_version = prediction.destination_weather_version(model, df)
+
+            table = self._tables.get(airport_code)
+            if (table is not None and table.timetable_fetched_at == fetched_at
+                    and table.weather_fetched_at == weather_fetched_at
+                    and table.destination_weather_version == destination_version
+                    and table.model is model):
+                return False
+
+            table = build_forecast_table(predictor, df, airport_code, weather_fetched_at, destination_version)
+        except Exception as e:
+            print(f'Forecasts for "{airport_code}" failed, serving the old ones: {e}')
+            return False
+
+        self._tables.set(airport_code, table)
+        return True
+
+    def notify(self, airport_code: str):
+        """
+        Asks the background thread to rebuild the forecasts of the airport (e.g. after a timetable refresh).
+        Does not block.
+
+        :param airport_code: IATA airport code
+        :type airport_code: str
+        """
+        with self._pending_lock:
+            self._pending[airport_code] = None
+        self._wake.set()
+
+    def get(self, airport_code: str) -> ForecastTable | None:
+        """
+        Returns the last forecast table of the airport immediately.
+        The first call for an airport only schedules its table.
+
+        :param airport_code: IATA airport code
+        :type airport_code: str
+        :return: Forecast table, None if there is none yet.
+        :rtype: ForecastTable | None
+        """
+        table = self._tables.get(airport_code)
+        if table is None:
+            self.notify(airport_code)
+        return table
+
+    def airports(self) -> list[str]:
+        """
+        :return: Airports with a forecast table, from the least to the most recently read.
+        :rtype: list[str]
+        """
+        return self._tables.keys()
+
+    def start(self) -> 'ForecastScheduler':
+        """
+        Starts the background thread. Calling it again does nothing.
+
+        :return: The scheduler itself.
+        :rtype: ForecastScheduler
+        """
+        with self._start_lock:
+            if self._thread is None and not self._stop.is_set():
+                self._thread = threading.Thread(target=self._run, name='forecast-scheduler', daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self):
+        """
+        Background loop - rebuilds the notified airports, every check_interval all the known ones.
+        """
+        next_check = time.monotonic() + self.check_interval
+        while not self._stop.is_set():
+            self._wake.wait(max(0.0, next_check - time.monotonic()))
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+
+            with self._pending_lock:
+                airports = list(self._pending)
+                self._pending.clear()
+            if time.monotonic() >= next_check:
+                airports += [airport for airport in self._tables.keys() if airport not in airports]
+                next_check = time.monotonic() + self.check_interval
+
+            for airport_code in airports:
+                self.refresh(airport_code)
+
+    def stop(self):
+        """
+        Stops the background thread.
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
@@ -0,0 +1,387 @@
+"""
+Prediction logic without Streamlit - usable from the app, scripts and background workers.
+Fetching the timetable, finding a flight and predicting delays with a loaded model.
+Errors are raised, showing them to the user is up to the caller (see services).
+"""
+
+import os
+import threading
+from typing import Callable
+import numpy as np
+import pandas as pd
+from flight_delay.airports import DEFAULT_AIRPORT
+from flight_delay.api import aviationstack_client, streaming
+from flight_delay.data_preprocessing import (
+    prepare_features, prepare_features_batch, encode_flight_record, get_feature_schema, get_traffic_index,
+    get_weather, get_weather_index, uses_destination_weather
+)
+from flight_delay.destination_weather import get_destination_weather
+from flight_delay.utils import metrics
+from flight_delay.utils.caching import LRUCache
+
+# Flight number of the row and of its codeshare partner flight
+FLIGHT_NUMBER_COLUMNS = ('flight.iataNumber', 'codeshared.flight.iataNumber')
+
+# Flight indexes of the last few timetable fetches (one per airport in the app, more in the server)
+FLIGHT_INDEX_CACHE_SIZE = 8
+
+# {fetched_at of the timetable: flight index}
+_flight_index_cache = {}
+_flight_index_lock = threading.Lock()
+
+# Predicted flights kept by predict_flight_cached
+PREDICTION_CACHE_SIZE = int(os.environ.get('FLIGHT_DELAY_PREDICTION_CACHE_SIZE', 4096))
+
+# {(airport, flight number, timetable version, weather version, model version, destination weather version):
+#  (delay, model)}
+_prediction_cache = LRUCache(max_entries=PREDICTION_CACHE_SIZE, name='prediction')
+
+
+@metrics.timed('get_timetable_df')
+def fetch_timetable_df(airport_code: str, timetable_type: str,
+                       on_page: Callable[[pd.DataFrame], None] = None) -> pd.DataFrame:
+    """
+    Fetches flight timetable from the AviationStack API. Errors are raised.
+    With FLIGHT_DELAY_STREAMING the pages are streamed into the used columns only (api/streaming.py).
+
+    :param airport_code: IATA airport code
+    :type airport_code: str
+    :param timetable_type: Type of the timetable to fetch ('departure'/'arrival').
+    :type timetable_type: str
+    :param on_page: With FLIGHT_DELAY_STREAMING called with the rows fetched so far after every page
+                    (see streaming.fetch_paginated_df), otherwise not called.
+    :type on_page: Callable[[pd.DataFrame], None]
+    :return: Flight schedule dataframe, empty if the API returned no data.
+    :rtype: DataFrame
+    """
+    params = aviationstack_client.timetable_params(airport_code, timetable_type)
+    if streaming.STREAMING:
+        # versioned by the download time, also when it comes from the response cache
+        return streaming.fetch_paginated_df('timetable', params, on_page=on_page)
+
+    raw_data, fetched_at = aviationstack_client.post_query_entry(
+        "timetable", params, ttl=aviationstack_client.RESPONSE_CACHE_TTL
+    )
+
+    if not raw_data or 'data' not in raw_data:
+        return pd.DataFrame()
+
+    df = pd.json_normalize(raw_data['data'])
+    # Version of the timetable, derived data (traffic index, ...) is cached per fetch.
+    # A response served from the response cache keeps the time it was fetched upstream.
+    df.attrs['fetched_at'] = pd.Timestamp(fetched_at, unit='s', tz='UTC')
+    return df
+
+
+def pinned_model(predictor):
+    """
+    The model version used for a whole prediction call. Reloading predictors (see predictor, registry) may swap
+    their model meanwhile, the features must be encoded with the schema of the model that scores them.
+
+    :param predictor: Loaded model (see predictor.load_predictor).
+    :return: The current model of a reloading predictor, otherwise the predictor itself.
+    """
+    return getattr(predictor, 'current', predictor)
+
+
+def score_shadow(predictor, predict, served):
+    """
+    Scores the same flights with the shadow version of a registry and records the differences.
+    Failures of the shadow version are only counted, they never reach the caller.
+
+    :param predictor: Loaded model, only registry predictors with a shadow version are scored.
+    :param predict: Predicts with the given model version.
+    :type predict: Callable
+    :param served: Delays predicted by the served version.
+    """
+    shadow = getattr(predictor, 'shadow', None)
+    if shadow is None:
+        return
+    try:
+        predictor.shadow_stats.add(served, predict(shadow))
+    except Exception as e:
+        predictor.shadow_stats.add_error()
+        print(f'Shadow model {shadow.version} failed: {e}')
+
+
+def predict_flight(predictor, flight_row: pd.DataFrame, df: pd.DataFrame, airport_code: str = DEFAULT_AIRPORT) -> int:
+    """
+    Preprocesses the flight and predicts its delay.
+
+    :param predictor: Loaded model (see predictor.load_predictor).
+    :param flight_row: Row with the flight to predict on.
+    :type flight_row: pd.DataFrame
+    :param df: Full departure timetable.
+    :type df: pd.DataFrame
+    :param airport_code: IATA code of the departure airport (traffic and weather are per airport).
+    :type airport_code: str
+    :return: The predicted delay in minutes. Rounded to the nearest integer.
+    :rtype: int
+    :raises ValueError: The flight could not be preprocessed.
+    :raises KeyError: The model expects a feature that is not generated.
+    """
+    delay = _predict_flight(pinned_model(predictor), flight_row, df, airport_code)
+    score_shadow(predictor, lambda shadow: [_predict_flight(shadow, flight_row, df, airport_code)], [delay])
+    return delay
+
+
+def _predict_flight(predictor, flight_row: pd.DataFrame, df: pd.DataFrame, airport_code: str) -> int:
+    # XGBoost has attribute 'feature_names_in_' so this will be skipped.
+    # Might be useful for future models.
+    if not hasattr(predictor, 'feature_names_in_'):
+        with metrics.span('prepare_features'):
+            x_input = prepare_features(df_departures=df, flight_row=flight_row, airport_code=airport_code,
+                                       schema=getattr(predictor, 'schema', None))
+        if x_input.empty:
+            raise ValueError('Error in preprocessing.')
+        with metrics.span('predict'):
+            return round(float(predictor.predict(x_input)[0]))
+
+    # Fast path - the record is encoded straight into the model's feature order
+    traffic_index = get_traffic_index(df, airport_code)
+    weather_index = get_weather_index(airport_code)
+    with metrics.span('encode_flight_record'):
+        x_input = encode_flight_record(
+            flight_row.iloc[0].to_dict(),
+            traffic_index=traffic_index,
+            weather_index=weather_index,
+            feature_names=predictor.feature_names_in_,
+            schema=getattr(predictor, 'schema', None),
+            airport_code=airport_code,
+        )
+    if x_input is None:
+        raise ValueError('Error in preprocessing.')
+
+    with metrics.span('predict'):
+        return round(float(predictor.predict(x_input.reshape(1, -1))[0]))
+
+
+def destination_weather_version(model, df: pd.DataFrame, positions=None) -> tuple | None:
+    """
+    Version of the destination weather the flights are predicted with (see DestinationWeather.version).
+    Models trained without the destination weather do not use it and make no requests.
+
+    :param model: Pinned model version (see pinned_model).
+    :param df: Departure timetable.
+    :type df: pd.DataFrame
+    :param positions: Row positions of the flights, all the rows if None.
+    :return: Version, None if the model does not use the destination weather.
+    :rtype: tuple | None
+    """
+    schema = getattr(model, 'schema', None) or get_feature_schema()
+    if not uses_destination_weather(schema) or 'arrival.iataCode' not in df:
+        return None
+    destinations = df['arrival.iataCode'] if positions is None else df['arrival.iataCode'].iloc[positions]
+    return get_destination_weather().version(destinations.dropna().astype(str).str.upper())
+
+
+def prediction_cache_key(predictor, flight_number: str, df: pd.DataFrame, airport_code: str) -> tuple | None:
+    """
+    Cache key of a flight prediction made of cheap version tokens - the fetch times of the timetable and
+    of the weather, the identity of the model and the expiry of the destination forecast, no dataframe is hashed.
+
+    :param predictor: Loaded model (see predictor.load_predictor).
+    :param flight_number: Normalized flight number.
+    :type flight_number: str
+    :param df: Full departure timetable.
+    :type df: pd.DataFrame
+    :param airport_code: IATA code of the departure airport.
+    :type airport_code: str
+    :return: Key, None if the timetable has no version (not fetched by fetch_timetable_df).
+    :rtype: tuple | None
+    """
+    timetable_version = df.attrs.get('fetched_at')
+    if timetable_version is None:
+        return None
+    weather_version = get_weather(airport_code).attrs.get('fetched_at')
+    # a registry version has a name, other models are told apart by identity (the entry keeps the model alive)
+    model = pinned_model(predictor)
+    model_version = getattr(model, 'version', None) or id(model)
+    # the destination of the row the flight is predicted from, see filter_flight
+    positions = get_flight_index(df).get(str(flight_number).strip().upper())
+    destination_version = destination_weather_version(model, df, [] if positions is None else positions[:1])
+    return airport_code, flight_number, timetable_version, weather_version, model_version, destination_version
+
+
+def predict_flight_cached(predictor, flight_row: pd.DataFrame, df: pd.DataFrame,
+                          airport_code: str = DEFAULT_AIRPORT) -> int:
+    """
+    predict_flight with a bounded LRU cache, see prediction_cache_key.
+    A new timetable, weather, model or destination forecast makes new keys, the old entries age out.
+
+    :param predictor: Loaded model (see predictor.load_predictor).
+    :param flight_row: Row with the flight to predict on (see filter_flight).
+    :type flight_row: pd.DataFrame
+    :param df: Full departure timetable.
+    :type df: pd.DataFrame
+    :param airport_code: IATA code of the departure airport.
+    :type airport_code: str
+    :return: The predicted delay in minutes. Rounded to the nearest integer.
+    :rtype: int
+    :raises ValueError: The flight could not be preprocessed.
+    :raises KeyError: The model expects a feature that is not generated.
+    """
+    key = prediction_cache_key(predictor, flight_row['flight.iataNumber'].iloc[0], df, airport_code)
+    if key is None:
+        return predict_flight(predictor, flight_row, df, airport_code)
+
+    hit = _prediction_cache.get(key)
+    if hit is not None:
+        return hit[0]
+
+    delay = predict_flight(predictor, flight_row, df, airport_code)
+    _prediction_cache.set(key, (delay, pinned_model(predictor)))
+    return delay
+
+
+def prediction_cache_stats() -> dict:
+    """
+    :return: Size, hits and misses of the flight prediction cache.
+    :rtype: dict
+    """
+    return _prediction_cache.stats()
+
+
+def predict_timetable(predictor, df: pd.DataFrame, airport_code: str = DEFAULT_AIRPORT) -> pd.Series:
+    """
+    Predicts the delay for every flight in the departure timetable.
+    Features are built for all rows at once and the model is called only once.
+
+    :param predictor: Loaded model (see predictor.load_predictor).
+    :param df: Full departure timetable.
+    :type df: pd.DataFrame
+    :param airport_code: IATA code of the departure airport.
+    :type airport_code: str
+    :return: Predicted delays in minutes (rounded) with the same index as df.
+             Flights that could not be preprocessed have a missing value.
+    :rtype: pd.Series
+    :raises KeyError: The model expects a feature that is not generated.
+    """
+    delays = _predict_timetable(pinned_model(predictor), df, airport_code)
+    score_shadow(
+        predictor,
+        lambda shadow: _predict_timetable(shadow, df, airport_code).to_numpy(dtype=float, na_value=np.nan),
+        delays.to_numpy(dtype=float, na_value=np.nan),
+    )
+    return delays
+
+
+def _predict_timetable(predictor, df: pd.DataFrame, airport_code: str) -> pd.Series:
+    delays = pd.Series(pd.NA, index=df.index, dtype='Int64')
+
+    x_input = prepare_features_batch(df, airport_code, schema=getattr(predictor, 'schema', None))
+    if x_input.empty:
+        return delays
+
+    if hasattr(predictor, 'feature_names_in_'):
+        x_input = x_input[predictor.feature_names_in_]
+
+    with metrics.span('predict'):
+        predictions = predictor.predict(x_input)
+
+    delays.loc[x_input.index] = pd.Series(predictions, index=x_input.index).round().astype('Int64')
+    return delays
+
+
+def valid_flight_number(flight_num: str) -> bool:
+    """
+    Very simple flight number validation.
+
+    :param flight_num: Flight number to validate
+    :type flight_num: str
+    :return: True if a flight is in valid format, False if it isn't.
+    :rtype: bool
+    """
+    flight_num = flight_num.strip()
+    if len(flight_num) < 2 or flight_num.isspace() or ' ' in flight_num or not flight_num.isalnum:
+        print(len(flight_num))
+        return False
+    return True
+
+
+def normalize_flight_numbers(numbers: pd.Series) -> pd.Series:
+    """
+    Flight numbers as they are looked up - stripped, upper case, missing values as ''.
+
+    :param numbers: Flight numbers.
+    :type numbers: pd.Series
+    :return: Normalized flight numbers.
+    :rtype: pd.Series
+    """
+    return numbers.fillna("").astype(str).str.strip().str.upper()
+
+
+def build_flight_index(df: pd.DataFrame) -> dict:
+    """
+    Maps every normalized flight number (operating and codeshare) to its row positions in the timetable.
+
+    :param df: Timetable dataframe.
+    :type df: pd.DataFrame
+    :return: {flight number: np.ndarray of row positions}
+    :rtype: dict
+    """
+    index = {}
+    for column in FLIGHT_NUMBER_COLUMNS:
+        if column not in df:
+            continue
+        numbers = normalize_flight_numbers(df[column]).reset_index(drop=True)
+        for number, positions in numbers.groupby(numbers, sort=False).indices.items():
+            if not number:
+                continue
+            if number in index:
+                positions = np.union1d(index[number], positions)
+            index[number] = positions
+    return index
+
+
+def get_flight_index(df: pd.DataFrame) -> dict:
+    """
+    Returns the flight index of the timetable, built once per timetable fetch
+    (keyed on df.attrs['fetched_at'] set by fetch_timetable_df).
+    Timetables without the fetch timestamp get a fresh index every call.
+
+    :param df: Timetable dataframe.
+    :type df: pd.DataFrame
+    :return: Flight index, see build_flight_index.
+    :rtype: dict
+    """
+    fetched_at = df.attrs.get('fetched_at')
+    if fetched_at is None:
+        return build_flight_index(df)
+
+    with _flight_index_lock:
+        index = _flight_index_cache.get(fetched_at)
+    if index is not None:
+        return index
+
+    index = build_flight_index(df)
+    with _flight_index_lock:
+        _flight_index_cache[fetched_at] = index
+        while len(_flight_index_cache) > FLIGHT_INDEX_CACHE_SIZE:
+            # dicts keep the insertion order - drop the oldest fetch
+            del _flight_index_cache[next(iter(_flight_index_cache))]
+    return index
+
+
+def filter_flight(df: pd.DataFrame, flight_number: str) -> pd.DataFrame:
+    """
+    Filters the flight data from the timetable dataframe by flight number. (finds the correct row)
+    Codeshare flight numbers ('codeshared.flight.iataNumber') find the flight too.
+
+    :param df: Timetable dataframe.
+    :type df: pd.DataFrame
+    :param flight_number: Flight number to find data for.
+    :type flight_number: str
+    :return: Row with the data of the flight.
+    :rtype: DataFrame
+    """
+    if df.empty:
+        return pd.DataFrame()
+
+    positions = get_flight_index(df).get(flight_number)
+    if positions is None:
+        return df.iloc[0:0]
+
+    flight_df = df.iloc[positions].copy()
+    flight_df['flight.iataNumber'] = normalize_flight_numbers(flight_df['flight.iataNumber'])
+    return flight_df
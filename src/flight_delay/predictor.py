@@ -0,0 +1,414 @@
+"""
+Serving formats of the trained delay model.
+
+The model is trained and saved as a pickled sklearn XGBRegressor (joblib). Unpickling it
+imports sklearn and xgboost and takes a while in every new process, so it can be exported to
+XGBoost's native booster formats:
+    models/flight_delay_xgb.ubj   - binary UBJSON booster, loaded with xgboost.Booster
+    models/flight_delay_xgb.json  - JSON booster, evaluated by NumpyTreePredictor (numpy only)
+
+Export:  python -m flight_delay.predictor [path/to/model.joblib]
+
+The backend is chosen with the FLIGHT_DELAY_MODEL_BACKEND environment variable:
+'numpy', 'booster', 'joblib' or 'auto' (default - the first exported format that exists, then joblib).
+All the predictors have 'feature_names_in_' and 'predict' like the XGBRegressor.
+
+load_predictor(watch=True) returns a ReloadingPredictor - a model updated on disk (see training.incremental)
+is swapped in without a restart. Directories with a versioned registry are served by registry.RegistryPredictor.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+
+MODELS_DIR = BASE_DIR / 'models'
+MODEL_NAME = 'flight_delay_xgb'
+
+BACKENDS = ('auto', 'numpy', 'booster', 'joblib')
+
+# Seconds between two checks of the model files for a new version
+RELOAD_INTERVAL = float(os.environ.get('FLIGHT_DELAY_MODEL_RELOAD_INTERVAL', 60))
+
+# Objectives whose prediction is the raw margin (no link function)
+IDENTITY_OBJECTIVES = ('reg:squarederror', 'reg:absoluteerror', 'reg:pseudohubererror', 'reg:quantileerror')
+
+
+def _to_matrix(x, feature_names: np.ndarray) -> np.ndarray:
+    """
+    Converts the model input to a float32 matrix in the model's feature order.
+    Dataframes are reordered by column names, arrays must already be in the right order.
+    (pandas is not imported here, the numpy backend should start without it)
+    """
+    if hasattr(x, 'columns'):
+        x = x[list(feature_names)]
+    x = np.asarray(x, dtype=np.float32)
+    if x.ndim == 1:
+        x = x.reshape(1, -1)
+    return x
+
+
+class NumpyTreePredictor:
+    """
+    Evaluates the trees of a JSON booster with numpy. No xgboost or sklearn needed.
+    All the trees are padded to one array, so a batch walks all of them at once, one level per step.
+    """
+
+    def __init__(self, model: dict):
+        """
+        :param model: Parsed JSON booster (xgboost Booster.save_model with a .json path).
+        :type model: dict
+        """
+        learner = model['learner']
+
+        objective = learner['objective']['name']
+        if objective not in IDENTITY_OBJECTIVES:
+            raise ValueError(f'Objective "{objective}" is not supported by the numpy predictor.')
+
+        booster = learner['gradient_booster']
+        if booster['name'] != 'gbtree':
+            raise ValueError(f'Booster "{booster["name"]}" is not supported by the numpy predictor.')
+
+        params = learner['learner_model_param']
+        if int(params.get('num_target', 1)) != 1 or int(params.get('num_class', 0)) > 1:
+            raise ValueError('Only single target regression models are supported by the numpy predictor.')
+
+        # base_score is stored as '[2.05E0]' in newer versions and as '2.05E0' in older ones
+        self.base_score = np.float32(params['base_score'].strip('[]'))
+        self.feature_names_in_ = np.array(learner['feature_names'], dtype=object)
+
+        trees = booster['model']['trees']
+        # Same trees as XGBRegressor.predict - only up to the best iteration if early stopping was used
+        best_iteration = learner.get('attributes', {}).get('best_iteration')
+        indptr = booster['model'].get('iteration_indptr')
+        if best_iteration is not None and indptr:
+            trees = trees[:indptr[int(best_iteration) + 1]]
+
+        n_nodes = max(len(tree['left_children']) for tree in trees)
+        shape = (len(trees), n_nodes)
+        self.left = np.full(shape, -1, dtype=np.int32)
+        self.right = np.full(shape, -1, dtype=np.int32)
+        self.feature = np.zeros(shape, dtype=np.int32)
+        # split threshold for inner nodes, leaf value for leaves
+        self.value = np.zeros(shape, dtype=np.float32)
+        self.default_left = np.zeros(shape, dtype=bool)
+
+        for i, tree in enumerate(trees):
+            n = len(tree['left_children'])
+            self.left[i, :n] = tree['left_children']
+            self.right[i, :n] = tree['right_children']
+            self.feature[i, :n] = tree['split_indices']
+            self.value[i, :n] = tree['split_conditions']
+            self.default_left[i, :n] = tree['default_left']
+
+        self.depth = self._max_depth()
+        self._trees = np.arange(len(trees))
+
+    def _max_depth(self) -> int:
+        """
+        Depth of the deepest tree - number of steps needed to reach every leaf.
+        """
+        depth = 0
+        level = np.zeros(self.left.shape, dtype=bool)
+        level[:, 0] = True
+        while True:
+            trees, nodes = np.nonzero(level & (self.left != -1))
+            if len(trees) == 0:
+                return depth
+            depth += 1
+            level[:] = False
+            level[trees, self.left[trees, nodes]] = True
+            level[trees, self.right[trees, nodes]] = True
+
+    @classmethod
+    def load(cls, path: Path) -> 'NumpyTreePredictor':
+        """
+        :param path: Path of the JSON booster.
+        :type path: Path
+        :return: Predictor.
+        :rtype: NumpyTreePredictor
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def predict(self, x) -> np.ndarray:
+        """
+        :param x: Features - dataframe (any column order) or array in feature_names_in_ order.
+        :return: Predicted delays.
+        :rtype: np.ndarray
+        """
+        x = _to_matrix(x, self.feature_names_in_)
+        rows = np.arange(len(x))[:, None]
+        trees = self._trees[None, :]
+        nodes = np.zeros((len(x), len(self._trees)), dtype=np.int32)
+
+        for _ in range(self.depth):
+            values = x[rows, self.feature[trees, nodes]]
+            go_left = np.where(
+                np.isnan(values), self.default_left[trees, nodes], values < self.value[trees, nodes]
+            )
+            children = np.where(go_left, self.left[trees, nodes], self.right[trees, nodes])
+            nodes = np.where(children == -1, nodes, children)
+
+        return self.base_score + self.value[trees, nodes].sum(axis=1, dtype=np.float32)
+
+
+class BoosterPredictor:
+    """
+    Native xgboost Booster (UBJSON or JSON file) without the sklearn wrapper.
+    """
+
+    def __init__(self, booster):
+        """
+        :param booster: Loaded booster with feature names.
+        :type booster: xgboost.Booster
+        """
+        self.booster = booster
+        self.feature_names_in_ = np.array(booster.feature_names, dtype=object)
+        best_iteration = booster.attr('best_iteration')
+        self._iteration_range = (0, int(best_iteration) + 1) if best_iteration is not None else (0, 0)
+
+    @classmethod
+    def load(cls, path: Path) -> 'BoosterPredictor':
+        """
+        :param path: Path of the saved booster.
+        :type path: Path
+        :return: Predictor.
+        :rtype: BoosterPredictor
+        """
+        import xgboost  # only needed by this backend
+
+        return cls(xgboost.Booster(model_file=str(path)))
+
+    def predict(self, x) -> np.ndarray:
+        """
+        :param x: Features - dataframe (any column order) or array in feature_names_in_ order.
+        :return: Predicted delays.
+        :rtype: np.ndarray
+        """
+        x = _to_matrix(x, self.feature_names_in_)
+        return self.booster.inplace_predict(x, iteration_range=self._iteration_range, validate_features=False)
+
+
+class ReloadingPredictor:
+    """
+    Predictor that reloads itself when its model files change on disk.
+    The files are checked at most once per check_interval, a changed model is loaded in a background thread
+    while the old one keeps serving, then it is swapped in atomically.
+    If the new files can not be loaded, the old model keeps serving.
+    """
+
+    def __init__(self, load: Callable, paths: list[Path], check_interval: float = RELOAD_INTERVAL,
+                 background: bool = True):
+        """
+        :param load: Loads the current model from the files.
+        :type load: Callable
+        :param paths: Model files to watch.
+        :type paths: list[Path]
+        :param check_interval: Seconds between two checks of the files.
+        :type check_interval: float
+        :param background: Load a changed model in a background thread (False loads it in the checking call).
+        :type background: bool
+        """
+        self._load = load
+        self.paths = [Path(path) for path in paths]
+        self.check_interval = check_interval
+        self.background = background
+
+        self._reload_lock = threading.Lock()
+        self._signature = self._files_signature()
+        self._predictor = load()
+        self._checked_at = time.monotonic()
+        self.reloads = 0
+
+    def _files_signature(self) -> tuple:
+        """
+        Modification times and sizes of the watched files.
+        """
+        signature = []
+        for path in self.paths:
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            signature.append((str(path), stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def reload_if_changed(self) -> bool:
+        """
+        Loads the model again if the files changed since the last load.
+
+        :return: True if a new model was swapped in.
+        :rtype: bool
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            # another thread is reloading, keep serving the current model meanwhile
+            return False
+        try:
+            self._checked_at = time.monotonic()
+            signature = self._files_signature()
+            if signature == self._signature:
+                return False
+            try:
+                predictor = self._load()
+            except Exception as e:
+                print(f'Reloading the model failed, serving the old one: {e}')
+                return False
+            self._predictor, self._signature = predictor, signature
+            self.reloads += 1
+            return True
+        finally:
+            self._reload_lock.release()
+
+    def _check(self):
+        if time.monotonic() - self._checked_at < self.check_interval or self._reload_lock.locked():
+            return
+        self._checked_at = time.monotonic()
+        if self.background:
+            # the load takes a while, the callers (also the server's event loop) keep the old model meanwhile
+            threading.Thread(target=self.reload_if_changed, name='model-reload', daemon=True).start()
+        else:
+            self.reload_if_changed()
+
+    @property
+    def current(self):
+        """
+        The current model. If check_interval passed, a check of the files is started first.
+        """
+        self._check()
+        return self._predictor
+
+    @property
+    def feature_names_in_(self) -> np.ndarray:
+        return self.current.feature_names_in_
+
+    def predict(self, x) -> np.ndarray:
+        """
+        :param x: Features, see the wrapped predictor.
+        :return: Predicted delays of the current model.
+        :rtype: np.ndarray
+        """
+        return self.current.predict(x)
+
+
+def export_model(model, models_dir: Path = MODELS_DIR, name: str = MODEL_NAME) -> tuple[Path, Path]:
+    """
+    Saves the model in both native booster formats (UBJSON and JSON).
+
+    :param model: Trained XGBRegressor (or its path to joblib.load).
+    :param models_dir: Output directory.
+    :type models_dir: Path
+    :param name: Base name of the files.
+    :type name: str
+    :return: Paths of the UBJSON and JSON booster.
+    :rtype: tuple[Path, Path]
+    """
+    if isinstance(model, (str, Path)):
+        import joblib
+
+        model = joblib.load(model)
+
+    booster = model.get_booster()
+    if booster.feature_names is None and hasattr(model, 'feature_names_in_'):
+        booster.feature_names = list(model.feature_names_in_)
+    if booster.feature_names is None:
+        raise ValueError('The model has no feature names, the serving formats need them.')
+
+    models_dir = Path(models_dir)
+    models_dir.mkdir(parents=True, exist_ok=True)
+    ubj_path = models_dir / f'{name}.ubj'
+    json_path = models_dir / f'{name}.json'
+    # the format is chosen by the extension, the temporary file keeps it
+    for path in (ubj_path, json_path):
+        tmp_path = path.with_name(f'.tmp-{path.name}')
+        booster.save_model(str(tmp_path))
+        os.replace(tmp_path, path)
+    return ubj_path, json_path
+
+
+def model_dir_for(models_dir: Path, airport_code: str = None) -> Path:
+    """
+    Directory of the airport's own model (models/<IATA>/), the shared models directory if it has none.
+
+    :param models_dir: Directory with the shared model files.
+    :type models_dir: Path
+    :param airport_code: IATA code of the departure airport.
+    :type airport_code: str
+    :return: Directory to load the model from.
+    :rtype: Path
+    """
+    models_dir = Path(models_dir)
+    if airport_code:
+        airport_dir = models_dir / airport_code.upper()
+        if airport_dir.is_dir() and any(airport_dir.iterdir()):
+            return airport_dir
+    return models_dir
+
+
+def load_predictor(backend: str = None, models_dir: Path = MODELS_DIR, name: str = MODEL_NAME,
+                   airport_code: str = None, watch: bool = False):
+    """
+    Loads the delay model with the chosen backend.
+    Airports with a model trained on their own data (models/<IATA>/) get it, others share the default model.
+    With watch the model is reloaded when its files change (see ReloadingPredictor).
+    A directory with a model registry serves its CURRENT version (see registry).
+
+    :param backend: 'auto', 'numpy', 'booster' or 'joblib', defaults to FLIGHT_DELAY_MODEL_BACKEND (or 'auto').
+    :type backend: str
+    :param models_dir: Directory with the model files.
+    :type models_dir: Path
+    :param name: Base name of the model files.
+    :type name: str
+    :param airport_code: IATA code of the departure airport, None for the default model.
+    :type airport_code: str
+    :param watch: Reload the model when its files change.
+    :type watch: bool
+    :return: Predictor with 'feature_names_in_' and 'predict'.
+    """
+    backend = backend or os.environ.get('FLIGHT_DELAY_MODEL_BACKEND', 'auto')
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown model backend "{backend}", use one of {BACKENDS}.')
+
+    models_dir = model_dir_for(models_dir, airport_code)
+    if (models_dir / 'CURRENT').is_file():
+        from flight_delay import registry  # the registry loads its versions with this function
+
+        if watch:
+            return registry.RegistryPredictor(models_dir, backend)
+        return registry.load_version(models_dir, registry.current_version(models_dir), backend)
+    if watch:
+        return ReloadingPredictor(
+            lambda: load_predictor(backend, models_dir, name),
+            [models_dir / f'{name}.{extension}' for extension in ('json', 'ubj', 'joblib')],
+        )
+    json_path = models_dir / f'{name}.json'
+    ubj_path = models_dir / f'{name}.ubj'
+
+    if backend == 'auto':
+        if json_path.exists():
+            backend = 'numpy'
+        elif ubj_path.exists():
+            backend = 'booster'
+        else:
+            backend = 'joblib'
+
+    if backend == 'numpy':
+        return NumpyTreePredictor.load(json_path)
+    if backend == 'booster':
+        return BoosterPredictor.load(ubj_path if ubj_path.exists() else json_path)
+
+    import joblib  # pulls in sklearn and xgboost
+
+    return joblib.load(models_dir / f'{name}.joblib')
+
+
+if __name__ == '__main__':
+    source = Path(sys.argv[1]) if len(sys.argv) > 1 else MODELS_DIR / f'{MODEL_NAME}.joblib'
+    for path in export_model(source, source.parent):
+        print(f'Saved {path}')
@@ -0,0 +1,250 @@
+"""
+Stale-while-revalidate refresh of the departure timetable.
+A background thread re-fetches the timetable before the cached one expires and swaps it in atomically.
+Readers always get the last good timetable immediately, upstream failures keep serving the stale one.
+With a paginated fetch (partial=True) the first load serves the rows of the first pages before the last one arrives.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable
+import pandas as pd
+
+# Refresh before the 30 minute TTL of the timetable runs out
+REFRESH_INTERVAL = 25 * 60
+
+# After a failed refresh try again sooner
+RETRY_INTERVAL = 60
+
+
+class TimetableRefresher:
+    """
+    Holds the last good timetable of one airport and keeps it fresh in a daemon thread.
+    The timetable is shared by all the sessions, treat it as read-only.
+    """
+
+    def __init__(self, fetch: Callable[[], pd.DataFrame], interval: float = REFRESH_INTERVAL,
+                 retry_interval: float = RETRY_INTERVAL, on_refresh: Callable[[pd.DataFrame], None] = None,
+                 partial: bool = False):
+        """
+        :param fetch: Fetches a new timetable. May raise or return an empty dataframe on failure.
+        :type fetch: Callable[[], pd.DataFrame]
+        :param interval: Seconds between two refreshes.
+        :type interval: float
+        :param retry_interval: Seconds to wait after a failed refresh.
+        :type retry_interval: float
+        :param on_refresh: Called with every new timetable after it was swapped in (e.g. to precompute forecasts).
+                           Should return quickly, its errors are printed.
+        :type on_refresh: Callable[[pd.DataFrame], None]
+        :param partial: fetch takes on_page (see prediction.fetch_timetable_df). Until the first timetable is
+                        complete, the rows fetched so far are served and start() returns with the first page.
+        :type partial: bool
+        """
+        self._fetch = fetch
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self._on_refresh = on_refresh
+        self.partial = partial
+
+        # (timetable, fetched_at) - replaced as a whole, readers never see a half updated state
+        self._snapshot = (pd.DataFrame(), None)
+
+        self._refresh_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        # set when the first rows are served (or the first load failed), start() waits for it
+        self._ready = threading.Event()
+        self._complete = False
+        self._thread = None
+
+    def refresh(self) -> bool:
+        """
+        Fetches a new timetable now and swaps it in. On failure the old one is kept.
+        Concurrent calls do not fetch twice, the later caller just waits for the running refresh.
+
+        :return: True if a new timetable was stored.
+        :rtype: bool
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            # someone else is refreshing, wait for the result instead of fetching again
+            with self._refresh_lock:
+                return self._snapshot[1] is not None
+
+        try:
+            try:
+                df = self._fetch(on_page=self._serve_partial) if self.partial else self._fetch()
+            except Exception as e:
+                print(f'Timetable refresh failed, serving the stale timetable: {e}')
+                return False
+
+            if df is None or df.empty:
+                print('Timetable refresh returned no data, serving the stale timetable.')
+                return False
+
+            fetched_at = df.attrs.get('fetched_at', pd.Timestamp.now(tz='UTC'))
+            self._snapshot = (df, fetched_at)
+            self._complete = True
+        finally:
+            self._refresh_lock.release()
+            self._ready.set()
+
+        if self._on_refresh is not None:
+            try:
+                self._on_refresh(df)
+            except Exception as e:
+                print(f'Timetable refresh callback failed: {e}')
+        return True
+
+    def _serve_partial(self, df: pd.DataFrame):
+        """
+        Serves the rows of the first pages while the first timetable is loading.
+        Later refreshes keep serving the last complete timetable until the new one is complete.
+        """
+        if self._complete or df is None or df.empty:
+            return
+        self._snapshot = (df, df.attrs.get('fetched_at', pd.Timestamp.now(tz='UTC')))
+        self._ready.set()
+
+    def start(self):
+        """
+        Starts the background thread, which loads the first timetable, and waits for it (there is nothing to
+        serve yet) - with partial=True only for its first page. Calling it again (also concurrently) only waits.
+        """
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None and not self._stop.is_set():
+                    self._thread = threading.Thread(target=self._run, name='timetable-refresher', daemon=True)
+                    self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        """
+        Background loop - loads the first timetable, then waits, refreshes, repeats until stopped.
+        """
+        wait = self.interval if self.refresh() else self.retry_interval
+        while not self._stop.is_set():
+            self._wake.wait(wait)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            wait = self.interval if self.refresh() else self.retry_interval
+
+    def request_refresh(self):
+        """
+        Asks the background thread to refresh now. Does not block.
+        """
+        self._wake.set()
+
+    def stop(self):
+        """
+        Stops the background thread.
+        """
+        self._stop.set()
+        self._wake.set()
+        self._ready.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def get(self) -> tuple[pd.DataFrame, pd.Timestamp | None]:
+        """
+        Returns the last good timetable immediately.
+
+        :return: (timetable, time it was fetched) - empty dataframe and None before the first success.
+        :rtype: tuple[pd.DataFrame, pd.Timestamp | None]
+        """
+        return self._snapshot
+
+    def age(self) -> pd.Timedelta | None:
+        """
+        :return: Age of the served timetable, None if there is none yet.
+        :rtype: pd.Timedelta | None
+        """
+        fetched_at = self._snapshot[1]
+        if fetched_at is None:
+            return None
+        return pd.Timestamp.now(tz='UTC') - fetched_at
+
+
+class RefresherPool:
+    """
+    One started TimetableRefresher per airport, at most max_airports of them.
+    The least recently used airport is stopped and dropped when another one is needed,
+    so a process serving many airports does not keep every timetable (and thread) forever.
+    """
+
+    def __init__(self, fetch: Callable[[str], pd.DataFrame], max_airports: int,
+                 on_refresh: Callable[[str, pd.DataFrame], None] = None, **refresher_kwargs):
+        """
+        :param fetch: Fetches the departure timetable of an airport code.
+        :type fetch: Callable[[str], pd.DataFrame]
+        :param max_airports: Maximal number of airports with a running refresher.
+        :type max_airports: int
+        :param on_refresh: Called with the airport code and its new timetable, see TimetableRefresher.
+        :type on_refresh: Callable[[str, pd.DataFrame], None]
+        :param refresher_kwargs: Passed to TimetableRefresher (interval, retry_interval, partial).
+        """
+        self._fetch = fetch
+        self._on_refresh = on_refresh
+        self.max_airports = max_airports
+        self._refresher_kwargs = refresher_kwargs
+        self._refreshers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_refresher(self, airport_code: str) -> TimetableRefresher:
+        """
+        Returns the started refresher of the airport, the first call for an airport loads its timetable.
+
+        :param airport_code: IATA airport code
+        :type airport_code: str
+        :return: Started refresher.
+        :rtype: TimetableRefresher
+        """
+        evicted = []
+        with self._lock:
+            refresher = self._refreshers.get(airport_code)
+            if refresher is None:
+                on_refresh = None
+                if self._on_refresh is not None:
+                    on_refresh = lambda df, airport_code=airport_code: self._on_refresh(airport_code, df)
+                refresher = TimetableRefresher(
+                    lambda **kwargs: self._fetch(airport_code, **kwargs), on_refresh=on_refresh,
+                    **self._refresher_kwargs
+                )
+                self._refreshers[airport_code] = refresher
+            self._refreshers.move_to_end(airport_code)
+            while len(self._refreshers) > self.max_airports:
+                evicted.append(self._refreshers.popitem(last=False)[1])
+
+        for old in evicted:
+            old.stop()
+        # start() only loads the timetable once, concurrent callers wait for the same refresh
+        refresher.start()
+        return refresher
+
+    def get(self, airport_code: str) -> tuple[pd.DataFrame, pd.Timestamp | None]:
+        """
+        :param airport_code: IATA airport code
+        :type airport_code: str
+        :return: (timetable, time it was fetched) of the airport, see TimetableRefresher.get.
+        :rtype: tuple[pd.DataFrame, pd.Timestamp | None]
+        """
+        return self.get_refresher(airport_code).get()
+
+    def airports(self) -> list[str]:
+        """
+        :return: Airports with a running refresher, from the least to the most recently used.
+        :rtype: list[str]
+        """
+        with self._lock:
+            return list(self._refreshers)
+
+    def stop(self):
+        """
+        Stops all the refreshers.
+        """
+        with self._lock:
+            refreshers = list(self._refreshers.values())
+            self._refreshers.clear()
+        for refresher in refreshers:
+            refresher.stop()
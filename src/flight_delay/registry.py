@@ -0,0 +1,433 @@
+"""
+Versioned model registry - a new model and its preprocessing artifacts are rolled out without a restart.
+
+Layout of a models directory with a registry:
+    models/
+        versions/20250501-120000/   flight_delay_xgb.{joblib,json,ubj}, fill_values.json, categories.json, metadata.json
+        versions/20250508-120000/
+        CURRENT                     name of the served version
+        SHADOW                      optional, name of a version scored next to CURRENT for comparison
+
+    python -m flight_delay.registry publish [--model-dir models] [--processed data/processed] [--shadow]
+    python -m flight_delay.registry activate 20250508-120000
+    python -m flight_delay.registry shadow 20250508-120000 | --off
+    python -m flight_delay.registry list
+
+A version directory is complete before it gets its name and the pointers are replaced atomically.
+RegistryPredictor polls the pointers, loads a new version in a background thread and swaps it in.
+Every prediction takes one version (model and schema together) for its whole call, so in-flight
+predictions finish on the version they started with. predictor.load_predictor uses the registry
+when the models directory has one.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping
+import numpy as np
+import pandas as pd
+from flight_delay.data_preprocessing import BASE_DIR, FeatureSchema
+from flight_delay.predictor import MODEL_NAME, MODELS_DIR, RELOAD_INTERVAL, load_predictor
+
+VERSIONS_DIR = 'versions'
+CURRENT_POINTER = 'CURRENT'
+SHADOW_POINTER = 'SHADOW'
+
+# Files of a version besides metadata.json
+MODEL_FILES = tuple(f'{MODEL_NAME}.{extension}' for extension in ('joblib', 'json', 'ubj'))
+SCHEMA_FILES = ('fill_values.json', 'categories.json')
+
+
+@dataclass(frozen=True)
+class ModelVersion:
+    """
+    Loaded version - the model together with the schema its features are encoded with.
+    Predicts like the model, so it can be used wherever a predictor is expected.
+    """
+    version: str
+    model: object
+    schema: FeatureSchema
+    metadata: Mapping = field(default_factory=dict)
+
+    @property
+    def feature_names_in_(self) -> np.ndarray:
+        return self.model.feature_names_in_
+
+    def predict(self, x) -> np.ndarray:
+        return self.model.predict(x)
+
+
+def has_registry(models_dir: Path) -> bool:
+    """
+    :param models_dir: Models directory.
+    :type models_dir: Path
+    :return: True if a version of the directory was activated.
+    :rtype: bool
+    """
+    return (Path(models_dir) / CURRENT_POINTER).is_file()
+
+
+def _read_pointer(models_dir: Path, name: str) -> str | None:
+    try:
+        return (Path(models_dir) / name).read_text(encoding='utf-8').strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _write_pointer(models_dir: Path, name: str, version: str | None):
+    """
+    Replaces the pointer atomically, readers see the old or the new version, never an empty file.
+    """
+    path = Path(models_dir) / name
+    if version is None:
+        path.unlink(missing_ok=True)
+        return
+    if not (Path(models_dir) / VERSIONS_DIR / version).is_dir():
+        raise ValueError(f'Unknown model version "{version}".')
+    tmp_path = path.with_name(f'.{name}.tmp')
+    tmp_path.write_text(version, encoding='utf-8')
+    os.replace(tmp_path, path)
+
+
+def current_version(models_dir: Path) -> str | None:
+    """
+    :return: Name of the served version, None without a registry.
+    :rtype: str | None
+    """
+    return _read_pointer(models_dir, CURRENT_POINTER)
+
+
+def shadow_version(models_dir: Path) -> str | None:
+    """
+    :return: Name of the shadow version, None if there is none.
+    :rtype: str | None
+    """
+    return _read_pointer(models_dir, SHADOW_POINTER)
+
+
+def list_versions(models_dir: Path) -> list[str]:
+    """
+    :return: Names of the published versions, oldest first.
+    :rtype: list[str]
+    """
+    versions_dir = Path(models_dir) / VERSIONS_DIR
+    if not versions_dir.is_dir():
+        return []
+    return sorted(path.name for path in versions_dir.iterdir() if path.is_dir() and not path.name.startswith('.'))
+
+
+def activate(models_dir: Path, version: str):
+    """
+    Makes the version the served one (also a rollback to an older version).
+
+    :param models_dir: Models directory.
+    :type models_dir: Path
+    :param version: Published version.
+    :type version: str
+    :raises ValueError: The version does not exist.
+    """
+    _write_pointer(models_dir, CURRENT_POINTER, version)
+
+
+def set_shadow(models_dir: Path, version: str | None):
+    """
+    Scores the version next to the served one, None turns the shadow mode off.
+
+    :param models_dir: Models directory.
+    :type models_dir: Path
+    :param version: Published version or None.
+    :type version: str | None
+    :raises ValueError: The version does not exist.
+    """
+    _write_pointer(models_dir, SHADOW_POINTER, version)
+
+
+def publish(models_dir: Path, model_dir: Path, processed_dir: Path, version: str = None,
+            metadata: dict = None, make_current: bool = True) -> str:
+    """
+    Copies a trained model and its schema into a new version of the registry.
+
+    :param models_dir: Models directory with the registry.
+    :type models_dir: Path
+    :param model_dir: Directory with the model files (joblib and / or the exported formats).
+    :type model_dir: Path
+    :param processed_dir: Directory with fill_values.json and categories.json of the model.
+    :type processed_dir: Path
+    :param version: Name of the version, the current UTC time by default.
+    :type version: str
+    :param metadata: Extra metadata (e.g. validation MAE) stored in metadata.json.
+    :type metadata: dict
+    :param make_current: Activate the version right away.
+    :type make_current: bool
+    :return: Name of the version.
+    :rtype: str
+    :raises ValueError: The version exists or there are no model files.
+    """
+    models_dir, model_dir, processed_dir = Path(models_dir), Path(model_dir), Path(processed_dir)
+    version = version or pd.Timestamp.now(tz='UTC').strftime('%Y%m%d-%H%M%S')
+    version_dir = models_dir / VERSIONS_DIR / version
+    if version_dir.exists():
+        raise ValueError(f'Model version "{version}" already exists.')
+
+    model_files = [model_dir / name for name in MODEL_FILES if (model_dir / name).is_file()]
+    if not model_files:
+        raise ValueError(f'No model files in {model_dir}.')
+
+    # the version gets its name only when it is complete
+    tmp_dir = version_dir.with_name(f'.tmp-{version}')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    for path in [*model_files, *(processed_dir / name for name in SCHEMA_FILES)]:
+        shutil.copy2(path, tmp_dir / path.name)
+    with open(tmp_dir / 'metadata.json', 'w', encoding='utf-8') as f:
+        json.dump({'version': version, 'created_at': pd.Timestamp.now(tz='UTC').isoformat(), **(metadata or {})}, f,
+                  indent=4)
+    os.rename(tmp_dir, version_dir)
+
+    if make_current:
+        activate(models_dir, version)
+    return version
+
+
+def read_metadata(models_dir: Path, version: str) -> dict:
+    """
+    :param models_dir: Models directory with the registry.
+    :type models_dir: Path
+    :param version: Published version.
+    :type version: str
+    :return: metadata.json of the version, empty if it has none.
+    :rtype: dict
+    """
+    metadata_path = Path(models_dir) / VERSIONS_DIR / version / 'metadata.json'
+    return json.loads(metadata_path.read_text(encoding='utf-8')) if metadata_path.is_file() else {}
+
+
+def load_version(models_dir: Path, version: str, backend: str = None) -> ModelVersion:
+    """
+    :param models_dir: Models directory with the registry.
+    :type models_dir: Path
+    :param version: Published version.
+    :type version: str
+    :param backend: Model backend, see predictor.load_predictor.
+    :type backend: str
+    :return: Loaded version.
+    :rtype: ModelVersion
+    """
+    version_dir = Path(models_dir) / VERSIONS_DIR / version
+    return ModelVersion(
+        version=version,
+        model=load_predictor(backend, version_dir),
+        schema=FeatureSchema.from_dir(version_dir),
+        metadata=MappingProxyType(read_metadata(models_dir, version)),
+    )
+
+
+class ShadowStats:
+    """
+    Running comparison of the shadow predictions with the served ones.
+    """
+
+    def __init__(self, version: str = None):
+        self.version = version
+        self._lock = threading.Lock()
+        self.count = 0
+        self.errors = 0
+        self._abs_diff_sum = 0.0
+        self._diff_sum = 0.0
+        self._max_abs_diff = 0.0
+
+    def add(self, served, shadow):
+        """
+        :param served: Delays predicted by the served version.
+        :param shadow: Delays predicted by the shadow version for the same flights.
+        """
+        diff = np.asarray(shadow, dtype=float) - np.asarray(served, dtype=float)
+        diff = diff[~np.isnan(diff)]
+        if not diff.size:
+            return
+        with self._lock:
+            self.count += diff.size
+            self._abs_diff_sum += float(np.abs(diff).sum())
+            self._diff_sum += float(diff.sum())
+            self._max_abs_diff = max(self._max_abs_diff, float(np.abs(diff).max()))
+
+    def add_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def summary(self) -> dict:
+        """
+        :return: Number of compared flights, failed shadow calls and the mean / maximal difference in minutes.
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                'version': self.version,
+                'compared': self.count,
+                'errors': self.errors,
+                'mean_abs_diff': self._abs_diff_sum / self.count if self.count else None,
+                'mean_diff': self._diff_sum / self.count if self.count else None,
+                'max_abs_diff': self._max_abs_diff if self.count else None,
+            }
+
+
+class RegistryPredictor:
+    """
+    Serves the CURRENT version of a registry and follows its pointers.
+    The pointers are checked at most once per check_interval, a changed version is loaded in a background
+    thread while the old one keeps serving, then both references are swapped at once.
+    If the new version can not be loaded, the old one keeps serving.
+    """
+
+    def __init__(self, models_dir: Path, backend: str = None, check_interval: float = RELOAD_INTERVAL,
+                 background: bool = True):
+        """
+        :param models_dir: Models directory with the registry.
+        :type models_dir: Path
+        :param backend: Model backend, see predictor.load_predictor.
+        :type backend: str
+        :param check_interval: Seconds between two checks of the pointers.
+        :type check_interval: float
+        :param background: Load new versions in a background thread (False loads them in the checking call).
+        :type background: bool
+        """
+        self.models_dir = Path(models_dir)
+        self.backend = backend
+        self.check_interval = check_interval
+        self.background = background
+
+        self._refresh_lock = threading.Lock()
+        self._pointers = (None, None)
+        self._versions = (None, None)
+        self.shadow_stats = ShadowStats()
+        self._checked_at = time.monotonic()
+        if not self.refresh():
+            raise ValueError(f'No model version can be served from {self.models_dir}.')
+
+    def refresh(self) -> bool:
+        """
+        Loads the versions the pointers name now, if they changed.
+
+        :return: True if new versions were swapped in.
+        :rtype: bool
+        """
+        with self._refresh_lock:
+            self._checked_at = time.monotonic()
+            pointers = (current_version(self.models_dir), shadow_version(self.models_dir))
+            if pointers == self._pointers or pointers[0] is None:
+                return False
+
+            loaded = {version.version: version for version in self._versions if version is not None}
+            try:
+                versions = tuple(
+                    None if name is None else loaded.get(name) or load_version(self.models_dir, name, self.backend)
+                    for name in pointers
+                )
+            except Exception as e:
+                print(f'Loading model version {pointers} failed, serving {self._pointers}: {e}')
+                # not retried until the pointers change again
+                self._pointers = pointers
+                return False
+
+            if pointers[1] != self._pointers[1]:
+                self.shadow_stats = ShadowStats(pointers[1])
+            # one assignment - readers get both versions of the same refresh
+            self._versions = versions
+            self._pointers = pointers
+            return True
+
+    def _check(self):
+        if time.monotonic() - self._checked_at < self.check_interval or self._refresh_lock.locked():
+            return
+        self._checked_at = time.monotonic()
+        if self.background:
+            threading.Thread(target=self.refresh, name='model-registry-refresh', daemon=True).start()
+        else:
+            self.refresh()
+
+    @property
+    def current(self) -> ModelVersion:
+        """
+        The served version. Take it once per prediction, it may change between two reads.
+        """
+        self._check()
+        return self._versions[0]
+
+    @property
+    def shadow(self) -> ModelVersion | None:
+        """
+        The shadow version or None.
+        """
+        return self._versions[1]
+
+    @property
+    def feature_names_in_(self) -> np.ndarray:
+        return self.current.feature_names_in_
+
+    def predict(self, x) -> np.ndarray:
+        return self.current.predict(x)
+
+    def status(self) -> dict:
+        """
+        :return: Served and shadow version with the shadow comparison.
+        :rtype: dict
+        """
+        current, shadow = self._versions
+        return {
+            'version': current.version,
+            'shadow': None if shadow is None else shadow.version,
+            'shadow_stats': self.shadow_stats.summary() if shadow is not None else None,
+        }
+
+
+def main(argv: list[str] = None):
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description='Manages the versions of the delay model.')
+    parser.add_argument('--models', type=Path, default=MODELS_DIR, help='Models directory with the registry.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    publish_parser = commands.add_parser('publish', help='Copy a trained model into a new version.')
+    publish_parser.add_argument('--model-dir', type=Path, default=MODELS_DIR, help='Directory with the model files.')
+    publish_parser.add_argument('--processed', type=Path, default=BASE_DIR / 'data' / 'processed',
+                                help='Directory with fill_values.json and categories.json.')
+    publish_parser.add_argument('--version')
+    publish_parser.add_argument('--shadow', action='store_true', help='Score it in shadow mode instead of serving it.')
+
+    activate_parser = commands.add_parser('activate', help='Serve a version.')
+    activate_parser.add_argument('version')
+
+    shadow_parser = commands.add_parser('shadow', help='Score a version next to the served one.')
+    shadow_parser.add_argument('version', nargs='?')
+    shadow_parser.add_argument('--off', action='store_true')
+
+    commands.add_parser('list', help='List the versions.')
+    args = parser.parse_args(argv)
+
+    if args.command == 'publish':
+        version = publish(args.models, args.model_dir, args.processed, args.version, make_current=not args.shadow)
+        if args.shadow:
+            set_shadow(args.models, version)
+        print(f'Published {version}')
+    elif args.command == 'activate':
+        activate(args.models, args.version)
+    elif args.command == 'shadow':
+        if not args.off and args.version is None:
+            parser.error('shadow needs a version or --off')
+        set_shadow(args.models, None if args.off else args.version)
+    else:
+        current, shadow = current_version(args.models), shadow_version(args.models)
+        for version in list_versions(args.models):
+            marker = ' (current)' if version == current else ' (shadow)' if version == shadow else ''
+            print(f'{version}{marker}')
+
+
+if __name__ == '__main__':
+    main()
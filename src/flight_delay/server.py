@@ -0,0 +1,285 @@
+"""
+Headless HTTP prediction service (ASGI, FastAPI - optional dependency).
+
+    pip install fastapi uvicorn
+    uvicorn flight_delay.server:app
+
+Endpoints:
+    GET  /predict?flight=OK123[&airport=PRG]        - one flight
+    POST /predict/batch  {"flights": [...], "airport": "PRG"}
+    GET  /health                                     - timetable age, batching stats and the model version
+    GET  /metrics                                    - stage latencies, cache and upstream API metrics (Prometheus)
+
+With FLIGHT_DELAY_PROFILING=1, GET /predict?...&profile=true profiles that one request (see utils.profiling)
+and returns the report with the prediction.
+
+Concurrent requests are collected into micro-batches (see batching) and scored with one predict call.
+The departure timetable is kept fresh in the background (see refresher), API keys come from the environment.
+"""
+
+import asyncio
+import os
+import threading
+from typing import Callable
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+from flight_delay import prediction
+from flight_delay import predictor as model_backends
+from flight_delay.airports import DEFAULT_AIRPORT, MAX_AIRPORTS, normalize_airport
+from flight_delay.api import streaming
+from flight_delay.batching import MicroBatcher
+from flight_delay.data_preprocessing import encode_flight_record, get_traffic_index, get_weather_index, prepare_features
+from flight_delay.refresher import RefresherPool
+from flight_delay.utils import metrics, profiling
+from flight_delay.utils.caching import LRUCache
+
+# Batching limits, a request waits at most MAX_WAIT seconds for others to join its batch
+MAX_BATCH_SIZE = int(os.environ.get('FLIGHT_DELAY_MAX_BATCH_SIZE', 64))
+MAX_WAIT = float(os.environ.get('FLIGHT_DELAY_MAX_BATCH_WAIT_MS', 5)) / 1000
+
+
+class BatchRequest(BaseModel):
+    """
+    Body of /predict/batch.
+    """
+    flights: list[str]
+    airport: str = DEFAULT_AIRPORT
+
+
+def live_timetables() -> Callable[[str], tuple[pd.DataFrame, pd.Timestamp | None]]:
+    """
+    Timetable source of the server - one background refresher per airport, started on first use.
+    At most MAX_AIRPORTS airports are kept fresh, the least recently used one is dropped first.
+
+    :return: Function returning (timetable, fetched_at) of an airport.
+    :rtype: Callable[[str], tuple[pd.DataFrame, pd.Timestamp | None]]
+    """
+    pool = RefresherPool(
+        lambda airport_code, **kwargs: prediction.fetch_timetable_df(airport_code, 'departure', **kwargs),
+        MAX_AIRPORTS,
+        # paginated timetables are served from their first page on a cold start
+        partial=streaming.STREAMING,
+    )
+    return pool.get
+
+
+def create_app(get_timetable: Callable = None, predictor=None, weather_index: Callable = get_weather_index,
+               max_batch_size: int = MAX_BATCH_SIZE, max_wait: float = MAX_WAIT,
+               profiling_enabled: bool = profiling.PROFILING) -> FastAPI:
+    """
+    Creates the ASGI app.
+
+    :param get_timetable: Returns (timetable, fetched_at) for an airport code, live timetables by default.
+    :type get_timetable: Callable
+    :param predictor: Loaded model used for every airport. By default the model of the airport is loaded
+                      on its first request (see predictor.load_predictor).
+    :param weather_index: Returns the hourly weather index of an airport code (see data_preprocessing.get_weather_index).
+    :type weather_index: Callable
+    :param max_batch_size: Maximal number of flights scored with one predict call.
+    :type max_batch_size: int
+    :param max_wait: Maximal time in seconds a request waits for its batch.
+    :type max_wait: float
+    :param profiling_enabled: Allow profiling single requests (profile=true).
+    :type profiling_enabled: bool
+    :return: FastAPI application.
+    :rtype: FastAPI
+    """
+    get_timetable = get_timetable or live_timetables()
+    # {model directory: predictor} - airports without their own model share the default one
+    models = LRUCache(max_entries=MAX_AIRPORTS, name='server_models')
+    models_lock = threading.Lock()
+
+    def get_predictor(airport_code: str):
+        # loads the model from disk on the first request of the airport, called from the executor
+        if predictor is not None:
+            return predictor
+        models_dir = model_backends.model_dir_for(model_backends.MODELS_DIR, airport_code)
+        with models_lock:
+            model_predictor = models.get(models_dir)
+            if model_predictor is None:
+                model_predictor = model_backends.load_predictor(models_dir=models_dir, watch=True)
+                models.set(models_dir, model_predictor)
+        return model_predictor
+
+    def predict_groups(entries: list) -> dict:
+        """
+        Scores (position, model, features) entries, every model is called once.
+
+        :return: {position: delay}
+        """
+        groups = {}
+        for position, model_predictor, x_input in entries:
+            groups.setdefault(id(model_predictor), (model_predictor, []))[1].append((position, x_input))
+
+        delays = {}
+        for model_predictor, group in groups.values():
+            positions, features = zip(*group)
+            # encoded vectors, or feature dataframes for models without feature names
+            if isinstance(features[0], pd.DataFrame):
+                x_input = pd.concat(features)
+            else:
+                x_input = np.vstack(features)
+            with metrics.span('predict'):
+                predictions = model_predictor.predict(x_input)
+            for position, delay in zip(positions, predictions):
+                delays[position] = round(float(delay))
+        return delays
+
+    def predict_batch(items: list) -> list:
+        # one batch can mix airports with different models (and model versions)
+        served = predict_groups([(i, model_predictor, x_input) for i, (model_predictor, x_input, _) in enumerate(items)])
+
+        # shadow versions of a registry score the same flights, only their differences are recorded
+        shadow_items = [(i, shadow_item) for i, (_, _, shadow_item) in enumerate(items) if shadow_item is not None]
+        if shadow_items:
+            try:
+                shadow = predict_groups([(i, shadow, x_input) for i, (_, shadow, x_input) in shadow_items])
+            except Exception as e:
+                print(f'Shadow model failed: {e}')
+                shadow = {}
+            for i, (airport_predictor, _, _) in shadow_items:
+                if i in shadow:
+                    airport_predictor.shadow_stats.add([served[i]], [shadow[i]])
+                else:
+                    airport_predictor.shadow_stats.add_error()
+        return [served[i] for i in range(len(items))]
+
+    batcher = MicroBatcher(predict_batch, max_batch_size=max_batch_size, max_wait=max_wait)
+
+    def encode(flight_number: str, timetable_df: pd.DataFrame, airport_code: str):
+        """
+        Finds the flight and builds its features. Raises HTTPException on failure.
+        Can block on the arrivals, weather and model loads - run it in the executor.
+        """
+        flight_df = prediction.filter_flight(timetable_df, flight_number)
+        if flight_df.empty:
+            raise HTTPException(status_code=404, detail=f'Flight {flight_number} not found.')
+
+        def encode_for(model_predictor):
+            if hasattr(model_predictor, 'feature_names_in_'):
+                traffic_index = get_traffic_index(timetable_df, airport_code)
+                airport_weather = weather_index(airport_code)
+                with metrics.span('encode_flight_record'):
+                    return encode_flight_record(
+                        flight_df.iloc[0].to_dict(),
+                        traffic_index=traffic_index,
+                        weather_index=airport_weather,
+                        feature_names=model_predictor.feature_names_in_,
+                        schema=getattr(model_predictor, 'schema', None),
+                        airport_code=airport_code,
+                    )
+            with metrics.span('prepare_features'):
+                x_input = prepare_features(df_departures=timetable_df, flight_row=flight_df, airport_code=airport_code,
+                                           schema=getattr(model_predictor, 'schema', None))
+            return None if x_input.empty else x_input
+
+        airport_predictor = get_predictor(airport_code)
+        # the request is scored by the version it was encoded for, even if a new one is swapped in meanwhile
+        model_predictor = prediction.pinned_model(airport_predictor)
+        try:
+            x_input = encode_for(model_predictor)
+        except KeyError as e:
+            raise HTTPException(status_code=500, detail=f'Feature expected by the model is missing: {e}')
+        if x_input is None:
+            raise HTTPException(status_code=422, detail=f'Flight {flight_number} could not be preprocessed.')
+
+        shadow_item = None
+        shadow = getattr(airport_predictor, 'shadow', None)
+        if shadow is not None:
+            try:
+                shadow_x = encode_for(shadow)
+            except KeyError:
+                shadow_x = None
+            if shadow_x is None:
+                airport_predictor.shadow_stats.add_error()
+            else:
+                shadow_item = (airport_predictor, shadow, shadow_x)
+        return flight_df['arrival.iataCode'].iloc[0], (model_predictor, x_input, shadow_item)
+
+    async def predict_one(flight_number: str, timetable_df: pd.DataFrame, airport_code: str) -> dict:
+        flight_number = flight_number.strip().upper()
+        if not prediction.valid_flight_number(flight_number):
+            raise HTTPException(status_code=422, detail=f'Invalid flight number "{flight_number}".')
+
+        # cold caches fetch the arrivals and weather, keep it off the event loop like the timetable
+        destination, item = await asyncio.get_running_loop().run_in_executor(
+            None, encode, flight_number, timetable_df, airport_code
+        )
+        delay = await batcher.submit(item)
+        return {'flight': flight_number, 'destination': destination, 'predicted_delay': delay}
+
+    async def timetable(airport_code: str) -> pd.DataFrame:
+        # the first call per airport fetches the timetable, keep it off the event loop
+        timetable_df, fetched_at = await asyncio.get_running_loop().run_in_executor(
+            None, get_timetable, airport_code
+        )
+        if fetched_at is None or timetable_df.empty:
+            raise HTTPException(status_code=503, detail='Timetable is not available. Try again later.')
+        return timetable_df
+
+    app = FastAPI(title='Flight Delay Prediction')
+    app.state.batcher = batcher
+
+    def predict_profiled(flight_number: str, airport_code: str) -> dict:
+        """
+        Runs the whole request in this thread under the profiler, without batching.
+        """
+        with profiling.capture() as capture:
+            timetable_df, fetched_at = get_timetable(airport_code)
+            if fetched_at is None or timetable_df.empty:
+                raise HTTPException(status_code=503, detail='Timetable is not available. Try again later.')
+            flight_number = flight_number.strip().upper()
+            if not prediction.valid_flight_number(flight_number):
+                raise HTTPException(status_code=422, detail=f'Invalid flight number "{flight_number}".')
+            destination, (model_predictor, x_input, _) = encode(flight_number, timetable_df, airport_code)
+            delay = predict_groups([(0, model_predictor, x_input)])[0]
+        return {
+            'flight': flight_number, 'destination': destination, 'predicted_delay': delay,
+            'profile': {'profiler': capture.profiler, 'report': capture.report},
+        }
+
+    @app.get('/predict')
+    async def predict(flight: str, airport: str = DEFAULT_AIRPORT, profile: bool = False):
+        airport = normalize_airport(airport)
+        if profile:
+            if not profiling_enabled:
+                raise HTTPException(status_code=403, detail='Profiling is disabled (FLIGHT_DELAY_PROFILING).')
+            return await asyncio.get_running_loop().run_in_executor(None, predict_profiled, flight, airport)
+        return await predict_one(flight, await timetable(airport), airport)
+
+    @app.post('/predict/batch')
+    async def predict_many(request: BatchRequest):
+        airport = normalize_airport(request.airport)
+        timetable_df = await timetable(airport)
+
+        async def safe_predict(flight_number):
+            try:
+                return await predict_one(flight_number, timetable_df, airport)
+            except HTTPException as e:
+                return {'flight': flight_number, 'error': e.detail}
+
+        return {'predictions': await asyncio.gather(*(safe_predict(f) for f in request.flights))}
+
+    @app.get('/health')
+    async def health(airport: str = DEFAULT_AIRPORT):
+        airport = normalize_airport(airport)
+        loop = asyncio.get_running_loop()
+        _, fetched_at = await loop.run_in_executor(None, get_timetable, airport)
+        airport_predictor = await loop.run_in_executor(None, get_predictor, airport)
+        return {
+            'timetable_fetched_at': None if fetched_at is None else fetched_at.isoformat(),
+            'batching': batcher.stats(),
+            'model': airport_predictor.status() if hasattr(airport_predictor, 'status') else None,
+        }
+
+    @app.get('/metrics')
+    async def metrics_endpoint():
+        return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+    return app
+
+
+app = create_app()
@@ -1,148 +1,233 @@
 """
 Logic and data services for the flight delay application.
 API interactions, Caching, Data validation.
+
+Streamlit adapter of the core (prediction, data_preprocessing, predictor, api):
+Streamlit caching and error messages for the user are applied here.
 """
 
-from datetime import time
+import time
 from pathlib import Path
 import pandas as pd
-import joblib
 import streamlit as st
-import requests
-from flight_delay.api import aviationstack_client
+from flight_delay import prediction
+from flight_delay import predictor as model_backends
+from flight_delay.airports import DEFAULT_AIRPORT, MAX_AIRPORTS, airport_location
+from flight_delay.api import streaming
+from flight_delay.forecasts import ForecastScheduler, ForecastTable
+from flight_delay.refresher import RefresherPool, TimetableRefresher
+from flight_delay.utils import metrics
 from flight_delay.utils.dicts import AIRPORT_COORDS
-from flight_delay.data_preprocessing import prepare_features
+from flight_delay.data_preprocessing import get_weather
+# Streamlit-free logic, re-exported for the app
+from flight_delay.prediction import fetch_timetable_df, valid_flight_number, filter_flight
 
 BASE_DIR = Path(__file__).resolve().parents[2]
 
 
-@st.cache_data(ttl=1800)
-def get_timetable_df(airport_code: str, timetable_type: str) -> pd.DataFrame:
+# Same as the TTL of the cached timetables and weather, prefetching more often would only waste API calls
+PREFETCH_INTERVAL = 1800
+
+_last_prefetch = {}
+
+
+def prefetch_airport_data(airport_code: str):
     """
-    Fetches flight timetable from the AviationStack API. Handles API errors.
-    Results are cached for 30 minutes.
-    
+    Cold start: fetches departures, arrivals and weather concurrently (async_client), so the first prediction
+    does not wait for the API calls one after another. The refresher started next serves the prefetched departures.
+    Runs at most once per PREFETCH_INTERVAL per airport.
+
     :param airport_code: IATA airport code
     :type airport_code: str
-    :param timetable_type: Type of the timetable to fetch ('departure'/'arrival').
-    :type timetable_type: str
-    :return: Flight schedule dataframe on success or an empty dataframe on failure.
-    :rtype: DataFrame
     """
+    now = time.monotonic()
+    last = _last_prefetch.get(airport_code)
+    if last is not None and now - last < PREFETCH_INTERVAL:
+        return
+    _last_prefetch[airport_code] = now
+
     try:
-        raw_data = aviationstack_client.fetch_query(
-            "timetable", {"iataCode": airport_code, "type": timetable_type}
-        )
-
-    except requests.exceptions.HTTPError as e:
-        if e.response is not None and e.response.status_code == 429:
-            st.error('Too many requests. Try again in 1 minute.')
-        else:
-            print(f'status code: {e.response.status_code}')
-            st.error('Something went wrong. Try again later.')
-            print(f'HTTP error fetching timetable for "{airport_code}" "{timetable_type}": {e}')
-        return pd.DataFrame()
+        from flight_delay.api import async_client  # pulls in httpx
+
+        async_client.prefetch_airport_data(airport_code, *airport_location(airport_code))
     except Exception as e:
-        st.error('Something went wrong. Try again later.')
-        print(f'Exception raised when fetching timetable for "{airport_code}" "{timetable_type}": {e}')
-        return pd.DataFrame()
+        print(f'Prefetch for "{airport_code}" failed: {e}')
+
+
+@st.cache_resource
+def get_refresher_pool() -> RefresherPool:
+    """
+    Background refreshers of the departure timetables, shared by all the sessions.
+    At most MAX_AIRPORTS airports are kept fresh, the least recently used one is dropped first.
+
+    :return: Refresher pool.
+    :rtype: RefresherPool
+    """
+    return RefresherPool(
+        lambda airport_code, **kwargs: fetch_timetable_df(airport_code, 'departure', **kwargs), MAX_AIRPORTS,
+        # every new timetable gets its forecasts right away
+        on_refresh=lambda airport_code, df: get_forecast_scheduler().notify(airport_code),
+        # paginated timetables are shown from their first page on a cold start
+        partial=streaming.STREAMING,
+    )
+
+
+@st.cache_resource
+def start_metrics_endpoint():
+    """
+    Serves the metrics of the app at http://127.0.0.1:<FLIGHT_DELAY_METRICS_PORT>/metrics, once per process.
+    Disabled if the port is not set.
+
+    :return: Running metrics server, None if disabled or the port is taken.
+    """
+    if not metrics.METRICS_PORT:
+        return None
+    try:
+        return metrics.serve(metrics.METRICS_PORT)
+    except OSError as e:
+        print(f'Metrics endpoint could not be started: {e}')
+        return None
+
+
+@st.cache_resource
+def get_forecast_scheduler() -> ForecastScheduler:
+    """
+    Background scheduler of the precomputed forecasts, shared by all the sessions.
+
+    :return: Started scheduler.
+    :rtype: ForecastScheduler
+    """
+    return ForecastScheduler(lambda airport_code: get_refresher_pool().get(airport_code), load_predictor,
+                             MAX_AIRPORTS).start()
+
+
+def get_forecasts(airport_code: str, timetable_df: pd.DataFrame) -> ForecastTable | None:
+    """
+    Precomputed forecasts of the shown timetable.
+
+    :param airport_code: IATA airport code
+    :type airport_code: str
+    :param timetable_df: The departure timetable.
+    :type timetable_df: pd.DataFrame
+    :return: Forecast table, None if the forecasts of this timetable are not ready yet.
+    :rtype: ForecastTable | None
+    """
+    table = get_forecast_scheduler().get(airport_code)
+    # a table of another fetch would not match the shown rows
+    if table is None or table.timetable_fetched_at != timetable_df.attrs.get('fetched_at'):
+        return None
+    return table
+
 
-    if not raw_data or 'data' not in raw_data:
-        return pd.DataFrame()
+def get_timetable_refresher(airport_code: str) -> TimetableRefresher:
+    """
+    One background refresher of the departure timetable per airport.
+    The first call loads the timetable, then it is refreshed before it expires.
+
+    :param airport_code: IATA airport code
+    :type airport_code: str
+    :return: Started refresher.
+    :rtype: TimetableRefresher
+    """
+    return get_refresher_pool().get_refresher(airport_code)
 
-    return pd.json_normalize(raw_data['data'])
+
+def get_live_timetable(airport_code: str) -> tuple[pd.DataFrame, pd.Timestamp | None]:
+    """
+    Returns the last good departure timetable immediately (stale-while-revalidate).
+    Shows an error only when there has never been a successful fetch.
+
+    :param airport_code: IATA airport code
+    :type airport_code: str
+    :return: (timetable, time it was fetched), empty dataframe and None if there is no timetable.
+    :rtype: tuple[pd.DataFrame, pd.Timestamp | None]
+    """
+    timetable_df, fetched_at = get_timetable_refresher(airport_code).get()
+    if fetched_at is None:
+        st.error('Something went wrong. Try again later.')
+    return timetable_df, fetched_at
 
 
 @st.cache_resource
-def load_predictor():
+def load_model_dir(models_dir: str):
+    """
+    Loads the model files of one directory. Caches resource to only load every model once,
+    airports without their own model share the default one. A model updated on disk is reloaded.
+
+    :param models_dir: Directory with the model files.
+    :type models_dir: str
+    :return: Model with 'feature_names_in_' and 'predict'
+    """
+    return model_backends.load_predictor(models_dir=Path(models_dir), watch=True)
+
+
+def load_predictor(airport_code: str = DEFAULT_AIRPORT):
     """
     Loads the XGBoost prediction model that I have trained and saved before.
-    Caches resource to only load the model once per session.
+    Airports with their own model (models/<IATA>/) get it, the others the default PRG model.
+    The serving format is chosen by FLIGHT_DELAY_MODEL_BACKEND (see flight_delay.predictor),
+    by default the exported native booster if there is one, otherwise the joblib XGBRegressor.
 
-    :return: Joblib model - XGBRegressor
+    :param airport_code: IATA code of the departure airport.
+    :type airport_code: str
+    :return: Model with 'feature_names_in_' and 'predict'
     """
-    predictor_path = BASE_DIR / 'models' / 'flight_delay_xgb.joblib'
-    return joblib.load(predictor_path)
+    return load_model_dir(str(model_backends.model_dir_for(BASE_DIR / 'models', airport_code)))
 
-@st.cache_data
-def predict_delay(flight_row : pd.DataFrame, df : pd.DataFrame) -> int:
+def predict_delay(flight_row : pd.DataFrame, df : pd.DataFrame, airport_code: str = DEFAULT_AIRPORT) -> int:
     """
     Calls prepare_features to preprocess the data and 
     predicts the delay if the data are in the expected format. 
     Returns the predicted delay. 
+    Cached per airport, flight and the versions of the timetable, weather and model
+    (see prediction.predict_flight_cached), the dataframes are not hashed.
     
     :param flight_row: Row with the flight to predict on.
     :type flight_row: pd.DataFrame
     :param df: Full departure timetable.
     :type df: pd.DataFrame
+    :param airport_code: IATA code of the departure airport.
+    :type airport_code: str
     :return: The predicted delay in minutes. Rounded to the nearest integer.
     :rtype: int
     """
-    x_input = prepare_features(df_departures=df, flight_row=flight_row)
-    if x_input.empty:
-        st.warning('Prediction failed. Error in preprocessing.')
-        return None
-
-    predictor = load_predictor()
-
-    # XGBoost has attribute 'feature_names_in_' so this will be skipped.
-    # Might be useful for future models.
-    if not hasattr(predictor, 'feature_names_in_'):
-        prediction = predictor.predict(x_input)[0]
-        return round(float(prediction))
-
-    predictor_features = predictor.feature_names_in_
-
     try:
-        x_input = x_input[predictor_features]
+        delay = prediction.predict_flight_cached(load_predictor(airport_code), flight_row, df, airport_code)
     except KeyError as e:
         st.warning(f'Error: generated row is missing columns expected by model: {e}')
         return None
+    except ValueError:
+        st.warning('Prediction failed. Error in preprocessing.')
+        return None
 
-    prediction = predictor.predict(x_input)[0]
-
-    return round(float(prediction))
-
-
-
-def valid_flight_number(flight_num: str) -> bool:
-    """
-    Very simple flight number validation.
-
-    :param flight_num: Flight number to validate
-    :type flight_num: str
-    :return: True if a flight is in valid format, False if it isn't.
-    :rtype: bool
-    """
-    flight_num = flight_num.strip()
-    if len(flight_num) < 2 or flight_num.isspace() or ' ' in flight_num or not flight_num.isalnum:
-        print(len(flight_num))
-        return False
-    return True
+    if get_weather(airport_code).empty:
+        st.warning('Weather API Failed. Using fallback values for weather.')
+    return delay
 
 
-def filter_flight(df: pd.DataFrame, flight_number: str) -> pd.DataFrame:
+def predict_timetable(df: pd.DataFrame, airport_code: str = DEFAULT_AIRPORT) -> pd.Series:
     """
-    Filters the flight data from the timetable dataframe by flight number. (finds the correct row)
+    Predicts the delay for every flight in the departure timetable.
+    Features are built for all rows at once and the model is called only once.
 
-    :param df: Timetable dataframe.
+    :param df: Full departure timetable.
     :type df: pd.DataFrame
-    :param flight_number: Flight number to find data for.
-    :type flight_number: str
-    :return: Row with the data of the flight.
-    :rtype: DataFrame
+    :param airport_code: IATA code of the departure airport.
+    :type airport_code: str
+    :return: Predicted delays in minutes (rounded) with the same index as df.
+             Flights that could not be preprocessed have a missing value.
+    :rtype: pd.Series
     """
-    if df.empty:
-        return pd.DataFrame()
-
-    df = df.copy()
-    df['flight.iataNumber'] = df['flight.iataNumber'].fillna("").str.strip().str.upper()
-
-    return df[df['flight.iataNumber'] == flight_number]
+    try:
+        return prediction.predict_timetable(load_predictor(airport_code), df, airport_code)
+    except KeyError as e:
+        st.warning(f'Error: generated rows are missing columns expected by model: {e}')
+        return pd.Series(pd.NA, index=df.index, dtype='Int64')
 
 
 # Maybe fix 'time' !
-def run_prediction(flight_number_input: str, flight_date_input, timetable_df: pd.DataFrame):
+def run_prediction(flight_number_input: str, flight_date_input, timetable_df: pd.DataFrame,
+                   airport_code: str = DEFAULT_AIRPORT):
     """
     Whole prediction process. Filtering, Preprocessing, Predicting.
     
@@ -151,6 +236,8 @@ def run_prediction(flight_number_input: str, flight_date_input, timetable_df: pd
     :param flight_date_input: Date of the flight inputted by the user.
     :param timetable_df: The departure timetable.
     :type timetable_df: pd.DataFrame
+    :param airport_code: IATA code of the departure airport.
+    :type airport_code: str
     """
     flight_number = flight_number_input.strip().upper()
     date_str = flight_date_input.strftime("%Y-%m-%d")
@@ -165,13 +252,18 @@ def run_prediction(flight_number_input: str, flight_date_input, timetable_df: pd
         st.error(f"Flight {flight_number} not found.")
         return None
 
-    with st.spinner("Calculating delay..."):
-        delay = predict_delay(flight_row=flight_df, df=timetable_df)
+    # precomputed by the forecast scheduler, predicted on demand only until its first table is ready
+    forecasts = get_forecasts(airport_code, timetable_df)
+    delay = forecasts.lookup(flight_number) if forecasts is not None else None
+    if delay is None:
+        with st.spinner("Calculating delay..."):
+            delay = predict_delay(flight_row=flight_df, df=timetable_df, airport_code=airport_code)
 
     return flight_df['arrival.iataCode'].iloc[0], delay, flight_number
 
 
-def add_flight_for_visualization(destination_iata: str, predicted_delay: int, flight_num: str, data: list[dict]) -> list[dict]:
+def add_flight_for_visualization(destination_iata: str, predicted_delay: int, flight_num: str, data: list[dict],
+                                 source_iata: str = DEFAULT_AIRPORT) -> list[dict]:
     """
     Updates the list of flights to be visualized on the map.
     If a previous flight to the same destination was in the list it will now be replaced by the current flight.
@@ -184,10 +276,12 @@ def add_flight_for_visualization(destination_iata: str, predicted_delay: int, fl
     :type flight_num: str
     :param data: List of the previously predicted flights so far. Each flight is a dict with data.
     :type data: list[dict]
+    :param source_iata: Departure airport of the current flight.
+    :type source_iata: str
     :return: New list with all of the predicted flights.
     :rtype: list[dict]
     """
-    prg_coords = AIRPORT_COORDS['PRG']
+    source_coords = AIRPORT_COORDS[source_iata]
 
     if destination_iata not in AIRPORT_COORDS:
         st.warning('Cannot visualize the flight. Destination coordinates unknown.')
@@ -195,12 +289,13 @@ def add_flight_for_visualization(destination_iata: str, predicted_delay: int, fl
 
     destination_coords = AIRPORT_COORDS[destination_iata]
 
-    data = [d for d in data if d['destination'] != destination_iata]
+    # flights predicted before multi-airport support have no source, they were all from PRG
+    data = [d for d in data if (d.get('source', DEFAULT_AIRPORT), d['destination']) != (source_iata, destination_iata)]
 
     data.append(
         {
-        'destination': destination_iata, 'destination_coords': destination_coords, 
-        'source_coords': prg_coords, 'predicted_delay': predicted_delay, 
+        'source': source_iata, 'destination': destination_iata, 'destination_coords': destination_coords,
+        'source_coords': source_coords, 'predicted_delay': predicted_delay, 
         'flight_number': flight_num
         }
     )
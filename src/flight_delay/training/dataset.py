@@ -0,0 +1,448 @@
+"""
+Builds the training set of the delay model from the raw AviationStack and Open-Meteo exports.
+Replaces get_dataset of notebooks/01_data_preprocessing.ipynb.
+
+    python -m flight_delay.training.dataset [--departures ...] [--arrivals ...] [--weather ...] [--output ...]
+                                            [--destination-weather ...]
+
+The inputs are raw CSV exports or the Parquet datasets converted from them (see storage).
+Both are read in chunks with explicit dtypes and only the needed columns, so years of data fit in memory:
+    1. pass - departures and arrivals per hour bucket are counted (traffic features need the whole period)
+    2. pass - every departure chunk is turned into features and appended to the Parquet file
+Time, traffic and terminal features use the same transforms as the online path (data_preprocessing).
+With the weather history of the destination airports the training set gets the destination weather features too
+(DESTINATION_WEATHER_FEATURES), a model trained on it is served with the destination forecasts.
+"""
+
+import argparse
+import json
+from pathlib import Path
+from typing import Iterator
+import numpy as np
+import pandas as pd
+from flight_delay.data_preprocessing import (
+    CATEGORICAL_FEATURES, WEATHER_FEATURES, add_time_features, fill_missing_terminal, hour_buckets
+)
+from flight_delay.destination_weather import DESTINATION_WEATHER_FEATURES
+from flight_delay.training import storage
+
+BASE_DIR = Path(__file__).resolve().parents[3]
+
+RAW_DIR = BASE_DIR / 'data' / 'raw'
+PROCESSED_DIR = BASE_DIR / 'data' / 'processed'
+
+# Rows per CSV chunk
+CHUNKSIZE = 100_000
+
+# Same split as the notebook
+RANDOM_SEED = 333
+
+# Flights delayed more than 5 hours are usually cancelled (from the data exploration)
+MAX_DELAY = 300
+
+# Feature order of the model (keys of fill_values.json)
+FEATURE_COLUMNS = (
+    'terminal', 'destination_airport', 'airline', 'temp_c', 'precip_mm', 'wind_kph', 'departure_traffic',
+    'arrival_traffic', 'day_in_month', 'hour_sin', 'hour_cos', 'weekday_sin', 'weekday_cos'
+)
+TARGET_COLUMN = 'delay'
+
+# Raw columns read from the exports, everything else in the wide CSVs is skipped
+DEPARTURE_DTYPES = {
+    'status': 'string',
+    'departure.scheduledTime': 'string',
+    'departure.estimatedTime': 'string',
+    'departure.actualTime': 'string',
+    'departure.delay': 'float64',
+    'departure.terminal': 'float64',
+    'airline.icaoCode': 'string',
+    'arrival.iataCode': 'string',
+}
+ARRIVAL_DTYPES = {'arrival.scheduledTime': 'string'}
+WEATHER_DTYPES = {'time': 'string', 'temp_c': 'float64', 'precip_mm': 'float64', 'wind_kph': 'float64'}
+# Weather exports of several airports, the airport of every row (the partition of a weather dataset, see storage)
+DESTINATION_WEATHER_DTYPES = {'airport': 'string', **WEATHER_DTYPES}
+
+
+def read_csv_chunks(path: Path, dtypes: dict, chunksize: int = CHUNKSIZE) -> Iterator[pd.DataFrame]:
+    """
+    Reads only the given columns of the CSV, chunk by chunk.
+
+    :param path: CSV file.
+    :type path: Path
+    :param dtypes: {column: dtype} of the columns to read.
+    :type dtypes: dict
+    :param chunksize: Rows per chunk.
+    :type chunksize: int
+    :return: Iterator of the chunks.
+    :rtype: Iterator[pd.DataFrame]
+    """
+    return pd.read_csv(path, usecols=list(dtypes), dtype=dtypes, chunksize=chunksize)
+
+
+def read_chunks(path: Path, dtypes: dict, chunksize: int = CHUNKSIZE, filters: dict = None) -> Iterator[pd.DataFrame]:
+    """
+    Reads the given columns of a CSV export or of a Parquet dataset (see storage), chunk by chunk.
+    Datasets are already typed, only the matching partitions are read.
+
+    :param path: CSV file or dataset directory.
+    :type path: Path
+    :param dtypes: {column: dtype} of the columns to read (used for CSV).
+    :type dtypes: dict
+    :param chunksize: Rows per chunk.
+    :type chunksize: int
+    :param filters: Partition filter of datasets - airport_code, start_month, end_month (see storage.dataset_filter).
+    :type filters: dict
+    :return: Iterator of the chunks.
+    :rtype: Iterator[pd.DataFrame]
+    """
+    if storage.is_dataset(path):
+        return storage.iter_batches(path, list(dtypes), chunksize, **(filters or {}))
+    return read_csv_chunks(path, dtypes, chunksize)
+
+
+def completed_flights(chunk: pd.DataFrame) -> pd.Series:
+    """
+    Flights the model learns from - active and with a known departure time (no unknown or cancelled ones).
+
+    :param chunk: Raw departures.
+    :type chunk: pd.DataFrame
+    :return: Boolean mask of the rows to keep.
+    :rtype: pd.Series
+    """
+    return (chunk['status'] == 'active').fillna(False) & chunk['departure.estimatedTime'].notna()
+
+
+def count_per_hour(path: Path, time_column: str, dtypes: dict, chunksize: int = CHUNKSIZE,
+                   completed_only: bool = False, filters: dict = None) -> pd.Series:
+    """
+    Counts the flights per hour bucket over the whole file.
+
+    :param path: Departures or arrivals CSV.
+    :type path: Path
+    :param time_column: Scheduled time column.
+    :type time_column: str
+    :param dtypes: Columns to read.
+    :type dtypes: dict
+    :param chunksize: Rows per chunk.
+    :type chunksize: int
+    :param completed_only: Count only completed flights (see completed_flights).
+    :type completed_only: bool
+    :param filters: Partition filter of datasets, see read_chunks.
+    :type filters: dict
+    :return: {hour bucket: number of flights}
+    :rtype: pd.Series
+    """
+    counts = pd.Series(dtype='float64')
+    for chunk in read_chunks(path, dtypes, chunksize, filters):
+        if completed_only:
+            chunk = chunk[completed_flights(chunk)]
+        counts = counts.add(hour_buckets(chunk[time_column]).value_counts(), fill_value=0)
+    return counts
+
+
+def load_weather(path: Path, chunksize: int = CHUNKSIZE, timezone: str = 'Europe/Prague',
+                 filters: dict = None) -> pd.DataFrame:
+    """
+    Loads the hourly weather history (Open-Meteo export in UTC) indexed by the local time of the flights.
+
+    :param path: Weather CSV.
+    :type path: Path
+    :param chunksize: Rows per chunk.
+    :type chunksize: int
+    :param timezone: Timezone of the flight timetables.
+    :type timezone: str
+    :param filters: Partition filter of datasets, see read_chunks.
+    :type filters: dict
+    :return: Weather features indexed by the local hour.
+    :rtype: pd.DataFrame
+    """
+    df_weather = pd.concat(read_chunks(path, WEATHER_DTYPES, chunksize, filters), ignore_index=True)
+
+    local_time = pd.to_datetime(df_weather['time']).dt.tz_localize('UTC').dt.tz_convert(timezone).dt.tz_localize(None)
+    df_weather = df_weather.drop(columns='time').set_index(local_time)
+
+    # the hour repeated when the clocks go back keeps its first value
+    return df_weather[~df_weather.index.duplicated()][list(WEATHER_FEATURES)]
+
+
+def load_destination_weather(path: Path, chunksize: int = CHUNKSIZE, filters: dict = None) -> pd.DataFrame:
+    """
+    Loads the hourly weather history (Open-Meteo exports in UTC) of the destination airports -
+    a CSV with an 'airport' column or a weather dataset with the exports of several airports (see storage).
+
+    :param path: Weather CSV or dataset.
+    :type path: Path
+    :param chunksize: Rows per chunk.
+    :type chunksize: int
+    :param filters: Month filter of datasets (start_month, end_month), see read_chunks.
+    :type filters: dict
+    :return: DESTINATION_WEATHER_FEATURES indexed by (IATA code, UTC hour).
+    :rtype: pd.DataFrame
+    """
+    df = pd.concat(read_chunks(path, DESTINATION_WEATHER_DTYPES, chunksize, filters), ignore_index=True)
+    index = pd.MultiIndex.from_arrays(
+        [df['airport'].astype('string').str.upper(), pd.to_datetime(df['time']).dt.round('h')], names=['airport', 'time']
+    )
+    weather = pd.DataFrame(
+        df[list(WEATHER_FEATURES)].to_numpy(dtype='float64'), index=index, columns=list(DESTINATION_WEATHER_FEATURES)
+    )
+    return weather[~weather.index.duplicated()]
+
+
+def training_features(columns) -> list[str]:
+    """
+    :param columns: Columns of a training set.
+    :return: Its feature columns - FEATURE_COLUMNS and the destination weather if it was built with it.
+    :rtype: list[str]
+    """
+    return [*FEATURE_COLUMNS, *(col for col in DESTINATION_WEATHER_FEATURES if col in columns)]
+
+
+def transform_departures(chunk: pd.DataFrame, departure_counts: pd.Series, arrival_counts: pd.Series,
+                         weather: pd.DataFrame, destination_weather: pd.DataFrame = None,
+                         timezone: str = 'Europe/Prague') -> pd.DataFrame:
+    """
+    Turns raw departures into model features and the delay target.
+    Categorical features stay strings, they are encoded when the model is trained (see encode_categories).
+
+    :param chunk: Raw departures (DEPARTURE_DTYPES columns).
+    :type chunk: pd.DataFrame
+    :param departure_counts: Completed departures per hour bucket.
+    :type departure_counts: pd.Series
+    :param arrival_counts: Arrivals per hour bucket.
+    :type arrival_counts: pd.Series
+    :param weather: Weather by the local hour (see load_weather).
+    :type weather: pd.DataFrame
+    :param destination_weather: Weather of the destinations by (IATA code, UTC hour) (see load_destination_weather),
+                                None leaves out the destination weather features.
+    :type destination_weather: pd.DataFrame
+    :param timezone: Timezone of the flight timetables.
+    :type timezone: str
+    :return: FEATURE_COLUMNS (with DESTINATION_WEATHER_FEATURES if destination_weather is given) and TARGET_COLUMN.
+    :rtype: pd.DataFrame
+    """
+    chunk = chunk[completed_flights(chunk)]
+
+    scheduled_time = pd.to_datetime(chunk['departure.scheduledTime'], errors='coerce')
+    actual_time = pd.to_datetime(
+        chunk['departure.actualTime'].fillna(chunk['departure.estimatedTime']), errors='coerce'
+    )
+    hour_bucket = scheduled_time.dt.round('h')
+
+    df = pd.DataFrame({
+        'terminal': chunk['departure.terminal'],
+        'destination_airport': chunk['arrival.iataCode'].str.upper(),
+        'airline': chunk['airline.icaoCode'].str.upper(),
+    })
+
+    for col in WEATHER_FEATURES:
+        df[col] = hour_bucket.map(weather[col])
+
+    if destination_weather is not None:
+        # looked up at the departure hour in UTC like the destination forecasts (see data_preprocessing)
+        utc_hour = (
+            hour_bucket.dt.tz_localize(timezone, ambiguous='NaT', nonexistent='NaT')
+            .dt.tz_convert('UTC').dt.tz_localize(None)
+        )
+        values = destination_weather.reindex(pd.MultiIndex.from_arrays([df['destination_airport'], utc_hour]))
+        for col in DESTINATION_WEATHER_FEATURES:
+            df[col] = values[col].to_numpy()
+
+    # Traffic - same definition as data_preprocessing.add_traffic
+    df['departure_traffic'] = hour_bucket.map(departure_counts) - 1
+    df['arrival_traffic'] = hour_bucket.map(arrival_counts).fillna(0)
+
+    df = add_time_features(df, scheduled_time)
+
+    # Missing delay of a flight that did not leave late means no delay
+    delay = chunk['departure.delay']
+    df[TARGET_COLUMN] = delay.mask(delay.isna() & (scheduled_time >= actual_time), 0)
+
+    df = df[df['airline'].notna() & df['temp_c'].notna() & (df[TARGET_COLUMN] < MAX_DELAY)].copy()
+    df = fill_missing_terminal(df)
+
+    features = training_features(df.columns)
+    return df[[*features, TARGET_COLUMN]].astype(
+        {col: 'float64' for col in features if col not in ('destination_airport', 'airline')}
+    )
+
+
+def build_training_set(departures_path: Path, arrivals_path: Path, weather_path: Path, output_path: Path,
+                       chunksize: int = CHUNKSIZE, timezone: str = 'Europe/Prague', airport_code: str = None,
+                       start_month: str = None, end_month: str = None, destination_weather_path: Path = None) -> int:
+    """
+    Builds the training set and writes it to a Parquet file (replaced only when complete).
+
+    :param departures_path: Raw departures CSV or dataset.
+    :type departures_path: Path
+    :param arrivals_path: Raw arrivals CSV or dataset.
+    :type arrivals_path: Path
+    :param weather_path: Hourly weather (UTC) CSV or dataset.
+    :type weather_path: Path
+    :param output_path: Parquet file to write.
+    :type output_path: Path
+    :param chunksize: Rows per CSV chunk.
+    :type chunksize: int
+    :param timezone: Timezone of the flight timetables.
+    :type timezone: str
+    :param airport_code: Departure airport, only read from the datasets (the CSVs hold one airport).
+    :type airport_code: str
+    :param start_month: First month ('2025-01') read from the datasets, inclusive.
+    :type start_month: str
+    :param end_month: Last month read from the datasets, inclusive.
+    :type end_month: str
+    :param destination_weather_path: Hourly weather (UTC) of the destination airports, CSV or dataset
+                                     (see load_destination_weather). None builds the set without it.
+    :type destination_weather_path: Path
+    :return: Number of rows written.
+    :rtype: int
+    """
+    import pyarrow as pa  # pandas' Parquet engine, only needed offline
+    import pyarrow.parquet as pq
+
+    filters = {'airport_code': airport_code, 'start_month': start_month, 'end_month': end_month}
+
+    departure_counts = count_per_hour(
+        departures_path, 'departure.scheduledTime', DEPARTURE_DTYPES, chunksize, completed_only=True, filters=filters
+    )
+    arrival_counts = count_per_hour(arrivals_path, 'arrival.scheduledTime', ARRIVAL_DTYPES, chunksize, filters=filters)
+    weather = load_weather(weather_path, chunksize, timezone, filters)
+    destination_weather = None
+    features = list(FEATURE_COLUMNS)
+    if destination_weather_path is not None:
+        # the destinations are other airports, only the months are filtered
+        destination_weather = load_destination_weather(
+            destination_weather_path, chunksize, {'start_month': start_month, 'end_month': end_month}
+        )
+        features += DESTINATION_WEATHER_FEATURES
+
+    schema = pa.schema([
+        (col, pa.string() if col in ('destination_airport', 'airline') else pa.float64())
+        for col in (*features, TARGET_COLUMN)
+    ])
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(output_path.name + '.tmp')
+
+    rows = 0
+    with pq.ParquetWriter(str(tmp_path), schema) as writer:
+        for chunk in read_chunks(departures_path, DEPARTURE_DTYPES, chunksize, filters):
+            rows_chunk = transform_departures(
+                chunk, departure_counts, arrival_counts, weather, destination_weather, timezone
+            )
+            writer.write_table(pa.Table.from_pandas(rows_chunk, schema=schema, preserve_index=False))
+            rows += len(rows_chunk)
+
+    tmp_path.replace(output_path)
+    return rows
+
+
+def load_training_set(path: Path, columns: list[str] = None) -> pd.DataFrame:
+    """
+    :param path: Parquet file written by build_training_set.
+    :type path: Path
+    :param columns: Columns to read, all by default.
+    :type columns: list[str]
+    :return: Training set with string categorical features.
+    :rtype: pd.DataFrame
+    """
+    return pd.read_parquet(path, columns=columns)
+
+
+def encode_categories(df: pd.DataFrame, categories: dict = None) -> tuple[pd.DataFrame, dict]:
+    """
+    Label encodes the categorical features like the app does (unknown values get -1).
+
+    :param df: Training set.
+    :type df: pd.DataFrame
+    :param categories: {feature: list of categories}, taken from the data (in order of appearance) if None.
+    :type categories: dict
+    :return: Encoded copy of df and the categories.
+    :rtype: tuple[pd.DataFrame, dict]
+    """
+    df = df.copy()
+    if categories is None:
+        categories = {col: df[col].dropna().unique().tolist() for col in CATEGORICAL_FEATURES}
+
+    for col in CATEGORICAL_FEATURES:
+        dtype = pd.api.types.CategoricalDtype(categories=categories[col], ordered=False)
+        df[col] = df[col].astype(dtype).cat.codes
+
+    return df, categories
+
+
+def split_dataset(df: pd.DataFrame, seed: int = RANDOM_SEED) -> tuple:
+    """
+    Splits the encoded training set 60 / 20 / 20 like the notebook.
+
+    :param df: Encoded training set.
+    :type df: pd.DataFrame
+    :param seed: Random state of the split.
+    :type seed: int
+    :return: Xtrain, Xval, Xtest, ytrain, yval, ytest
+    :rtype: tuple
+    """
+    from sklearn.model_selection import train_test_split
+
+    x, y = df[training_features(df.columns)], df[TARGET_COLUMN]
+    xtrain, xrest, ytrain, yrest = train_test_split(x, y, test_size=0.4, random_state=seed)
+    xval, xtest, yval, ytest = train_test_split(xrest, yrest, test_size=0.5, random_state=seed)
+    return xtrain, xval, xtest, ytrain, yval, ytest
+
+
+def save_artifacts(xtrain: pd.DataFrame, categories: dict, processed_dir: Path = PROCESSED_DIR):
+    """
+    Writes the preprocessing artifacts of a newly trained model (read by data_preprocessing.FeatureSchema):
+    fill_values.json (medians of the training features, in the model's feature order) and categories.json.
+
+    :param xtrain: Encoded training features.
+    :type xtrain: pd.DataFrame
+    :param categories: Categories used for the encoding.
+    :type categories: dict
+    :param processed_dir: Output directory.
+    :type processed_dir: Path
+    """
+    processed_dir = Path(processed_dir)
+    processed_dir.mkdir(parents=True, exist_ok=True)
+
+    fill_values = {col: float(value) for col, value in xtrain.median(numeric_only=True).items()}
+    with open(processed_dir / 'fill_values.json', 'w', encoding='utf-8') as f:
+        json.dump(fill_values, f, indent=4)
+
+    categories = {
+        col: [value.item() if isinstance(value, np.generic) else value for value in values]
+        for col, values in categories.items()
+    }
+    with open(processed_dir / 'categories.json', 'w', encoding='utf-8') as f:
+        json.dump(categories, f)
+
+
+def main(argv: list[str] = None):
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description='Builds the training set of the delay model (Parquet).')
+    parser.add_argument('--departures', type=Path, default=RAW_DIR / 'departures_250101_250430.csv')
+    parser.add_argument('--arrivals', type=Path, default=RAW_DIR / 'arrivals_250101_250430.csv')
+    parser.add_argument('--weather', type=Path, default=RAW_DIR / 'weather_250101_250430.csv')
+    parser.add_argument('--output', type=Path, default=PROCESSED_DIR / 'training.parquet')
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE)
+    parser.add_argument('--timezone', default='Europe/Prague', help='Timezone of the timetables.')
+    parser.add_argument('--airport', help='Departure airport (Parquet datasets only).')
+    parser.add_argument('--start-month', help='First month, e.g. 2025-01 (Parquet datasets only).')
+    parser.add_argument('--end-month', help='Last month, e.g. 2025-04 (Parquet datasets only).')
+    parser.add_argument('--destination-weather', type=Path,
+                        help='Hourly weather of the destination airports (CSV with an airport column or dataset).')
+    args = parser.parse_args(argv)
+
+    rows = build_training_set(
+        args.departures, args.arrivals, args.weather, args.output, args.chunksize, args.timezone,
+        args.airport, args.start_month, args.end_month, args.destination_weather
+    )
+    print(f'Saved {rows} rows to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,444 @@
+"""
+Incremental updates of the delay model from the newly observed actual delays.
+
+Once a day the completed departures of the live timetable are turned into training rows (the same
+transforms as the training set) and appended to a store of daily Parquet files. The model then
+continues boosting from its current trees on the days it has not learned yet - no retraining from scratch.
+The latest collected day is held out, the update is only saved if it does not predict that day worse
+than the current model. A model grown to MAX_ROUNDS trees is not updated any more, it needs a full training.
+
+    python -m flight_delay.training.incremental [--airport PRG] [--rounds 50] [--window-days 7]
+
+The model files are replaced atomically, running apps and servers load the new version without
+a restart (predictor.load_predictor(watch=True)). The learned days are recorded next to them (learned_days.json).
+A models directory with a registry is served by its CURRENT version (see registry) - that version is updated
+and the result is published as a new version (with --shadow scored next to the served one first),
+its learned days are kept in the metadata of the version. The categories of the encoding stay those of the
+full training, flights of new airlines or destinations get the unknown code (-1) until the next one.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+import pandas as pd
+from flight_delay.airports import DEFAULT_AIRPORT, normalize_airport
+from flight_delay.data_preprocessing import (
+    CATEGORICAL_FEATURES, WEATHER_FEATURES, FeatureSchema, get_arrival_df, get_weather, hour_buckets
+)
+from flight_delay.destination_weather import DESTINATION_WEATHER_FEATURES, get_destination_weather, to_utc_hours
+from flight_delay.training.dataset import (
+    DEPARTURE_DTYPES, FEATURE_COLUMNS, PROCESSED_DIR, TARGET_COLUMN, completed_flights, encode_categories,
+    transform_departures
+)
+from flight_delay.utils.dicts import AIRPORT_TIMEZONES
+
+UPDATES_DIR = PROCESSED_DIR / 'updates'
+
+# Boosting rounds added by one update
+UPDATE_ROUNDS = 50
+
+# At most this many not yet learned days are used by one update
+WINDOW_DAYS = 7
+
+# Size of the ensemble the updates may grow the model to
+MAX_ROUNDS = 2000
+
+# Days the model has learned from, next to the model files
+LEARNED_DAYS_FILE = 'learned_days.json'
+
+# Live timetable statuses of departed flights, the historical exports call them all 'active'
+DEPARTED_STATUSES = ('active', 'landed')
+
+
+def collect_day(df_departures: pd.DataFrame, airport_code: str = DEFAULT_AIRPORT) -> pd.DataFrame:
+    """
+    Turns the departed flights of a live timetable into training rows.
+    Traffic is counted from the timetable and the arrivals, weather is the hourly data of the day,
+    the destination weather comes from the destination forecasts (if the airport timezone is known).
+
+    :param df_departures: Departure timetable of the day (see prediction.fetch_timetable_df).
+    :type df_departures: pd.DataFrame
+    :param airport_code: IATA code of the departure airport.
+    :type airport_code: str
+    :return: FEATURE_COLUMNS, DESTINATION_WEATHER_FEATURES and TARGET_COLUMN,
+             empty if nothing departed or the weather is missing.
+    :rtype: pd.DataFrame
+    """
+    empty = pd.DataFrame(columns=[*FEATURE_COLUMNS, TARGET_COLUMN])
+    if df_departures.empty:
+        return empty
+
+    chunk = df_departures.reindex(columns=list(DEPARTURE_DTYPES)).astype(DEPARTURE_DTYPES)
+    chunk['status'] = chunk['status'].where(~chunk['status'].isin(DEPARTED_STATUSES), 'active')
+
+    completed = chunk[completed_flights(chunk)]
+    departure_counts = hour_buckets(completed['departure.scheduledTime']).value_counts()
+
+    df_arrivals = get_arrival_df(airport_code)
+    arrival_counts = df_arrivals['hour_bucket'].value_counts() if not df_arrivals.empty else pd.Series(dtype='int64')
+
+    df_weather = get_weather(airport_code)
+    if df_weather.empty:
+        print(f'No weather for {airport_code}, the day is not collected.')
+        return empty
+    weather = df_weather.set_index('time')[list(WEATHER_FEATURES)]
+    weather = weather[~weather.index.duplicated()]
+
+    if airport_code not in AIRPORT_TIMEZONES:
+        return transform_departures(chunk, departure_counts, arrival_counts, weather)
+    return transform_departures(
+        chunk, departure_counts, arrival_counts, weather, live_destination_weather(completed, airport_code),
+        AIRPORT_TIMEZONES[airport_code]
+    )
+
+
+def live_destination_weather(departures: pd.DataFrame, airport_code: str) -> pd.DataFrame:
+    """
+    Forecasts of the destinations of the departures at their departure hours (see destination_weather),
+    in the layout of the weather history of the training set (dataset.load_destination_weather).
+
+    :param departures: Raw departures (DEPARTURE_DTYPES columns).
+    :type departures: pd.DataFrame
+    :param airport_code: IATA code of the departure airport.
+    :type airport_code: str
+    :return: DESTINATION_WEATHER_FEATURES indexed by (IATA code, UTC hour), unknown ones are left out.
+    :rtype: pd.DataFrame
+    """
+    destinations = departures['arrival.iataCode'].str.upper().reset_index(drop=True)
+    hours = to_utc_hours(hour_buckets(departures['departure.scheduledTime']), airport_code).reset_index(drop=True)
+    weather = pd.DataFrame(
+        get_destination_weather().lookup(destinations, hours),
+        index=pd.MultiIndex.from_arrays([destinations, hours], names=['airport', 'time']),
+        columns=list(DESTINATION_WEATHER_FEATURES),
+    ).dropna(how='all')
+    return weather[~weather.index.duplicated()]
+
+
+def day_path(updates_dir: Path, airport_code: str, day: str) -> Path:
+    """
+    :return: File of the observed flights of one airport and day.
+    :rtype: Path
+    """
+    return Path(updates_dir) / f'airport={airport_code}' / f'day={day}.parquet'
+
+
+def append_day(rows: pd.DataFrame, day: str, airport_code: str = DEFAULT_AIRPORT,
+               updates_dir: Path = UPDATES_DIR) -> Path:
+    """
+    Stores the rows of one day. Collecting the same day again replaces its file.
+
+    :param rows: Training rows (see collect_day).
+    :type rows: pd.DataFrame
+    :param day: Day of the flights ('2025-05-01').
+    :type day: str
+    :param airport_code: IATA code of the departure airport.
+    :type airport_code: str
+    :param updates_dir: Root directory of the store.
+    :type updates_dir: Path
+    :return: Written file.
+    :rtype: Path
+    """
+    path = day_path(updates_dir, airport_code, day)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    rows.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def collected_days(updates_dir: Path = UPDATES_DIR, airport_code: str = None) -> list[str]:
+    """
+    :param updates_dir: Root directory of the store.
+    :type updates_dir: Path
+    :param airport_code: Only this airport, all of them if None.
+    :type airport_code: str
+    :return: Collected days ('2025-05-01'), oldest first.
+    :rtype: list[str]
+    """
+    airport_dir = f'airport={airport_code}' if airport_code else 'airport=*'
+    return sorted({path.stem.split('=', 1)[1] for path in Path(updates_dir).glob(f'{airport_dir}/day=*.parquet')})
+
+
+def load_days(updates_dir: Path, airport_code: str, days: list[str]) -> pd.DataFrame:
+    """
+    Loads the rows of the given days.
+
+    :param updates_dir: Root directory of the store.
+    :type updates_dir: Path
+    :param airport_code: Only this airport, all of them if None.
+    :type airport_code: str
+    :param days: Days to load.
+    :type days: list[str]
+    :return: Training rows, empty if none of the days was collected.
+    :rtype: pd.DataFrame
+    """
+    airport_dir = f'airport={airport_code}' if airport_code else 'airport=*'
+    paths = sorted(Path(updates_dir).glob(f'{airport_dir}/day=*.parquet'), key=lambda path: path.stem)
+
+    days = {f'day={day}' for day in days}
+    frames = [pd.read_parquet(path) for path in paths if path.stem in days]
+    if not frames:
+        return pd.DataFrame(columns=[*FEATURE_COLUMNS, TARGET_COLUMN])
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_recent(updates_dir: Path = UPDATES_DIR, airport_code: str = None, window_days: int = WINDOW_DAYS) -> pd.DataFrame:
+    """
+    Loads the rows of the last window_days collected days.
+
+    :param updates_dir: Root directory of the store.
+    :type updates_dir: Path
+    :param airport_code: Only this airport, all of them if None.
+    :type airport_code: str
+    :param window_days: Number of the latest days to load.
+    :type window_days: int
+    :return: Training rows, empty if nothing was collected.
+    :rtype: pd.DataFrame
+    """
+    return load_days(updates_dir, airport_code, collected_days(updates_dir, airport_code)[-window_days:])
+
+
+def read_learned_days(models_dir: Path) -> list[str]:
+    """
+    :param models_dir: Directory of the model.
+    :type models_dir: Path
+    :return: Days the model was updated with, empty for a model that was only trained.
+    :rtype: list[str]
+    """
+    path = Path(models_dir) / LEARNED_DAYS_FILE
+    if not path.is_file():
+        return []
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def write_learned_days(models_dir: Path, days: list[str]):
+    """
+    Replaces the record of the learned days atomically.
+
+    :param models_dir: Directory of the model.
+    :type models_dir: Path
+    :param days: Days the model was updated with.
+    :type days: list[str]
+    """
+    path = Path(models_dir) / LEARNED_DAYS_FILE
+    tmp_path = path.with_name(f'.tmp-{path.name}')
+    tmp_path.write_text(json.dumps(sorted(set(days))), encoding='utf-8')
+    os.replace(tmp_path, path)
+
+
+def plan_update(days: list[str], learned: list[str], window_days: int = WINDOW_DAYS) -> tuple[list[str], str | None]:
+    """
+    Chooses the days of the next update - the latest collected day is held out for the validation,
+    of the others only those the model has not learned yet are trained on (at most window_days of them).
+
+    :param days: Collected days, oldest first.
+    :type days: list[str]
+    :param learned: Days the model was already updated with.
+    :type learned: list[str]
+    :param window_days: Maximal number of the trained days.
+    :type window_days: int
+    :return: (days to train on, holdout day) - no holdout if fewer than two days were collected.
+    :rtype: tuple[list[str], str | None]
+    """
+    if len(days) < 2:
+        return [], None
+    learned = set(learned)
+    return [day for day in days[:-1] if day not in learned][-window_days:], days[-1]
+
+
+def update_model(models_dir: Path, rows: pd.DataFrame, processed_dir: Path = PROCESSED_DIR,
+                 rounds: int = UPDATE_ROUNDS, n_jobs: int = None, holdout: pd.DataFrame = None,
+                 max_rounds: int = MAX_ROUNDS):
+    """
+    Continues boosting the saved model on the new rows and replaces its files (joblib, native formats).
+    The rows get the features of the model, those they miss (e.g. days collected without the destination
+    weather) are NaN. An early stopped model continues from its best iteration (the trees it predicts with),
+    the updated model predicts with all its trees. With holdout rows the files are only replaced if the updated
+    model predicts them better.
+
+    :param models_dir: Directory of the model.
+    :type models_dir: Path
+    :param rows: Training rows (see load_days), not learned by the model yet.
+    :type rows: pd.DataFrame
+    :param processed_dir: Directory with categories.json of the model.
+    :type processed_dir: Path
+    :param rounds: Boosting rounds to add.
+    :type rounds: int
+    :param n_jobs: XGBoost threads.
+    :type n_jobs: int
+    :param holdout: Rows of a day not in rows, the updated model must have a lower MAE on them.
+    :type holdout: pd.DataFrame
+    :param max_rounds: The model is not grown beyond this many rounds.
+    :type max_rounds: int
+    :return: Updated model, None if there were no rows, the model is full or the update was not better.
+    :rtype: xgboost.XGBRegressor | None
+    """
+    import joblib
+    from sklearn.metrics import mean_absolute_error
+    from flight_delay.predictor import MODEL_NAME, export_model
+
+    if rows.empty:
+        print('No new flights, the model is not updated.')
+        return None
+
+    models_dir = Path(models_dir)
+    model = joblib.load(models_dir / f'{MODEL_NAME}.joblib')
+    booster = model.get_booster()
+    best_iteration = booster.attr('best_iteration')
+    if best_iteration is not None:
+        # the trees after the best iteration are not predicted with, and the kept best_iteration
+        # would hide the new ones - the slice has no early stopping attributes
+        booster = booster[:int(best_iteration) + 1]
+    if booster.num_boosted_rounds() + rounds > max_rounds:
+        print(f'The model has {booster.num_boosted_rounds()} rounds, '
+              f'adding {rounds} would exceed {max_rounds}. Train it again from scratch.')
+        return None
+
+    # the codes must stay those the trees were trained with
+    schema = FeatureSchema.from_dir(processed_dir)
+    categories = {col: list(schema.categories[col].categories) for col in CATEGORICAL_FEATURES}
+    df, _ = encode_categories(rows, categories)
+    features = list(getattr(model, 'feature_names_in_', FEATURE_COLUMNS))
+
+    params = model.get_params()
+    params.update(n_estimators=rounds, early_stopping_rounds=None, n_jobs=n_jobs)
+    updated = type(model)(**params)
+    updated.fit(df.reindex(columns=features), df[TARGET_COLUMN], xgb_model=booster)
+
+    if holdout is not None and not holdout.empty:
+        x, _ = encode_categories(holdout, categories)
+        before = mean_absolute_error(x[TARGET_COLUMN], model.predict(x.reindex(columns=features)))
+        after = mean_absolute_error(x[TARGET_COLUMN], updated.predict(x.reindex(columns=features)))
+        print(f'MAE (Holdout): {before:.3f} minutes before, {after:.3f} minutes after the update')
+        if after >= before:
+            print('The update does not predict the holdout day better, the model is not replaced.')
+            return None
+
+    joblib_path = models_dir / f'{MODEL_NAME}.joblib'
+    tmp_path = joblib_path.with_name(f'.tmp-{joblib_path.name}')
+    joblib.dump(updated, tmp_path)
+    os.replace(tmp_path, joblib_path)
+    export_model(updated, models_dir)
+    return updated
+
+
+def publish_update(models_dir: Path, rows: pd.DataFrame, days: list[str], holdout: pd.DataFrame,
+                   rounds: int = UPDATE_ROUNDS, max_rounds: int = MAX_ROUNDS, shadow: bool = False,
+                   version: str = None, n_jobs: int = None) -> str | None:
+    """
+    Updates the CURRENT version of a model registry and publishes the result as a new version,
+    with the schema of the updated version. The updated version is not changed.
+
+    :param models_dir: Models directory with the registry.
+    :type models_dir: Path
+    :param rows: Training rows of the days (see load_days).
+    :type rows: pd.DataFrame
+    :param days: Days of the rows, added to the learned days in the metadata of the new version.
+    :type days: list[str]
+    :param holdout: Validation rows, see update_model.
+    :type holdout: pd.DataFrame
+    :param rounds: Boosting rounds to add.
+    :type rounds: int
+    :param max_rounds: The model is not grown beyond this many rounds.
+    :type max_rounds: int
+    :param shadow: Score the new version next to the served one instead of serving it.
+    :type shadow: bool
+    :param version: Name of the new version, the current UTC time by default (see registry.publish).
+    :type version: str
+    :param n_jobs: XGBoost threads.
+    :type n_jobs: int
+    :return: Name of the new version, None if the model was not updated.
+    :rtype: str | None
+    """
+    from flight_delay import registry
+
+    models_dir = Path(models_dir)
+    base_version = registry.current_version(models_dir)
+    version_dir = models_dir / registry.VERSIONS_DIR / base_version
+    learned = registry.read_metadata(models_dir, base_version).get('learned_days', [])
+
+    with tempfile.TemporaryDirectory(prefix='.update-', dir=models_dir) as work_dir:
+        for name in registry.MODEL_FILES:
+            if (version_dir / name).is_file():
+                shutil.copy2(version_dir / name, Path(work_dir) / name)
+        model = update_model(work_dir, rows, version_dir, rounds, n_jobs, holdout=holdout, max_rounds=max_rounds)
+        if model is None:
+            return None
+        metadata = {
+            'base_version': base_version,
+            'learned_days': sorted({*learned, *days}),
+            'rounds': model.get_booster().num_boosted_rounds(),
+        }
+        version = registry.publish(models_dir, work_dir, version_dir, version, metadata, make_current=not shadow)
+    if shadow:
+        registry.set_shadow(models_dir, version)
+    return version
+
+
+def main(argv: list[str] = None):
+    """
+    Command line entry point.
+    """
+    from flight_delay import registry
+    from flight_delay.prediction import fetch_timetable_df
+    from flight_delay.predictor import MODELS_DIR, model_dir_for
+
+    parser = argparse.ArgumentParser(description='Updates the delay model with the flights observed today.')
+    parser.add_argument('--airport', default=DEFAULT_AIRPORT)
+    parser.add_argument('--updates', type=Path, default=UPDATES_DIR, help='Root directory of the observed flights.')
+    parser.add_argument('--models', type=Path, default=MODELS_DIR)
+    parser.add_argument('--processed', type=Path, default=PROCESSED_DIR,
+                        help='Directory with categories.json (of a model without a registry).')
+    parser.add_argument('--rounds', type=int, default=UPDATE_ROUNDS)
+    parser.add_argument('--max-rounds', type=int, default=MAX_ROUNDS)
+    parser.add_argument('--window-days', type=int, default=WINDOW_DAYS, help='Maximal number of new days per update.')
+    parser.add_argument('--skip-collect', action='store_true', help='Only update the model from the store.')
+    parser.add_argument('--shadow', action='store_true',
+                        help='With a registry, score the new version in shadow mode instead of serving it.')
+    args = parser.parse_args(argv)
+
+    airport_code = normalize_airport(args.airport)
+    if not args.skip_collect:
+        df_departures = fetch_timetable_df(airport_code, 'departure')
+        rows = collect_day(df_departures, airport_code)
+        day = pd.Timestamp.now().strftime('%Y-%m-%d')
+        if not df_departures.empty:
+            # the local day of the timetable, not of the machine
+            scheduled = pd.to_datetime(df_departures['departure.scheduledTime'], errors='coerce')
+            day = scheduled.dt.strftime('%Y-%m-%d').mode().iat[0]
+        path = append_day(rows, day, airport_code, args.updates)
+        print(f'Collected {len(rows)} flights to {path}')
+
+    models_dir = model_dir_for(args.models, airport_code)
+    # the served model - with a registry its CURRENT version, not the files in the directory
+    with_registry = registry.has_registry(models_dir)
+    if with_registry:
+        learned = registry.read_metadata(models_dir, registry.current_version(models_dir)).get('learned_days', [])
+    else:
+        learned = read_learned_days(models_dir)
+    days, holdout_day = plan_update(collected_days(args.updates, airport_code), learned, args.window_days)
+    if not days:
+        print('No days the model has not learned yet (the latest one is held out), the model is not updated.')
+        return
+
+    rows = load_days(args.updates, airport_code, days)
+    holdout = load_days(args.updates, airport_code, [holdout_day])
+    if with_registry:
+        version = publish_update(models_dir, rows, days, holdout, args.rounds, args.max_rounds, args.shadow)
+        if version is not None:
+            print(f'Published {version} in {models_dir} updated on {len(rows)} flights of {", ".join(days)}'
+                  f'{" as the shadow version" if args.shadow else ""}')
+        return
+
+    model = update_model(models_dir, rows, args.processed, args.rounds, holdout=holdout, max_rounds=args.max_rounds)
+    if model is not None:
+        write_learned_days(models_dir, [*learned, *days])
+        print(f'Updated the model in {models_dir} on {len(rows)} flights of {", ".join(days)}, '
+              f'{model.get_booster().num_boosted_rounds()} rounds')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""
+Columnar storage of the raw training data.
+
+The AviationStack exports are wide CSVs (every nested field is a column) and reading them with
+pd.read_csv parses every column as text. They are converted once to Parquet datasets partitioned by
+month and airport (hive layout: month=2025-01/airport=PRG/...) with typed columns:
+    - time columns ('...Time', '...Runway', 'time') as timestamps
+    - numeric columns (delays, terminal, weather) as float64
+    - everything else as dictionary encoded strings (codes, names, statuses repeat a lot)
+
+    python -m flight_delay.training.storage departures data/raw/departures_250101_250430.csv data/parquet/departures
+    python -m flight_delay.training.storage weather data/raw/weather_250101_250430.csv data/parquet/weather --airport PRG
+
+Readers ask only for the columns and partitions they need (column projection, predicate pushdown),
+see read_dataset and iter_batches. pyarrow is imported lazily, the app does not need it.
+"""
+
+import argparse
+from pathlib import Path
+from typing import Iterator
+import pandas as pd
+
+CHUNKSIZE = 100_000
+
+# Kind of export: (time column of the month partition, airport column of the airport partition)
+KINDS = {
+    'departures': ('departure.scheduledTime', 'departure.iataCode'),
+    'arrivals': ('arrival.scheduledTime', 'arrival.iataCode'),
+    'weather': ('time', None),
+}
+
+NUMERIC_COLUMNS = {
+    'departure.delay', 'arrival.delay', 'departure.terminal',
+    'temp_c', 'precip_mm', 'snow_cm', 'wind_kph', 'visibility_m',
+}
+
+PARTITION_COLUMNS = ('month', 'airport')
+
+
+def is_time_column(column: str) -> bool:
+    """
+    :param column: Column name of the export.
+    :type column: str
+    :return: True for the timestamp columns.
+    :rtype: bool
+    """
+    return column == 'time' or column.endswith('Time') or column.endswith('Runway')
+
+
+def arrow_schema(columns: list[str]):
+    """
+    Stable Arrow schema of the export, the same for every chunk (a column that is empty in one chunk
+    must not change its type).
+
+    :param columns: Column names of the CSV.
+    :type columns: list[str]
+    :return: Schema with the partition columns.
+    :rtype: pyarrow.Schema
+    """
+    import pyarrow as pa
+
+    fields = []
+    for column in columns:
+        if is_time_column(column):
+            fields.append((column, pa.timestamp('ns')))
+        elif column in NUMERIC_COLUMNS:
+            fields.append((column, pa.float64()))
+        else:
+            fields.append((column, pa.dictionary(pa.int32(), pa.string())))
+    return pa.schema(fields + [(col, pa.string()) for col in PARTITION_COLUMNS])
+
+
+def partitioning():
+    """
+    :return: Hive partitioning by month ('2025-01') and airport ('PRG').
+    :rtype: pyarrow.dataset.Partitioning
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    return ds.partitioning(pa.schema([(col, pa.string()) for col in PARTITION_COLUMNS]), flavor='hive')
+
+
+def _typed_chunk(chunk: pd.DataFrame, kind: str, airport_code: str = None) -> pd.DataFrame:
+    """
+    Converts the text columns of a CSV chunk to their storage types and adds the partition columns.
+    """
+    for column in chunk.columns:
+        if is_time_column(column):
+            chunk[column] = pd.to_datetime(chunk[column], errors='coerce')
+        elif column in NUMERIC_COLUMNS:
+            chunk[column] = pd.to_numeric(chunk[column], errors='coerce')
+        else:
+            chunk[column] = chunk[column].astype('category')
+
+    time_column, airport_column = KINDS[kind]
+    chunk['month'] = chunk[time_column].dt.strftime('%Y-%m').fillna('unknown')
+    if airport_column is not None and airport_column in chunk:
+        chunk['airport'] = chunk[airport_column].astype('string').str.upper().fillna(airport_code or 'unknown')
+    else:
+        chunk['airport'] = airport_code or 'unknown'
+    return chunk
+
+
+def convert_csv(csv_path: Path, dataset_dir: Path, kind: str, airport_code: str = None,
+                chunksize: int = CHUNKSIZE) -> int:
+    """
+    Converts a raw CSV export to a partitioned Parquet dataset, chunk by chunk.
+    Files converted earlier from the same CSV are replaced.
+
+    :param csv_path: Raw CSV export.
+    :type csv_path: Path
+    :param dataset_dir: Root directory of the dataset (one per kind).
+    :type dataset_dir: Path
+    :param kind: 'departures', 'arrivals' or 'weather'.
+    :type kind: str
+    :param airport_code: Airport of the rows without an airport column (weather).
+    :type airport_code: str
+    :param chunksize: Rows per CSV chunk.
+    :type chunksize: int
+    :return: Number of converted rows.
+    :rtype: int
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    if kind not in KINDS:
+        raise ValueError(f'Unknown kind "{kind}", use one of {tuple(KINDS)}.')
+
+    csv_path, dataset_dir = Path(csv_path), Path(dataset_dir)
+    for old_file in dataset_dir.glob(f'**/{csv_path.stem}-*.parquet'):
+        old_file.unlink()
+
+    columns = list(pd.read_csv(csv_path, nrows=0).columns)
+    schema = arrow_schema(columns)
+
+    rows = 0
+    # everything is read as text and typed in _typed_chunk, pandas does not guess per chunk
+    for i, chunk in enumerate(pd.read_csv(csv_path, dtype=str, chunksize=chunksize)):
+        table = pa.Table.from_pandas(_typed_chunk(chunk, kind, airport_code), schema=schema, preserve_index=False)
+        ds.write_dataset(
+            table, dataset_dir, format='parquet', partitioning=partitioning(),
+            basename_template=f'{csv_path.stem}-{i}-{{i}}.parquet', existing_data_behavior='overwrite_or_ignore',
+        )
+        rows += len(chunk)
+    return rows
+
+
+def is_dataset(path: Path) -> bool:
+    """
+    :param path: Path of a CSV export or of a Parquet dataset.
+    :type path: Path
+    :return: True if the path is a Parquet dataset (directory).
+    :rtype: bool
+    """
+    return Path(path).is_dir()
+
+
+def dataset_filter(airport_code: str = None, start_month: str = None, end_month: str = None):
+    """
+    Partition filter pushed down to the dataset scan - files of other airports and months are not read.
+
+    :param airport_code: Only this airport.
+    :type airport_code: str
+    :param start_month: First month ('2025-01'), inclusive.
+    :type start_month: str
+    :param end_month: Last month ('2025-04'), inclusive.
+    :type end_month: str
+    :return: Filter expression or None for everything.
+    :rtype: pyarrow.dataset.Expression | None
+    """
+    import pyarrow.dataset as ds
+
+    conditions = []
+    if airport_code is not None:
+        conditions.append(ds.field('airport') == airport_code.upper())
+    if start_month is not None:
+        conditions.append(ds.field('month') >= start_month)
+    if end_month is not None:
+        conditions.append(ds.field('month') <= end_month)
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def iter_batches(dataset_dir: Path, columns: list[str], batch_size: int = CHUNKSIZE, airport_code: str = None,
+                 start_month: str = None, end_month: str = None) -> Iterator[pd.DataFrame]:
+    """
+    Reads the dataset in batches, only the given columns of the matching partitions.
+
+    :param dataset_dir: Root directory of the dataset.
+    :type dataset_dir: Path
+    :param columns: Columns to read.
+    :type columns: list[str]
+    :param batch_size: Maximal rows per batch.
+    :type batch_size: int
+    :param airport_code: Only this airport.
+    :type airport_code: str
+    :param start_month: First month ('2025-01'), inclusive.
+    :type start_month: str
+    :param end_month: Last month, inclusive.
+    :type end_month: str
+    :return: Iterator of dataframes.
+    :rtype: Iterator[pd.DataFrame]
+    """
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(dataset_dir, format='parquet', partitioning=partitioning())
+    scanner = dataset.scanner(
+        columns=list(columns), filter=dataset_filter(airport_code, start_month, end_month), batch_size=batch_size
+    )
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def read_dataset(dataset_dir: Path, columns: list[str] = None, airport_code: str = None,
+                 start_month: str = None, end_month: str = None) -> pd.DataFrame:
+    """
+    Reads the dataset into one dataframe, see iter_batches.
+
+    :param dataset_dir: Root directory of the dataset.
+    :type dataset_dir: Path
+    :param columns: Columns to read, all by default.
+    :type columns: list[str]
+    :param airport_code: Only this airport.
+    :type airport_code: str
+    :param start_month: First month ('2025-01'), inclusive.
+    :type start_month: str
+    :param end_month: Last month, inclusive.
+    :type end_month: str
+    :return: Typed data, the string columns are categorical.
+    :rtype: pd.DataFrame
+    """
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(dataset_dir, format='parquet', partitioning=partitioning())
+    table = dataset.to_table(columns=columns, filter=dataset_filter(airport_code, start_month, end_month))
+    return table.to_pandas()
+
+
+def main(argv: list[str] = None):
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description='Converts a raw CSV export to a partitioned Parquet dataset.')
+    parser.add_argument('kind', choices=tuple(KINDS))
+    parser.add_argument('csv', type=Path)
+    parser.add_argument('output', type=Path, help='Root directory of the dataset.')
+    parser.add_argument('--airport', help='Airport of the rows without an airport column (weather).')
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE)
+    args = parser.parse_args(argv)
+
+    rows = convert_csv(args.csv, args.output, args.kind, args.airport, args.chunksize)
+    print(f'Converted {rows} rows to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
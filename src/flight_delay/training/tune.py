@@ -0,0 +1,349 @@
+"""
+Hyperparameter search of the delay model. Replaces the ParameterGrid loop of the notebook.
+
+    python -m flight_delay.training.tune [--data data/processed/training.parquet] [--workers 4] [--save-model]
+
+- Trials run in a process pool, every trial uses at most threads_per_trial XGBoost threads.
+- The number of boosting rounds is not searched, every trial stops early on the validation MAE.
+- Successive halving: all the configurations get a small budget of rounds, only the best 1/reduction
+  of every rung continue with reduction times more rounds, up to max_rounds. A trial that stopped early
+  within its budget would stop at the same round with a bigger one, its result is carried over untrained.
+- Finished trials are appended to a JSON lines file, an interrupted search resumes where it stopped
+  (a trial is identified by its parameters, budget, seed and the training set file).
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from pathlib import Path
+from flight_delay.training.dataset import (
+    PROCESSED_DIR, RANDOM_SEED, encode_categories, load_training_set, save_artifacts, split_dataset
+)
+
+PARAM_GRID = {
+    'max_depth': [5, 6, 7, 8, 9],
+    'learning_rate': [0.02, 0.05, 0.1],
+}
+
+# Fixed parameters of the notebook
+BASE_PARAMS = {'subsample': 0.8, 'colsample_bytree': 0.8, 'random_state': 42}
+
+MIN_ROUNDS = 50
+MAX_ROUNDS = 500
+REDUCTION = 3
+EARLY_STOPPING_ROUNDS = 20
+
+# Training data of the worker process, loaded once per worker (see _init_worker)
+_split = None
+
+
+def param_combinations(grid: dict = PARAM_GRID) -> list[dict]:
+    """
+    :param grid: {parameter: list of values}
+    :type grid: dict
+    :return: All the combinations of the grid.
+    :rtype: list[dict]
+    """
+    return [dict(zip(grid, values)) for values in product(*grid.values())]
+
+
+def rung_budgets(min_rounds: int = MIN_ROUNDS, max_rounds: int = MAX_ROUNDS, reduction: int = REDUCTION) -> list[int]:
+    """
+    Boosting rounds of the successive halving rungs, e.g. 50, 150, 450, 500.
+
+    :param min_rounds: Budget of the first rung.
+    :type min_rounds: int
+    :param max_rounds: Budget of the last rung.
+    :type max_rounds: int
+    :param reduction: Growth of the budget (and shrinking of the configurations) per rung.
+    :type reduction: int
+    :return: Budgets of the rungs.
+    :rtype: list[int]
+    """
+    budgets = []
+    rounds = min_rounds
+    while rounds < max_rounds:
+        budgets.append(rounds)
+        rounds *= reduction
+    budgets.append(max_rounds)
+    return budgets
+
+
+class TrialStore:
+    """
+    Finished trials in a JSON lines file. Written only by the parent process.
+    """
+
+    def __init__(self, path: Path):
+        """
+        :param path: JSON lines file, created on the first trial.
+        :type path: Path
+        """
+        self.path = Path(path)
+        self._trials = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    # a line cut off by an interrupted write is skipped, the trial runs again
+                    try:
+                        trial = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._trials[trial['key']] = trial
+
+    def get(self, key: str) -> dict | None:
+        """
+        :param key: Trial key (see trial_key).
+        :type key: str
+        :return: Finished trial or None.
+        :rtype: dict | None
+        """
+        return self._trials.get(key)
+
+    def add(self, trial: dict):
+        """
+        :param trial: Finished trial with its 'key'.
+        :type trial: dict
+        """
+        self._trials[trial['key']] = trial
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(trial) + '\n')
+
+    def __len__(self):
+        return len(self._trials)
+
+
+def stopped_early(trial: dict) -> bool:
+    """
+    :param trial: Finished trial.
+    :type trial: dict
+    :return: True if the trial stopped early before its budget ran out - the same configuration
+             with more rounds ends at the same best iteration.
+    :rtype: bool
+    """
+    return trial['best_iteration'] + 1 + EARLY_STOPPING_ROUNDS <= trial['rounds']
+
+
+def data_fingerprint(path: Path) -> str:
+    """
+    Identifies the version of the training set file (path, size and modification time).
+    """
+    stat = Path(path).stat()
+    return f'{Path(path).resolve()}:{stat.st_size}:{stat.st_mtime_ns}'
+
+
+def trial_key(params: dict, rounds: int, seed: int, fingerprint: str) -> str:
+    """
+    :return: Key of the trial in the TrialStore.
+    :rtype: str
+    """
+    payload = json.dumps({'params': params, 'rounds': rounds, 'seed': seed, 'data': fingerprint}, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def load_split(data_path: Path, seed: int = RANDOM_SEED) -> tuple:
+    """
+    :return: Xtrain, Xval, Xtest, ytrain, yval, ytest and the categories of the encoding.
+    :rtype: tuple
+    """
+    df, categories = encode_categories(load_training_set(data_path))
+    return (*split_dataset(df, seed=seed), categories)
+
+
+def _init_worker(data_path: Path, seed: int):
+    """
+    Loads the training and validation set once per worker process.
+    """
+    global _split
+    xtrain, xval, _, ytrain, yval, _, _ = load_split(data_path, seed)
+    _split = (xtrain, xval, ytrain, yval)
+
+
+def make_model(params: dict, rounds: int, base_score: float, n_jobs: int, early_stopping: bool = True):
+    """
+    :return: XGBRegressor of the trial.
+    :rtype: xgboost.XGBRegressor
+    """
+    from xgboost import XGBRegressor
+
+    return XGBRegressor(
+        n_estimators=rounds,
+        base_score=base_score,
+        n_jobs=n_jobs,
+        eval_metric='mae',
+        early_stopping_rounds=EARLY_STOPPING_ROUNDS if early_stopping else None,
+        **BASE_PARAMS,
+        **params,
+    )
+
+
+def run_trial(params: dict, rounds: int, n_jobs: int = 1) -> dict:
+    """
+    Trains one configuration with at most `rounds` boosting rounds, stopping early on the validation MAE.
+    Runs in a worker process (see _init_worker).
+
+    :param params: Searched parameters.
+    :type params: dict
+    :param rounds: Maximal number of boosting rounds.
+    :type rounds: int
+    :param n_jobs: XGBoost threads of the trial.
+    :type n_jobs: int
+    :return: Validation MAE ('score') and the best number of rounds ('best_iteration').
+    :rtype: dict
+    """
+    xtrain, xval, ytrain, yval = _split
+    model = make_model(params, rounds, float(ytrain.mean()), n_jobs)
+    model.fit(xtrain, ytrain, eval_set=[(xval, yval)], verbose=False)
+    return {'score': float(model.best_score), 'best_iteration': int(model.best_iteration)}
+
+
+def tune(data_path: Path, results_path: Path, workers: int = None, threads_per_trial: int = 1,
+         grid: dict = PARAM_GRID, min_rounds: int = MIN_ROUNDS, max_rounds: int = MAX_ROUNDS,
+         reduction: int = REDUCTION, prune: bool = True, seed: int = RANDOM_SEED) -> dict:
+    """
+    Runs the search and returns the best trial.
+
+    :param data_path: Training set (see dataset.build_training_set).
+    :type data_path: Path
+    :param results_path: JSON lines file with the finished trials, reused to resume.
+    :type results_path: Path
+    :param workers: Number of worker processes, defaults to CPU count / threads_per_trial.
+    :type workers: int
+    :param threads_per_trial: XGBoost threads of one trial.
+    :type threads_per_trial: int
+    :param grid: {parameter: list of values}
+    :type grid: dict
+    :param min_rounds: Budget of the first successive halving rung.
+    :type min_rounds: int
+    :param max_rounds: Maximal number of boosting rounds.
+    :type max_rounds: int
+    :param reduction: Successive halving factor.
+    :type reduction: int
+    :param prune: False trains every configuration with max_rounds.
+    :type prune: bool
+    :param seed: Random state of the train / validation split.
+    :type seed: int
+    :return: Best trial of the last rung - 'params', 'rounds', 'score', 'best_iteration'.
+    :rtype: dict
+    """
+    workers = workers or max(1, (os.cpu_count() or 1) // threads_per_trial)
+    store = TrialStore(results_path)
+    fingerprint = data_fingerprint(data_path)
+
+    budgets = rung_budgets(min_rounds, max_rounds, reduction) if prune else [max_rounds]
+    configurations = param_combinations(grid)
+    # {parameters: trial of the previous rung}
+    previous = {}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data_path, seed)) as pool:
+        for rung, rounds in enumerate(budgets):
+            trials = []
+            pending = {}
+            carried = 0
+            for params in configurations:
+                key = trial_key(params, rounds, seed, fingerprint)
+                trial = store.get(key)
+                last = previous.get(json.dumps(params, sort_keys=True))
+                if trial is None and last is not None and stopped_early(last):
+                    trial = {**last, 'key': key, 'rounds': rounds}
+                    store.add(trial)
+                    carried += 1
+                if trial is None:
+                    pending[key] = (params, pool.submit(run_trial, params, rounds, threads_per_trial))
+                else:
+                    trials.append(trial)
+
+            for key, (params, future) in pending.items():
+                trial = {'key': key, 'params': params, 'rounds': rounds, **future.result()}
+                store.add(trial)
+                trials.append(trial)
+
+            trials.sort(key=lambda t: t['score'])
+            print(f'rung {rung}: {len(configurations)} configurations x {rounds} rounds '
+                  f'({len(configurations) - len(pending) - carried} resumed) ({carried} carried over), '
+                  f'best MAE {trials[0]["score"]:.3f} {trials[0]["params"]}')
+
+            keep = max(1, math.ceil(len(trials) / reduction))
+            configurations = [trial['params'] for trial in trials[:keep]]
+            previous = {json.dumps(trial['params'], sort_keys=True): trial for trial in trials[:keep]}
+
+    return trials[0]
+
+
+def train_final(data_path: Path, best: dict, models_dir: Path, processed_dir: Path = PROCESSED_DIR,
+                seed: int = RANDOM_SEED, n_jobs: int = None):
+    """
+    Trains the model with the best parameters and the best number of rounds, saves it with its artifacts
+    (joblib, native formats, fill_values.json, categories.json) and prints the validation and test errors.
+
+    :param data_path: Training set.
+    :type data_path: Path
+    :param best: Best trial (see tune).
+    :type best: dict
+    :param models_dir: Output directory of the model.
+    :type models_dir: Path
+    :param processed_dir: Output directory of the preprocessing artifacts.
+    :type processed_dir: Path
+    :param seed: Random state of the split.
+    :type seed: int
+    :param n_jobs: XGBoost threads.
+    :type n_jobs: int
+    """
+    import joblib
+    from sklearn.metrics import mean_absolute_error, root_mean_squared_error
+    from flight_delay.predictor import MODEL_NAME, export_model
+
+    xtrain, xval, xtest, ytrain, yval, ytest, categories = load_split(data_path, seed)
+    model = make_model(best['params'], best['best_iteration'] + 1, float(ytrain.mean()), n_jobs, early_stopping=False)
+    model.fit(xtrain, ytrain)
+
+    for name, x, y in [('Valid', xval, yval), ('Test', xtest, ytest)]:
+        prediction = model.predict(x)
+        print(f'MAE ({name}): {mean_absolute_error(y, prediction):.3f} minutes, '
+              f'RMSE ({name}): {root_mean_squared_error(y, prediction):.3f} minutes')
+
+    models_dir = Path(models_dir)
+    models_dir.mkdir(parents=True, exist_ok=True)
+    joblib.dump(model, models_dir / f'{MODEL_NAME}.joblib')
+    export_model(model, models_dir)
+    save_artifacts(xtrain, categories, processed_dir)
+    print(f'Saved the model to {models_dir} and the artifacts to {processed_dir}')
+
+
+def main(argv: list[str] = None):
+    """
+    Command line entry point.
+    """
+    from flight_delay.predictor import MODELS_DIR
+
+    parser = argparse.ArgumentParser(description='Hyperparameter search of the delay model.')
+    parser.add_argument('--data', type=Path, default=PROCESSED_DIR / 'training.parquet')
+    parser.add_argument('--results', type=Path, default=PROCESSED_DIR / 'tune_trials.jsonl',
+                        help='Finished trials, an interrupted search resumes from them.')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count / threads per trial).')
+    parser.add_argument('--threads-per-trial', type=int, default=1)
+    parser.add_argument('--min-rounds', type=int, default=MIN_ROUNDS)
+    parser.add_argument('--max-rounds', type=int, default=MAX_ROUNDS)
+    parser.add_argument('--reduction', type=int, default=REDUCTION)
+    parser.add_argument('--no-prune', action='store_true', help='Train every configuration with max rounds.')
+    parser.add_argument('--save-model', action='store_true', help='Train the best configuration and save it.')
+    parser.add_argument('--models-dir', type=Path, default=MODELS_DIR)
+    args = parser.parse_args(argv)
+
+    best = tune(
+        args.data, args.results, args.workers, args.threads_per_trial, min_rounds=args.min_rounds,
+        max_rounds=args.max_rounds, reduction=args.reduction, prune=not args.no_prune
+    )
+    print(f'Best: {best["params"]}, {best["best_iteration"] + 1} rounds, validation MAE {best["score"]:.3f}')
+
+    if args.save_model:
+        train_final(args.data, best, args.models_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,7 +7,8 @@ from datetime import date
 import streamlit as st
 import pandas as pd
 import pydeck as pdk
-from flight_delay.services import get_timetable_df
+from flight_delay.services import get_timetable_refresher
+from flight_delay.utils.dicts import SUPPORTED_AIRPORTS
 
 st.markdown(
     '''
@@ -26,20 +27,18 @@ def render_header():
     """
     st.title('Flight Delay Prediction')
     st.caption('@tichytadeas')
-    st.caption('BETA: Prediction works only for flights departuring TODAY from PRG Airport')
+    st.caption('BETA: Prediction works only for flights departuring TODAY. The model is trained on PRG Airport data')
 
 def render_airport_select() -> str:
     """
-    Renders a selectbox for choosing the departure airport. 
-    There is only 'PRG' airport. I made this function for better scalability.
+    Renders a selectbox for choosing the departure airport.
+    The airports are listed in SUPPORTED_AIRPORTS (utils/dicts.py), PRG is the default.
 
     :return: IATA code of the selected airport
     :rtype: str
     """
-    # Scaling: Add more airports.
-    airports = ['Prague International Airport (PRG)']
-    airport_codes = {'Prague International Airport (PRG)' : 'PRG'}
-    selected_airport = st.selectbox('Departure Airport', airports)
+    airport_codes = {f'{name} ({code})': code for code, name in SUPPORTED_AIRPORTS.items()}
+    selected_airport = st.selectbox('Departure Airport', list(airport_codes))
     return airport_codes.get(selected_airport)
 
 def color_status_text(val: str) -> str:
@@ -63,13 +62,19 @@ def color_status_text(val: str) -> str:
     return colors.get(val, 'color: gray;')
 
 
-def render_timetable(df : pd.DataFrame):
+def timetable_view(df: pd.DataFrame, predicted_delays: pd.Series = None, now: pd.Timestamp = None) -> pd.DataFrame | None:
     """
-    Processes the timetable dataframe and renders departure table.
-    Displays only todays flights that has not left yet.
-    
+    Preprocessing of the departures board without Streamlit.
+    Keeps only todays flights that have not left yet and the displayed columns.
+
     :param df: Raw timetable dataframe
     :type df: pd.DataFrame
+    :param predicted_delays: Precomputed delays with the index of df (see services.get_forecasts), adds a column.
+    :type predicted_delays: pd.Series
+    :param now: Current time (UTC), the current time by default.
+    :type now: pd.Timestamp
+    :return: Rows and columns of the board, None if df is missing some required columns.
+    :rtype: pd.DataFrame | None
     """
     required_cols = [
         'departure.scheduledTime',
@@ -81,8 +86,7 @@ def render_timetable(df : pd.DataFrame):
 
     missing = [c for c in required_cols if c not in df.columns]
     if missing:
-        st.warning('Timetable rendering failed. Dataframe is missing some required columns.')
-        return
+        return None
 
     df = df.copy()
 
@@ -90,11 +94,12 @@ def render_timetable(df : pd.DataFrame):
         df['departure.scheduledTime'], utc=True, errors='coerce'
     )
 
-    now = pd.Timestamp.now(tz='UTC')
+    today = date.today() if now is None else now.date()
+    now = pd.Timestamp.now(tz='UTC') if now is None else now
     df = df[df['departure.scheduledTime'] >= now]
 
     # only todays flights
-    df = df[df['departure.scheduledTime'].dt.date == date.today()]
+    df = df[df['departure.scheduledTime'].dt.date == today]
     df = df[df['flight.iataNumber'].notna() & (df['flight.iataNumber'].str.strip() != '')]
 
     df['Scheduled Time'] = df['departure.scheduledTime'].dt.strftime('%H:%M')
@@ -104,7 +109,29 @@ def render_timetable(df : pd.DataFrame):
     df['Destination Airport'] = df['arrival.iataCode']
 
 
-    df_render = df[['Status', 'Scheduled Time', 'Flight Number', 'Airline', 'Destination Airport']]
+    columns = ['Status', 'Scheduled Time', 'Flight Number', 'Airline', 'Destination Airport']
+    if predicted_delays is not None:
+        delays = predicted_delays.reindex(df.index)
+        df['Predicted Delay'] = [f'{delay} min' if not pd.isna(delay) else '' for delay in delays]
+        columns.append('Predicted Delay')
+
+    return df[columns]
+
+
+def render_timetable(df : pd.DataFrame, predicted_delays: pd.Series = None):
+    """
+    Processes the timetable dataframe and renders departure table.
+    Displays only todays flights that has not left yet.
+    
+    :param df: Raw timetable dataframe
+    :type df: pd.DataFrame
+    :param predicted_delays: Precomputed delays with the index of df (see services.get_forecasts), adds a column.
+    :type predicted_delays: pd.Series
+    """
+    df_render = timetable_view(df, predicted_delays)
+    if df_render is None:
+        st.warning('Timetable rendering failed. Dataframe is missing some required columns.')
+        return
 
     df_styled = df_render.style.map(
         color_status_text, subset=['Status'],
@@ -236,21 +263,32 @@ def render_prediction_form():
     return flight_number_input, flight_date_input, submitted
 
 
-def render_refresh_button(airport_code: str, timetable_df: pd.DataFrame):
+def render_timetable_age(fetched_at: pd.Timestamp):
+    """
+    Renders how old the shown timetable is.
+
+    :param fetched_at: Time the timetable was fetched (UTC).
+    :type fetched_at: pd.Timestamp
+    """
+    if fetched_at is None:
+        return
+    minutes = int((pd.Timestamp.now(tz='UTC') - fetched_at).total_seconds() // 60)
+    if minutes < 1:
+        st.caption('Timetable updated just now')
+    else:
+        st.caption(f'Timetable updated {minutes} min ago')
+
+
+def render_refresh_button(airport_code: str):
     """
     Renders a button to refresh the flight timetable data.
     
-    After clicking it clears the cache, fetches new data and updates the session state.
+    After clicking it asks the background refresher to fetch a new timetable.
+    The current timetable stays visible until the new one is ready.
 
     :param airport_code: IATA code of the selected airport.
     :type airport_code: str
-    :param timetable_df: Current timetable (before refreshing).
-    :type timetable_df: pd.DataFrame
     """
     if st.button(f'Refresh timetable for **{airport_code}**'):
-        get_timetable_df.clear()
-        new_timetable_df = get_timetable_df(airport_code=airport_code, timetable_type='departure')
-        if new_timetable_df.equals(timetable_df):
-            st.toast('Timetable is already up-to-date!', icon='✔️', duration=2)
-        if not new_timetable_df.empty:
-            st.session_state['timetable_df'] = new_timetable_df
+        get_timetable_refresher(airport_code).request_refresh()
+        st.toast('Refreshing timetable in the background...', icon='🔄', duration=2)
@@ -0,0 +1,212 @@
+"""
+In-process caching of the core functions without Streamlit.
+Works in the app, in CLI scripts and in background threads alike.
+Caches can be bounded by the number of entries and by the estimated memory of the cached values,
+the least recently used entries (e.g. airports nobody asked for lately) are evicted first.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+import numpy as np
+from flight_delay.utils import metrics
+
+
+def _freeze(value):
+    """
+    Makes dict / list arguments hashable, so they can be part of the cache key.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def estimate_size(value) -> int:
+    """
+    Rough memory footprint of a cached value in bytes.
+    Dataframes and arrays are measured, containers are summed recursively.
+
+    :param value: Cached value.
+    :return: Estimated size in bytes.
+    :rtype: int
+    """
+    if hasattr(value, 'memory_usage') and hasattr(value, 'columns'):
+        # deep=False - object columns would be walked element by element
+        return int(value.memory_usage(index=True, deep=False).sum())
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sys.getsizeof(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """
+    Thread-safe LRU mapping bounded by the number of entries and / or their estimated size.
+    Counts the hits and misses of get, see stats. Named caches are reported by the metrics endpoint.
+    """
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None, name: str = None):
+        """
+        :param max_entries: Maximal number of entries, unbounded if None.
+        :type max_entries: int
+        :param max_bytes: Maximal estimated size of the values, unbounded if None.
+        :type max_bytes: int
+        :param name: Name of the cache in the metrics, not reported if None.
+        :type name: str
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if name is not None:
+            metrics.register_cache(name, self)
+
+    def get(self, key, default=None):
+        """
+        :param key: Cache key.
+        :param default: Returned when the key is missing.
+        :return: Cached value, marked as recently used.
+        """
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def count_stale(self):
+        """
+        Counts the last hit of get as a miss, for values found but no longer valid (e.g. expired).
+        """
+        with self._lock:
+            self.hits -= 1
+            self.misses += 1
+
+    def set(self, key, value):
+        """
+        Stores the value and evicts the least recently used entries over the limits.
+        The newest entry is always kept, even if it alone is over max_bytes.
+
+        :param key: Cache key.
+        :param value: Value to cache.
+        """
+        size = estimate_size(value) if self.max_bytes is not None else 0
+        with self._lock:
+            if key in self._data:
+                self._bytes -= self._sizes.pop(key)
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self._sizes[key] = size
+            self._bytes += size
+
+            while len(self._data) > 1 and (
+                (self.max_entries is not None and len(self._data) > self.max_entries)
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                old_key, _ = self._data.popitem(last=False)
+                self._bytes -= self._sizes.pop(old_key)
+
+    def pop(self, key, default=None):
+        """
+        Removes the key.
+
+        :return: The removed value or default.
+        """
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._bytes -= self._sizes.pop(key)
+            return self._data.pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def keys(self) -> list:
+        """
+        :return: Keys from the least to the most recently used.
+        :rtype: list
+        """
+        with self._lock:
+            return list(self._data)
+
+    def stats(self) -> dict:
+        """
+        :return: Number of entries, their estimated size, hits, misses and the hit rate of get.
+        :rtype: dict
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+            }
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Estimated size of the cached values (0 if the cache is not bounded by size).
+        """
+        return self._bytes
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+def ttl_cache(ttl: float, max_entries: int = None, max_bytes: int = None, name: str = None):
+    """
+    Caches the results of the function per arguments for ttl seconds (like st.cache_data(ttl=...)).
+    Optionally bounded like LRUCache. Exceptions are not cached.
+    The cached objects are shared, treat them as read-only. The decorated function has cache_clear().
+
+    :param ttl: Time to live of a result in seconds.
+    :type ttl: float
+    :param max_entries: Maximal number of cached results (e.g. one per airport).
+    :type max_entries: int
+    :param max_bytes: Maximal estimated size of the cached results.
+    :type max_bytes: int
+    :param name: Name of the cache in the metrics, the function name by default.
+    :type name: str
+    """
+    def decorator(func):
+        cache = LRUCache(max_entries=max_entries, max_bytes=max_bytes, name=name or func.__name__)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (_freeze(args), _freeze(kwargs))
+            now = time.monotonic()
+            hit = cache.get(key)
+            if hit is not None and hit[0] > now:
+                return hit[1]
+            if hit is not None:
+                cache.count_stale()
+
+            result = func(*args, **kwargs)
+            cache.set(key, (now + ttl, result))
+            return result
+
+        wrapper.cache_clear = cache.clear
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
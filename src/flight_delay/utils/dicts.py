@@ -218,3 +218,35 @@ ADDITIONAL_AIRPORT_COORDS = {
 }
 
 AIRPORT_COORDS.update(ADDITIONAL_AIRPORT_COORDS)
+
+# Departure airports offered in the app, PRG first (the model is trained on PRG data)
+SUPPORTED_AIRPORTS = {
+    'PRG': 'Prague International Airport',
+    'VIE': 'Vienna International Airport',
+    'FRA': 'Frankfurt Airport',
+    'MUC': 'Munich Airport',
+    'AMS': 'Amsterdam Schiphol Airport',
+    'CDG': 'Paris Charles de Gaulle Airport',
+    'LHR': 'London Heathrow Airport',
+    'MAD': 'Adolfo Suárez Madrid-Barajas Airport',
+    'BCN': 'Barcelona-El Prat Airport',
+    'FCO': 'Rome Fiumicino Airport',
+    'ZRH': 'Zurich Airport',
+    'WAW': 'Warsaw Chopin Airport',
+}
+
+# Local timezone of the supported airports - timetables and forecasts are in local time, weather history in UTC
+AIRPORT_TIMEZONES = {
+    'PRG': 'Europe/Prague',
+    'VIE': 'Europe/Vienna',
+    'FRA': 'Europe/Berlin',
+    'MUC': 'Europe/Berlin',
+    'AMS': 'Europe/Amsterdam',
+    'CDG': 'Europe/Paris',
+    'LHR': 'Europe/London',
+    'MAD': 'Europe/Madrid',
+    'BCN': 'Europe/Madrid',
+    'FCO': 'Europe/Rome',
+    'ZRH': 'Europe/Zurich',
+    'WAW': 'Europe/Warsaw',
+}
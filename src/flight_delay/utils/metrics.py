@@ -0,0 +1,325 @@
+"""
+Lightweight metrics of the prediction path, no dependency.
+
+The stages (fetching the timetable, arrivals and weather, building the features, predict) are timed by spans:
+
+    with metrics.span('get_weather'):
+        ...
+
+Upstream API requests are observed in latency histograms and the named caches (LRUCache(name=...), ttl_cache)
+report their hits and misses. render() exports everything in the Prometheus text format -
+GET /metrics of the server, or the local endpoint of serve() for the Streamlit app (FLIGHT_DELAY_METRICS_PORT).
+"""
+
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+PREFIX = 'flight_delay_'
+
+# Upper bounds of the latency buckets in seconds, +Inf is added
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Port of the local metrics endpoint of the app (127.0.0.1), 0 disables it
+METRICS_PORT = int(os.environ.get('FLIGHT_DELAY_METRICS_PORT', 0))
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+HELP = {
+    'stage_seconds': 'Duration of the stages of the prediction path.',
+    'upstream_seconds': 'Latency of the upstream API requests.',
+    'upstream_errors_total': 'Failed upstream API requests.',
+    'response_cache_total': 'Lookups of the persistent response cache.',
+    'cache_hits_total': 'Hits of the in-process caches.',
+    'cache_misses_total': 'Misses of the in-process caches.',
+    'cache_entries': 'Entries of the in-process caches.',
+    'cache_bytes': 'Estimated size of the in-process caches bounded by memory.',
+}
+
+
+class Histogram:
+    """
+    Counts of the observed values per bucket, their sum and count. Thread-safe.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS):
+        """
+        :param buckets: Upper bounds of the buckets, ascending.
+        :type buckets: tuple[float, ...]
+        """
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """
+        :param value: Observed value, e.g. a duration in seconds.
+        :type value: float
+        """
+        with self._lock:
+            self._counts[bisect_left(self.buckets, value)] += 1
+            self._sum += value
+
+    def snapshot(self) -> tuple[list[int], float, int]:
+        """
+        :return: Cumulative counts per bucket (the last one is +Inf), the sum and the count.
+        :rtype: tuple[list[int], float, int]
+        """
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative = []
+        running = 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+
+def _labels(labels: tuple) -> str:
+    """
+    Formats the (name, value) pairs as {name="value",...}.
+    """
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class Metrics:
+    """
+    Histograms, counters and the registered caches of the process.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS):
+        """
+        :param buckets: Upper bounds of the histogram buckets in seconds.
+        :type buckets: tuple[float, ...]
+        """
+        self.buckets = buckets
+        # {(name, labels): Histogram}
+        self._histograms = {}
+        # {(name, labels): value}
+        self._counters = {}
+        # {cache name: weak reference to an object with stats()}
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, **labels):
+        """
+        Adds the value to the histogram of the name and labels.
+
+        :param name: Metric name without the prefix, e.g. 'upstream_seconds'.
+        :type name: str
+        :param value: Observed value.
+        :type value: float
+        """
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(self.buckets))
+        histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """
+        Increases the counter of the name and labels.
+
+        :param name: Metric name without the prefix, e.g. 'upstream_errors_total'.
+        :type name: str
+        :param value: Increment.
+        :type value: float
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def span(self, stage: str):
+        """
+        Times the block into the 'stage_seconds' histogram, also when it raises.
+
+        :param stage: Name of the stage, e.g. 'get_weather'.
+        :type stage: str
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - start, stage=stage)
+
+    def register_cache(self, name: str, cache):
+        """
+        Reports the hits, misses and size of the cache. A cache of the same name replaces the previous one,
+        the cache is not kept alive by the registration.
+
+        :param name: Cache name, the 'cache' label.
+        :type name: str
+        :param cache: Cache with stats() like LRUCache.
+        """
+        with self._lock:
+            self._caches[name] = weakref.ref(cache)
+
+    def histogram(self, name: str, **labels) -> Histogram | None:
+        """
+        :return: Histogram of the name and labels, None if nothing was observed.
+        :rtype: Histogram | None
+        """
+        return self._histograms.get((name, tuple(sorted(labels.items()))))
+
+    def counter(self, name: str, **labels) -> float:
+        """
+        :return: Value of the counter, 0 if it was not increased.
+        :rtype: float
+        """
+        return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def cache_stats(self) -> dict[str, dict]:
+        """
+        :return: {cache name: stats} of the caches that still exist.
+        :rtype: dict[str, dict]
+        """
+        with self._lock:
+            caches = {name: ref() for name, ref in self._caches.items()}
+            for name in [name for name, cache in caches.items() if cache is None]:
+                del self._caches[name]
+        return {name: cache.stats() for name, cache in sorted(caches.items()) if cache is not None}
+
+    def render(self) -> str:
+        """
+        :return: All the metrics in the Prometheus text format (version 0.0.4).
+        :rtype: str
+        """
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        lines = []
+
+        def header(name: str, kind: str):
+            lines.append(f'# HELP {PREFIX}{name} {HELP.get(name, name)}')
+            lines.append(f'# TYPE {PREFIX}{name} {kind}')
+
+        last = None
+        for (name, labels), histogram in histograms:
+            if name != last:
+                header(name, 'histogram')
+                last = name
+            cumulative, total, count = histogram.snapshot()
+            for bound, value in zip([*histogram.buckets, '+Inf'], cumulative):
+                lines.append(f'{PREFIX}{name}_bucket{_labels((*labels, ("le", bound)))} {value}')
+            lines.append(f'{PREFIX}{name}_sum{_labels(labels)} {total}')
+            lines.append(f'{PREFIX}{name}_count{_labels(labels)} {count}')
+
+        for (name, labels), value in counters:
+            if name != last:
+                header(name, 'counter')
+                last = name
+            lines.append(f'{PREFIX}{name}{_labels(labels)} {value}')
+
+        caches = self.cache_stats()
+        for name, key, kind in [('cache_hits_total', 'hits', 'counter'), ('cache_misses_total', 'misses', 'counter'),
+                                ('cache_entries', 'entries', 'gauge'), ('cache_bytes', 'bytes', 'gauge')]:
+            if caches:
+                header(name, kind)
+            for cache_name, stats in caches.items():
+                lines.append(f'{PREFIX}{name}{_labels((("cache", cache_name),))} {stats[key]}')
+
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        """
+        Drops the observed values, the caches stay registered.
+        """
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """
+    :return: Metrics of the process.
+    :rtype: Metrics
+    """
+    return _metrics
+
+
+def span(stage: str):
+    """
+    Times a stage of the prediction path, see Metrics.span.
+    """
+    return _metrics.span(stage)
+
+
+def timed(stage: str):
+    """
+    Decorator timing every call of the function as the stage.
+
+    :param stage: Name of the stage.
+    :type stage: str
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with _metrics.span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe(name: str, value: float, **labels):
+    _metrics.observe(name, value, **labels)
+
+
+def inc(name: str, value: float = 1, **labels):
+    _metrics.inc(name, value, **labels)
+
+
+def register_cache(name: str, cache):
+    _metrics.register_cache(name, cache)
+
+
+def render() -> str:
+    return _metrics.render()
+
+
+def serve(port: int = METRICS_PORT, host: str = '127.0.0.1'):
+    """
+    Serves render() at http://host:port/metrics from a daemon thread.
+
+    :param port: Port of the endpoint, 0 picks a free one.
+    :type port: int
+    :param host: Interface, only the local one by default.
+    :type host: str
+    :return: Running server, server.server_address has the port.
+    :rtype: http.server.ThreadingHTTPServer
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=httpd.serve_forever, name='metrics-endpoint', daemon=True).start()
+    return httpd
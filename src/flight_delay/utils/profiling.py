@@ -0,0 +1,69 @@
+"""
+Opt-in profiling of a single request.
+
+Disabled unless FLIGHT_DELAY_PROFILING=1. The server then profiles GET /predict?...&profile=true and returns the
+report with the prediction. cProfile is used by default, FLIGHT_DELAY_PROFILER=pyinstrument uses pyinstrument
+(optional dependency, pip install pyinstrument) which also shows the time spent waiting for the APIs.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+from contextlib import contextmanager
+
+PROFILING = os.environ.get('FLIGHT_DELAY_PROFILING', '0').lower() in ('1', 'true', 'yes')
+
+PROFILER = os.environ.get('FLIGHT_DELAY_PROFILER', 'cprofile')
+
+# Functions listed in the cProfile report
+TOP_FUNCTIONS = 30
+
+
+class Capture:
+    """
+    Result of a profiled block, report is filled when the block ends.
+    """
+
+    def __init__(self, profiler: str):
+        self.profiler = profiler
+        self.report = ''
+
+
+@contextmanager
+def capture(profiler: str = PROFILER):
+    """
+    Profiles the block (the current thread only).
+
+    :param profiler: 'cprofile' or 'pyinstrument', cProfile if pyinstrument is not installed.
+    :type profiler: str
+    :return: Capture with the text report after the block.
+    :rtype: Capture
+    """
+    if profiler == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler  # optional dependency
+        except ImportError:
+            print('pyinstrument is not installed, profiling with cProfile.')
+            profiler = 'cprofile'
+
+    result = Capture(profiler)
+    if profiler == 'pyinstrument':
+        profile = Profiler(async_mode='disabled')
+        profile.start()
+        try:
+            yield result
+        finally:
+            profile.stop()
+            result.report = profile.output_text()
+        return
+
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield result
+    finally:
+        profile.disable()
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        result.report = out.getvalue()
@@ -0,0 +1,209 @@
+"""
+Local store of the hourly weather at the departure airports.
+
+The weather history of the raw exports (data/raw/weather_*.csv, UTC) is merged with the multi-day Open-Meteo
+forecast (local time) into a dense hourly array - the weather of any hour is found by its offset from the first hour,
+without a search or a scan. Flights of past and coming days are scored without an API call per flight.
+
+History files: data/raw/weather_<IATA>_*.csv, the files without an airport code belong to the default airport (PRG).
+"""
+
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from flight_delay.airports import DEFAULT_AIRPORT, MAX_AIRPORTS
+from flight_delay.utils.caching import LRUCache
+from flight_delay.utils.dicts import AIRPORT_TIMEZONES, SUPPORTED_AIRPORTS
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+
+RAW_DIR = BASE_DIR / 'data' / 'raw'
+
+HOUR = pd.Timedelta(hours=1)
+
+# Longest span the array may cover, older history is dropped (~10 years, 0.7 MB per weather column)
+MAX_HOURS = 10 * 366 * 24
+
+
+class HourlyWeather:
+    """
+    Weather values of consecutive hours in one float64 array, hours without data are NaN.
+    Read-only, merging creates a new store. Has get like the dict it replaces ({hour: values}).
+    """
+
+    def __init__(self, start: pd.Timestamp, values: np.ndarray, columns: tuple[str, ...]):
+        """
+        :param start: First hour (local time, no timezone).
+        :type start: pd.Timestamp
+        :param values: Array of shape (hours, columns).
+        :type values: np.ndarray
+        :param columns: Names of the weather columns.
+        :type columns: tuple[str, ...]
+        """
+        self.start = start
+        self.values = values
+        self.columns = tuple(columns)
+        self.values.flags.writeable = False
+
+    @classmethod
+    def from_frames(cls, frames: list[pd.DataFrame], columns: tuple[str, ...]) -> 'HourlyWeather':
+        """
+        Builds the store from hourly frames ('time' and the weather columns), later frames win on the same hour.
+
+        :param frames: Hourly weather, e.g. the history and then the forecast.
+        :type frames: list[pd.DataFrame]
+        :param columns: Weather columns to store.
+        :type columns: tuple[str, ...]
+        :return: Weather store, empty if there is no data.
+        :rtype: HourlyWeather
+        """
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return cls(pd.Timestamp(0), np.empty((0, len(columns))), columns)
+
+        df = pd.concat([frame[['time', *columns]] for frame in frames], ignore_index=True)
+        df['time'] = pd.to_datetime(df['time']).dt.round('h')
+        df = df.dropna(subset=['time']).drop_duplicates('time', keep='last')
+
+        end = df['time'].max()
+        df = df[df['time'] > end - MAX_HOURS * HOUR]
+        start = df['time'].min()
+
+        values = np.full(((end - start) // HOUR + 1, len(columns)), np.nan)
+        values[((df['time'] - start) // HOUR).to_numpy()] = df[list(columns)].to_numpy(dtype='float64')
+        return cls(start, values, columns)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def end(self) -> pd.Timestamp | None:
+        """
+        Last hour of the store, None if it is empty.
+        """
+        return self.start + (len(self) - 1) * HOUR if len(self) else None
+
+    def get(self, hour: pd.Timestamp, default=None):
+        """
+        :param hour: Whole hour (local time).
+        :type hour: pd.Timestamp
+        :param default: Returned for hours without data.
+        :return: Weather values in the order of columns.
+        :rtype: tuple | None
+        """
+        if hour is None or pd.isna(hour) or not len(self):
+            return default
+        offset, rest = divmod(hour - self.start, HOUR)
+        if rest or not 0 <= offset < len(self):
+            return default
+        row = self.values[offset]
+        if np.isnan(row).all():
+            return default
+        return tuple(row.tolist())
+
+    def __contains__(self, hour) -> bool:
+        return self.get(hour) is not None
+
+    def lookup(self, hours: pd.Series) -> np.ndarray:
+        """
+        Vectorized get.
+
+        :param hours: Whole hours (local time), may contain NaT.
+        :type hours: pd.Series
+        :return: Array of shape (len(hours), columns), NaN for hours without data.
+        :rtype: np.ndarray
+        """
+        out = np.full((len(hours), len(self.columns)), np.nan)
+        if not len(self):
+            return out
+        offsets = (pd.to_datetime(pd.Series(hours)) - self.start).to_numpy(dtype='timedelta64[ns]')
+        offsets = offsets / np.timedelta64(1, 'h')
+        valid = ~np.isnan(offsets) & (offsets >= 0) & (offsets < len(self)) & (offsets % 1 == 0)
+        out[valid] = self.values[offsets[valid].astype(np.int64)]
+        return out
+
+
+def history_paths(airport_code: str, raw_dir: Path = RAW_DIR) -> list[Path]:
+    """
+    :param airport_code: IATA code of the airport.
+    :type airport_code: str
+    :param raw_dir: Directory with the raw exports.
+    :type raw_dir: Path
+    :return: Weather history files of the airport, oldest first.
+    :rtype: list[Path]
+    """
+    paths = list(Path(raw_dir).glob(f'weather_{airport_code}_*.csv'))
+    if airport_code == DEFAULT_AIRPORT:
+        # files without an airport code, weather_250101_250430.csv
+        paths += [path for path in Path(raw_dir).glob('weather_*.csv') if path.stem.split('_')[1][:1].isdigit()]
+    return sorted(paths)
+
+
+def load_history(airport_code: str, columns: tuple[str, ...], raw_dir: Path = RAW_DIR) -> pd.DataFrame:
+    """
+    Loads the weather history of the airport in its local time.
+
+    :param airport_code: IATA code of the airport.
+    :type airport_code: str
+    :param columns: Weather columns to load.
+    :type columns: tuple[str, ...]
+    :param raw_dir: Directory with the raw exports.
+    :type raw_dir: Path
+    :return: 'time' (local, no timezone) and the weather columns, empty if there is no history.
+    :rtype: pd.DataFrame
+    """
+    paths = history_paths(airport_code, raw_dir)
+    if not paths or airport_code not in AIRPORT_TIMEZONES:
+        return pd.DataFrame(columns=['time', *columns])
+
+    df = pd.concat([pd.read_csv(path, usecols=['time', *columns]) for path in paths], ignore_index=True)
+    df['time'] = (
+        pd.to_datetime(df['time']).dt.tz_localize('UTC').dt.tz_convert(AIRPORT_TIMEZONES[airport_code])
+        .dt.tz_localize(None)
+    )
+    # the hour repeated when the clocks go back keeps its first value, as in the training set
+    return df.drop_duplicates('time', keep='first')
+
+
+# {airport code: weather history} - the files do not change while the app runs
+_history_cache = LRUCache(max_entries=MAX_AIRPORTS, name='weather_history')
+
+
+def get_history(airport_code: str, columns: tuple[str, ...]) -> pd.DataFrame:
+    """
+    Weather history of the airport, read once per process.
+
+    :param airport_code: IATA code of the airport.
+    :type airport_code: str
+    :param columns: Weather columns.
+    :type columns: tuple[str, ...]
+    :return: See load_history.
+    :rtype: pd.DataFrame
+    """
+    key = (airport_code, tuple(columns))
+    history = _history_cache.get(key)
+    if history is None:
+        try:
+            history = load_history(airport_code, columns)
+        except Exception as e:
+            print(f'Weather history of "{airport_code}" could not be loaded: {e}')
+            history = pd.DataFrame(columns=['time', *columns])
+        if airport_code in SUPPORTED_AIRPORTS:
+            _history_cache.set(key, history)
+    return history
+
+
+def build_weather_store(airport_code: str, df_forecast: pd.DataFrame, columns: tuple[str, ...]) -> HourlyWeather:
+    """
+    Merges the history of the airport with its current forecast, the forecast wins on the same hour.
+
+    :param airport_code: IATA code of the airport.
+    :type airport_code: str
+    :param df_forecast: Hourly forecast (data_preprocessing.get_weather), can be empty.
+    :type df_forecast: pd.DataFrame
+    :param columns: Weather columns.
+    :type columns: tuple[str, ...]
+    :return: Weather store.
+    :rtype: HourlyWeather
+    """
+    return HourlyWeather.from_frames([get_history(airport_code, columns), df_forecast], columns)
@@ -0,0 +1,200 @@
+"""
+Tests for src/flight_delay/api/async_client.py
+Uses a local stub HTTP server, every endpoint answers after a fixed delay.
+"""
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import pytest
+from flight_delay.api import async_client, aviationstack_client, http_client, open_meteo_client
+from flight_delay.api import response_cache, streaming
+
+DELAY = 0.3
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers timetable and forecast requests after DELAY seconds. Keeps the connections open.
+    """
+    protocol_version = 'HTTP/1.1'
+    requests_seen = []
+    client_ports = set()
+
+    def do_GET(self):
+        """
+        Mock GET
+        """
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        StubHandler.requests_seen.append((url.path, params))
+        StubHandler.client_ports.add(self.client_address[1])
+        time.sleep(DELAY)
+
+        if url.path.endswith('/timetable'):
+            body = {'data': [{'type': params.get('type'), 'flight': {'iataNumber': 'OK1'}}]}
+        else:
+            body = {'hourly': {'time': [], 'temperature_2m': [], 'precipitation': [], 'wind_speed_10m': []}}
+
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        """
+        Silence the server log
+        """
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    """
+    Runs the stub server and points both API clients to it.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f'http://127.0.0.1:{server.server_address[1]}'
+
+    monkeypatch.setattr(aviationstack_client, 'AVIATIONSTACK_BASE_URL', f'{base}/v1/')
+    monkeypatch.setattr(aviationstack_client, 'API_KEY_DEPARTURE', 'KEY1')
+    monkeypatch.setattr(aviationstack_client, 'API_KEY_ARRIVAL', 'KEY2')
+    monkeypatch.setattr(open_meteo_client, 'OPEN_METEO_URL', f'{base}/v1/forecast')
+    monkeypatch.setattr(response_cache, '_cache', response_cache.NullCache())
+    monkeypatch.setattr(streaming, 'STREAMING', False)
+    monkeypatch.setattr(async_client, '_client_loop', async_client.ClientLoop())
+    StubHandler.requests_seen = []
+    StubHandler.client_ports = set()
+
+    yield base
+
+    async_client.get_client_loop().close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_prefetch_is_concurrent(stub_server):
+    """
+    The requests run at the same time, so the cold path takes about one DELAY.
+    """
+    start = time.perf_counter()
+    results = async_client.prefetch_airport_data('PRG', 50.1, 14.26)
+    elapsed = time.perf_counter() - start
+
+    assert set(results) == {'departures', 'arrivals', 'weather'}
+    assert results['arrivals']['data'][0]['type'] == 'arrival'
+    assert elapsed < 2 * DELAY
+
+    keys = {params.get('access_key') for path, params in StubHandler.requests_seen if path.endswith('timetable')}
+    assert keys == {'KEY1', 'KEY2'}
+
+
+def test_prefetched_responses_are_reused(stub_server):
+    """
+    After the prefetch the synchronous client gets the stored responses without a request.
+    """
+    async_client.prefetch_airport_data('PRG', 50.1, 14.26)
+    seen = len(StubHandler.requests_seen)
+
+    departures = aviationstack_client.post_query('timetable', {'iataCode': 'PRG', 'type': 'departure'})
+    arrivals = aviationstack_client.post_query('timetable', {'iataCode': 'PRG', 'type': 'arrival'})
+    forecast = open_meteo_client.fetch_forecast(50.1, 14.26)
+
+    assert departures['data'][0]['type'] == 'departure'
+    assert arrivals['data'][0]['type'] == 'arrival'
+    assert 'hourly' in forecast
+    assert len(StubHandler.requests_seen) == seen
+
+    # consumed - the next call goes to the server again
+    aviationstack_client.post_query('timetable', {'iataCode': 'PRG', 'type': 'arrival'})
+    assert len(StubHandler.requests_seen) == seen + 1
+
+
+def test_failed_request_does_not_cancel_others(stub_server, monkeypatch):
+    """
+    A missing API key fails only the AviationStack requests, the weather still arrives.
+    """
+    monkeypatch.setattr(aviationstack_client, 'API_KEY_ARRIVAL', None)
+
+    results = async_client.prefetch_airport_data('PRG', 50.1, 14.26)
+
+    assert isinstance(results['arrivals'], ValueError)
+    assert 'data' in results['departures']
+    assert 'hourly' in results['weather']
+    assert http_client.get_session() is http_client.get_session()
+
+
+def test_prefetches_reuse_connections(stub_server):
+    """
+    The client loop keeps one client, the next prefetch goes over the open connections.
+    """
+    async_client.prefetch_airport_data('PRG', 50.1, 14.26)
+    client = async_client.get_client_loop().client
+    ports = set(StubHandler.client_ports)
+
+    async_client.prefetch_airport_data('PRG', 50.1, 14.26)
+
+    assert async_client.get_client_loop().client is client
+    assert len(StubHandler.requests_seen) == 6
+    assert StubHandler.client_ports == ports
+
+
+def test_prefetch_uses_response_cache(stub_server, tmp_path, monkeypatch):
+    """
+    The prefetched responses are stored in the persistent cache, the prefetch of another process
+    (or the synchronous client) within the TTL does not go upstream.
+    """
+    monkeypatch.setattr(response_cache, '_cache', response_cache.SQLiteCache(tmp_path / 'responses.sqlite'))
+    async_client.prefetch_airport_data('PRG', 50.1, 14.26)
+    assert len(StubHandler.requests_seen) == 3
+
+    # another process - nothing prefetched in memory, the same cache
+    monkeypatch.setattr(http_client, '_prefetched', {})
+    results = async_client.prefetch_airport_data('PRG', 50.1, 14.26)
+    departures = aviationstack_client.post_query(
+        'timetable', {'iataCode': 'PRG', 'type': 'departure'}, ttl=aviationstack_client.RESPONSE_CACHE_TTL
+    )
+    forecast = open_meteo_client.fetch_forecast(50.1, 14.26)
+
+    assert len(StubHandler.requests_seen) == 3
+    assert results['arrivals']['data'][0]['type'] == 'arrival'
+    assert departures['data'][0]['type'] == 'departure'
+    assert 'hourly' in forecast
+
+
+def test_cold_start_takes_one_call(stub_server):
+    """
+    The cold path - the prefetch and the first load of the departures (as the refresher does it) -
+    costs about one DELAY, the departures are not requested again.
+    """
+    from flight_delay.prediction import fetch_timetable_df
+    from flight_delay.refresher import TimetableRefresher
+
+    start = time.perf_counter()
+    async_client.prefetch_airport_data('PRG', 50.1, 14.26)
+    refresher = TimetableRefresher(lambda: fetch_timetable_df('PRG', 'departure'))
+    refresher.start()
+    elapsed = time.perf_counter() - start
+    refresher.stop()
+
+    departures, fetched_at = refresher.get()
+    assert departures['type'].tolist() == ['departure']
+    assert fetched_at is not None
+    assert elapsed < 2 * DELAY
+    assert len(StubHandler.requests_seen) == 3
+
+
+def test_streamed_timetables_are_not_prefetched(stub_server, monkeypatch):
+    """
+    Paginated timetables are fetched by the streaming client, only the weather is prefetched.
+    """
+    monkeypatch.setattr(streaming, 'STREAMING', True)
+
+    results = async_client.prefetch_airport_data('PRG', 50.1, 14.26)
+
+    assert set(results) == {'weather'}
+    assert [path for path, _ in StubHandler.requests_seen] == ['/v1/forecast']
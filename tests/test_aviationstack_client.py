@@ -2,17 +2,8 @@
 Tests for src/flight_delay/api/aviationstack_client.py
 Just quick verification of error handling.
 """
-import sys
-from types import SimpleNamespace
 import requests
 import pytest
-
-# Simple mock for Streamlit, we just need to mock cache_data
-sys.modules["streamlit"] = SimpleNamespace(
-    cache_data=lambda ttl=None: (lambda f: f)
-)
-
-# Import after mocking
 from flight_delay.api.aviationstack_client import post_query, fetch_query
 
 class FakeResponse:
@@ -56,7 +47,7 @@ def test_post_query_http_error(monkeypatch):
     """
     monkeypatch.setenv("AVIATIONSTACK_API_KEY", "KEY")
     monkeypatch.setattr(
-        requests,
+        requests.Session,
         "get",
         lambda *a, **k: FakeResponse(raise_error=True),
     )
@@ -74,3 +65,19 @@ def test_fetch_query_raises_on_none(monkeypatch):
 
     with pytest.raises(ValueError):
         fetch_query("timetable")
+
+
+def test_fetch_query_cache_is_bounded(monkeypatch):
+    """
+    Check if fetch_query keeps at most MAX_AIRPORTS responses, the least recently used is dropped.
+    """
+    from flight_delay.airports import MAX_AIRPORTS
+
+    monkeypatch.setattr("flight_delay.api.aviationstack_client.post_query", lambda *a, **k: {"data": []})
+    fetch_query.cache_clear()
+
+    for i in range(MAX_AIRPORTS + 5):
+        fetch_query("timetable", {"iataCode": f"A{i:02d}", "type": "arrival"})
+
+    assert len(fetch_query.cache.keys()) == MAX_AIRPORTS
+    fetch_query.cache_clear()
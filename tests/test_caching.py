@@ -0,0 +1,107 @@
+"""
+Tests for src/flight_delay/utils/caching.py
+LRU eviction by entries and by memory, TTL cache bounded across airports.
+"""
+import numpy as np
+import pandas as pd
+from flight_delay.utils.caching import LRUCache, estimate_size, ttl_cache
+
+
+def test_lru_evicts_least_recently_used():
+    """
+    Reading an entry marks it as used, the oldest unused one is evicted.
+    """
+    cache = LRUCache(max_entries=2)
+    cache.set('PRG', 1)
+    cache.set('VIE', 2)
+    cache.get('PRG')
+    cache.set('FRA', 3)
+
+    assert cache.keys() == ['PRG', 'FRA']
+    assert cache.get('VIE') is None
+    assert cache.stats() == {'entries': 2, 'bytes': 0, 'hits': 1, 'misses': 1, 'hit_rate': 0.5}
+
+
+def test_lru_bounded_by_bytes():
+    """
+    Entries are evicted until the estimated size fits, the newest entry is always kept.
+    """
+    cache = LRUCache(max_bytes=3000)
+    cache.set('PRG', np.zeros(200))
+    cache.set('VIE', np.zeros(200))
+    assert len(cache) == 1 and 'VIE' in cache
+    assert cache.nbytes == 1600
+
+    cache.set('FRA', np.zeros(1000))
+    assert cache.keys() == ['FRA']
+
+    cache.pop('FRA')
+    assert cache.nbytes == 0
+
+
+def test_estimate_size_of_dataframe():
+    """
+    Dataframes are measured by their columns, not by the Python object.
+    """
+    df = pd.DataFrame({'a': np.zeros(1000)})
+    assert estimate_size(df) >= 8000
+    assert estimate_size((0.0, df)) > estimate_size(df)
+
+
+def test_ttl_cache_per_airport_bounded():
+    """
+    Every airport is cached separately, over max_entries the least recently used airport is fetched again.
+    """
+    calls = []
+
+    @ttl_cache(ttl=60, max_entries=2)
+    def fetch(airport_code):
+        calls.append(airport_code)
+        return airport_code.lower()
+
+    assert [fetch('PRG'), fetch('VIE'), fetch('PRG')] == ['prg', 'vie', 'prg']
+    assert calls == ['PRG', 'VIE']
+
+    fetch('FRA')
+    fetch('PRG')
+    fetch('VIE')
+    assert calls == ['PRG', 'VIE', 'FRA', 'VIE']
+
+
+def test_ttl_cache_expires(monkeypatch):
+    """
+    Results older than ttl are fetched again.
+    """
+    now = [0.0]
+    monkeypatch.setattr('flight_delay.utils.caching.time.monotonic', lambda: now[0])
+    calls = []
+
+    @ttl_cache(ttl=10)
+    def fetch():
+        calls.append(1)
+        return len(calls)
+
+    assert fetch() == 1
+    now[0] = 9.0
+    assert fetch() == 1
+    now[0] = 11.0
+    assert fetch() == 2
+
+
+def test_ttl_cache_counts_expired_as_miss(monkeypatch):
+    """
+    An expired result is a miss in the cache stats.
+    """
+    now = [0.0]
+    monkeypatch.setattr('flight_delay.utils.caching.time.monotonic', lambda: now[0])
+
+    @ttl_cache(ttl=10, name='test_fetch')
+    def fetch():
+        return 1
+
+    fetch()
+    fetch()
+    now[0] = 11.0
+    fetch()
+    assert fetch.cache.stats()['hits'] == 1
+    assert fetch.cache.stats()['misses'] == 2
@@ -0,0 +1,284 @@
+"""
+Tests for src/flight_delay/data_preprocessing.py
+Checks that the vectorized feature pipeline matches the single flight pipeline.
+"""
+import pytest
+import numpy as np
+import pandas as pd
+from flight_delay import data_preprocessing
+
+
+@pytest.fixture
+def timetable_df():
+    """
+    Mock raw departure timetable (json_normalized AviationStack response).
+    """
+    return pd.DataFrame({
+        'departure.terminal': [None, '2', None, '1', None],
+        'departure.delay': [None, 5.0, None, None, 12.0],
+        'departure.scheduledTime': [
+            '2025-12-26t06:05:00.000', '2025-12-26t06:20:00.000', '2025-12-26t09:40:00.000',
+            None, '2025-12-26t23:55:00.000'
+        ],
+        'airline.icaoCode': ['CSA', 'RYR', 'DLH', 'KLM', None],
+        'departure.actualTime': [None, '2025-12-26t06:25:00.000', None, '2025-12-26t06:10:00.000', None],
+        'arrival.iataCode': ['FRA', 'STN', 'MUC', 'AMS', 'JFK'],
+        'flight.iataNumber': ['OK100', 'FR200', 'LH300', 'KL400', 'XX500'],
+    })
+
+
+@pytest.fixture
+def mock_external_data(monkeypatch):
+    """
+    Mock weather and arrivals so the tests do not call any API.
+    """
+    weather = pd.DataFrame({
+        'time': pd.date_range('2025-12-26 00:00', periods=24, freq='h'),
+        'temp_c': [float(i) for i in range(24)],
+        'precip_mm': [0.1 * i for i in range(24)],
+        'wind_kph': [10.0 + i for i in range(24)],
+    })
+    arrivals = pd.DataFrame({
+        'hour_bucket': pd.to_datetime(['2025-12-26 06:00', '2025-12-26 06:00', '2025-12-26 10:00']),
+    })
+    monkeypatch.setattr(data_preprocessing, 'get_weather', lambda airport_code='PRG': weather)
+    monkeypatch.setattr(data_preprocessing, 'get_arrival_df', lambda airport_code='PRG': arrivals)
+
+
+def test_prepare_features_batch_matches_single(timetable_df, mock_external_data):
+    """
+    Every row of the batch must equal prepare_features called on that row alone.
+    """
+    batch = data_preprocessing.prepare_features_batch(timetable_df)
+
+    assert list(batch.index) == list(timetable_df.index)
+
+    for idx in timetable_df.index:
+        single = data_preprocessing.prepare_features(timetable_df, timetable_df.loc[[idx]])
+        expected = single.iloc[0]
+        got = batch.loc[idx, single.columns]
+        pd.testing.assert_series_equal(
+            got.astype(float), expected.astype(float), check_names=False
+        )
+
+
+def test_prepare_features_batch_missing_columns(mock_external_data):
+    """
+    Timetable without the required columns returns an empty dataframe.
+    """
+    df = pd.DataFrame({'flight.iataNumber': ['OK100']})
+    assert data_preprocessing.prepare_features_batch(df).empty
+
+
+def test_traffic_index_built_once_per_fetch(timetable_df, monkeypatch):
+    """
+    The traffic index is reused while the timetable fetch timestamp stays the same
+    and rebuilt when a new timetable arrives.
+    """
+    arrival_calls = []
+
+    def fake_arrivals(airport_code='PRG'):
+        arrival_calls.append(1)
+        return pd.DataFrame({'hour_bucket': pd.to_datetime(['2025-12-26 06:00'])})
+
+    monkeypatch.setattr(data_preprocessing, 'get_arrival_df', fake_arrivals)
+
+    timetable_df.attrs['fetched_at'] = pd.Timestamp('2025-12-26 05:00', tz='UTC')
+    first = data_preprocessing.get_traffic_index(timetable_df)
+    second = data_preprocessing.get_traffic_index(timetable_df.copy())
+
+    assert first is second
+    assert len(arrival_calls) == 1
+    assert first['departure'][pd.Timestamp('2025-12-26 06:00')] == 2
+    assert first['arrival'][pd.Timestamp('2025-12-26 06:00')] == 1
+
+    timetable_df.attrs['fetched_at'] = pd.Timestamp('2025-12-26 05:30', tz='UTC')
+    third = data_preprocessing.get_traffic_index(timetable_df)
+
+    assert third is not first
+    assert len(arrival_calls) == 2
+
+
+def test_add_traffic_uses_index(timetable_df, mock_external_data):
+    """
+    Traffic counts for one flight: other departures and all arrivals in the same hour.
+    """
+    flight_row = pd.DataFrame({'scheduled_time': pd.to_datetime(['2025-12-26 06:10'])})
+    flight_row = data_preprocessing.add_traffic(timetable_df, flight_row)
+
+    assert flight_row['departure_traffic'].iloc[0] == 1
+    assert flight_row['arrival_traffic'].iloc[0] == 2
+
+
+def test_feature_schema_loaded_once(timetable_df, mock_external_data, monkeypatch):
+    """
+    After the first load the hot path does not touch the JSON artifacts.
+    reload_feature_schema loads them again.
+    """
+    schema = data_preprocessing.get_feature_schema()
+    assert data_preprocessing.get_feature_schema() is schema
+    assert schema.feature_order[0] == 'terminal'
+    assert schema.category_codes['airline']['RYR'] == 0
+
+    def no_open(*args, **kwargs):
+        raise AssertionError('file opened in the prediction path')
+
+    monkeypatch.setattr('builtins.open', no_open)
+    assert not data_preprocessing.prepare_features(timetable_df, timetable_df.loc[[0]]).empty
+    assert not data_preprocessing.prepare_features_batch(timetable_df).empty
+    monkeypatch.undo()
+
+    reloaded = data_preprocessing.reload_feature_schema()
+    assert reloaded is not schema
+    assert reloaded == schema
+
+
+@pytest.fixture
+def raw_records():
+    """
+    Raw (nested) AviationStack timetable records.
+    """
+    def record(terminal, scheduled, actual, airline, destination):
+        return {
+            'type': 'departure',
+            'status': 'scheduled',
+            'departure': {'iataCode': 'PRG', 'terminal': terminal, 'delay': None,
+                          'scheduledTime': scheduled, 'actualTime': actual},
+            'arrival': {'iataCode': destination},
+            'airline': {'name': 'Airline', 'icaoCode': airline},
+            'flight': {'iataNumber': 'XX1'},
+        }
+
+    return [
+        record(None, '2025-12-26t06:05:00.000', None, 'CSA', 'FRA'),
+        record('2', '2025-12-26t06:30:00.000', '2025-12-26t06:41:00.000', 'RYR', 'STN'),
+        record('1', '2025-12-26t07:30:00.000', None, 'DLH', 'MUC'),
+        record(None, None, '2025-12-26t06:10:00.000', 'KLM', 'AMS'),
+        record(None, '2025-12-26t23:55:00.000', None, None, 'JFK'),
+        record(None, None, None, 'CSA', None),
+    ]
+
+
+def test_encode_flight_record_matches_prepare_features(raw_records, mock_external_data):
+    """
+    The NumPy encoder must produce exactly the prepare_features values (in float32),
+    for both the nested and the flattened record.
+    """
+    timetable_df = pd.json_normalize(raw_records)
+    schema = data_preprocessing.get_feature_schema()
+    traffic_index = data_preprocessing.get_traffic_index(timetable_df)
+    weather_index = data_preprocessing.get_weather_index()
+
+    for idx, record in enumerate(raw_records):
+        expected = data_preprocessing.prepare_features(timetable_df, timetable_df.loc[[idx]])
+        expected = expected[list(schema.feature_order)].to_numpy(dtype='float32')[0]
+
+        nested = data_preprocessing.encode_flight_record(record, traffic_index, weather_index)
+        flat = data_preprocessing.encode_flight_record(
+            timetable_df.iloc[idx].to_dict(), traffic_index, weather_index
+        )
+
+        assert nested.dtype == 'float32'
+        assert nested.tolist() == expected.tolist()
+        assert flat.tolist() == expected.tolist()
+
+
+def test_encode_flight_record_feature_order(raw_records, mock_external_data):
+    """
+    Features are written in the requested order into the preallocated array.
+    """
+    timetable_df = pd.json_normalize(raw_records)
+    traffic_index = data_preprocessing.get_traffic_index(timetable_df)
+    weather_index = data_preprocessing.get_weather_index()
+    out = np.zeros(2, dtype='float32')
+
+    result = data_preprocessing.encode_flight_record(
+        raw_records[0], traffic_index, weather_index,
+        feature_names=['day_in_month', 'departure_traffic'], out=out
+    )
+
+    assert result is out
+    assert out.tolist() == [26.0, 1.0]
+
+    with pytest.raises(KeyError):
+        data_preprocessing.encode_flight_record(
+            raw_records[0], traffic_index, weather_index, feature_names=['unknown']
+        )
+
+
+def test_traffic_index_cached_per_airport(timetable_df, monkeypatch):
+    """
+    Every airport gets its own arrivals and traffic index, one airport does not replace the other.
+    """
+    arrival_calls = []
+
+    def fake_arrivals(airport_code='PRG'):
+        arrival_calls.append(airport_code)
+        hours = {'PRG': ['2025-12-26 06:00'], 'VIE': ['2025-12-26 06:00'] * 3}[airport_code]
+        return pd.DataFrame({'hour_bucket': pd.to_datetime(hours)})
+
+    monkeypatch.setattr(data_preprocessing, 'get_arrival_df', fake_arrivals)
+    timetable_df.attrs['fetched_at'] = pd.Timestamp('2025-12-26 04:00', tz='UTC')
+
+    prague = data_preprocessing.get_traffic_index(timetable_df, 'PRG')
+    vienna = data_preprocessing.get_traffic_index(timetable_df, 'VIE')
+
+    assert prague['arrival'][pd.Timestamp('2025-12-26 06:00')] == 1
+    assert vienna['arrival'][pd.Timestamp('2025-12-26 06:00')] == 3
+    assert data_preprocessing.get_traffic_index(timetable_df, 'PRG') is prague
+    assert arrival_calls == ['PRG', 'VIE']
+
+
+def test_weather_index_covers_history(monkeypatch):
+    """
+    Hours outside the forecast are looked up in the raw weather history (UTC export, local hours).
+    """
+    forecast = pd.DataFrame({
+        'time': pd.date_range('2025-12-26 00:00', periods=2, freq='h'),
+        'temp_c': [1.0, 2.0], 'precip_mm': 0.0, 'wind_kph': 5.0,
+    })
+    monkeypatch.setattr(data_preprocessing, 'get_weather', lambda airport_code='PRG': forecast)
+
+    weather_index = data_preprocessing.get_weather_index('PRG')
+
+    # first row of data/raw/weather_250101_250430.csv: 2025-01-01 00:00 UTC, 0.4 °C, 14.9 km/h
+    assert weather_index.get(pd.Timestamp('2025-01-01 01:00')) == (0.4, 0.0, 14.9)
+    assert weather_index.get(pd.Timestamp('2025-12-26 01:00')) == (2.0, 0.0, 5.0)
+    assert weather_index.get(pd.Timestamp('2025-12-26 02:00')) is None
+
+
+def test_destination_weather_only_for_models_trained_with_it(timetable_df, mock_external_data, monkeypatch):
+    """
+    The current model needs no destination weather request. A model trained with it gets the weather
+    at the destination, destinations without weather get the fill values and no row is dropped.
+    """
+    from dataclasses import replace
+    from flight_delay.destination_weather import DESTINATION_WEATHER_FEATURES
+
+    calls = []
+
+    class FakeDestinationWeather:
+        def lookup(self, destinations, hours):
+            calls.append((list(destinations), list(hours)))
+            values = np.full((len(destinations), 3), np.nan)
+            values[(destinations == 'FRA').to_numpy()] = [4.0, 0.5, 20.0]
+            return values
+
+    monkeypatch.setattr(data_preprocessing, 'get_destination_weather', FakeDestinationWeather)
+
+    schema = data_preprocessing.get_feature_schema()
+    data_preprocessing.prepare_features_batch(timetable_df, schema=schema)
+    assert not calls
+
+    fill_values = {**schema.fill_values, 'dest_temp_c': 10.0, 'dest_precip_mm': 0.0, 'dest_wind_kph': 15.0}
+    trained_with = replace(schema, fill_values=fill_values, feature_order=tuple(fill_values))
+    batch = data_preprocessing.prepare_features_batch(timetable_df, schema=trained_with)
+
+    assert list(batch.index) == list(timetable_df.index)
+    assert calls[0][1][0] == pd.Timestamp('2025-12-26 05:00')
+    assert list(batch.loc[0, list(DESTINATION_WEATHER_FEATURES)]) == [4.0, 0.5, 20.0]
+    assert list(batch.loc[1, list(DESTINATION_WEATHER_FEATURES)]) == [10.0, 0.0, 15.0]
+
+    # the single flight path encodes with the schema of the pinned version too
+    single = data_preprocessing.prepare_features(timetable_df, timetable_df.loc[[0]], schema=trained_with)
+    assert list(single.loc[0, list(DESTINATION_WEATHER_FEATURES)]) == [4.0, 0.5, 20.0]
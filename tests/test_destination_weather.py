@@ -0,0 +1,131 @@
+"""
+Tests for src/flight_delay/destination_weather.py
+Destination forecasts are fetched in batched multi-location requests and shared per grid cell.
+"""
+import numpy as np
+import pandas as pd
+from flight_delay import destination_weather
+from flight_delay.api import open_meteo_client
+from flight_delay.destination_weather import DestinationWeather, grid_cell, to_utc_hours
+from flight_delay.utils.dicts import AIRPORT_COORDS
+
+
+class FakeOpenMeteo:
+    """
+    Multi-location endpoint, the temperature of a location is its latitude.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, locations):
+        self.calls.append(locations)
+        times = pd.date_range('2025-12-26 00:00', periods=48, freq='h').strftime('%Y-%m-%dT%H:%M').tolist()
+        return [
+            {'hourly': {
+                'time': times,
+                'temperature_2m': [latitude] * len(times),
+                'precipitation': [0.0] * len(times),
+                'wind_speed_10m': [float(hour) for hour in range(len(times))],
+            }}
+            for latitude, _ in locations
+        ]
+
+
+def test_grid_cell_groups_nearby_airports():
+    """
+    Airports of one city share a cell, distant ones do not.
+    """
+    def cell(iata):
+        longitude, latitude = AIRPORT_COORDS[iata]
+        return grid_cell(latitude, longitude, 0.5)
+
+    assert cell('LHR') == cell('LGW')
+    assert cell('ORY') == cell('LBG')
+    assert cell('LHR') != cell('ORY')
+    assert grid_cell(-0.1, -0.1, 0.5) == (-1, -1)
+
+
+def test_destinations_fetched_in_batches():
+    """
+    All the destinations cost one request per MAX_LOCATIONS cells, the next lookups hit the cache.
+    """
+    fetch = FakeOpenMeteo()
+    weather = DestinationWeather(fetch=fetch, ttl=1800, grid=0.5)
+    destinations = pd.Series(sorted(AIRPORT_COORDS) + ['XXX', None])
+    hours = pd.Series(pd.Timestamp('2025-12-26 10:00'), index=destinations.index)
+
+    values = weather.lookup(destinations, hours)
+
+    cells = len(weather.cells(AIRPORT_COORDS))
+    assert len(fetch.calls) == -(-cells // open_meteo_client.MAX_LOCATIONS) < len(AIRPORT_COORDS) // 10
+    assert values.shape == (len(destinations), 3)
+    assert np.isnan(values[-2:]).all()
+    lhr, lgw = destinations[destinations == 'LHR'].index[0], destinations[destinations == 'LGW'].index[0]
+    np.testing.assert_array_equal(values[lhr], values[lgw])
+    assert values[lhr][2] == 10.0
+
+    assert weather.get('LHR', pd.Timestamp('2025-12-26 11:00'))[2] == 11.0
+    assert weather.get('LHR', pd.Timestamp('2026-01-01 00:00')) is None
+    weather.lookup(destinations, hours)
+    assert len(fetch.calls) == weather.requests == -(-cells // open_meteo_client.MAX_LOCATIONS)
+
+
+def test_failed_request_waits_before_retry(monkeypatch):
+    """
+    A failed request gives no weather and is not repeated by every lookup, expired forecasts are kept.
+    """
+    fetch = FakeOpenMeteo()
+    clock = [1000.0]
+    monkeypatch.setattr(destination_weather.time, 'monotonic', lambda: clock[0])
+    weather = DestinationWeather(fetch=fetch, ttl=10)
+    hour = pd.Timestamp('2025-12-26 05:00')
+    assert weather.get('FRA', hour) is not None
+
+    def broken(locations):
+        fetch.calls.append(locations)
+        raise ConnectionError('offline')
+
+    weather._fetch = broken
+    clock[0] += 20
+    assert weather.get('FRA', hour) is not None
+    assert weather.get('CDG', hour) is None
+    assert len(fetch.calls) == 2
+
+    clock[0] += destination_weather.RETRY_AFTER
+    weather._fetch = fetch
+    assert weather.get('CDG', hour) is not None
+
+
+def test_version_changes_when_a_cell_is_fetched_again(monkeypatch):
+    """
+    The version of the destinations stays the same while their forecasts are valid, a refetch changes it.
+    """
+    fetch = FakeOpenMeteo()
+    clock = [1000.0]
+    monkeypatch.setattr(destination_weather.time, 'monotonic', lambda: clock[0])
+    weather = DestinationWeather(fetch=fetch, ttl=10)
+
+    version = weather.version(['FRA', 'LHR', 'XXX'])
+    assert len(version) == 2
+    assert weather.version(['LHR', 'FRA']) == version
+    assert weather.version(['FRA']) != version
+    assert len(fetch.calls) == 1
+
+    clock[0] += 20
+    assert weather.version(['FRA', 'LHR']) != version
+    assert len(fetch.calls) == 2
+
+
+def test_local_hours_to_utc():
+    """
+    Departure hours are converted with the timezone of the departure airport, the repeated hour is unknown.
+    """
+    hours = pd.Series(pd.to_datetime(['2025-07-01 10:00', '2025-10-26 02:00', '2025-12-26 10:00']))
+
+    utc = to_utc_hours(hours, 'PRG')
+
+    assert utc[0] == pd.Timestamp('2025-07-01 08:00')
+    assert pd.isna(utc[1])
+    assert utc[2] == pd.Timestamp('2025-12-26 09:00')
+    assert to_utc_hours(hours, 'XXX').isna().all()
@@ -0,0 +1,135 @@
+"""
+Tests for src/flight_delay/forecasts.py
+Forecast tables are built once per timetable, weather and model version and read by flight number.
+"""
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from flight_delay import forecasts, prediction
+
+
+class FakeModel:
+    """
+    Predicts the departure traffic as the delay and counts its calls.
+    """
+    feature_names_in_ = np.array(['departure_traffic'])
+
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, x):
+        self.calls += 1
+        return x['departure_traffic'].to_numpy(dtype=float)
+
+
+def weather(fetched_at):
+    df = pd.DataFrame()
+    df.attrs['fetched_at'] = fetched_at
+    return df
+
+
+@pytest.fixture
+def timetable(monkeypatch):
+    """
+    Three departures, the last one can not be preprocessed. The second one has a codeshare number.
+    """
+    df = pd.DataFrame({
+        'flight.iataNumber': ['OK1', 'FR2', 'W63'],
+        'codeshared.flight.iataNumber': [None, 'ok9', None],
+    }, index=[10, 11, 12])
+    df.attrs['fetched_at'] = pd.Timestamp('2025-05-01 06:00', tz='UTC')
+    monkeypatch.setattr(
+        prediction, 'prepare_features_batch',
+        lambda df, airport_code, schema=None: pd.DataFrame({'departure_traffic': [5.0, 12.4]}, index=df.index[:2]),
+    )
+    return df
+
+
+def test_build_forecast_table(timetable):
+    """
+    Every flight number (codeshares too) maps to its delay, flights without features have none.
+    """
+    table = forecasts.build_forecast_table(FakeModel(), timetable, 'PRG')
+
+    assert dict(table.delays) == {'OK1': 5, 'FR2': 12, 'OK9': 12}
+    assert table.lookup('W63') is None
+    assert table.by_row.index.tolist() == [10, 11, 12]
+    assert table.timetable_fetched_at == timetable.attrs['fetched_at']
+
+
+def test_scheduler_rebuilds_only_on_changes(timetable):
+    """
+    Refreshing without a new timetable, weather or model does not predict again.
+    """
+    model = FakeModel()
+    weather_fetched_at = [pd.Timestamp('2025-05-01 05:00', tz='UTC')]
+    scheduler = forecasts.ForecastScheduler(
+        lambda airport_code: (timetable, timetable.attrs['fetched_at']), lambda airport_code: model,
+        weather=lambda airport_code: weather(weather_fetched_at[0]),
+    )
+
+    assert scheduler.get('PRG') is None
+    assert scheduler.refresh('PRG')
+    assert not scheduler.refresh('PRG')
+    assert model.calls == 1
+
+    weather_fetched_at[0] = pd.Timestamp('2025-05-01 05:30', tz='UTC')
+    assert scheduler.refresh('PRG')
+    assert model.calls == 2
+    assert scheduler.get('PRG').lookup('OK1') == 5
+
+
+def test_scheduler_builds_notified_airports_in_background(timetable):
+    """
+    A notification (e.g. from the timetable refresher) is handled by the background thread.
+    """
+    scheduler = forecasts.ForecastScheduler(
+        lambda airport_code: (timetable, timetable.attrs['fetched_at']), lambda airport_code: FakeModel(),
+        weather=lambda airport_code: weather(None),
+    ).start()
+    try:
+        scheduler.notify('PRG')
+        deadline = time.time() + 2
+        while scheduler.get('PRG') is None and time.time() < deadline:
+            time.sleep(0.01)
+        assert scheduler.get('PRG').lookup('FR2') == 12
+    finally:
+        scheduler.stop()
+
+
+def test_scheduler_rebuilds_on_destination_weather_refresh(timetable, monkeypatch):
+    """
+    A model trained with the destination weather gets new forecasts when a destination forecast is refetched.
+    """
+    from dataclasses import replace
+    from flight_delay.data_preprocessing import get_feature_schema
+
+    class FakeDestinationWeather:
+        expires = 100.0
+
+        def version(self, iata_codes):
+            return (((0, 0), self.expires),)
+
+    destination_weather = FakeDestinationWeather()
+    monkeypatch.setattr(prediction, 'get_destination_weather', lambda: destination_weather)
+    timetable['arrival.iataCode'] = ['FRA', 'LHR', 'CDG']
+    schema = get_feature_schema()
+    model = FakeModel()
+    scheduler = forecasts.ForecastScheduler(
+        lambda airport_code: (timetable, timetable.attrs['fetched_at']), lambda airport_code: model,
+        weather=lambda airport_code: weather(None),
+    )
+
+    assert scheduler.refresh('PRG')
+    destination_weather.expires = 200.0
+    assert not scheduler.refresh('PRG')
+    assert scheduler.get('PRG').destination_weather_version is None
+
+    model.schema = replace(schema, fill_values={**schema.fill_values, 'dest_temp_c': 10.0})
+    assert scheduler.refresh('PRG')
+    assert not scheduler.refresh('PRG')
+    destination_weather.expires = 300.0
+    assert scheduler.refresh('PRG')
+    assert scheduler.get('PRG').destination_weather_version == (((0, 0), 300.0),)
+    assert model.calls == 3
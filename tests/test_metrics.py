@@ -0,0 +1,122 @@
+"""
+Tests for src/flight_delay/utils/metrics.py and src/flight_delay/utils/profiling.py
+Stage spans, cache counters and upstream latencies exported in the Prometheus text format.
+"""
+import urllib.request
+import pytest
+import requests
+from flight_delay.api import http_client, response_cache
+from flight_delay.utils import metrics, profiling
+from flight_delay.utils.caching import LRUCache
+from flight_delay.utils.metrics import Metrics
+
+
+def test_spans_fill_histograms():
+    """
+    Every span is one observation of its stage, also when the block raises.
+    """
+    registry = Metrics(buckets=(0.5, 1.0))
+    with registry.span('get_weather'):
+        pass
+    with pytest.raises(ValueError):
+        with registry.span('get_weather'):
+            raise ValueError('API down')
+    registry.observe('upstream_seconds', 0.7, host='api.open-meteo.com')
+
+    cumulative, total, count = registry.histogram('stage_seconds', stage='get_weather').snapshot()
+    assert count == 2 and cumulative == [2, 2, 2] and total < 0.5
+    assert registry.histogram('upstream_seconds', host='api.open-meteo.com').snapshot()[0] == [0, 1, 1]
+
+    text = registry.render()
+    assert '# TYPE flight_delay_stage_seconds histogram' in text
+    assert 'flight_delay_stage_seconds_bucket{stage="get_weather",le="+Inf"} 2' in text
+    assert 'flight_delay_stage_seconds_count{stage="get_weather"} 2' in text
+    assert 'flight_delay_upstream_seconds_bucket{host="api.open-meteo.com",le="1.0"} 1' in text
+
+
+def test_named_caches_are_reported():
+    """
+    Hits and misses of the named caches are exported, expired values count as misses.
+    """
+    registry = Metrics()
+    cache = LRUCache(max_entries=2)
+    registry.register_cache('weather_index', cache)
+    cache.set('PRG', 1)
+    cache.get('PRG')
+    cache.get('VIE')
+    cache.get('PRG')
+    cache.count_stale()
+
+    text = registry.render()
+    assert 'flight_delay_cache_hits_total{cache="weather_index"} 1' in text
+    assert 'flight_delay_cache_misses_total{cache="weather_index"} 2' in text
+    assert 'flight_delay_cache_entries{cache="weather_index"} 1' in text
+
+    del cache
+    assert 'weather_index' not in registry.cache_stats()
+
+
+def test_upstream_requests_are_timed(monkeypatch):
+    """
+    Requests sent upstream are observed per host, failures are counted, cache hits are not timed.
+    """
+    class FakeResponse:
+        def __init__(self, status: int):
+            self.status = status
+
+        def raise_for_status(self):
+            if self.status >= 400:
+                raise requests.HTTPError(f'{self.status}')
+
+        def json(self):
+            return {'data': []}
+
+    statuses = iter([200, 500])
+    monkeypatch.setattr(requests.Session, 'get', lambda *a, **k: FakeResponse(next(statuses)))
+    monkeypatch.setattr(response_cache, '_cache', response_cache.NullCache())
+    monkeypatch.setattr(metrics, '_metrics', Metrics())
+
+    http_client.get_json('https://api.test/timetable', {'iataCode': 'PRG'}, ttl=60)
+    with pytest.raises(requests.HTTPError):
+        http_client.get_json('https://api.test/timetable', {'iataCode': 'VIE'})
+
+    registry = metrics.get_metrics()
+    assert registry.histogram('upstream_seconds', host='api.test').snapshot()[2] == 2
+    assert registry.counter('upstream_errors_total', host='api.test') == 1
+    assert registry.counter('response_cache_total', host='api.test', result='miss') == 1
+
+
+def test_local_endpoint_serves_metrics(monkeypatch):
+    """
+    The endpoint of the app serves the process metrics.
+    """
+    monkeypatch.setattr(metrics, '_metrics', Metrics())
+    with metrics.span('predict'):
+        pass
+
+    httpd = metrics.serve(port=0)
+    try:
+        port = httpd.server_address[1]
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=5) as response:
+            assert response.headers['Content-Type'] == metrics.CONTENT_TYPE
+            assert 'flight_delay_stage_seconds_count{stage="predict"} 1' in response.read().decode()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_profile_capture():
+    """
+    cProfile report of the block, pyinstrument falls back to cProfile when it is not installed.
+    """
+    def slow_stage():
+        return sum(range(10000))
+
+    with profiling.capture('cprofile') as capture:
+        slow_stage()
+    assert 'slow_stage' in capture.report
+
+    with profiling.capture('pyinstrument') as capture:
+        slow_stage()
+    assert capture.profiler in ('cprofile', 'pyinstrument')
+    assert 'slow_stage' in capture.report
@@ -0,0 +1,161 @@
+"""
+Tests for src/flight_delay/prediction.py
+The core runs without Streamlit and raises errors instead of showing them.
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
+from flight_delay import prediction
+
+SRC_DIR = Path(__file__).resolve().parents[1] / 'src'
+
+
+def test_core_does_not_import_ui_or_heavy_dependencies():
+    """
+    Importing the core in a fresh process loads no Streamlit and no model / HTTP libraries.
+    """
+    code = (
+        'import sys, flight_delay.prediction, flight_delay.predictor; '
+        'print(sorted({"streamlit", "requests", "httpx", "joblib", "sklearn", "xgboost"} & set(sys.modules)))'
+    )
+    env = {**os.environ, 'PYTHONPATH': str(SRC_DIR)}
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env, check=True)
+
+    assert result.stdout.strip() == '[]'
+
+
+class ConstantPredictor:
+    """
+    Mock model expecting two features.
+    """
+    feature_names_in_ = np.array(['hour_sin', 'missing_feature'])
+
+    def predict(self, x_input):
+        """
+        Mock predict
+        """
+        return np.full(len(x_input), 4.6)
+
+
+def test_predict_flight_raises_on_unknown_feature(monkeypatch):
+    """
+    Errors reach the caller (the Streamlit layer turns them into warnings).
+    """
+    monkeypatch.setattr(prediction, 'get_traffic_index', lambda df, airport_code='PRG': {'departure': {}, 'arrival': None})
+    monkeypatch.setattr(prediction, 'get_weather_index', lambda airport_code='PRG': {})
+    flight_row = pd.DataFrame({'departure.scheduledTime': ['2025-12-26t06:05:00.000']})
+
+    with pytest.raises(KeyError):
+        prediction.predict_flight(ConstantPredictor(), flight_row, flight_row)
+
+
+@pytest.fixture
+def codeshare_timetable():
+    """
+    Timetable with codeshare flight numbers, messy formatting.
+    """
+    df = pd.DataFrame({
+        'flight.iataNumber': [' ok100', 'AF1700', 'FR200', None],
+        'codeshared.flight.iataNumber': [None, 'ok100', None, 'LH300'],
+        'arrival.iataCode': ['CDG', 'CDG', 'STN', 'FRA'],
+    })
+    df.attrs['fetched_at'] = pd.Timestamp.now(tz='UTC')
+    return df
+
+
+@pytest.mark.parametrize("flight_number,expected_destinations", [
+    ('OK100', ['CDG', 'CDG']),
+    ('AF1700', ['CDG']),
+    ('LH300', ['FRA']),
+    ('XX1', []),
+    ('', []),
+])
+def test_filter_flight_codeshares(codeshare_timetable, flight_number, expected_destinations):
+    """
+    Operating and codeshare flight numbers resolve, missing numbers never match.
+    """
+    flight_df = prediction.filter_flight(codeshare_timetable, flight_number)
+
+    assert flight_df['arrival.iataCode'].tolist() == expected_destinations
+
+
+def test_flight_index_built_once_per_fetch(codeshare_timetable, monkeypatch):
+    """
+    The index is reused across lookups on the same timetable fetch.
+    """
+    calls = []
+    build = prediction.build_flight_index
+    monkeypatch.setattr(prediction, 'build_flight_index', lambda df: calls.append(1) or build(df))
+
+    for flight_number in ['OK100', 'FR200', 'XX1']:
+        prediction.filter_flight(codeshare_timetable, flight_number)
+
+    assert len(calls) == 1
+
+
+def test_predict_flight_cached_keys_on_versions(codeshare_timetable, monkeypatch):
+    """
+    Repeated predictions of a flight are cache hits until the timetable, the weather or the model changes.
+    """
+    calls = []
+    monkeypatch.setattr(prediction, 'predict_flight',
+                        lambda predictor, flight_row, df, airport_code: calls.append(predictor) or 7)
+    weather = pd.DataFrame()
+    weather.attrs['fetched_at'] = pd.Timestamp('2025-05-01 06:00', tz='UTC')
+    monkeypatch.setattr(prediction, 'get_weather', lambda airport_code: weather)
+    monkeypatch.setattr(prediction, '_prediction_cache', prediction.LRUCache(max_entries=8))
+
+    model = ConstantPredictor()
+    flight_row = prediction.filter_flight(codeshare_timetable, 'FR200')
+    for _ in range(3):
+        assert prediction.predict_flight_cached(model, flight_row, codeshare_timetable, 'PRG') == 7
+    assert len(calls) == 1
+
+    prediction.predict_flight_cached(ConstantPredictor(), flight_row, codeshare_timetable, 'PRG')
+    weather.attrs['fetched_at'] = pd.Timestamp('2025-05-01 06:30', tz='UTC')
+    prediction.predict_flight_cached(model, flight_row, codeshare_timetable, 'PRG')
+    codeshare_timetable.attrs['fetched_at'] += pd.Timedelta(minutes=30)
+    prediction.predict_flight_cached(model, flight_row, codeshare_timetable, 'PRG')
+    assert len(calls) == 4
+
+    stats = prediction.prediction_cache_stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (2, 4, 4)
+
+
+def test_predict_flight_cached_keys_on_destination_weather(codeshare_timetable, monkeypatch):
+    """
+    For a model trained with the destination weather, a refetched forecast of the destination is a cache miss.
+    """
+    from dataclasses import replace
+
+    monkeypatch.setattr(prediction, 'predict_flight', lambda predictor, flight_row, df, airport_code: 7)
+    monkeypatch.setattr(prediction, 'get_weather', lambda airport_code: pd.DataFrame())
+    monkeypatch.setattr(prediction, '_prediction_cache', prediction.LRUCache(max_entries=8))
+    versions = []
+
+    class FakeDestinationWeather:
+        expires = 100.0
+
+        def version(self, iata_codes):
+            versions.append(list(iata_codes))
+            return ((tuple(versions[-1]), self.expires),)
+
+    destination_weather = FakeDestinationWeather()
+    monkeypatch.setattr(prediction, 'get_destination_weather', lambda: destination_weather)
+    schema = prediction.get_feature_schema()
+    model = ConstantPredictor()
+    model.schema = replace(schema, fill_values={**schema.fill_values, 'dest_temp_c': 10.0})
+    flight_row = prediction.filter_flight(codeshare_timetable, 'FR200')
+
+    prediction.predict_flight_cached(model, flight_row, codeshare_timetable, 'PRG')
+    prediction.predict_flight_cached(model, flight_row, codeshare_timetable, 'PRG')
+    destination_weather.expires = 200.0
+    prediction.predict_flight_cached(model, flight_row, codeshare_timetable, 'PRG')
+
+    assert versions[0] == [flight_row['arrival.iataCode'].iloc[0].upper()]
+    stats = prediction.prediction_cache_stats()
+    assert (stats['hits'], stats['misses']) == (1, 2)
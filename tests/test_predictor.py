@@ -0,0 +1,153 @@
+"""
+Tests for src/flight_delay/predictor.py
+The exported serving formats must predict the same delays as the joblib XGBRegressor.
+"""
+import json
+import threading
+import time
+import joblib
+import pytest
+import numpy as np
+import pandas as pd
+from xgboost import XGBRegressor
+from flight_delay import predictor as model_backends
+
+# Feature order of the model (fill_values.json)
+FEATURES = [
+    'terminal', 'destination_airport', 'airline', 'temp_c', 'precip_mm', 'wind_kph',
+    'departure_traffic', 'arrival_traffic', 'day_in_month', 'hour_sin', 'hour_cos',
+    'weekday_sin', 'weekday_cos'
+]
+
+
+@pytest.fixture(scope='module')
+def features():
+    """
+    Random feature rows, some values missing.
+    """
+    rng = np.random.default_rng(0)
+    x = pd.DataFrame(rng.normal(size=(300, len(FEATURES))).astype(np.float32), columns=FEATURES)
+    x.iloc[::7, 3] = np.nan
+    return x
+
+
+@pytest.fixture(scope='module')
+def models_dir(tmp_path_factory, features):
+    """
+    Small trained model saved with joblib and exported to the native formats.
+    """
+    y = 10 * features['temp_c'].fillna(0) + 5 * features['departure_traffic'] + features['airline']
+    model = XGBRegressor(n_estimators=20, max_depth=4).fit(features, y)
+
+    models_dir = tmp_path_factory.mktemp('models')
+    joblib.dump(model, models_dir / 'flight_delay_xgb.joblib')
+    model_backends.export_model(models_dir / 'flight_delay_xgb.joblib', models_dir)
+    return models_dir
+
+
+@pytest.mark.parametrize('backend', ['numpy', 'booster'])
+def test_backend_matches_joblib(models_dir, features, backend):
+    """
+    Same feature order and the same predictions (incl. missing values) as the XGBRegressor.
+    """
+    reference = model_backends.load_predictor('joblib', models_dir)
+    predictor = model_backends.load_predictor(backend, models_dir)
+
+    assert list(predictor.feature_names_in_) == list(reference.feature_names_in_) == FEATURES
+
+    expected = reference.predict(features)
+    np.testing.assert_allclose(predictor.predict(features), expected, rtol=1e-5, atol=1e-4)
+
+    # dataframes are reordered by name, arrays (the encoder output) are taken as they are
+    shuffled = features[FEATURES[::-1]]
+    np.testing.assert_allclose(predictor.predict(shuffled), expected, rtol=1e-5, atol=1e-4)
+    np.testing.assert_allclose(
+        predictor.predict(features.to_numpy()[0]), expected[:1], rtol=1e-5, atol=1e-4
+    )
+
+
+def test_numpy_backend_uses_best_iteration(models_dir, features):
+    """
+    Only the trees up to best_iteration count, like in XGBRegressor.predict after early stopping.
+    """
+    with open(models_dir / 'flight_delay_xgb.json', 'r', encoding='utf-8') as f:
+        model = json.load(f)
+    model['learner']['attributes']['best_iteration'] = '4'
+
+    reference = model_backends.load_predictor('joblib', models_dir)
+    expected = reference.predict(features, iteration_range=(0, 5))
+
+    np.testing.assert_allclose(
+        model_backends.NumpyTreePredictor(model).predict(features), expected, rtol=1e-5, atol=1e-4
+    )
+
+
+def test_auto_backend(models_dir, tmp_path):
+    """
+    'auto' prefers the numpy evaluator, joblib is the fallback when nothing was exported.
+    """
+    assert isinstance(model_backends.load_predictor('auto', models_dir), model_backends.NumpyTreePredictor)
+
+    joblib_only = tmp_path / 'flight_delay_xgb.joblib'
+    joblib_only.write_bytes((models_dir / 'flight_delay_xgb.joblib').read_bytes())
+    assert isinstance(model_backends.load_predictor('auto', tmp_path), XGBRegressor)
+
+    with pytest.raises(ValueError):
+        model_backends.load_predictor('treelite', models_dir)
+
+
+def test_reloading_predictor_swaps_updated_model(models_dir, features, tmp_path):
+    """
+    A model replaced on disk is served without reloading the process, a broken file keeps the old model.
+    """
+    for path in models_dir.iterdir():
+        (tmp_path / path.name).write_bytes(path.read_bytes())
+    predictor = model_backends.load_predictor('numpy', tmp_path, watch=True)
+    predictor.check_interval = 0
+    predictor.background = False
+    before = predictor.predict(features)
+
+    model = XGBRegressor(n_estimators=5, max_depth=2).fit(features, features['wind_kph'])
+    model_backends.export_model(model, tmp_path)
+
+    np.testing.assert_allclose(predictor.predict(features), model.predict(features), rtol=1e-5, atol=1e-4)
+    assert predictor.reloads == 1
+    assert not np.allclose(predictor.predict(features), before)
+
+    (tmp_path / 'flight_delay_xgb.json').write_text('{broken')
+    np.testing.assert_allclose(predictor.predict(features), model.predict(features), rtol=1e-5, atol=1e-4)
+    assert predictor.reloads == 1
+
+
+def test_reloading_predictor_loads_in_background(models_dir, features, tmp_path):
+    """
+    A slow load of the updated model does not block the callers, they get the old model until it is ready.
+    """
+    for path in models_dir.iterdir():
+        (tmp_path / path.name).write_bytes(path.read_bytes())
+    loading = threading.Event()
+    release = threading.Event()
+
+    def slow_load():
+        if loading.is_set():
+            release.wait(5)
+        loading.set()
+        return model_backends.load_predictor('numpy', tmp_path)
+
+    paths = [tmp_path / 'flight_delay_xgb.json']
+    predictor = model_backends.ReloadingPredictor(slow_load, paths, check_interval=0)
+    old = predictor.current
+
+    model = XGBRegressor(n_estimators=5, max_depth=2).fit(features, features['wind_kph'])
+    model_backends.export_model(model, tmp_path)
+
+    start = time.perf_counter()
+    assert predictor.current is old
+    assert predictor.current is old
+    assert time.perf_counter() - start < 1
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while predictor.reloads == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    np.testing.assert_allclose(predictor.predict(features), model.predict(features), rtol=1e-5, atol=1e-4)
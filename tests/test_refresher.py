@@ -0,0 +1,205 @@
+"""
+Tests for src/flight_delay/refresher.py
+Stale-while-revalidate behaviour of the background timetable refresher.
+"""
+import threading
+import time
+import pandas as pd
+import pytest
+from flight_delay.refresher import RefresherPool, TimetableRefresher
+
+
+def timetable(flight_number: str) -> pd.DataFrame:
+    """
+    Small timetable with a fetch timestamp.
+    """
+    df = pd.DataFrame({'flight.iataNumber': [flight_number]})
+    df.attrs['fetched_at'] = pd.Timestamp.now(tz='UTC')
+    return df
+
+
+class FakeFetch:
+    """
+    Returns the queued results one by one (dataframes or exceptions to raise).
+    """
+    def __init__(self, *results, delay=0.0):
+        self.results = list(results)
+        self.delay = delay
+        self.calls = 0
+        self.called = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        self.called.set()
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+@pytest.fixture
+def refresher_factory():
+    """
+    Creates refreshers and stops their threads after the test.
+    """
+    created = []
+
+    def factory(fetch, **kwargs):
+        refresher = TimetableRefresher(fetch, **kwargs)
+        created.append(refresher)
+        return refresher
+
+    yield factory
+
+    for refresher in created:
+        refresher.stop()
+
+
+def test_start_loads_first_timetable(refresher_factory):
+    """
+    start() blocks for the first timetable, then it is served with its age.
+    """
+    refresher = refresher_factory(FakeFetch(timetable('OK1')))
+    assert refresher.get()[1] is None
+    assert refresher.age() is None
+
+    refresher.start()
+
+    df, fetched_at = refresher.get()
+    assert df['flight.iataNumber'].tolist() == ['OK1']
+    assert fetched_at == df.attrs['fetched_at']
+    assert refresher.age() >= pd.Timedelta(0)
+
+
+@pytest.mark.parametrize("failure", [
+    RuntimeError('API down'),
+    pd.DataFrame(),
+])
+def test_failed_refresh_keeps_stale_timetable(refresher_factory, failure):
+    """
+    Upstream errors and empty responses keep serving the last good timetable.
+    """
+    refresher = refresher_factory(FakeFetch(timetable('OK1'), failure))
+    refresher.refresh()
+
+    assert refresher.refresh() is False
+    assert refresher.get()[0]['flight.iataNumber'].tolist() == ['OK1']
+
+
+def test_background_refresh_swaps_timetable(refresher_factory):
+    """
+    request_refresh refreshes in the background, readers get the stale timetable meanwhile.
+    """
+    fetch = FakeFetch(timetable('OK1'), timetable('OK2'), delay=0.0)
+    refresher = refresher_factory(fetch, interval=3600)
+    refresher.start()
+    fetch.called.clear()
+    fetch.delay = 0.2
+
+    start = time.perf_counter()
+    refresher.request_refresh()
+    stale = refresher.get()[0]
+    assert time.perf_counter() - start < 0.1
+    assert stale['flight.iataNumber'].tolist() == ['OK1']
+
+    assert fetch.called.wait(2)
+    deadline = time.time() + 2
+    while refresher.get()[0]['flight.iataNumber'].iloc[0] != 'OK2' and time.time() < deadline:
+        time.sleep(0.01)
+    assert refresher.get()[0]['flight.iataNumber'].tolist() == ['OK2']
+
+
+def test_on_refresh_gets_new_timetables(refresher_factory):
+    """
+    The callback sees every stored timetable, failed refreshes and its own errors do not break the refresher.
+    """
+    seen = []
+
+    def on_refresh(df):
+        seen.append(df['flight.iataNumber'].iloc[0])
+        raise RuntimeError('callback failed')
+
+    refresher = refresher_factory(FakeFetch(timetable('OK1'), RuntimeError('down'), timetable('OK2')),
+                                  on_refresh=on_refresh)
+
+    assert [refresher.refresh() for _ in range(3)] == [True, False, True]
+    assert seen == ['OK1', 'OK2']
+
+
+def test_concurrent_refresh_fetches_once(refresher_factory):
+    """
+    Two refreshes at the same time result in one upstream fetch.
+    """
+    fetch = FakeFetch(timetable('OK1'), timetable('OK2'), delay=0.2)
+    refresher = refresher_factory(fetch)
+
+    threads = [threading.Thread(target=refresher.refresh) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fetch.calls == 1
+
+
+def test_pool_stops_least_recently_used_airport():
+    """
+    The pool keeps at most max_airports refreshers, the evicted one is stopped.
+    """
+    fetched = []
+
+    def fetch(airport_code):
+        fetched.append(airport_code)
+        return timetable(airport_code)
+
+    pool = RefresherPool(fetch, max_airports=2, interval=60)
+    try:
+        prague = pool.get_refresher('PRG')
+        assert pool.get('VIE')[0]['flight.iataNumber'].tolist() == ['VIE']
+        pool.get('PRG')
+        pool.get('FRA')
+
+        assert pool.airports() == ['PRG', 'FRA']
+        assert pool.get_refresher('PRG') is prague
+        assert fetched == ['PRG', 'VIE', 'FRA']
+    finally:
+        pool.stop()
+    assert not prague._thread.is_alive()
+
+
+def test_first_pages_served_before_complete(refresher_factory):
+    """
+    With partial=True start() returns with the first page, later refreshes serve the complete timetable until
+    the new one is complete.
+    """
+    release = threading.Event()
+    refreshing = threading.Event()
+    pages = []
+
+    def fetch(on_page):
+        first = timetable('OK1')
+        on_page(first)
+        pages.append(first)
+        if len(pages) > 1:
+            refreshing.set()
+        release.wait(5)
+        complete = pd.concat([timetable('OK1'), timetable('OK2')], ignore_index=True)
+        complete.attrs['fetched_at'] = pd.Timestamp.now(tz='UTC')
+        return complete
+
+    refresher = refresher_factory(fetch, interval=3600, partial=True)
+    refresher.start()
+
+    assert refresher.get()[0]['flight.iataNumber'].tolist() == ['OK1']
+    release.set()
+    deadline = time.time() + 5
+    while len(refresher.get()[0]) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert refresher.get()[0]['flight.iataNumber'].tolist() == ['OK1', 'OK2']
+
+    release.clear()
+    refresher.request_refresh()
+    assert refreshing.wait(5)
+    assert refresher.get()[0]['flight.iataNumber'].tolist() == ['OK1', 'OK2']
+    release.set()
@@ -0,0 +1,115 @@
+"""
+Tests for src/flight_delay/registry.py
+Versions are published next to each other, swapped without a restart and compared in shadow mode.
+"""
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from xgboost import XGBRegressor
+from flight_delay import prediction, registry
+from flight_delay import predictor as model_backends
+from flight_delay.data_preprocessing import BASE_DIR
+
+FEATURES = [
+    'terminal', 'destination_airport', 'airline', 'temp_c', 'precip_mm', 'wind_kph',
+    'departure_traffic', 'arrival_traffic', 'day_in_month', 'hour_sin', 'hour_cos',
+    'weekday_sin', 'weekday_cos'
+]
+
+
+@pytest.fixture(scope='module')
+def features():
+    rng = np.random.default_rng(1)
+    return pd.DataFrame(rng.normal(size=(50, len(FEATURES))).astype(np.float32), columns=FEATURES)
+
+
+def train(features, tmp_path, target: str, name: str):
+    """
+    Saves a small model trained on one feature into its own directory.
+    """
+    model_dir = tmp_path / name
+    model_dir.mkdir()
+    model = XGBRegressor(n_estimators=5, max_depth=2).fit(features, 10 * features[target])
+    joblib.dump(model, model_dir / 'flight_delay_xgb.joblib')
+    model_backends.export_model(model, model_dir)
+    return model
+
+
+@pytest.fixture
+def models_dir(features, tmp_path):
+    """
+    Registry with two versions, v1 is served.
+    """
+    models_dir = tmp_path / 'models'
+    processed_dir = BASE_DIR / 'data' / 'processed'
+    train(features, tmp_path, 'temp_c', 'first')
+    train(features, tmp_path, 'wind_kph', 'second')
+    registry.publish(models_dir, tmp_path / 'first', processed_dir, version='v1', metadata={'mae': 1.5})
+    registry.publish(models_dir, tmp_path / 'second', processed_dir, version='v2', make_current=False)
+    return models_dir
+
+
+def test_publish_and_activate(models_dir, features):
+    """
+    Versions hold the model with its schema, the served one is chosen by the pointer.
+    """
+    assert registry.list_versions(models_dir) == ['v1', 'v2']
+    assert registry.current_version(models_dir) == 'v1'
+    assert {'flight_delay_xgb.json', 'categories.json', 'fill_values.json', 'metadata.json'} <= {
+        path.name for path in (models_dir / 'versions' / 'v1').iterdir()
+    }
+
+    version = model_backends.load_predictor('numpy', models_dir)
+    assert version.version == 'v1'
+    assert version.metadata['mae'] == 1.5
+    assert list(version.feature_names_in_) == FEATURES
+    assert 'RYR' in version.schema.categories['airline'].categories
+
+    with pytest.raises(ValueError):
+        registry.activate(models_dir, 'v3')
+    with pytest.raises(ValueError):
+        registry.publish(models_dir, models_dir, models_dir, version='v1')
+
+
+def test_swap_keeps_pinned_version(models_dir, features):
+    """
+    A new version is swapped in on the next check, a prediction that pinned the old one finishes with it.
+    """
+    predictor = registry.RegistryPredictor(models_dir, 'numpy', check_interval=0, background=False)
+    pinned = prediction.pinned_model(predictor)
+    served_before = pinned.predict(features)
+
+    registry.activate(models_dir, 'v2')
+    assert prediction.pinned_model(predictor).version == 'v2'
+    assert not np.allclose(predictor.predict(features), served_before)
+    np.testing.assert_allclose(pinned.predict(features), served_before)
+
+    # a broken version is not served
+    (models_dir / 'versions' / 'v1' / 'categories.json').write_text('{broken')
+    registry.activate(models_dir, 'v1')
+    assert predictor.current.version == 'v2'
+
+
+def test_shadow_mode_compares_versions(models_dir, features, monkeypatch):
+    """
+    The shadow version scores the same flights, the response comes from the served one.
+    """
+    monkeypatch.setattr(prediction, 'prepare_features_batch', lambda df, airport_code, schema=None: features)
+    registry.set_shadow(models_dir, 'v2')
+    predictor = registry.RegistryPredictor(models_dir, 'numpy', check_interval=0, background=False)
+    timetable = pd.DataFrame(index=features.index)
+
+    delays = prediction.predict_timetable(predictor, timetable, 'PRG')
+
+    served = predictor.current.predict(features)
+    shadow = predictor.shadow.predict(features)
+    np.testing.assert_array_equal(delays.to_numpy(dtype=float), served.round())
+    stats = predictor.status()['shadow_stats']
+    assert stats['version'] == 'v2'
+    assert stats['compared'] == len(features)
+    assert stats['mean_abs_diff'] == pytest.approx(np.abs(shadow.round() - served.round()).mean())
+
+    registry.set_shadow(models_dir, None)
+    predictor.refresh()
+    assert predictor.status()['shadow'] is None
@@ -0,0 +1,216 @@
+"""
+Tests for src/flight_delay/api/response_cache.py
+TTL, size bounded eviction, sharing between processes and the HTTP layer integration.
+"""
+import pandas as pd
+import pytest
+import requests
+from flight_delay.api import http_client, response_cache
+
+
+class FakeRedis:
+    """
+    Local stand-in for a Redis server (get / set with ex / delete).
+    """
+    def __init__(self):
+        self.data = {}
+        self.ttl = {}
+
+    def get(self, name):
+        """
+        Mock get
+        """
+        return self.data.get(name)
+
+    def set(self, name, value, ex=None):
+        """
+        Mock set
+        """
+        self.data[name] = value
+        self.ttl[name] = ex
+
+    def delete(self, name):
+        """
+        Mock delete
+        """
+        self.data.pop(name, None)
+
+
+class FakeResponse:
+    """
+    Mock API response class
+    """
+    def __init__(self, data):
+        self._data = data
+
+    def raise_for_status(self):
+        """
+        Mock raise for status
+        """
+
+    def json(self):
+        """
+        Mock response json
+        """
+        return self._data
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Controllable time.time for the TTL tests.
+    """
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, 'time', lambda: now[0])
+    return now
+
+
+def test_sqlite_cache_ttl(tmp_path, clock):
+    """
+    Entries are served until their TTL expires.
+    """
+    cache = response_cache.SQLiteCache(tmp_path / 'cache.sqlite')
+    cache.set('a', {'data': [1, 2]}, ttl=60)
+
+    assert cache.get('a') == {'data': [1, 2]}
+    clock[0] += 61
+    assert cache.get('a') is None
+
+
+def test_sqlite_cache_shared_between_instances(tmp_path):
+    """
+    Two caches on the same file (two processes) see each other's entries.
+    """
+    writer = response_cache.SQLiteCache(tmp_path / 'cache.sqlite')
+    reader = response_cache.SQLiteCache(tmp_path / 'cache.sqlite')
+
+    writer.set('timetable', {'data': ['OK1']}, ttl=60)
+
+    assert reader.get('timetable') == {'data': ['OK1']}
+
+
+def test_sqlite_cache_evicts_least_recently_used(tmp_path, clock):
+    """
+    Above max_bytes the least recently used entries are evicted.
+    """
+    cache = response_cache.SQLiteCache(tmp_path / 'cache.sqlite', max_bytes=100)
+    value = {'data': 'x' * 30}  # ~44 bytes of JSON
+
+    cache.set('a', value, ttl=60)
+    clock[0] += 1
+    cache.set('b', value, ttl=60)
+    clock[0] += 1
+    cache.get('a')
+    clock[0] += 1
+    cache.set('c', value, ttl=60)
+
+    assert cache.get('a') == value
+    assert cache.get('b') is None
+    assert cache.get('c') == value
+
+
+def test_redis_cache_with_stand_in():
+    """
+    Redis backend works with any client implementing get / set / delete.
+    """
+    client = FakeRedis()
+    cache = response_cache.RedisCache(client)
+
+    cache.set('a', {'data': []}, ttl=300)
+
+    assert cache.get('a') == {'data': []}
+    assert client.ttl['flight_delay:a'] == 300
+    cache.clear()
+    assert cache.get('a') is None
+
+
+@pytest.mark.parametrize("url,expected", [
+    ("none", response_cache.NullCache),
+    ("", response_cache.NullCache),
+])
+def test_cache_from_url(url, expected):
+    """
+    Backend is chosen by the URL.
+    """
+    assert isinstance(response_cache.cache_from_url(url), expected)
+
+
+def test_cache_from_url_unknown():
+    """
+    Unknown scheme raises a ValueError.
+    """
+    with pytest.raises(ValueError):
+        response_cache.cache_from_url('memcached://localhost')
+
+
+def test_get_json_calls_upstream_once_per_ttl(tmp_path, monkeypatch):
+    """
+    Two 'replicas' (separate caches on the same file) make only one upstream call.
+    API keys are not part of the cache key.
+    """
+    calls = []
+
+    def fake_get(self, url, params=None, timeout=None):
+        calls.append(params)
+        return FakeResponse({'data': ['OK1']})
+
+    monkeypatch.setattr(requests.Session, 'get', fake_get)
+
+    monkeypatch.setattr(response_cache, '_cache', response_cache.SQLiteCache(tmp_path / 'c.sqlite'))
+    first = http_client.get_json('https://api/timetable', {'iataCode': 'PRG', 'access_key': 'A'}, ttl=60)
+
+    monkeypatch.setattr(response_cache, '_cache', response_cache.SQLiteCache(tmp_path / 'c.sqlite'))
+    second = http_client.get_json('https://api/timetable', {'iataCode': 'PRG', 'access_key': 'B'}, ttl=60)
+
+    assert first == second == {'data': ['OK1']}
+    assert len(calls) == 1
+
+
+def test_get_json_survives_cache_failure(monkeypatch):
+    """
+    A broken cache backend is treated as a miss.
+    """
+    class BrokenCache(response_cache.ResponseCache):
+        """
+        Every operation fails.
+        """
+        def get(self, key):
+            raise OSError('disk full')
+
+        def set(self, key, value, ttl):
+            raise OSError('disk full')
+
+    monkeypatch.setattr(requests.Session, 'get', lambda *a, **k: FakeResponse({'data': []}))
+    monkeypatch.setattr(response_cache, '_cache', BrokenCache())
+
+    assert http_client.get_json('https://api/timetable', {}, ttl=60) == {'data': []}
+
+
+def test_cached_timetable_keeps_fetch_time(tmp_path, monkeypatch):
+    """
+    A timetable served from the response cache keeps the version of its upstream fetch,
+    so the caches keyed by it (traffic index, predictions, forecasts) stay valid.
+    """
+    from flight_delay import prediction
+    from flight_delay.api import aviationstack_client, streaming
+
+    calls = []
+
+    def fake_get(self, url, params=None, timeout=None):
+        calls.append(params)
+        return FakeResponse({'data': [{'flight': {'iataNumber': 'OK1'}}]})
+
+    monkeypatch.setattr(requests.Session, 'get', fake_get)
+    monkeypatch.setattr(streaming, 'STREAMING', False)
+    monkeypatch.setattr(aviationstack_client, 'API_KEY_DEPARTURE', 'KEY')
+    monkeypatch.setattr(response_cache, '_cache', response_cache.SQLiteCache(tmp_path / 'c.sqlite'))
+
+    first = prediction.fetch_timetable_df('PRG', 'departure')
+    second = prediction.fetch_timetable_df('PRG', 'departure')
+
+    assert len(calls) == 1
+    assert second.attrs['fetched_at'] == first.attrs['fetched_at']
+
+    url = f'{aviationstack_client.AVIATIONSTACK_BASE_URL}timetable'
+    _, fetched_at = http_client.read_cache(url, aviationstack_client.timetable_params('PRG', 'departure'))
+    assert pd.Timestamp(fetched_at, unit='s', tz='UTC') == first.attrs['fetched_at']
@@ -0,0 +1,207 @@
+"""
+Tests for src/flight_delay/server.py
+Runs the ASGI app in-process with a mock timetable and a mock model.
+"""
+import asyncio
+import time
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('fastapi')
+
+import httpx
+from fastapi.testclient import TestClient
+from flight_delay import data_preprocessing, server
+from flight_delay.batching import MicroBatcher
+
+
+class CountingPredictor:
+    """
+    Mock model, the delay is the departure traffic (other departures in the hour). Counts the predict calls.
+    """
+    def __init__(self):
+        """
+        Loads the feature order of the model.
+        """
+        self.feature_names_in_ = np.array(data_preprocessing.get_feature_schema().feature_order)
+        self.calls = 0
+        self.batch_sizes = []
+
+    def predict(self, x_input):
+        """
+        Mock predict
+        """
+        self.calls += 1
+        self.batch_sizes.append(len(x_input))
+        traffic = list(self.feature_names_in_).index('departure_traffic')
+        return x_input[:, traffic] + 0.4
+
+
+@pytest.fixture
+def timetable_df(monkeypatch):
+    """
+    Departure timetable with 40 flights in the same hour, no external data.
+    """
+    monkeypatch.setattr(data_preprocessing, 'get_arrival_df', lambda airport_code='PRG': pd.DataFrame())
+    df = pd.DataFrame({
+        'departure.terminal': [None] * 40,
+        'departure.delay': [None] * 40,
+        'departure.scheduledTime': [f'2025-12-26t06:{i % 20:02d}:00.000' for i in range(40)],
+        'airline.icaoCode': ['CSA'] * 40,
+        'departure.actualTime': [None] * 40,
+        'arrival.iataCode': ['FRA'] * 40,
+        'flight.iataNumber': [f'OK{i}' for i in range(40)],
+    })
+    df.attrs['fetched_at'] = pd.Timestamp.now(tz='UTC')
+    return df
+
+
+@pytest.fixture
+def predictor():
+    """
+    Fresh mock model.
+    """
+    return CountingPredictor()
+
+
+@pytest.fixture
+def app(timetable_df, predictor):
+    """
+    App with the mock timetable and model.
+    """
+    return server.create_app(
+        get_timetable=lambda airport: (timetable_df, timetable_df.attrs['fetched_at']),
+        predictor=predictor,
+        weather_index=lambda airport_code: {},
+        max_batch_size=16,
+        max_wait=0.05,
+    )
+
+
+def test_predict_single_flight(app):
+    """
+    One flight - delay, destination, 404 for unknown flights.
+    """
+    client = TestClient(app)
+
+    response = client.get('/predict', params={'flight': ' ok3 '})
+    assert response.status_code == 200
+    assert response.json() == {'flight': 'OK3', 'destination': 'FRA', 'predicted_delay': 39}
+
+    assert client.get('/predict', params={'flight': 'XX999'}).status_code == 404
+
+
+def test_predict_batch_endpoint(app, predictor):
+    """
+    Batch endpoint scores the flights in one predict call, errors are reported per flight.
+    """
+    client = TestClient(app)
+
+    response = client.post('/predict/batch', json={'flights': ['OK1', 'OK15', 'XX999']})
+    predictions = response.json()['predictions']
+
+    assert [p.get('predicted_delay') for p in predictions] == [39, 39, None]
+    assert 'error' in predictions[2]
+    assert predictor.calls == 1
+
+
+def test_concurrent_requests_are_batched(app, predictor):
+    """
+    Concurrent single flight requests end up in a few predict calls, bounded by max_batch_size.
+    """
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            return await asyncio.gather(
+                *(client.get('/predict', params={'flight': f'OK{i}'}) for i in range(40))
+            )
+
+    responses = asyncio.run(run())
+
+    assert all(r.status_code == 200 for r in responses)
+    assert sum(predictor.batch_sizes) == 40
+    assert predictor.calls < 40
+    assert max(predictor.batch_sizes) <= 16
+
+
+def test_slow_upstream_does_not_block_event_loop(app, monkeypatch):
+    """
+    Encoding on a cold cache waits for the arrivals in the executor, the event loop keeps serving meanwhile.
+    """
+    def slow_arrivals(airport_code='PRG'):
+        time.sleep(0.5)
+        return pd.DataFrame()
+
+    monkeypatch.setattr(data_preprocessing, 'get_arrival_df', slow_arrivals)
+
+    async def run():
+        ticks = []
+
+        async def heartbeat():
+            while True:
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+
+        beating = asyncio.create_task(heartbeat())
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            responses = await asyncio.gather(
+                *(client.get('/predict', params={'flight': f'OK{i}'}) for i in range(8))
+            )
+        beating.cancel()
+        return responses, ticks
+
+    responses, ticks = asyncio.run(run())
+
+    assert all(r.status_code == 200 for r in responses)
+    assert ticks[-1] - ticks[0] >= 0.5
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.25
+
+
+def test_metrics_endpoint(app):
+    """
+    Stage latencies and cache counters of the served requests are exported for Prometheus.
+    """
+    client = TestClient(app)
+    client.get('/predict', params={'flight': 'OK3'})
+
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain; version=0.0.4')
+    assert 'flight_delay_stage_seconds_count{stage="encode_flight_record"}' in response.text
+    assert 'flight_delay_stage_seconds_count{stage="predict"}' in response.text
+    assert 'flight_delay_cache_hits_total{cache="traffic_index"}' in response.text
+
+
+def test_profiled_request(timetable_df, predictor):
+    """
+    A single request is profiled only when profiling is enabled, the report comes with the prediction.
+    """
+    def create(enabled):
+        return TestClient(server.create_app(
+            get_timetable=lambda airport: (timetable_df, timetable_df.attrs['fetched_at']),
+            predictor=predictor, weather_index=lambda airport_code: {}, profiling_enabled=enabled,
+        ))
+
+    params = {'flight': 'OK3', 'profile': 'true'}
+    assert create(False).get('/predict', params=params).status_code == 403
+
+    body = create(True).get('/predict', params=params).json()
+    assert body['predicted_delay'] == 39
+    assert 'function calls' in body['profile']['report']
+
+
+def test_micro_batcher_propagates_errors():
+    """
+    A failed batch fails all of its requests.
+    """
+    def failing(items):
+        raise RuntimeError('model failed')
+
+    async def run():
+        batcher = MicroBatcher(failing, max_batch_size=4, max_wait=0.01)
+        return await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(run()))
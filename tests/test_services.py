@@ -50,12 +50,33 @@ def mock_timetable_df():
     })
 
 
+class FakeScheduler:
+    """
+    Forecast scheduler with fixed forecast tables.
+    """
+    def __init__(self, tables=None):
+        self.tables = tables or {}
+
+    def get(self, airport_code):
+        return self.tables.get(airport_code)
+
+
+@pytest.fixture(autouse=True)
+def no_forecasts(monkeypatch):
+    """
+    No precomputed forecasts unless the test sets them, predictions are made on demand.
+    """
+    scheduler = FakeScheduler()
+    monkeypatch.setattr("flight_delay.services.get_forecast_scheduler", lambda: scheduler)
+    yield scheduler
+
+
 @pytest.fixture
 def mock_predict_delay(monkeypatch):
     """
     Mock predict_delay function to return a constant. (42)
     """
-    monkeypatch.setattr("flight_delay.services.predict_delay", lambda flight_row, df: 42)
+    monkeypatch.setattr("flight_delay.services.predict_delay", lambda flight_row, df, airport_code="PRG": 42)
     yield
 
 
@@ -110,6 +131,30 @@ def test_run_prediction(mock_predict_delay, mock_timetable_df, flight_number_inp
     assert flight_number == flight_number_input
 
 
+def test_run_prediction_reads_forecast(no_forecasts, mock_timetable_df, monkeypatch):
+    """
+    A precomputed forecast of the shown timetable is returned without a prediction,
+    a forecast table of another timetable fetch is not used.
+    """
+    from flight_delay.forecasts import ForecastTable
+
+    def fail(**kwargs):
+        raise AssertionError('predict_delay should not be called')
+
+    monkeypatch.setattr("flight_delay.services.predict_delay", fail)
+    mock_timetable_df.attrs['fetched_at'] = pd.Timestamp("2025-12-26 08:00", tz="UTC")
+    no_forecasts.tables["PRG"] = ForecastTable(
+        airport_code="PRG", timetable_fetched_at=mock_timetable_df.attrs['fetched_at'], weather_fetched_at=None,
+        model=None, delays={"LH123": 17}, by_row=pd.Series([17, None, None, None], dtype='Int64'),
+    )
+
+    assert services.run_prediction("LH123", pd.Timestamp("2025-12-26"), mock_timetable_df) == ("FRA", 17, "LH123")
+
+    monkeypatch.setattr("flight_delay.services.predict_delay", lambda flight_row, df, airport_code="PRG": 42)
+    mock_timetable_df.attrs['fetched_at'] = pd.Timestamp("2025-12-26 08:30", tz="UTC")
+    assert services.run_prediction("LH123", pd.Timestamp("2025-12-26"), mock_timetable_df)[1] == 42
+
+
 @pytest.mark.parametrize("flight_number_input", [
     "",
     " ",
@@ -145,3 +190,41 @@ def test_add_flight_for_visualization(destination_iata, prev_flights, new_delay,
     assert len(result) == expected_len
     assert result[-1]['predicted_delay'] == expected_delay
     assert result[-1]['flight_number'] == expected_number
+
+
+class CountingPredictor:
+    """
+    Fake model that counts calls to predict and returns the departure traffic as the delay.
+    """
+    feature_names_in_ = ['departure_traffic', 'hour_sin']
+
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, x_input):
+        """
+        Mock predict
+        """
+        self.calls += 1
+        return x_input['departure_traffic'].to_numpy() + 0.4
+
+
+def test_predict_timetable_single_predict_call(monkeypatch, mock_timetable_df):
+    """
+    The whole timetable is scored with exactly one predict call.
+    Rows dropped by preprocessing get a missing value.
+    """
+    predictor = CountingPredictor()
+    features = pd.DataFrame(
+        {'hour_sin': [0.0, 0.5, 1.0], 'departure_traffic': [3, 7, 1]},
+        index=[0, 1, 3],
+    )
+    monkeypatch.setattr("flight_delay.services.load_predictor", lambda airport_code="PRG": predictor)
+    monkeypatch.setattr("flight_delay.prediction.prepare_features_batch", lambda df, airport_code="PRG", schema=None: features)
+
+    delays = services.predict_timetable(mock_timetable_df)
+
+    assert predictor.calls == 1
+    assert list(delays.index) == list(mock_timetable_df.index)
+    assert delays.loc[[0, 1, 3]].tolist() == [3, 7, 1]
+    assert pd.isna(delays.loc[2])
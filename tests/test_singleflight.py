@@ -0,0 +1,125 @@
+"""
+Tests for src/flight_delay/api/singleflight.py
+Concurrent identical calls must reach the upstream only once.
+"""
+import asyncio
+import threading
+import time
+from flight_delay.api import aviationstack_client, http_client
+from flight_delay.api.singleflight import SingleFlight, AsyncSingleFlight
+
+
+def run_in_threads(fn, n: int) -> list:
+    """
+    Calls fn from n threads at once, returns the results (or exceptions).
+    """
+    results = [None] * n
+    barrier = threading.Barrier(n)
+
+    def worker(i):
+        barrier.wait()
+        try:
+            results[i] = fn()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_calls_share_one_upstream_call():
+    """
+    Ten threads asking for the same key get the same response from a single call.
+    """
+    flight = SingleFlight()
+    calls = []
+
+    def upstream():
+        calls.append(1)
+        time.sleep(0.2)
+        return {'data': ['OK1']}
+
+    results = run_in_threads(lambda: flight.do('timetable', upstream), 10)
+
+    assert len(calls) == 1
+    assert all(result == {'data': ['OK1']} for result in results)
+    assert flight.stats() == {'issued': 1, 'coalesced': 9}
+
+
+def test_errors_are_shared_and_not_remembered():
+    """
+    Waiters get the exception of the shared call, the next call is sent again.
+    """
+    flight = SingleFlight()
+
+    def failing():
+        time.sleep(0.2)
+        raise ValueError('429')
+
+    results = run_in_threads(lambda: flight.do('timetable', failing), 5)
+    assert all(isinstance(result, ValueError) for result in results)
+
+    assert flight.do('timetable', lambda: 'fresh') == 'fresh'
+    assert flight.stats()['issued'] == 2
+
+
+def test_different_keys_are_not_coalesced():
+    """
+    Only identical calls wait for each other.
+    """
+    flight = SingleFlight()
+    results = run_in_threads(lambda: flight.do(threading.get_ident(), lambda: time.sleep(0.05)), 4)
+
+    assert results == [None] * 4
+    assert flight.stats() == {'issued': 4, 'coalesced': 0}
+
+
+def test_async_calls_share_one_upstream_call():
+    """
+    Concurrent coroutines with the same key await one call, cancelling a waiter keeps it running.
+    """
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def upstream():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return 'OK1'
+
+    async def main():
+        cancelled = asyncio.ensure_future(flight.do('timetable', upstream))
+        others = [flight.do('timetable', upstream) for _ in range(4)]
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        return await asyncio.gather(*others)
+
+    assert asyncio.run(main()) == ['OK1'] * 4
+    assert len(calls) == 1
+    assert flight.stats() == {'issued': 1, 'coalesced': 4}
+
+
+def test_post_query_coalesces_identical_requests(monkeypatch):
+    """
+    Sessions missing the cache at the same moment send one timetable request.
+    """
+    monkeypatch.setattr(aviationstack_client, 'API_KEY_DEPARTURE', 'KEY')
+    monkeypatch.setattr(aviationstack_client, '_flight', SingleFlight())
+    calls = []
+
+    def get_json_entry(url, params=None, timeout=10, ttl=0):
+        calls.append(params)
+        time.sleep(0.2)
+        return {'data': []}, time.time()
+
+    monkeypatch.setattr(http_client, 'get_json_entry', get_json_entry)
+
+    params = aviationstack_client.timetable_params('PRG', 'departure')
+    results = run_in_threads(lambda: aviationstack_client.post_query('timetable', params), 8)
+
+    assert results == [{'data': []}] * 8
+    assert len(calls) == 1
+    assert aviationstack_client.coalescing_stats()['coalesced'] >= 7
@@ -0,0 +1,246 @@
+"""
+Tests for src/flight_delay/api/streaming.py
+Paginated results are streamed page by page into the used columns only.
+"""
+import io
+import json
+import sys
+import threading
+import time
+import pandas as pd
+import pytest
+import requests
+from flight_delay import prediction
+from flight_delay.api import aviationstack_client, http_client, response_cache, streaming
+from flight_delay.api.singleflight import SingleFlight
+from flight_delay.api.streaming import ColumnBuffer, fetch_paginated_df
+
+
+def make_record(i):
+    return {
+        'type': 'departure',
+        'status': 'active',
+        'departure': {'iataCode': 'prg', 'delay': i, 'scheduledTime': '2025-12-26t10:00:00.000', 'gate': 'A1'},
+        'arrival': {'iataCode': 'lhr', 'scheduledTime': '2025-12-26t12:00:00.000'},
+        'airline': {'name': 'Airline', 'iataCode': 'ok', 'icaoCode': 'csa'},
+        'flight': {'number': str(i), 'iataNumber': f'ok{i}', 'icaoNumber': f'csa{i}'},
+        'codeshared': None,
+    }
+
+
+class FakeResponse:
+    """
+    Streamed response, the body is read from raw (ijson) or content.
+    """
+
+    def __init__(self, payload, status=200):
+        self._body = json.dumps(payload).encode('utf-8')
+        self.raw = io.BytesIO(self._body)
+        self.status = status
+
+    @property
+    def content(self):
+        return self._body
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise requests.HTTPError(f'HTTP {self.status}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """
+    Paginated endpoint with total records, the plan caps the limit at max_limit.
+    """
+
+    def __init__(self, total, max_limit=1000, with_total=True, delay=0.0):
+        self.total = total
+        self.max_limit = max_limit
+        self.with_total = with_total
+        self.delay = delay
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None, stream=False):
+        assert stream
+        time.sleep(self.delay)
+        self.calls.append(dict(params))
+        offset, limit = params['offset'], min(params['limit'], self.max_limit)
+        data = [make_record(i) for i in range(offset, min(offset + limit, self.total))]
+        pagination = {'offset': offset, 'limit': limit, 'count': len(data)}
+        if self.with_total:
+            pagination['total'] = self.total
+        return FakeResponse({'pagination': pagination, 'data': data})
+
+
+@pytest.fixture(params=['ijson', 'json'])
+def parser(request, monkeypatch):
+    """
+    Runs the test with the incremental parser and with the whole page parser.
+    """
+    if request.param == 'ijson':
+        pytest.importorskip('ijson')
+    else:
+        monkeypatch.setitem(sys.modules, 'ijson', None)
+    return request.param
+
+
+@pytest.fixture
+def session(monkeypatch, parser):
+    monkeypatch.setenv('AVIATIONSTACK_API_KEY', 'KEY')
+    monkeypatch.setattr(response_cache, '_cache', response_cache.NullCache())
+    monkeypatch.setattr(aviationstack_client, '_flight', SingleFlight())
+    session = FakeSession(total=25)
+    monkeypatch.setattr(http_client, 'get_session', lambda: session)
+    return session
+
+
+def test_column_buffer_keeps_selected_columns():
+    """
+    Nested values are flattened to the json_normalize names, missing ones are None.
+    """
+    buffer = ColumnBuffer(('flight.iataNumber', 'codeshared.flight.iataNumber', 'status'))
+    assert buffer.extend([make_record(1), {'codeshared': {'flight': {'iataNumber': 'af1'}}}]) == 2
+
+    df = buffer.frame()
+
+    assert list(df.columns) == ['flight.iataNumber', 'codeshared.flight.iataNumber', 'status']
+    assert df.to_dict('list') == {
+        'flight.iataNumber': ['ok1', None], 'codeshared.flight.iataNumber': [None, 'af1'], 'status': ['active', None]
+    }
+    assert list(buffer.frame(1).index) == [1]
+
+
+def test_pages_requested_until_total(session):
+    """
+    Offsets advance by the received records until the total is fetched.
+    """
+    df = fetch_paginated_df('timetable', {'iataCode': 'PRG', 'type': 'departure'}, page_size=10)
+
+    assert [call['offset'] for call in session.calls] == [0, 10, 20]
+    assert all(call['limit'] == 10 and call['access_key'] == 'KEY' for call in session.calls)
+    assert len(df) == 25
+    assert list(df.columns) == list(streaming.TIMETABLE_COLUMNS)
+    assert 'departure.gate' not in df.columns
+    assert df['departure.delay'].tolist() == list(range(25))
+    normalized = pd.json_normalize([make_record(i) for i in range(25)])
+    shared = df.columns.intersection(normalized.columns)
+    pd.testing.assert_frame_equal(df[shared], normalized[shared])
+    assert df['codeshared.flight.iataNumber'].isna().all()
+
+
+def test_first_rows_ready_before_last_page(session):
+    """
+    The rows fetched so far are handed over after every page, before the next one is requested.
+    """
+    seen = []
+
+    def on_page(df):
+        seen.append((len(session.calls), len(df), df.attrs['partial']))
+
+    df = fetch_paginated_df('timetable', {'iataCode': 'PRG'}, page_size=10, on_page=on_page)
+
+    assert seen == [(1, 10, True), (2, 20, True), (3, 25, True)]
+    assert len(df) == 25
+    assert 'partial' not in df.attrs
+
+
+def test_pages_cached_and_coalesced(session, tmp_path, monkeypatch):
+    """
+    Concurrent fetches share one download, later ones (other processes) read the kept columns from the
+    response cache and get the time of the download.
+    """
+    monkeypatch.setattr(response_cache, '_cache', response_cache.SQLiteCache(tmp_path / 'responses.sqlite'))
+    session.delay = 0.05
+    results = []
+
+    def fetch():
+        results.append(fetch_paginated_df('timetable', {'iataCode': 'PRG'}, page_size=10))
+
+    threads = [threading.Thread(target=fetch) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(session.calls) == 3
+    assert aviationstack_client.coalescing_stats()['coalesced'] == 3
+    assert len({id(df) for df in results}) == 4
+
+    monkeypatch.setattr(aviationstack_client, '_flight', SingleFlight())
+    cached = fetch_paginated_df('timetable', {'iataCode': 'PRG'}, page_size=10)
+
+    assert len(session.calls) == 3
+    pd.testing.assert_frame_equal(cached, results[0])
+    assert cached.attrs['fetched_at'] == results[0].attrs['fetched_at']
+    fetch_paginated_df('timetable', {'iataCode': 'PRG'}, columns=('flight.iataNumber',), page_size=10)
+    assert len(session.calls) == 6
+
+
+def test_max_pages_bounds_requests(session):
+    """
+    No more than max_pages requests, whatever the number of results.
+    """
+    df = fetch_paginated_df('timetable', page_size=5, max_pages=2)
+
+    assert len(session.calls) == 2
+    assert len(df) == 10
+
+
+@pytest.mark.parametrize('with_total', [True, False])
+def test_capped_limit_fetches_all_pages(session, with_total):
+    """
+    A plan returning fewer records than requested does not cut the result to the first page.
+    """
+    session.max_limit = 10
+    session.with_total = with_total
+
+    df = fetch_paginated_df('timetable', page_size=1000)
+
+    assert [call['offset'] for call in session.calls] == [0, 10, 20]
+    assert df['departure.delay'].tolist() == list(range(25))
+
+
+def test_errors_are_raised(monkeypatch, parser):
+    """
+    HTTP errors and error payloads are raised, an empty result is an empty dataframe.
+    """
+    monkeypatch.setenv('AVIATIONSTACK_API_KEY', 'KEY')
+    monkeypatch.setattr(response_cache, '_cache', response_cache.NullCache())
+    responses = []
+    monkeypatch.setattr(http_client, 'get_session', lambda: type('Session', (), {
+        'get': lambda self, *a, **k: responses.pop(0)
+    })())
+
+    responses.append(FakeResponse({}, status=500))
+    with pytest.raises(requests.HTTPError):
+        fetch_paginated_df('timetable')
+
+    responses.append(FakeResponse({'data': []}))
+    assert fetch_paginated_df('timetable').empty
+
+    responses.append(FakeResponse({'error': {'code': 'invalid_access_key', 'message': 'Invalid key.'}}))
+    with pytest.raises(ValueError, match='invalid_access_key'):
+        fetch_paginated_df('timetable')
+
+    responses.append(FakeResponse({'data': [make_record(1)], 'error': 'usage_limit_reached'}))
+    with pytest.raises(ValueError, match='usage_limit_reached'):
+        fetch_paginated_df('timetable')
+
+
+def test_timetable_streamed_when_enabled(session, monkeypatch):
+    """
+    fetch_timetable_df uses the paginated fetch and versions the result like the single request.
+    """
+    monkeypatch.setattr(streaming, 'STREAMING', True)
+
+    df = prediction.fetch_timetable_df('PRG', 'departure')
+
+    assert len(df) == 25
+    assert len(session.calls) == 1
+    assert session.calls[0]['iataCode'] == 'PRG'
+    assert 'fetched_at' in df.attrs
@@ -0,0 +1,497 @@
+"""
+Tests for src/flight_delay/training/
+Chunked training set builder, the Parquet storage, the hyperparameter search and the incremental updates
+on small synthetic data.
+"""
+import json
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from flight_delay.training import dataset, storage
+
+
+@pytest.fixture
+def raw_exports(tmp_path):
+    """
+    Departures, arrivals and weather CSVs like the AviationStack / Open-Meteo exports (with unused columns).
+    """
+    departures = pd.DataFrame({
+        'type': ['departure'] * 6,
+        'status': ['active', 'active', 'active', 'cancelled', 'active', 'active'],
+        'departure.iataCode': ['prg'] * 6,
+        'departure.terminal': [None, None, None, 2.0, 1.0, None],
+        'departure.delay': [12.0, None, None, 5.0, 400.0, None],
+        'departure.scheduledTime': [
+            '2025-01-01t06:05:00.000', '2025-01-01t06:20:00.000', '2025-01-01t06:50:00.000',
+            '2025-01-01t06:10:00.000', '2025-01-01t09:00:00.000', '2025-01-01t10:00:00.000',
+        ],
+        'departure.estimatedTime': ['2025-01-01t06:05:00.000'] * 5 + [None],
+        'departure.actualTime': [
+            '2025-01-01t06:17:00.000', None, None,
+            None, '2025-01-01t15:40:00.000', None,
+        ],
+        'airline.icaoCode': ['csa', 'ryr', 'ryr', 'csa', 'csa', 'csa'],
+        'arrival.iataCode': ['cdg', 'stn', 'jfk', 'ams', 'fra', 'fra'],
+        'codeshared.flight.iataNumber': [None] * 6,
+    })
+    arrivals = pd.DataFrame({
+        'arrival.scheduledTime': ['2025-01-01t06:10:00.000', '2025-01-01t05:45:00.000', '2025-01-01t09:00:00.000'],
+        'arrival.gate': ['A1', 'A2', 'A3'],
+    })
+    # UTC, Prague is UTC+1 in January
+    weather = pd.DataFrame({
+        'time': pd.date_range('2025-01-01 00:00', periods=12, freq='h').astype(str),
+        'temp_c': np.arange(12, dtype=float),
+        'precip_mm': 0.0,
+        'snow_cm': 0.0,
+        'wind_kph': 10.0,
+        'visibility_m': None,
+    })
+
+    paths = {name: tmp_path / f'{name}.csv' for name in ('departures', 'arrivals', 'weather')}
+    departures.to_csv(paths['departures'], index=False)
+    arrivals.to_csv(paths['arrivals'], index=False)
+    weather.to_csv(paths['weather'], index=False)
+    return paths
+
+
+def build(raw_exports, tmp_path, chunksize):
+    """
+    Builds the training set and reads it back.
+    """
+    output = tmp_path / f'training_{chunksize}.parquet'
+    rows = dataset.build_training_set(
+        raw_exports['departures'], raw_exports['arrivals'], raw_exports['weather'], output, chunksize=chunksize
+    )
+    df = dataset.load_training_set(output)
+    assert len(df) == rows
+    return df
+
+
+def test_build_training_set_features(raw_exports, tmp_path):
+    """
+    Only completed flights under the delay limit are kept, the features follow the online definitions.
+    """
+    df = build(raw_exports, tmp_path, chunksize=1000)
+
+    assert list(df.columns) == [*dataset.FEATURE_COLUMNS, dataset.TARGET_COLUMN]
+    # cancelled, 400 min delay and unknown departure time are dropped
+    assert df['airline'].tolist() == ['CSA', 'RYR', 'RYR']
+    assert df['destination_airport'].tolist() == ['CDG', 'STN', 'JFK']
+
+    # missing delay of a flight that did not leave late is 0
+    assert df['delay'].tolist() == [12.0, 0.0, 0.0]
+
+    # 2 completed departures at 06:00 (the cancelled one does not count), 06:50 rounds to 07:00
+    assert df['departure_traffic'].tolist() == [1.0, 1.0, 0.0]
+    assert df['arrival_traffic'].tolist() == [2.0, 2.0, 0.0]
+
+    # 06:00 local time is 05:00 UTC
+    assert df['temp_c'].tolist() == [5.0, 5.0, 6.0]
+
+    # Schengen destination -> terminal 2, other -> 1
+    assert df['terminal'].tolist() == [2.0, 1.0, 1.0]
+    assert df['hour_sin'].iloc[0] == pytest.approx(np.sin(2 * np.pi * 6 / 24))
+
+
+def test_build_training_set_chunks_do_not_change_result(raw_exports, tmp_path):
+    """
+    Reading the exports in tiny chunks gives the same training set as one chunk.
+    """
+    pd.testing.assert_frame_equal(build(raw_exports, tmp_path, chunksize=2), build(raw_exports, tmp_path, chunksize=1000))
+
+
+def test_build_training_set_with_destination_weather(raw_exports, tmp_path):
+    """
+    The destination weather history is joined at the departure hour in UTC, a model trained on it
+    is served with the destination weather (its fill values list the features).
+    """
+    from flight_delay.data_preprocessing import FeatureSchema, uses_destination_weather
+
+    # UTC - the 06:00 departures (local, UTC+1) look up 05:00, the 07:00 one 06:00
+    pd.DataFrame({
+        'airport': ['cdg', 'stn', 'stn', 'cdg'],
+        'time': ['2025-01-01 05:00', '2025-01-01 05:00', '2025-01-01 06:00', '2025-01-01 06:00'],
+        'temp_c': [15.0, 25.0, 26.0, 16.0], 'precip_mm': [1.0, 0.0, 0.0, 0.0], 'wind_kph': [30.0, 5.0, 5.0, 20.0],
+    }).to_csv(tmp_path / 'destinations.csv', index=False)
+
+    output = tmp_path / 'training.parquet'
+    dataset.build_training_set(
+        raw_exports['departures'], raw_exports['arrivals'], raw_exports['weather'], output,
+        destination_weather_path=tmp_path / 'destinations.csv'
+    )
+    df = dataset.load_training_set(output)
+
+    assert list(df.columns) == [*dataset.FEATURE_COLUMNS, 'dest_temp_c', 'dest_precip_mm', 'dest_wind_kph', 'delay']
+    assert df['destination_airport'].tolist() == ['CDG', 'STN', 'JFK']
+    assert df['dest_temp_c'].tolist()[:2] == [15.0, 25.0]
+    assert df['dest_wind_kph'].tolist()[:2] == [30.0, 5.0]
+    # no history of JFK
+    assert np.isnan(df['dest_temp_c'].iloc[2])
+
+    encoded, categories = dataset.encode_categories(df)
+    xtrain = dataset.split_dataset(pd.concat([encoded] * 5, ignore_index=True))[0]
+    assert list(xtrain.columns) == dataset.training_features(df.columns)
+    dataset.save_artifacts(xtrain, categories, tmp_path)
+    assert uses_destination_weather(FeatureSchema.from_dir(tmp_path))
+
+
+def test_encode_and_save_artifacts(raw_exports, tmp_path):
+    """
+    Artifacts of the encoded training set are loadable by the online feature schema.
+    """
+    from flight_delay.data_preprocessing import FeatureSchema
+
+    df, categories = dataset.encode_categories(build(raw_exports, tmp_path, chunksize=1000))
+    assert categories['airline'] == ['CSA', 'RYR']
+    assert df['airline'].tolist() == [0, 1, 1]
+
+    dataset.save_artifacts(df[list(dataset.FEATURE_COLUMNS)], categories, tmp_path)
+    schema = FeatureSchema.from_dir(tmp_path)
+
+    assert schema.feature_order == dataset.FEATURE_COLUMNS
+    assert schema.category_codes['destination_airport']['STN'] == 1
+
+
+@pytest.fixture
+def parquet_exports(raw_exports, tmp_path):
+    """
+    The raw exports converted to partitioned Parquet datasets (tiny chunks).
+    """
+    paths = {}
+    for kind, name in [('departures', 'departures'), ('arrivals', 'arrivals'), ('weather', 'weather')]:
+        paths[name] = tmp_path / 'parquet' / name
+        storage.convert_csv(raw_exports[name], paths[name], kind, airport_code='PRG', chunksize=2)
+    return paths
+
+
+def test_convert_csv_partitions_and_types(parquet_exports):
+    """
+    The datasets are partitioned by month and airport, times are timestamps and text is categorical.
+    """
+    assert (parquet_exports['departures'] / 'month=2025-01' / 'airport=PRG').is_dir()
+
+    df = storage.read_dataset(parquet_exports['departures'])
+    assert len(df) == 6
+    assert pd.api.types.is_datetime64_any_dtype(df['departure.scheduledTime'])
+    assert isinstance(df['status'].dtype, pd.CategoricalDtype)
+    assert df['departure.delay'].dtype == np.float64
+
+
+def test_read_dataset_projection_and_pushdown(parquet_exports):
+    """
+    Only the requested columns of the matching partitions are read.
+    """
+    df = storage.read_dataset(parquet_exports['arrivals'], columns=['arrival.scheduledTime'], airport_code='prg')
+    assert list(df.columns) == ['arrival.scheduledTime']
+    assert len(df) == 3
+
+    assert storage.read_dataset(parquet_exports['arrivals'], airport_code='VIE').empty
+    assert storage.read_dataset(parquet_exports['arrivals'], start_month='2025-02').empty
+
+
+def test_build_training_set_from_parquet(raw_exports, parquet_exports, tmp_path):
+    """
+    The Parquet datasets give the same training set as the CSVs.
+    """
+    output = tmp_path / 'from_parquet.parquet'
+    dataset.build_training_set(
+        parquet_exports['departures'], parquet_exports['arrivals'], parquet_exports['weather'], output,
+        chunksize=2, airport_code='PRG'
+    )
+
+    pd.testing.assert_frame_equal(dataset.load_training_set(output), build(raw_exports, tmp_path, chunksize=1000))
+
+
+@pytest.fixture
+def training_parquet(tmp_path):
+    """
+    Synthetic training set, the delay depends on the traffic.
+    """
+    rng = np.random.default_rng(0)
+    rows = 600
+    df = pd.DataFrame({
+        'terminal': rng.choice([1.0, 2.0], rows),
+        'destination_airport': rng.choice(['CDG', 'STN', 'FRA'], rows),
+        'airline': rng.choice(['CSA', 'RYR'], rows),
+        **{col: rng.normal(size=rows) for col in dataset.FEATURE_COLUMNS[3:]},
+    })
+    df['delay'] = df['departure_traffic'] * 10 + rng.normal(size=rows)
+    path = tmp_path / 'training.parquet'
+    df.to_parquet(path)
+    return path
+
+
+def test_rung_budgets():
+    """
+    The budget grows by the reduction factor up to the maximum.
+    """
+    from flight_delay.training import tune
+
+    assert tune.rung_budgets(50, 500, 3) == [50, 150, 450, 500]
+    assert tune.rung_budgets(500, 500, 3) == [500]
+
+
+def test_tune_prunes_and_resumes(training_parquet, tmp_path, capsys):
+    """
+    Only the best configurations reach the next rung and a repeated search trains nothing again.
+    """
+    from flight_delay.training import tune
+
+    grid = {'max_depth': [2, 3, 4], 'learning_rate': [0.05, 0.3]}
+    results = tmp_path / 'trials.jsonl'
+
+    best = tune.tune(training_parquet, results, workers=2, grid=grid, min_rounds=5, max_rounds=20, reduction=3)
+
+    trials = [json.loads(line) for line in results.read_text().splitlines()]
+    # 6 configurations x 5 rounds, 2 x 15 rounds, 1 x 20 rounds
+    assert [t['rounds'] for t in trials].count(5) == 6
+    assert [t['rounds'] for t in trials].count(15) == 2
+    assert [t['rounds'] for t in trials].count(20) == 1
+    assert best['rounds'] == 20
+    assert best['best_iteration'] < 20
+
+    assert tune.tune(training_parquet, results, workers=2, grid=grid, min_rounds=5, max_rounds=20) == best
+    assert len(results.read_text().splitlines()) == len(trials)
+    assert '(6 resumed)' in capsys.readouterr().out
+
+
+def test_tune_carries_over_trials_that_stopped_early(training_parquet, tmp_path, capsys):
+    """
+    A configuration that stopped early is not trained again with a bigger budget.
+    """
+    from flight_delay.training import tune
+
+    grid = {'max_depth': [3], 'learning_rate': [1.0, 0.9]}
+    results = tmp_path / 'trials.jsonl'
+
+    best = tune.tune(training_parquet, results, workers=2, grid=grid, min_rounds=60, max_rounds=200, reduction=3)
+
+    trials = [json.loads(line) for line in results.read_text().splitlines()]
+    first = next(t for t in trials if t['rounds'] == 60 and t['params'] == best['params'])
+    assert tune.stopped_early(first)
+    assert [t['rounds'] for t in trials] == [60, 60, 180, 200]
+    assert (best['rounds'], best['best_iteration'], best['score']) == (200, first['best_iteration'], first['score'])
+    assert '(1 carried over)' in capsys.readouterr().out
+
+
+def test_collect_day_from_live_timetable(monkeypatch):
+    """
+    Departed flights of the live timetable become training rows, scheduled and cancelled ones are skipped.
+    """
+    from flight_delay.destination_weather import DestinationWeather
+    from flight_delay.training import incremental
+
+    timetable = pd.DataFrame({
+        'status': ['landed', 'active', 'scheduled', 'cancelled'],
+        'departure.scheduledTime': ['2025-05-01t06:00:00.000', '2025-05-01t06:10:00.000',
+                                    '2025-05-01t20:00:00.000', '2025-05-01t06:30:00.000'],
+        'departure.estimatedTime': ['2025-05-01t06:00:00.000'] * 3 + [None],
+        'departure.actualTime': ['2025-05-01t06:20:00.000', None, None, None],
+        'departure.delay': [20.0, None, None, None],
+        'airline.icaoCode': ['csa', 'ryr', 'csa', 'csa'],
+        'arrival.iataCode': ['cdg', 'stn', 'jfk', 'ams'],
+    })
+    arrivals = pd.DataFrame({'hour_bucket': pd.to_datetime(['2025-05-01 06:00', '2025-05-01 06:00'])})
+    weather = pd.DataFrame({
+        'time': pd.date_range('2025-05-01', periods=24, freq='h'),
+        'temp_c': np.arange(24, dtype=float), 'precip_mm': 0.0, 'wind_kph': 5.0,
+    })
+    # UTC, Prague is UTC+2 in May - the 06:00 departures look up 04:00
+    forecast = {'hourly': {
+        'time': [f'2025-05-01T{hour:02d}:00' for hour in range(24)],
+        'temperature_2m': [float(hour) for hour in range(24)],
+        'precipitation': [0.0] * 24,
+        'wind_speed_10m': [7.0] * 24,
+    }}
+    destination_weather = DestinationWeather(fetch=lambda locations: [forecast] * len(locations))
+    monkeypatch.setattr(incremental, 'get_arrival_df', lambda airport_code: arrivals)
+    monkeypatch.setattr(incremental, 'get_weather', lambda airport_code: weather)
+    monkeypatch.setattr(incremental, 'get_destination_weather', lambda: destination_weather)
+
+    rows = incremental.collect_day(timetable, 'PRG')
+
+    assert rows['airline'].tolist() == ['CSA', 'RYR']
+    assert rows['delay'].tolist() == [20.0, 0.0]
+    assert rows['departure_traffic'].tolist() == [1.0, 1.0]
+    assert rows['arrival_traffic'].tolist() == [2.0, 2.0]
+    assert rows['temp_c'].tolist() == [6.0, 6.0]
+    assert rows['dest_temp_c'].tolist() == [4.0, 4.0]
+    assert rows['dest_wind_kph'].tolist() == [7.0, 7.0]
+
+
+def test_update_model_continues_boosting(training_parquet, tmp_path):
+    """
+    The update adds rounds to the saved model and only the last days of the store are used.
+    """
+    import joblib
+    from xgboost import XGBRegressor
+    from flight_delay.training import incremental
+
+    df, categories = dataset.encode_categories(dataset.load_training_set(training_parquet))
+    x, y = df[list(dataset.FEATURE_COLUMNS)], df['delay']
+    models_dir = tmp_path / 'models'
+    models_dir.mkdir()
+    joblib.dump(XGBRegressor(n_estimators=10, max_depth=3).fit(x, y), models_dir / 'flight_delay_xgb.joblib')
+    dataset.save_artifacts(x, categories, tmp_path)
+
+    rows = dataset.load_training_set(training_parquet)
+    updates = tmp_path / 'updates'
+    for i, day in enumerate(['2025-05-01', '2025-05-02', '2025-05-03']):
+        incremental.append_day(rows.iloc[i * 200:(i + 1) * 200], day, 'PRG', updates)
+    incremental.append_day(rows.iloc[:10], '2025-05-03', 'PRG', updates)
+
+    recent = incremental.load_recent(updates, 'PRG', window_days=2)
+    assert len(recent) == 200 + 10
+
+    model = incremental.update_model(models_dir, recent, tmp_path, rounds=5)
+    assert model.get_booster().num_boosted_rounds() == 15
+    assert joblib.load(models_dir / 'flight_delay_xgb.joblib').get_booster().num_boosted_rounds() == 15
+    assert (models_dir / 'flight_delay_xgb.json').exists()
+    assert incremental.update_model(models_dir, recent.iloc[:0], tmp_path) is None
+
+
+def test_plan_update_skips_learned_days():
+    """
+    Learned days are not trained on again and the latest day is held out.
+    """
+    from flight_delay.training import incremental
+
+    days = ['2025-05-01', '2025-05-02', '2025-05-03', '2025-05-04']
+    assert incremental.plan_update(days, []) == (days[:3], '2025-05-04')
+    assert incremental.plan_update(days, days[:2]) == (['2025-05-03'], '2025-05-04')
+    assert incremental.plan_update(days, days[:3]) == ([], '2025-05-04')
+    assert incremental.plan_update(days, [], window_days=1) == (['2025-05-03'], '2025-05-04')
+    assert incremental.plan_update(days[:1], []) == ([], None)
+
+
+def test_update_model_bounded_and_validated(training_parquet, tmp_path, capsys):
+    """
+    The nightly job learns every day once, an update worse on the holdout day or beyond
+    max_rounds leaves the model files as they were.
+    """
+    import joblib
+    from xgboost import XGBRegressor
+    from flight_delay.training import incremental
+
+    df, categories = dataset.encode_categories(dataset.load_training_set(training_parquet))
+    x, y = df[list(dataset.FEATURE_COLUMNS)], df['delay']
+    models_dir = tmp_path / 'models'
+    models_dir.mkdir()
+    joblib.dump(XGBRegressor(n_estimators=10, max_depth=3).fit(x, y), models_dir / 'flight_delay_xgb.joblib')
+    dataset.save_artifacts(x, categories, tmp_path)
+    model_path = models_dir / 'flight_delay_xgb.joblib'
+
+    rows = dataset.load_training_set(training_parquet)
+    updates = tmp_path / 'updates'
+    for i, day in enumerate(['2025-05-01', '2025-05-02', '2025-05-03']):
+        incremental.append_day(rows.iloc[i * 200:(i + 1) * 200], day, 'PRG', updates)
+
+    argv = ['--skip-collect', '--updates', str(updates), '--models', str(models_dir), '--processed', str(tmp_path),
+            '--rounds', '5']
+    incremental.main(argv)
+    assert 'MAE (Holdout)' in capsys.readouterr().out
+    assert joblib.load(model_path).get_booster().num_boosted_rounds() == 15
+    assert incremental.read_learned_days(models_dir) == ['2025-05-01', '2025-05-02']
+
+    # nothing new - the ensemble does not grow
+    incremental.main(argv)
+    assert joblib.load(model_path).get_booster().num_boosted_rounds() == 15
+
+    # an update fitted to noise is rejected on the holdout day
+    noise = rows.iloc[:200].assign(delay=rows['delay'].iloc[:200].sample(frac=1, random_state=0).to_numpy() * 50)
+    holdout = rows.iloc[400:600]
+    assert incremental.update_model(models_dir, noise, tmp_path, rounds=20, holdout=holdout) is None
+    assert joblib.load(model_path).get_booster().num_boosted_rounds() == 15
+
+    assert incremental.update_model(models_dir, rows.iloc[:200], tmp_path, rounds=5, max_rounds=19) is None
+
+
+def test_update_continues_early_stopped_model(training_parquet, tmp_path):
+    """
+    A model trained with early stopping is updated from its best iteration, the new trees change the predictions
+    of the model and of its exported native formats.
+    """
+    import joblib
+    from xgboost import XGBRegressor
+    from flight_delay.predictor import BoosterPredictor, NumpyTreePredictor
+    from flight_delay.training import incremental
+
+    df, categories = dataset.encode_categories(dataset.load_training_set(training_parquet))
+    x, y = df[list(dataset.FEATURE_COLUMNS)], df['delay']
+    model = XGBRegressor(n_estimators=200, max_depth=3, learning_rate=1.0, early_stopping_rounds=5)
+    model.fit(x.iloc[:300], y.iloc[:300], eval_set=[(x.iloc[300:], y.iloc[300:])], verbose=False)
+    assert model.best_iteration + 1 < model.get_booster().num_boosted_rounds()
+    models_dir = tmp_path / 'models'
+    models_dir.mkdir()
+    joblib.dump(model, models_dir / 'flight_delay_xgb.joblib')
+    dataset.save_artifacts(x, categories, tmp_path)
+
+    rows = dataset.load_training_set(training_parquet)
+    shifted = rows.assign(delay=rows['delay'] + 30)
+    updated = incremental.update_model(models_dir, shifted.iloc[:400], tmp_path, rounds=10,
+                                       holdout=shifted.iloc[400:])
+
+    assert updated is not None
+    assert updated.get_booster().num_boosted_rounds() == model.best_iteration + 1 + 10
+    assert np.abs(updated.predict(x) - model.predict(x)).min() > 1
+    for backend, path in [(BoosterPredictor, 'flight_delay_xgb.ubj'), (NumpyTreePredictor, 'flight_delay_xgb.json')]:
+        served = backend.load(models_dir / path)
+        np.testing.assert_allclose(served.predict(x), updated.predict(x), rtol=1e-4, atol=1e-3)
+
+
+def test_update_publishes_registry_version(training_parquet, tmp_path):
+    """
+    With a registry the served version is updated (with its schema) and published as a new version,
+    the root model files are not written.
+    """
+    import joblib
+    from xgboost import XGBRegressor
+    from flight_delay import registry
+    from flight_delay.training import incremental
+
+    df, categories = dataset.encode_categories(dataset.load_training_set(training_parquet))
+    x, y = df[list(dataset.FEATURE_COLUMNS)], df['delay']
+    trained = tmp_path / 'trained'
+    trained.mkdir()
+    joblib.dump(XGBRegressor(n_estimators=10, max_depth=3).fit(x, y), trained / 'flight_delay_xgb.joblib')
+    dataset.save_artifacts(x, categories, trained)
+    models_dir = tmp_path / 'models'
+    registry.publish(models_dir, trained, trained, version='v1')
+
+    rows = dataset.load_training_set(training_parquet)
+    updates = tmp_path / 'updates'
+    for i, day in enumerate(['2025-05-01', '2025-05-02', '2025-05-03']):
+        incremental.append_day(rows.iloc[i * 200:(i + 1) * 200], day, 'PRG', updates)
+
+    # --processed points to nowhere, the schema comes from the version
+    argv = ['--skip-collect', '--updates', str(updates), '--models', str(models_dir),
+            '--processed', str(tmp_path / 'missing'), '--rounds', '5']
+    incremental.main([*argv, '--shadow'])
+
+    shadow = registry.shadow_version(models_dir)
+    assert sorted(registry.list_versions(models_dir)) == sorted(['v1', shadow])
+    assert registry.current_version(models_dir) == 'v1'
+    metadata = registry.read_metadata(models_dir, shadow)
+    assert metadata['base_version'] == 'v1'
+    assert metadata['learned_days'] == ['2025-05-01', '2025-05-02']
+    assert not (models_dir / 'flight_delay_xgb.joblib').exists()
+    assert not (models_dir / incremental.LEARNED_DAYS_FILE).exists()
+    assert joblib.load(models_dir / 'versions' / 'v1' / 'flight_delay_xgb.joblib').get_booster().num_boosted_rounds() == 10
+
+    updated = registry.load_version(models_dir, shadow, 'joblib')
+    assert updated.model.get_booster().num_boosted_rounds() == 15
+    assert updated.schema.categories == registry.load_version(models_dir, 'v1', 'joblib').schema.categories
+
+    # the served version has not learned the days yet, without --shadow the update is served
+    days, holdout_day = incremental.plan_update(incremental.collected_days(updates, 'PRG'), [])
+    holdout = incremental.load_days(updates, 'PRG', [holdout_day])
+    version = incremental.publish_update(models_dir, incremental.load_days(updates, 'PRG', days), days, holdout,
+                                         rounds=5, version='v3')
+    assert version == 'v3'
+    assert registry.current_version(models_dir) == 'v3'
+    assert registry.read_metadata(models_dir, 'v3')['base_version'] == 'v1'
+    assert [path.name for path in models_dir.iterdir() if path.name.startswith('.update-')] == []
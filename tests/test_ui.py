@@ -39,6 +39,9 @@ sys.modules['streamlit'] = SimpleNamespace(
     pills=lambda *args, **kwargs: [ 'TEST123' ],
     expander=lambda label, expanded=False: DummySpinner(),
     pydeck_chart=lambda *args, **kwargs: None,
+    fragment=lambda *args, **kwargs: lambda f: f,
+    cache_data=lambda *args, **kwargs: lambda f: f,
+    cache_resource=lambda f: f,
 )
 
 # We have to import only after mocking streamlit
@@ -113,6 +116,37 @@ def test_render_timetable_runs(timetable_df):
     ui.render_timetable(timetable_df)
 
 
+def test_render_timetable_predicted_delays(timetable_df, monkeypatch):
+    """
+    Precomputed delays are shown in their own column, flights without a forecast stay empty.
+    """
+    rendered = {}
+    monkeypatch.setattr(ui.st, 'dataframe', lambda data, **kwargs: rendered.setdefault('data', data.data))
+
+    ui.render_timetable(timetable_df, pd.Series([12, None], index=timetable_df.index, dtype='Int64'))
+
+    assert rendered['data']['Predicted Delay'].tolist() == ['12 min', '']
+
+
+def test_timetable_view_keeps_upcoming_flights_of_the_day():
+    """
+    The board shows the flights of the given day that have not left yet.
+    """
+    df = pd.DataFrame({
+        'departure.scheduledTime': ['2025-03-12T05:00:00Z', '2025-03-12T09:30:00Z', '2025-03-13T09:00:00Z'],
+        'flight.iataNumber': ['AB1', 'AB2', 'AB3'],
+        'arrival.iataCode': ['FRA', 'AMS', 'CDG'],
+        'status': ['active', 'scheduled', 'scheduled'],
+        'airline.name': ['Lufthansa', 'KLM', 'Air France'],
+    })
+
+    view = ui.timetable_view(df, now=pd.Timestamp('2025-03-12 06:00', tz='UTC'))
+
+    assert view['Flight Number'].tolist() == ['AB2']
+    assert view['Scheduled Time'].tolist() == ['09:30']
+    assert ui.timetable_view(df[['flight.iataNumber']]) is None
+
+
 @pytest.fixture
 def incomplete_df():
     """
@@ -0,0 +1,73 @@
+"""
+Tests for src/flight_delay/weather_store.py
+Hourly weather history and forecasts merged into one array and looked up by the hour offset.
+"""
+import numpy as np
+import pandas as pd
+from flight_delay import weather_store
+from flight_delay.weather_store import HourlyWeather
+
+COLUMNS = ('temp_c', 'precip_mm', 'wind_kph')
+
+
+def hourly(start: str, temps: list[float]) -> pd.DataFrame:
+    return pd.DataFrame({
+        'time': pd.date_range(start, periods=len(temps), freq='h'),
+        'temp_c': temps,
+        'precip_mm': 0.0,
+        'wind_kph': 10.0,
+    })
+
+
+def test_later_frames_win_and_gaps_are_missing():
+    """
+    The forecast overrides the history on the same hour, hours between them have no weather.
+    """
+    store = HourlyWeather.from_frames(
+        [hourly('2025-01-01 00:00', [1.0, 2.0, 3.0]), hourly('2025-01-01 02:00', [30.0]),
+         hourly('2025-01-01 06:00', [6.0])],
+        COLUMNS,
+    )
+
+    assert len(store) == 7
+    assert store.end == pd.Timestamp('2025-01-01 06:00')
+    assert store.get(pd.Timestamp('2025-01-01 01:00')) == (2.0, 0.0, 10.0)
+    assert store.get(pd.Timestamp('2025-01-01 02:00'))[0] == 30.0
+    assert store.get(pd.Timestamp('2025-01-01 04:00')) is None
+    assert store.get(pd.Timestamp('2024-12-31 23:00')) is None
+    assert store.get(pd.Timestamp('2025-01-01 07:00')) is None
+    assert store.get(pd.Timestamp('2025-01-01 01:30')) is None
+    assert store.get(None) is None
+
+
+def test_lookup_matches_get():
+    """
+    The vectorized lookup returns the same values, NaN for missing hours and NaT.
+    """
+    store = HourlyWeather.from_frames([hourly('2025-01-01 00:00', [1.0, 2.0, 3.0])], COLUMNS)
+    hours = pd.Series(pd.to_datetime(['2025-01-01 02:00', None, '2025-01-02 00:00', '2025-01-01 00:00']))
+
+    values = store.lookup(hours)
+
+    assert values.shape == (4, 3)
+    np.testing.assert_array_equal(values[[0, 3], 0], [3.0, 1.0])
+    assert np.isnan(values[[1, 2]]).all()
+    assert np.isnan(HourlyWeather.from_frames([], COLUMNS).lookup(hours)).all()
+
+
+def test_history_in_local_time(tmp_path):
+    """
+    The UTC history is converted to the local time of the airport, files of other airports are not read.
+    """
+    hourly('2025-03-30 00:00', [0.0, 1.0, 2.0]).to_csv(tmp_path / 'weather_250101_250430.csv', index=False)
+    hourly('2025-03-30 00:00', [9.0]).to_csv(tmp_path / 'weather_VIE_250101_250430.csv', index=False)
+
+    assert [path.name for path in weather_store.history_paths('PRG', tmp_path)] == ['weather_250101_250430.csv']
+    history = weather_store.load_history('PRG', COLUMNS, tmp_path)
+
+    # clocks go forward at 01:00 UTC: UTC+1 before, UTC+2 after
+    assert history['time'].tolist() == pd.to_datetime(
+        ['2025-03-30 01:00', '2025-03-30 03:00', '2025-03-30 04:00']
+    ).tolist()
+    assert weather_store.load_history('VIE', COLUMNS, tmp_path)['temp_c'].tolist() == [9.0]
+    assert weather_store.load_history('FRA', COLUMNS, tmp_path).empty